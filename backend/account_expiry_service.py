@@ -0,0 +1,491 @@
+"""
+Account Expiry Service - Set-based subscription and reseller trial jobs
+
+The daily scheduler jobs that suspend expired customer subscriptions,
+remind resellers three days before their trial ends and suspend resellers
+whose trial has ended. Each job:
+
+- streams matching documents from a cursor in batches of EXPIRY_BATCH_SIZE
+  instead of loading them all (the trial jobs used to stop at 100)
+- suspends a batch with one update_many whose filter repeats the expiry
+  predicate, so an account renewed or extended since it was read is left
+  alone; the accounts actually suspended are read back by their run stamp
+- resolves reseller subdomains from one prefetched map and reseller owners
+  with one lookup per batch
+- queues its notification emails through the outbox, one insert per batch
+
+Every run is recorded in `scheduler_job_runs` (processed, updated and
+emails queued), kept for JOB_RUN_RETENTION_DAYS by a TTL index.
+
+Deploying: the trial jobs never ran before this service (they failed on an
+import), so the first run finds every trial that ended since. A run
+suspends at most TRIAL_SUSPENSION_MAX_PER_RUN resellers (0 for no limit),
+and TRIAL_SUSPENSION_DRY_RUN=true only counts them; check the first run in
+GET /api/scheduler/job-runs before lifting either.
+"""
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable via environment)
+EXPIRY_BATCH_SIZE = int(os.environ.get("EXPIRY_BATCH_SIZE", 500))
+JOB_RUN_RETENTION_DAYS = int(os.environ.get("JOB_RUN_RETENTION_DAYS", 30))
+TRIAL_SUSPENSION_MAX_PER_RUN = int(os.environ.get("TRIAL_SUSPENSION_MAX_PER_RUN", 100))
+TRIAL_SUSPENSION_DRY_RUN = os.environ.get("TRIAL_SUSPENSION_DRY_RUN", "false").lower() == "true"
+
+_NOTIFICATION_KEY_INDEX = "notification_key_unique"
+
+# Trial reminders go out when the trial ends between 2.5 and 3.5 days from now
+TRIAL_REMINDER_WINDOW_DAYS = (2.5, 3.5)
+
+
+def _date_range(field: str, lower: Optional[datetime] = None, upper: Optional[datetime] = None) -> Dict[str, Any]:
+    """Filter on a date stored either as a datetime or as an ISO string"""
+    as_date, as_string = {}, {}
+    if lower is not None:
+        as_date["$gte"], as_string["$gte"] = lower, lower.isoformat()
+    if upper is not None:
+        as_date["$lt"], as_string["$lt"] = upper, upper.isoformat()
+    return {"$or": [{field: as_date}, {field: as_string}]}
+
+
+def _expired_subscription_email(user: Dict, pricing_link: str) -> Dict[str, Any]:
+    first_name = (user.get("full_name") or "there").split()[0]
+    html_body = f'''
+    <html>
+    <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
+        <div style="text-align: center; margin-bottom: 30px;">
+            <h1 style="color: #dc2626;">Subscription Expired</h1>
+        </div>
+        <p>Hi {first_name},</p>
+        <p>Your subscription has expired and your account access has been temporarily suspended.</p>
+        <p><strong>What this means:</strong></p>
+        <ul>
+            <li>You can still log in to view your account</li>
+            <li>Premium features (CV Builder, AI tools, etc.) are now disabled</li>
+            <li>Your saved documents remain safe</li>
+        </ul>
+        <p><strong>To reactivate your account:</strong></p>
+        <div style="text-align: center; margin: 30px 0;">
+            <a href="{pricing_link}" style="background: linear-gradient(135deg, #1e40af, #7c3aed); color: white; padding: 14px 28px; text-decoration: none; border-radius: 8px; font-weight: bold;">
+                Resubscribe Now
+            </a>
+        </div>
+        <p>If you have any questions, please don't hesitate to contact our support team.</p>
+        <hr style="margin: 30px 0; border: none; border-top: 1px solid #eee;">
+        <p style="color: #888; font-size: 12px;">This email was sent by UpShift.</p>
+    </body>
+    </html>
+    '''
+    return {
+        "to_email": user["email"],
+        "subject": "Your Subscription Has Expired - Action Required",
+        "html_body": html_body,
+        "text_body": f"Hi {user.get('full_name', 'there')}, your subscription has expired. Visit {pricing_link} to resubscribe.",
+        "email_type": "subscription_expired",
+        "log": {"user_id": user["id"], "sent_by": "system"}
+    }
+
+
+def _trial_reminder_email(reseller: Dict, owner: Dict, upgrade_url: str) -> Dict[str, Any]:
+    html_body = f"""
+    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+        <div style="background: linear-gradient(135deg, #1e40af 0%, #7c3aed 100%); padding: 30px; text-align: center;">
+            <h1 style="color: white; margin: 0;">Trial Ending Soon</h1>
+        </div>
+        <div style="padding: 30px; background: #f9fafb;">
+            <p>Hi {owner.get('full_name', 'there')},</p>
+
+            <p>Your <strong>{reseller.get('brand_name', reseller.get('company_name'))}</strong> reseller trial ends in <strong>3 days</strong>.</p>
+
+            <p>To continue using your white-label platform without interruption:</p>
+
+            <div style="text-align: center; margin: 30px 0;">
+                <a href="{upgrade_url}" style="background: #1e40af; color: white; padding: 15px 30px; text-decoration: none; border-radius: 8px; font-weight: bold;">
+                    Upgrade Now
+                </a>
+            </div>
+
+            <p>After your trial ends:</p>
+            <ul>
+                <li>Your partner portal will be temporarily disabled</li>
+                <li>Your customers won't be able to access the platform</li>
+                <li>All your data will be preserved</li>
+            </ul>
+
+            <p>Questions? Reply to this email or contact our support team.</p>
+
+            <p>Best regards,<br>The UpShift Team</p>
+        </div>
+    </div>
+    """
+    return {
+        "to_email": owner["email"],
+        "subject": f"Your {reseller.get('brand_name', 'reseller')} trial ends in 3 days",
+        "html_body": html_body,
+        "text_body": f"Hi {owner.get('full_name', 'there')}, your reseller trial ends in 3 days. Visit {upgrade_url} to upgrade and continue using your white-label platform.",
+        "email_type": "reseller_trial_reminder",
+        "log": {"reseller_id": reseller["id"], "sent_by": "system"}
+    }
+
+
+def _trial_expired_email(reseller: Dict, owner: Dict, upgrade_url: str) -> Dict[str, Any]:
+    html_body = f"""
+    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+        <div style="background: #dc2626; padding: 30px; text-align: center;">
+            <h1 style="color: white; margin: 0;">Trial Period Ended</h1>
+        </div>
+        <div style="padding: 30px; background: #f9fafb;">
+            <p>Hi {owner.get('full_name', 'there')},</p>
+
+            <p>Your free trial for <strong>{reseller.get('brand_name', reseller.get('company_name'))}</strong> has ended.</p>
+
+            <p>Your reseller account has been temporarily suspended. This means:</p>
+            <ul>
+                <li>Your partner portal is currently offline</li>
+                <li>Your customers cannot access the platform</li>
+                <li>All your data is safely preserved</li>
+            </ul>
+
+            <p>To reactivate your account immediately:</p>
+
+            <div style="text-align: center; margin: 30px 0;">
+                <a href="{upgrade_url}" style="background: #1e40af; color: white; padding: 15px 30px; text-decoration: none; border-radius: 8px; font-weight: bold;">
+                    Subscribe Now
+                </a>
+            </div>
+
+            <p>Choose from our plans:</p>
+            <ul>
+                <li><strong>Starter</strong> - R2,499/month (1,000 CVs)</li>
+                <li><strong>Professional</strong> - R4,999/month (3,500 CVs)</li>
+                <li><strong>Enterprise</strong> - Custom pricing (Unlimited)</li>
+            </ul>
+
+            <p>Questions? Reply to this email or contact our support team.</p>
+
+            <p>Best regards,<br>The UpShift Team</p>
+        </div>
+    </div>
+    """
+    return {
+        "to_email": owner["email"],
+        "subject": f"Your {reseller.get('brand_name', 'reseller')} trial has ended - Account suspended",
+        "html_body": html_body,
+        "text_body": f"Hi {owner.get('full_name', 'there')}, your reseller trial has ended and your account has been suspended. Visit {upgrade_url} to subscribe and reactivate your platform.",
+        "email_type": "reseller_trial_expired",
+        "log": {"reseller_id": reseller["id"], "sent_by": "system"}
+    }
+
+
+class AccountExpiryService:
+    """Suspends expired subscriptions and reseller trials in batches"""
+
+    def __init__(
+        self,
+        batch_size: int = EXPIRY_BATCH_SIZE,
+        max_trial_suspensions: int = TRIAL_SUSPENSION_MAX_PER_RUN,
+        trial_dry_run: bool = TRIAL_SUSPENSION_DRY_RUN
+    ):
+        self.db = None
+        self.batch_size = batch_size
+        self.max_trial_suspensions = max_trial_suspensions
+        self.trial_dry_run = trial_dry_run
+        self.last_runs: Dict[str, Dict[str, Any]] = {}
+
+    def set_db(self, database):
+        self.db = database
+
+    async def ensure_indexes(self):
+        await self.db.scheduler_job_runs.create_index("expires_at", expireAfterSeconds=0)
+        await self.db.scheduler_job_runs.create_index([("job", 1), ("started_at", -1)])
+        await self._ensure_notification_key_index()
+
+    async def _ensure_notification_key_index(self):
+        """Unique reminder keys, replacing the earlier non-unique index"""
+        notifications = self.db.notifications
+        existing = await notifications.index_information()
+        legacy = existing.get("key_1")
+        if legacy and not legacy.get("unique"):
+            await notifications.drop_index("key_1")
+
+        # Reminders claimed twice before the index was unique: keep the first claim
+        duplicates = notifications.aggregate([
+            {"$match": {"key": {"$exists": True}}},
+            {"$sort": {"sent_at": 1}},
+            {"$group": {"_id": "$key", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}}
+        ])
+        extra = [_id async for duplicate in duplicates for _id in duplicate["ids"][1:]]
+        if extra:
+            result = await notifications.delete_many({"_id": {"$in": extra}})
+            logger.warning(f"Removed {result.deleted_count} duplicate notification keys")
+
+        try:
+            await notifications.create_index("key", unique=True, sparse=True, name=_NOTIFICATION_KEY_INDEX)
+        except (DuplicateKeyError, OperationFailure) as e:
+            # A key claimed again while duplicates were being removed; retried on next startup
+            logger.error(f"Cannot create unique notification key index: {e}")
+            await notifications.create_index("key", sparse=True)
+
+    async def _batches(self, collection, query: Dict, projection: Dict):
+        """Matching documents from a cursor, batch_size at a time"""
+        batch = []
+        async for document in collection.find(query, projection).batch_size(self.batch_size):
+            batch.append(document)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def _owners(self, resellers: List[Dict]) -> Dict[str, Dict]:
+        owner_ids = [r["owner_user_id"] for r in resellers if r.get("owner_user_id")]
+        if not owner_ids:
+            return {}
+        owners = await self.db.users.find(
+            {"id": {"$in": owner_ids}},
+            {"_id": 0, "id": 1, "email": 1, "full_name": 1}
+        ).to_list(None)
+        return {owner["id"]: owner for owner in owners}
+
+    async def _queue(self, messages: List[Dict[str, Any]]) -> int:
+        from email_outbox import email_outbox
+
+        if not messages:
+            return 0
+        await email_outbox.enqueue_many(messages)
+        return len(messages)
+
+    async def _record_run(self, job: str, started_at: datetime, started: float, **counts) -> Dict[str, Any]:
+        run = {
+            "id": str(uuid.uuid4()),
+            "job": job,
+            "started_at": started_at,
+            "finished_at": datetime.now(timezone.utc),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            **counts,
+            "expires_at": started_at + timedelta(days=JOB_RUN_RETENTION_DAYS)
+        }
+        try:
+            await self.db.scheduler_job_runs.insert_one(dict(run))
+        except Exception as e:
+            logger.error(f"Failed to record {job} run: {e}")
+        run.pop("_id", None)
+        self.last_runs[job] = run
+        return run
+
+    async def suspend_expired_subscriptions(self) -> Dict[str, Any]:
+        """Suspend customers whose subscription has expired and email them"""
+        from email_service import email_service
+
+        started, now = time.perf_counter(), datetime.now(timezone.utc)
+        expired = {
+            "status": "active",
+            "active_tier": {"$ne": None},
+            "subscription_expires_at": {"$lt": now},
+            "role": "customer"  # Only suspend customer accounts, not admins
+        }
+        processed = suspended = emails_queued = 0
+
+        subdomains = {
+            r["id"]: r["subdomain"]
+            async for r in self.db.resellers.find({"subdomain": {"$nin": [None, ""]}}, {"_id": 0, "id": 1, "subdomain": 1})
+        }
+        frontend_url = os.environ.get('FRONTEND_URL', os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:3000')).rstrip('/')
+
+        projection = {"_id": 0, "id": 1, "email": 1, "full_name": 1, "reseller_id": 1}
+        async for batch in self._batches(self.db.users, expired, projection):
+            processed += len(batch)
+            ids = [user["id"] for user in batch]
+            result = await self.db.users.update_many(
+                {**expired, "id": {"$in": ids}},
+                {"$set": {
+                    "status": "suspended",
+                    "active_tier": None,
+                    "suspended_at": now,
+                    "suspension_reason": "subscription_expired"
+                }}
+            )
+            suspended += result.modified_count
+            if not email_service.is_configured or not result.modified_count:
+                continue
+
+            # Only those this run suspended; a renewal in between kept the others active
+            suspended_ids = set(await self.db.users.distinct(
+                "id", {"id": {"$in": ids}, "suspended_at": now, "suspension_reason": "subscription_expired"}
+            ))
+            messages = []
+            for user in batch:
+                if user["id"] not in suspended_ids or not user.get("email"):
+                    continue
+                subdomain = subdomains.get(user.get("reseller_id"))
+                reseller_path = f"/partner/{subdomain}" if subdomain else ""
+                messages.append(_expired_subscription_email(user, f"{frontend_url}{reseller_path}/pricing"))
+            try:
+                emails_queued += await self._queue(messages)
+            except Exception as e:
+                logger.warning(f"Failed to queue {len(messages)} suspension emails: {e}")
+
+        return await self._record_run(
+            "subscription_expiry", now, started,
+            processed=processed, updated=suspended, emails_queued=emails_queued
+        )
+
+    async def send_trial_reminders(self) -> Dict[str, Any]:
+        """Remind reseller owners three days before their trial ends (once per reseller)"""
+        from email_service import email_service
+
+        started, now = time.perf_counter(), datetime.now(timezone.utc)
+        earliest, latest = TRIAL_REMINDER_WINDOW_DAYS
+        ending_soon = {
+            "status": "trial",
+            "is_demo_account": {"$ne": True},
+            **_date_range("subscription.trial_end_date", now + timedelta(days=earliest), now + timedelta(days=latest))
+        }
+        processed = reminded = 0
+        upgrade_url = f"{os.environ.get('REACT_APP_BACKEND_URL', '')}/reseller-dashboard/subscription"
+
+        projection = {"_id": 0, "id": 1, "owner_user_id": 1, "brand_name": 1, "company_name": 1}
+        async for batch in self._batches(self.db.resellers, ending_soon, projection):
+            processed += len(batch)
+            if not email_service.is_configured:
+                # Leave the reminder unsent so a later run in the window can still send it
+                continue
+            owners = await self._owners(batch)
+            recipients = [(r, owners[r["owner_user_id"]]) for r in batch if r.get("owner_user_id") in owners]
+            if not recipients:
+                continue
+
+            # Claim each reminder key first; resellers already reminded are not upserted again
+            claims = [
+                UpdateOne(
+                    {"key": f"trial_reminder_3day_{reseller['id']}"},
+                    {"$setOnInsert": {
+                        "reseller_id": reseller["id"],
+                        "type": "trial_reminder",
+                        "sent_at": now,
+                        "days_before_expiry": 3
+                    }},
+                    upsert=True
+                )
+                for reseller, _ in recipients
+            ]
+            result = await self.db.notifications.bulk_write(claims, ordered=False)
+            claimed = [recipients[i] for i in sorted(result.upserted_ids)]
+            messages = [_trial_reminder_email(reseller, owner, upgrade_url) for reseller, owner in claimed]
+            try:
+                reminded += await self._queue(messages)
+            except Exception as e:
+                logger.error(f"Failed to queue {len(messages)} trial reminders: {e}")
+                await self.db.notifications.delete_many({
+                    "key": {"$in": [f"trial_reminder_3day_{reseller['id']}" for reseller, _ in claimed]},
+                    "sent_at": now
+                })
+
+        return await self._record_run(
+            "reseller_trial_reminders", now, started,
+            processed=processed, updated=reminded, emails_queued=reminded
+        )
+
+    async def suspend_expired_trials(self) -> Dict[str, Any]:
+        """
+        Suspend resellers whose trial has ended and email their owners, at most
+        max_trial_suspensions per run; a dry run only counts them.
+        """
+        from email_service import email_service
+
+        started, now = time.perf_counter(), datetime.now(timezone.utc)
+        stamp = now.isoformat()
+        expired = {
+            "status": "trial",
+            "is_demo_account": {"$ne": True},
+            **_date_range("subscription.trial_end_date", upper=now)
+        }
+        processed = suspended = emails_queued = 0
+        limit = self.max_trial_suspensions
+        upgrade_url = f"{os.environ.get('REACT_APP_BACKEND_URL', '')}/reseller-dashboard/subscription"
+
+        projection = {"_id": 0, "id": 1, "owner_user_id": 1, "brand_name": 1, "company_name": 1}
+        async for batch in self._batches(self.db.resellers, expired, projection):
+            if limit and processed >= limit:
+                break
+            if limit:
+                batch = batch[:limit - processed]
+            processed += len(batch)
+            if self.trial_dry_run:
+                continue
+            ids = [reseller["id"] for reseller in batch]
+            result = await self.db.resellers.update_many(
+                {**expired, "id": {"$in": ids}},
+                {"$set": {
+                    "status": "suspended",
+                    "subscription.status": "trial_expired",
+                    "subscription.suspended_at": stamp,
+                    "subscription.suspension_reason": "trial_expired",
+                    "updated_at": now
+                }}
+            )
+            suspended += result.modified_count
+            if not email_service.is_configured or not result.modified_count:
+                continue
+
+            # Only those this run suspended; an extended or converted trial is left out
+            suspended_ids = set(await self.db.resellers.distinct(
+                "id", {"id": {"$in": ids}, "status": "suspended", "subscription.suspended_at": stamp}
+            ))
+            owners = await self._owners(batch)
+            messages = [
+                _trial_expired_email(reseller, owners[reseller["owner_user_id"]], upgrade_url)
+                for reseller in batch
+                if reseller["id"] in suspended_ids and reseller.get("owner_user_id") in owners
+            ]
+            try:
+                emails_queued += await self._queue(messages)
+            except Exception as e:
+                logger.error(f"Failed to queue {len(messages)} trial suspension emails: {e}")
+
+        remaining = 0
+        if limit and processed >= limit:
+            remaining = await self.db.resellers.count_documents(expired)
+            if self.trial_dry_run:
+                # Nothing was suspended, so the count still includes this run's
+                remaining -= processed
+        if self.trial_dry_run:
+            logger.warning(f"Trial suspension dry run: {processed + remaining} resellers have an expired trial, none suspended")
+        elif remaining:
+            logger.warning(
+                f"Trial suspension stopped at TRIAL_SUSPENSION_MAX_PER_RUN={limit}; "
+                f"{remaining} expired trials left for the next run"
+            )
+        return await self._record_run(
+            "reseller_trial_suspension", now, started,
+            processed=processed, updated=suspended, emails_queued=emails_queued,
+            remaining=remaining, dry_run=self.trial_dry_run
+        )
+
+    async def recent_runs(self, job: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        query = {"job": job} if job else {}
+        return await self.db.scheduler_job_runs.find(
+            query, {"_id": 0, "expires_at": 0}
+        ).sort("started_at", -1).limit(limit).to_list(limit)
+
+    def get_stats(self) -> dict:
+        return {
+            "batch_size": self.batch_size,
+            "max_trial_suspensions": self.max_trial_suspensions,
+            "trial_dry_run": self.trial_dry_run,
+            "last_runs": self.last_runs
+        }
+
+
+# Global account expiry service
+account_expiry = AccountExpiryService()
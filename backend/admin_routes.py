@@ -1,9 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Request
+from fastapi import APIRouter, HTTPException, Depends, status, Request, Query
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timezone, timedelta
 import uuid
+import io
 import logging
 
 from reseller_models import (
@@ -11,7 +12,8 @@ from reseller_models import (
     ResellerInvoice, InvoiceItem
 )
 from auth import UserResponse, get_password_hash
-from invoice_pdf_service import invoice_pdf_generator
+from invoice_pdf_service import generate_reseller_invoice_pdf
+from pdf_render_service import pdf_render_service
 
 logger = logging.getLogger(__name__)
 
@@ -1279,59 +1281,14 @@ async def generate_monthly_invoices(
 ):
     """Generate monthly invoices for all active resellers"""
     try:
-        now = datetime.now(timezone.utc)
-        if not period:
-            period = f"{now.year}-{str(now.month).zfill(2)}"
+        from invoicing_service import invoicing_service
         
-        # Get all active resellers
-        resellers = await db.resellers.find(
-            {"status": "active"},
-            {"_id": 0}
-        ).to_list(None)
-        
-        invoices_created = 0
-        
-        for reseller in resellers:
-            # Check if invoice already exists for this period
-            existing = await db.reseller_invoices.find_one({
-                "reseller_id": reseller["id"],
-                "period": period
-            })
-            
-            if existing:
-                continue
-            
-            # Create invoice
-            invoice_number = f"INV-{period}-{str(invoices_created + 1).zfill(4)}"
-            monthly_fee = reseller["subscription"].get("monthly_fee", 250000)
-            
-            invoice = {
-                "id": str(uuid.uuid4()),
-                "reseller_id": reseller["id"],
-                "invoice_number": invoice_number,
-                "amount": monthly_fee,
-                "period": period,
-                "due_date": (now + timedelta(days=15)).isoformat(),
-                "paid_date": None,
-                "status": "pending",
-                "items": [
-                    {
-                        "description": f"Monthly SaaS Subscription - {period}",
-                        "amount": monthly_fee
-                    }
-                ],
-                "created_at": now
-            }
-            
-            await db.reseller_invoices.insert_one(invoice)
-            invoices_created += 1
-        
-        logger.info(f"Generated {invoices_created} invoices for period {period}")
+        result = await invoicing_service.generate_monthly(period, notify=False, sent_by=admin.id)
         
         return {
             "success": True,
-            "invoices_created": invoices_created,
-            "period": period
+            "invoices_created": result["invoices_created"],
+            "period": result["period"]
         }
     except Exception as e:
         logger.error(f"Error generating invoices: {str(e)}")
@@ -1437,7 +1394,8 @@ async def download_invoice_pdf(
         }
         
         # Generate PDF
-        pdf_buffer = invoice_pdf_generator.generate_reseller_invoice_pdf(
+        pdf_bytes = await pdf_render_service.render(
+            generate_reseller_invoice_pdf,
             invoice=invoice,
             reseller=reseller,
             platform_settings=platform_settings
@@ -1446,7 +1404,7 @@ async def download_invoice_pdf(
         filename = f"invoice_{invoice.get('invoice_number', invoice_id)}.pdf"
         
         return StreamingResponse(
-            pdf_buffer,
+            io.BytesIO(pdf_bytes),
             media_type="application/pdf",
             headers={
                 "Content-Disposition": f"attachment; filename={filename}"
@@ -2195,7 +2153,7 @@ async def test_admin_email_connection(admin: UserResponse = Depends(get_current_
     """Test platform SMTP connection"""
     try:
         import smtplib
-        import ssl
+        from smtp_transport import SMTPConfig, smtp_transport
         
         settings = await db.platform_settings.find_one({"key": "email"}, {"_id": 0})
         
@@ -2203,19 +2161,7 @@ async def test_admin_email_connection(admin: UserResponse = Depends(get_current_
             return {"success": False, "error": "Email settings not configured. Please enter SMTP host and username."}
         
         try:
-            encryption = settings.get("encryption", "tls")
-            
-            if encryption == "ssl":
-                context = ssl.create_default_context()
-                with smtplib.SMTP_SSL(settings["smtp_host"], settings["smtp_port"], context=context, timeout=10) as server:
-                    server.login(settings["smtp_user"], settings["smtp_password"])
-            elif encryption == "tls":
-                with smtplib.SMTP(settings["smtp_host"], settings["smtp_port"], timeout=10) as server:
-                    server.starttls()
-                    server.login(settings["smtp_user"], settings["smtp_password"])
-            else:
-                with smtplib.SMTP(settings["smtp_host"], settings["smtp_port"], timeout=10) as server:
-                    server.login(settings["smtp_user"], settings["smtp_password"])
+            await smtp_transport.verify(SMTPConfig.from_settings(settings, timeout=10))
             
             return {"success": True, "message": "SMTP connection successful! Your email settings are working."}
         except smtplib.SMTPAuthenticationError:
@@ -2233,9 +2179,9 @@ async def send_admin_test_email(to_email: str, admin: UserResponse = Depends(get
     """Send a test email using platform SMTP settings"""
     try:
         import smtplib
-        import ssl
         from email.mime.text import MIMEText
         from email.mime.multipart import MIMEMultipart
+        from smtp_transport import SMTPConfig, smtp_transport
         
         settings = await db.platform_settings.find_one({"key": "email"}, {"_id": 0})
         
@@ -2277,24 +2223,10 @@ async def send_admin_test_email(to_email: str, admin: UserResponse = Depends(get
         
         msg.attach(MIMEText(html_content, 'html'))
         
-        encryption = settings.get("encryption", "tls")
         error_message = None
         
         try:
-            if encryption == "ssl":
-                context = ssl.create_default_context()
-                with smtplib.SMTP_SSL(settings["smtp_host"], settings["smtp_port"], context=context, timeout=15) as server:
-                    server.login(settings["smtp_user"], settings["smtp_password"])
-                    server.send_message(msg)
-            elif encryption == "tls":
-                with smtplib.SMTP(settings["smtp_host"], settings["smtp_port"], timeout=15) as server:
-                    server.starttls()
-                    server.login(settings["smtp_user"], settings["smtp_password"])
-                    server.send_message(msg)
-            else:
-                with smtplib.SMTP(settings["smtp_host"], settings["smtp_port"], timeout=15) as server:
-                    server.login(settings["smtp_user"], settings["smtp_password"])
-                    server.send_message(msg)
+            await smtp_transport.send(SMTPConfig.from_settings(settings, timeout=15), from_email, [to_email], msg)
             
             # Log successful email to email_logs collection
             await db.email_logs.insert_one({
@@ -2405,6 +2337,7 @@ async def get_email_status(admin: UserResponse = Depends(get_current_super_admin
         # Count stats
         total_sent = await db.email_logs.count_documents({"status": "sent"})
         total_failed = await db.email_logs.count_documents({"status": "failed"})
+        total_queued = await db.email_logs.count_documents({"status": {"$in": ["queued", "retrying"]}})
         
         # Check if SMTP connection works
         smtp_status = "unknown"
@@ -2413,23 +2346,9 @@ async def get_email_status(admin: UserResponse = Depends(get_current_super_admin
         if settings and settings.get("smtp_host") and settings.get("smtp_user"):
             try:
                 import smtplib
-                encryption = settings.get("encryption", "tls")
-                
-                if encryption == "ssl":
-                    import ssl
-                    context = ssl.create_default_context()
-                    with smtplib.SMTP_SSL(settings["smtp_host"], settings["smtp_port"], context=context, timeout=5) as server:
-                        server.login(settings["smtp_user"], settings["smtp_password"])
-                    smtp_status = "connected"
-                elif encryption == "tls":
-                    with smtplib.SMTP(settings["smtp_host"], settings["smtp_port"], timeout=5) as server:
-                        server.starttls()
-                        server.login(settings["smtp_user"], settings["smtp_password"])
-                    smtp_status = "connected"
-                else:
-                    with smtplib.SMTP(settings["smtp_host"], settings["smtp_port"], timeout=5) as server:
-                        server.login(settings["smtp_user"], settings["smtp_password"])
-                    smtp_status = "connected"
+                from smtp_transport import SMTPConfig, smtp_transport
+                await smtp_transport.verify(SMTPConfig.from_settings(settings, timeout=5))
+                smtp_status = "connected"
             except smtplib.SMTPAuthenticationError as e:
                 smtp_status = "auth_failed"
                 smtp_error = "Authentication failed - check username/password"
@@ -2451,7 +2370,8 @@ async def get_email_status(admin: UserResponse = Depends(get_current_super_admin
             "smtp_error": smtp_error,
             "stats": {
                 "total_sent": total_sent,
-                "total_failed": total_failed
+                "total_failed": total_failed,
+                "total_queued": total_queued
             },
             "recent_logs": recent_logs
         }
@@ -2460,6 +2380,33 @@ async def get_email_status(admin: UserResponse = Depends(get_current_super_admin
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@admin_router.get("/email-outbox", response_model=dict)
+async def get_email_outbox(admin: UserResponse = Depends(get_current_super_admin)):
+    """Get email outbox queue depth, age of the oldest waiting message and recent failures"""
+    try:
+        from email_outbox import email_outbox
+        return {"success": True, **await email_outbox.queue_summary()}
+    except Exception as e:
+        logger.error(f"Error fetching email outbox: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@admin_router.post("/email-outbox/{message_id}/retry", response_model=dict)
+async def retry_outbox_email(message_id: str, admin: UserResponse = Depends(get_current_super_admin)):
+    """Queue a failed outbox email for delivery again"""
+    try:
+        from email_outbox import email_outbox
+        if not await email_outbox.retry(message_id):
+            raise HTTPException(status_code=404, detail="Failed email not found")
+        logger.info(f"Outbox email {message_id} requeued by admin {admin.email}")
+        return {"success": True, "message": "Email queued for delivery"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrying outbox email: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ==================== Platform Pricing Routes ====================
 
 @admin_router.get("/platform-pricing", response_model=dict)
@@ -2645,32 +2592,34 @@ async def save_openai_settings(data: dict, admin: UserResponse = Depends(get_cur
 async def test_openai_connection(admin: UserResponse = Depends(get_current_super_admin)):
     """Test OpenAI API connection"""
     try:
-        import os
-        from emergentintegrations.llm.chat import LlmChat, UserMessage
+        from llm_gateway import llm_gateway
         
         # Get settings
         settings = await db.platform_settings.find_one({"key": "openai_settings"}, {"_id": 0})
         
-        # Determine which key to use
+        # A custom key is tested as saved; otherwise the gateway's own key is used
+        api_key = None
         if settings and not settings.get("is_emergent_key", True) and settings.get("api_key"):
             api_key = settings["api_key"]
-        else:
-            api_key = os.environ.get("EMERGENT_LLM_KEY")
-        
-        if not api_key:
-            return {"success": False, "detail": "No API key configured"}
         
         model = settings.get("model", "gpt-4o") if settings else "gpt-4o"
         
-        # Test with a simple request
-        chat = LlmChat(
-            api_key=api_key,
-            session_id=f"test-{admin.id}",
-            system_message="You are a helpful assistant."
-        ).with_model("openai", model)
-        
-        user_message = UserMessage(text="Say 'Connection successful!' and nothing else.")
-        response = await chat.send_message(user_message)
+        # Test with a simple request, reporting the first failure instead of retrying
+        try:
+            response = await llm_gateway.complete(
+                "Say 'Connection successful!' and nothing else.",
+                system_message="You are a helpful assistant.",
+                endpoint="admin_connection_test",
+                session_id=f"test-{admin.id}",
+                model=model,
+                provider="openai",
+                api_key=api_key,
+                max_retries=0,
+                cache=False
+            )
+        except HTTPException as e:
+            # Gateway errors (breaker open, timeout, quota, no key configured)
+            return {"success": False, "detail": e.detail}
         
         if response and "successful" in response.lower():
             return {
@@ -3161,7 +3110,7 @@ async def cancel_admin_booking(
             email_settings = await db.platform_settings.find_one({"key": "email"}, {"_id": 0})
             if email_settings and email_settings.get("smtp_host"):
                 email_service.configure(email_settings)
-                await email_service.send_email(
+                await email_service.queue_email(
                     to_email=booking["email"],
                     subject="Your Strategy Call Booking Has Been Cancelled - UpShift",
                     html_body=f"""
@@ -3174,7 +3123,8 @@ async def cancel_admin_booking(
                         <p>Best regards,<br>The UpShift Team</p>
                     </body>
                     </html>
-                    """
+                    """,
+                    email_type="booking_cancelled"
                 )
         except Exception as email_error:
             logger.warning(f"Could not send cancellation email: {str(email_error)}")
@@ -3490,3 +3440,107 @@ async def delete_recruiter(
     except Exception as e:
         logger.error(f"Error deleting recruiter: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# ==================== System Performance ====================
+
+@admin_router.get("/system/pdf-rendering", response_model=dict)
+async def get_pdf_rendering_stats(
+    admin: UserResponse = Depends(get_current_super_admin)
+):
+    """Get PDF render pool, render cache, CV photo, DOCX conversion, generated CV, text extraction, ATS cache, LLM gateway, LLM response cache, LLM metrics, assistant session, AI job queue, SMTP pool, email outbox and campaign statistics"""
+    from pdf_cache_service import pdf_render_cache
+    from photo_service import photo_service
+    from docx_conversion_service import docx_conversion_service
+    from generated_artifact_store import generated_artifact_store
+    from text_extraction_service import text_extraction_service
+    from ats_cache_service import ats_cache_service
+    from llm_gateway import llm_gateway
+    from llm_response_cache import llm_response_cache
+    from assistant_session_service import assistant_sessions
+    from job_queue_service import job_queue
+    from llm_metrics import llm_metrics
+    from smtp_transport import smtp_transport
+    from email_outbox import email_outbox
+    from campaign_service import campaign_sender
+    from email_template_cache import email_template_cache
+    from invoicing_service import invoicing_service
+    from account_expiry_service import account_expiry
+    
+    return {
+        "render_pool": pdf_render_service.get_stats(),
+        "render_cache": pdf_render_cache.get_stats(),
+        "photos": photo_service.get_stats(),
+        "docx_conversion": docx_conversion_service.get_stats(),
+        "generated_cvs": generated_artifact_store.get_stats(),
+        "text_extraction": text_extraction_service.get_stats(),
+        "ats_cache": ats_cache_service.get_stats(),
+        "llm_gateway": llm_gateway.get_stats(),
+        "llm_response_cache": llm_response_cache.get_stats(),
+        "assistant_sessions": assistant_sessions.get_stats(),
+        "ai_jobs": job_queue.get_stats(),
+        "llm_metrics": llm_metrics.get_stats(),
+        "smtp": smtp_transport.get_stats(),
+        "email_outbox": email_outbox.get_stats(),
+        "email_campaigns": campaign_sender.get_stats(),
+        "email_templates": email_template_cache.get_stats(),
+        "invoicing": invoicing_service.get_stats(),
+        "account_expiry": account_expiry.get_stats()
+    }
+
+
+LLM_USAGE_GROUPS = ("endpoint", "route", "reseller_id", "model", "date")
+
+
+@admin_router.get("/system/llm-usage", response_model=dict)
+async def get_llm_usage(
+    days: int = Query(30, ge=1, le=366),
+    group_by: str = Query("endpoint", description="endpoint, route, reseller_id, model or date"),
+    admin: UserResponse = Depends(get_current_super_admin)
+):
+    """AI usage, cost drivers and latency from the daily LLM usage rollups"""
+    from llm_metrics import llm_metrics
+    
+    if group_by not in LLM_USAGE_GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(LLM_USAGE_GROUPS)}")
+    try:
+        # Include calls not yet written by the periodic flush
+        await llm_metrics.flush()
+        return await llm_metrics.usage_report(days, group_by)
+    except Exception as e:
+        logger.error(f"Error building LLM usage report: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to load AI usage")
+
+
+@admin_router.post("/system/migrate-document-pdfs", response_model=dict)
+async def migrate_document_pdfs_to_blob_store(
+    limit: Optional[int] = None,
+    admin: UserResponse = Depends(get_current_super_admin)
+):
+    """Move legacy base64 pdf_content out of user_documents into the blob store"""
+    try:
+        from blob_store import migrate_document_pdfs
+        
+        result = await migrate_document_pdfs(db, limit=limit)
+        logger.info(f"Document PDF migration run by {admin.email}: {result}")
+        return {"success": True, **result}
+    except Exception as e:
+        logger.error(f"Error migrating document PDFs: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@admin_router.post("/system/migrate-cv-photos", response_model=dict)
+async def migrate_cv_photos(
+    limit: Optional[int] = None,
+    admin: UserResponse = Depends(get_current_super_admin)
+):
+    """Normalize inline base64 CV photos in saved documents and replace them with references"""
+    try:
+        from photo_service import migrate_document_photos
+        
+        result = await migrate_document_photos(db, limit=limit)
+        logger.info(f"CV photo migration run by {admin.email}: {result}")
+        return {"success": True, **result}
+    except Exception as e:
+        logger.error(f"Error migrating CV photos: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -7,13 +7,14 @@ from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime, timezone
 from uuid import uuid4
-import os
 import logging
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from llm_gateway import llm_gateway
+from event_stream import sse_event, event_stream_response
+from assistant_session_service import assistant_sessions
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +26,7 @@ db = None
 def set_db(database):
     global db
     db = database
+    assistant_sessions.set_db(database)
 
 # Pydantic Models
 class ChatMessageRequest(BaseModel):
@@ -137,35 +139,22 @@ When users ask to go somewhere, provide these exact URLs:
 
 Remember: Your goal is to help users succeed in their career journey with UpShift's tools!"""
 
-# Store active chat sessions in memory (for conversation context)
-chat_sessions = {}
+async def get_chat_session(session_id: str):
+    """Get the chat for a session (bounded in memory, rehydrated from chat history)"""
+    return await assistant_sessions.get(session_id, UPSHIFT_SYSTEM_PROMPT)
 
 @ai_assistant_router.post("/chat", response_model=ChatMessageResponse)
 async def chat_with_assistant(request: ChatMessageRequest):
     """Send a message to the AI assistant and get a response"""
     try:
-        api_key = os.environ.get("EMERGENT_LLM_KEY")
-        if not api_key:
-            raise HTTPException(status_code=500, detail="AI service not configured")
-        
         # Generate or use existing session ID
         session_id = request.session_id or str(uuid4())
         
         # Get or create chat session
-        if session_id not in chat_sessions:
-            chat_sessions[session_id] = LlmChat(
-                api_key=api_key,
-                session_id=session_id,
-                system_message=UPSHIFT_SYSTEM_PROMPT
-            ).with_model("openai", "gpt-4o")
-        
-        chat = chat_sessions[session_id]
-        
-        # Create user message
-        user_message = UserMessage(text=request.message)
+        chat = await get_chat_session(session_id)
         
         # Get AI response
-        response = await chat.send_message(user_message)
+        response = await llm_gateway.send(chat, request.message, endpoint="assistant_chat")
         
         timestamp = datetime.now(timezone.utc).isoformat()
         
@@ -178,11 +167,35 @@ async def chat_with_assistant(request: ChatMessageRequest):
             timestamp=timestamp
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"AI Assistant error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
 
 
+@ai_assistant_router.post("/chat/stream")
+async def chat_with_assistant_stream(request: ChatMessageRequest):
+    """Send a message to the AI assistant and stream the response as server-sent events"""
+    session_id = request.session_id or str(uuid4())
+    chat = await get_chat_session(session_id)
+    
+    async def events():
+        yield sse_event("start", {"session_id": session_id})
+        parts = []
+        async for chunk in llm_gateway.stream_send(chat, request.message, endpoint="assistant_chat"):
+            parts.append(chunk)
+            yield sse_event("chunk", {"text": chunk})
+        response = "".join(parts)
+        timestamp = datetime.now(timezone.utc).isoformat()
+        
+        # Save to database for analytics
+        await save_chat_message(session_id, request.message, response, timestamp)
+        yield sse_event("done", {"response": response, "session_id": session_id, "timestamp": timestamp})
+    
+    return event_stream_response(events())
+
+
 @ai_assistant_router.get("/quick-actions", response_model=List[QuickAction])
 async def get_quick_actions():
     """Get predefined quick action buttons for the chat widget"""
@@ -217,8 +230,7 @@ async def get_chat_history(session_id: str):
 async def clear_chat_session(session_id: str):
     """Clear a chat session"""
     try:
-        if session_id in chat_sessions:
-            del chat_sessions[session_id]
+        assistant_sessions.discard(session_id)
         
         # Optionally clear from database
         await db.ai_chat_history.delete_many({"session_id": session_id})
@@ -233,20 +245,32 @@ async def clear_chat_session(session_id: str):
 async def get_chat_analytics():
     """Get analytics for AI assistant usage (admin only)"""
     try:
-        # Get total conversations
-        total_sessions = await db.ai_chat_history.distinct("session_id")
-        total_messages = await db.ai_chat_history.count_documents({})
+        from llm_metrics import llm_metrics
+        
+        # Count conversations on the server (a distinct list grows with every session);
+        # sorting on the session index lets Mongo skip between session IDs
+        counted = await db.ai_chat_history.aggregate([
+            {"$sort": {"session_id": 1}},
+            {"$group": {"_id": "$session_id"}},
+            {"$count": "sessions"}
+        ]).to_list(1)
+        total_sessions = counted[0]["sessions"] if counted else 0
+        total_messages = await db.ai_chat_history.estimated_document_count()
         
         # Get recent conversations
         recent = await db.ai_chat_history.find(
             {},
             {"_id": 0, "session_id": 1, "user_message": 1, "timestamp": 1}
-        ).sort("timestamp", -1).limit(20).to_list(20)
+        ).sort("created_at", -1).limit(20).to_list(20)
+        
+        # Calls, errors, tokens and latency of the assistant from the LLM usage rollups
+        usage = await llm_metrics.usage_report(30, "endpoint", endpoint="assistant_chat")
         
         return {
-            "total_sessions": len(total_sessions),
+            "total_sessions": total_sessions,
             "total_messages": total_messages,
-            "recent_conversations": recent
+            "recent_conversations": recent,
+            "llm_usage_30_days": usage["rows"][0] if usage["rows"] else None
         }
     except Exception as e:
         logger.error(f"Error fetching analytics: {str(e)}")
@@ -264,5 +288,6 @@ async def save_chat_message(session_id: str, user_message: str, ai_response: str
             "timestamp": timestamp,
             "created_at": datetime.now(timezone.utc)
         })
+        assistant_sessions.record_turn(session_id, user_message, ai_response)
     except Exception as e:
         logger.error(f"Error saving chat message: {str(e)}")
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from datetime import datetime, timezone
 import logging
 import os
@@ -10,7 +10,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from llm_gateway import llm_gateway
+from event_stream import sse_event, event_stream_response
 
 logger = logging.getLogger(__name__)
 
@@ -48,20 +49,9 @@ class CoverLetterRequest(BaseModel):
     why_interested: Optional[str] = ""
 
 
-@ai_content_router.post("/generate-cover-letter")
-async def generate_cover_letter(data: CoverLetterRequest, current_user = Depends(get_current_user_with_db)):
-    """Generate a professional cover letter using AI"""
-    try:
-        if not EMERGENT_LLM_KEY:
-            raise HTTPException(status_code=500, detail="AI service not configured")
-        
-        # Check if user has active tier
-        if not current_user.active_tier:
-            raise HTTPException(status_code=403, detail="Please purchase a plan to use AI features")
-        
-        session_id = f"cover-letter-{current_user.id}-{uuid.uuid4()}"
-        
-        system_message = """You are an expert career coach and professional cover letter writer specialising in the South African job market. 
+def _cover_letter_messages(data: CoverLetterRequest):
+    """System message and prompt for a cover letter"""
+    system_message = """You are an expert career coach and professional cover letter writer specialising in the South African job market. 
 Write compelling, personalised cover letters that:
 - Use UK English spelling (e.g., organisation, specialise, colour)
 - Are tailored to South African companies and culture
@@ -72,13 +62,8 @@ Write compelling, personalised cover letters that:
 - Are concise (max 400 words)
 - Format with proper paragraphs (no bullet points)"""
 
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=session_id,
-            system_message=system_message
-        ).with_model("openai", "gpt-4o")
 
-        prompt = f"""Write a professional cover letter for the following:
+    prompt = f"""Write a professional cover letter for the following:
 
 Applicant: {data.full_name}
 Email: {data.email}
@@ -99,18 +84,49 @@ Job Description:
 
 Write a complete, ready-to-send cover letter. Start with "Dear {data.recipient_name or 'Hiring Manager'}," and end with the applicant's name and contact details."""
 
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
+    return system_message, prompt
+
+
+async def _save_cover_letter_generation(current_user, data: CoverLetterRequest, response: str):
+    """Log a generated cover letter"""
+    await db.ai_generations.insert_one({
+        "id": str(uuid.uuid4()),
+        "user_id": current_user.id,
+        "type": "cover_letter",
+        "input": data.dict(),
+        "output": response,
+        "created_at": datetime.now(timezone.utc)
+    })
+
+
+def _check_ai_access(current_user, detail: str = "Please purchase a plan to use AI features"):
+    if not EMERGENT_LLM_KEY:
+        raise HTTPException(status_code=500, detail="AI service not configured")
+    
+    # Check if user has active tier
+    if not current_user.active_tier:
+        raise HTTPException(status_code=403, detail=detail)
+
+
+@ai_content_router.post("/generate-cover-letter")
+async def generate_cover_letter(data: CoverLetterRequest, current_user = Depends(get_current_user_with_db)):
+    """Generate a professional cover letter using AI"""
+    try:
+        _check_ai_access(current_user)
+        
+        session_id = f"cover-letter-{current_user.id}-{uuid.uuid4()}"
+        system_message, prompt = _cover_letter_messages(data)
+
+        response = await llm_gateway.complete(
+            prompt,
+            system_message=system_message,
+            session_id=session_id,
+            endpoint="cover_letter",
+            reseller_id=current_user.reseller_id
+        )
         
         # Log the generation
-        await db.ai_generations.insert_one({
-            "id": str(uuid.uuid4()),
-            "user_id": current_user.id,
-            "type": "cover_letter",
-            "input": data.dict(),
-            "output": response,
-            "created_at": datetime.now(timezone.utc)
-        })
+        await _save_cover_letter_generation(current_user, data, response)
         
         return {
             "success": True,
@@ -124,6 +140,34 @@ Write a complete, ready-to-send cover letter. Start with "Dear {data.recipient_n
         raise HTTPException(status_code=500, detail=f"Failed to generate cover letter: {str(e)}")
 
 
+@ai_content_router.post("/generate-cover-letter/stream")
+async def generate_cover_letter_stream(data: CoverLetterRequest, current_user = Depends(get_current_user_with_db)):
+    """Generate a cover letter, streaming the text as server-sent events"""
+    _check_ai_access(current_user)
+    
+    session_id = f"cover-letter-{current_user.id}-{uuid.uuid4()}"
+    system_message, prompt = _cover_letter_messages(data)
+    
+    async def events():
+        yield sse_event("start", {"type": "cover_letter"})
+        parts = []
+        async for chunk in llm_gateway.stream(
+            prompt,
+            system_message=system_message,
+            session_id=session_id,
+            endpoint="cover_letter",
+            reseller_id=current_user.reseller_id
+        ):
+            parts.append(chunk)
+            yield sse_event("chunk", {"text": chunk})
+        response = "".join(parts)
+        
+        await _save_cover_letter_generation(current_user, data, response)
+        yield sse_event("done", {"success": True, "cover_letter": response})
+    
+    return event_stream_response(events())
+
+
 # ==================== CV AI SUGGESTIONS ====================
 
 class CVSuggestionRequest(BaseModel):
@@ -151,11 +195,6 @@ Provide specific, actionable suggestions to improve CV content.
 - Include industry-specific keywords when relevant
 - Suggest quantifiable achievements where possible"""
 
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=session_id,
-            system_message=system_message
-        ).with_model("openai", "gpt-4o")
 
         field_prompts = {
             "summary": f"""Suggest an improved professional summary for a CV.
@@ -194,8 +233,13 @@ Job title: {data.job_title or 'Not specified'}
 
 Provide specific, actionable improvements.""")
 
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
+        response = await llm_gateway.complete(
+            prompt,
+            system_message=system_message,
+            session_id=session_id,
+            endpoint="cv_suggestion",
+            reseller_id=current_user.reseller_id
+        )
         
         return {
             "success": True,
@@ -231,78 +275,85 @@ class CVGenerationRequest(BaseModel):
     template_id: Optional[str] = "professional"
 
 
+def _cv_summary_messages(data: CVGenerationRequest):
+    """System message and prompt for a generated CV summary"""
+    system_message = """You are an expert CV writer. Generate a professional summary for a CV.
+Use UK English. Be concise (2-3 sentences). Focus on key strengths and career objectives."""
+    
+    experience_text = ""
+    if data.experience:
+        for exp in data.experience[:2]:
+            experience_text += f"- {exp.get('title', '')} at {exp.get('company', '')}\n"
+    
+    prompt = f"""Generate a professional summary for:
+Name: {data.full_name}
+Industry: {data.industry or 'Not specified'}
+Recent Experience:
+{experience_text or 'Not provided'}
+Skills: {', '.join(data.skills[:5]) if data.skills else 'Not provided'}
+
+Write a 2-3 sentence professional summary."""
+    
+    return system_message, prompt
+
+
+async def _save_generated_cv(current_user, data: CVGenerationRequest, enhanced_summary: str) -> str:
+    """Save a generated CV and return its ID"""
+    cv_data = {
+        "id": str(uuid.uuid4()),
+        "user_id": current_user.id,
+        "full_name": data.full_name,
+        "email": data.email,
+        "phone": data.phone,
+        "id_number": data.id_number,
+        "address": data.address,
+        "city": data.city,
+        "province": data.province,
+        "postal_code": data.postal_code,
+        "industry": data.industry,
+        "summary": enhanced_summary,
+        "experience": data.experience,
+        "education": data.education,
+        "skills": data.skills,
+        "languages": data.languages,
+        "references": data.references,
+        "template_id": data.template_id,
+        "created_at": datetime.now(timezone.utc),
+        "updated_at": datetime.now(timezone.utc)
+    }
+    
+    await db.user_cvs.insert_one(cv_data)
+    return cv_data["id"]
+
+
 @ai_content_router.post("/generate-cv")
 async def generate_cv(data: CVGenerationRequest, current_user = Depends(get_current_user_with_db)):
     """Generate/enhance a CV using AI"""
     try:
-        if not EMERGENT_LLM_KEY:
-            raise HTTPException(status_code=500, detail="AI service not configured")
-        
-        # Check if user has active tier
-        if not current_user.active_tier:
-            raise HTTPException(status_code=403, detail="Please purchase a plan to generate CVs")
+        _check_ai_access(current_user, "Please purchase a plan to generate CVs")
         
         session_id = f"cv-gen-{current_user.id}-{uuid.uuid4()}"
         
         # If summary is empty or minimal, generate one
         enhanced_summary = data.summary
         if not data.summary or len(data.summary) < 50:
-            system_message = """You are an expert CV writer. Generate a professional summary for a CV.
-Use UK English. Be concise (2-3 sentences). Focus on key strengths and career objectives."""
+            system_message, prompt = _cv_summary_messages(data)
             
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
+            enhanced_summary = await llm_gateway.complete(
+                prompt,
+                system_message=system_message,
                 session_id=session_id,
-                system_message=system_message
-            ).with_model("openai", "gpt-4o")
-            
-            experience_text = ""
-            if data.experience:
-                for exp in data.experience[:2]:
-                    experience_text += f"- {exp.get('title', '')} at {exp.get('company', '')}\n"
-            
-            prompt = f"""Generate a professional summary for:
-Name: {data.full_name}
-Industry: {data.industry or 'Not specified'}
-Recent Experience:
-{experience_text or 'Not provided'}
-Skills: {', '.join(data.skills[:5]) if data.skills else 'Not provided'}
-
-Write a 2-3 sentence professional summary."""
-            
-            user_message = UserMessage(text=prompt)
-            enhanced_summary = await chat.send_message(user_message)
+                endpoint="cv_generate",
+                reseller_id=current_user.reseller_id
+            )
         
         # Save CV to database
-        cv_data = {
-            "id": str(uuid.uuid4()),
-            "user_id": current_user.id,
-            "full_name": data.full_name,
-            "email": data.email,
-            "phone": data.phone,
-            "id_number": data.id_number,
-            "address": data.address,
-            "city": data.city,
-            "province": data.province,
-            "postal_code": data.postal_code,
-            "industry": data.industry,
-            "summary": enhanced_summary,
-            "experience": data.experience,
-            "education": data.education,
-            "skills": data.skills,
-            "languages": data.languages,
-            "references": data.references,
-            "template_id": data.template_id,
-            "created_at": datetime.now(timezone.utc),
-            "updated_at": datetime.now(timezone.utc)
-        }
-        
-        await db.user_cvs.insert_one(cv_data)
+        cv_id = await _save_generated_cv(current_user, data, enhanced_summary)
         
         return {
             "success": True,
             "message": "CV generated successfully",
-            "cv_id": cv_data["id"],
+            "cv_id": cv_id,
             "enhanced_summary": enhanced_summary
         }
         
@@ -313,6 +364,42 @@ Write a 2-3 sentence professional summary."""
         raise HTTPException(status_code=500, detail=f"Failed to generate CV: {str(e)}")
 
 
+@ai_content_router.post("/generate-cv/stream")
+async def generate_cv_stream(data: CVGenerationRequest, current_user = Depends(get_current_user_with_db)):
+    """Generate a CV, streaming the generated summary as server-sent events"""
+    _check_ai_access(current_user, "Please purchase a plan to generate CVs")
+    
+    session_id = f"cv-gen-{current_user.id}-{uuid.uuid4()}"
+    
+    async def events():
+        yield sse_event("start", {"type": "cv"})
+        enhanced_summary = data.summary
+        if not data.summary or len(data.summary) < 50:
+            system_message, prompt = _cv_summary_messages(data)
+            parts = []
+            async for chunk in llm_gateway.stream(
+                prompt,
+                system_message=system_message,
+                session_id=session_id,
+                endpoint="cv_generate",
+                reseller_id=current_user.reseller_id
+            ):
+                parts.append(chunk)
+                yield sse_event("chunk", {"section": "summary", "text": chunk})
+            enhanced_summary = "".join(parts)
+        yield sse_event("section", {"section": "summary", "content": enhanced_summary})
+        
+        cv_id = await _save_generated_cv(current_user, data, enhanced_summary)
+        yield sse_event("done", {
+            "success": True,
+            "message": "CV generated successfully",
+            "cv_id": cv_id,
+            "enhanced_summary": enhanced_summary
+        })
+    
+    return event_stream_response(events())
+
+
 # ==================== PARTNER ENQUIRY (White-Label Page) ====================
 
 class PartnerEnquiryRequest(BaseModel):
@@ -381,11 +468,11 @@ async def submit_partner_enquiry(data: PartnerEnquiryRequest):
             </html>
             """
             
-            await email_service.send_email(
+            await email_service.queue_email(
                 to_email=admin_email,
                 subject=f"[Partner Enquiry] {data.company} - {data.type}",
                 html_body=email_content,
-                raise_exceptions=False
+                email_type="partner_enquiry"
             )
             logger.info(f"Partner enquiry notification sent to {admin_email}")
             
@@ -415,11 +502,11 @@ async def submit_partner_enquiry(data: PartnerEnquiryRequest):
             </html>
             """
             
-            await email_service.send_email(
+            await email_service.queue_email(
                 to_email=data.email,
                 subject="We've Received Your Partnership Enquiry - UpShift",
                 html_body=confirmation_content,
-                raise_exceptions=False
+                email_type="partner_enquiry_confirmation"
             )
             logger.info(f"Partner enquiry confirmation sent to {data.email}")
         except Exception as email_error:
@@ -519,15 +606,15 @@ Provide skills in clear bullet points grouped by category. Each skill should be
 Generate the skills now:"""
 
         # Initialize LLM
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"skills-{uuid.uuid4()}",
-            system_message="You are an expert resume writer and ATS optimization specialist."
-        ).with_model("openai", "gpt-4o")
+        system_message = "You are an expert resume writer and ATS optimization specialist."
         
         # Generate skills
-        user_message = UserMessage(prompt)
-        response = await chat.send_message(user_message)
+        response = await llm_gateway.complete(
+            prompt,
+            system_message=system_message,
+            session_id=f"skills-{uuid.uuid4()}",
+            endpoint="resume_skills"
+        )
         
         # Handle response - could be string or object with content attribute
         if hasattr(response, 'content'):
@@ -600,20 +687,15 @@ Example output format:
 
 Generate skills now:"""
 
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            model="anthropic/claude-sonnet-4-20250514"
+        response = await llm_gateway.complete(
+            prompt,
+            system_message="You are an expert resume writer and career coach.",
+            provider="anthropic",
+            model="claude-sonnet-4-20250514",
+            endpoint="cv_builder_skills"
         )
         
-        response = chat.send_message(UserMessage(text=prompt))
-        
-        # Handle response - could be string or object with text/content attribute
-        if hasattr(response, 'text'):
-            response_text = response.text.strip()
-        elif hasattr(response, 'content'):
-            response_text = response.content.strip()
-        else:
-            response_text = str(response).strip()
+        response_text = response.strip()
         
         # Parse the JSON array from response
         import json
@@ -653,44 +735,24 @@ Generate skills now:"""
 
 # ==================== CV DATA EXTRACTION FROM FILE ====================
 
-from fastapi import UploadFile, File
+from fastapi import UploadFile, File, Query
+from job_queue_service import job_queue
 
-@ai_content_router.post("/extract-cv-data")
-async def extract_cv_data(
-    file: UploadFile = File(...),
-    current_user = Depends(get_current_user_with_db)
-):
-    """
-    Extract structured CV data from an uploaded PDF or text file.
-    Requires any paid tier.
-    """
+
+async def extract_cv_data_content(
+    content: bytes,
+    filename: str,
+    user_id: str,
+    reseller_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Structured CV data parsed by AI from an uploaded CV"""
     try:
-        import PyPDF2
-        import io
         import json
         import re
+        from text_extraction_service import text_extraction_service
         
-        # Check if user has active tier
-        if not current_user.active_tier:
-            raise HTTPException(status_code=403, detail="Please purchase a plan to use this feature")
-        
-        # Read file content
-        content = await file.read()
-        resume_text = ""
-        
-        # Extract text based on file type
-        if file.filename.lower().endswith('.pdf'):
-            try:
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
-                for page in pdf_reader.pages:
-                    resume_text += page.extract_text() or ""
-            except Exception as pdf_error:
-                logger.warning(f"PDF extraction failed: {pdf_error}, trying as text")
-                resume_text = content.decode('utf-8', errors='ignore')
-        elif file.filename.lower().endswith(('.txt', '.doc', '.docx')):
-            resume_text = content.decode('utf-8', errors='ignore')
-        else:
-            resume_text = content.decode('utf-8', errors='ignore')
+        # Extract text (off the event loop, cached by file hash)
+        resume_text = await text_extraction_service.extract(content, filename, lenient=True)
         
         if not resume_text or len(resume_text.strip()) < 50:
             raise HTTPException(
@@ -699,7 +761,7 @@ async def extract_cv_data(
             )
         
         # Use AI to extract structured data from the resume
-        session_id = f"cv-extract-{current_user.id}-{uuid.uuid4()}"
+        session_id = f"cv-extract-{user_id}-{uuid.uuid4()}"
         
         system_message = """You are an expert CV parser. Extract structured data from the resume text provided.
 Return ONLY a valid JSON object with the following structure (use null for missing fields):
@@ -732,11 +794,6 @@ Return ONLY a valid JSON object with the following structure (use null for missi
 
 Be accurate and extract real data. Do not make up information."""
 
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=session_id,
-            system_message=system_message
-        ).with_model("openai", "gpt-4o")
         
         prompt = f"""Parse this resume and extract the structured data:
 
@@ -744,16 +801,15 @@ Be accurate and extract real data. Do not make up information."""
 
 Return ONLY the JSON object, no explanation."""
 
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
+        response = await llm_gateway.complete(
+            prompt,
+            system_message=system_message,
+            session_id=session_id,
+            endpoint="cv_data_extraction",
+            reseller_id=reseller_id
+        )
         
-        # Handle response - could be string or object with text/content attribute
-        if hasattr(response, 'text'):
-            response_text = response.text.strip()
-        elif hasattr(response, 'content'):
-            response_text = response.content.strip()
-        else:
-            response_text = str(response).strip()
+        response_text = response.strip()
         
         # Parse JSON from response
         # Remove markdown code blocks if present
@@ -771,7 +827,7 @@ Return ONLY the JSON object, no explanation."""
             else:
                 raise HTTPException(status_code=500, detail="Failed to parse CV data. Please try again.")
         
-        logger.info(f"CV data extracted for user {current_user.email}")
+        logger.info(f"CV data extracted for user {user_id}")
         
         return {
             "success": True,
@@ -786,6 +842,52 @@ Return ONLY the JSON object, no explanation."""
         raise HTTPException(status_code=500, detail="Failed to extract CV data. Please try again.")
 
 
+async def _extract_cv_data_job(job: Dict[str, Any], content: Optional[bytes]) -> Dict[str, Any]:
+    return await extract_cv_data_content(content, job["filename"], job["user_id"], job.get("reseller_id"))
+
+
+job_queue.register("cv_data_extraction", _extract_cv_data_job)
+
+
+@ai_content_router.post("/extract-cv-data")
+async def extract_cv_data(
+    file: UploadFile = File(...),
+    run_async: bool = Query(False, alias="async", description="Queue the extraction and return a job ID at once"),
+    current_user = Depends(get_current_user_with_db)
+):
+    """
+    Extract structured CV data from an uploaded PDF or text file.
+    Requires any paid tier.
+    With async=true the extraction runs as a job; poll /api/jobs/{job_id} for the result.
+    """
+    try:
+        from text_extraction_service import read_upload
+        
+        # Check if user has active tier
+        if not current_user.active_tier:
+            raise HTTPException(status_code=403, detail="Please purchase a plan to use this feature")
+        
+        content = await read_upload(file)
+        
+        if run_async:
+            job = await job_queue.submit(
+                "cv_data_extraction",
+                content=content,
+                filename=file.filename,
+                user_id=current_user.id,
+                reseller_id=current_user.reseller_id
+            )
+            return job_queue.accepted_response(job)
+        
+        return await extract_cv_data_content(content, file.filename, current_user.id, current_user.reseller_id)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error extracting CV data: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to extract CV data. Please try again.")
+
+
 # ==================== CV PROFESSIONAL SUMMARY GENERATION ====================
 
 class CVSummaryRequest(BaseModel):
@@ -839,19 +941,16 @@ Write ONLY the summary text, no introduction, explanation, or quotes."""
 
         system_message = """You are an expert CV writer specializing in creating compelling professional summaries for the South African job market."""
         
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"cv-summary-{current_user.id}",
-            system_message=system_message
-        ).with_model("openai", "gpt-4o")
         
-        response = await chat.send_message(UserMessage(text=prompt))
+        response = await llm_gateway.complete(
+            prompt,
+            system_message=system_message,
+            session_id=f"cv-summary-{current_user.id}",
+            endpoint="cv_summary",
+            reseller_id=current_user.reseller_id
+        )
         
-        # Handle response - could be string or object with text attribute
-        if hasattr(response, 'text'):
-            summary_text = response.text.strip()
-        else:
-            summary_text = str(response).strip()
+        summary_text = response.strip()
         
         # Clean up the response if it has quotes or extra formatting
         summary_text = summary_text.strip('"\'')
@@ -916,19 +1015,16 @@ Generate skills now:"""
 
         system_message = """You are an expert CV writer and ATS optimization specialist."""
         
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"cv-skills-{current_user.id}",
-            system_message=system_message
-        ).with_model("openai", "gpt-4o")
         
-        response = await chat.send_message(UserMessage(text=prompt))
+        response = await llm_gateway.complete(
+            prompt,
+            system_message=system_message,
+            session_id=f"cv-skills-{current_user.id}",
+            endpoint="cv_skills",
+            reseller_id=current_user.reseller_id
+        )
         
-        # Handle response - could be string or object with text attribute
-        if hasattr(response, 'text'):
-            response_text = response.text.strip()
-        else:
-            response_text = str(response).strip()
+        response_text = response.strip()
         
         # Parse the JSON array from response
         import json
@@ -1,9 +1,10 @@
-from emergentintegrations.llm.chat import LlmChat, UserMessage
 import os
 from dotenv import load_dotenv
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional
 import logging
 
+from llm_gateway import llm_gateway
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -14,17 +15,12 @@ class AIService:
         if not self.api_key:
             raise ValueError("EMERGENT_LLM_KEY not found in environment variables")
     
-    async def improve_resume_section(self, section: str, content: str, context: str = "") -> str:
+    async def improve_resume_section(self, section: str, content: str, context: str = "", reseller_id: Optional[str] = None) -> str:
         """
         Improve a specific section of a resume using AI.
         """
         try:
-            chat = LlmChat(
-                api_key=self.api_key,
-                session_id=f"resume_improve_{section}",
-                system_message="You are an expert CV/Resume writer specializing in the South African job market with deep expertise in ATS (Applicant Tracking Systems). Every CV you create or improve MUST be ATS-friendly with proper formatting, relevant keywords, and clear structure. Provide concise, impactful improvements that focus on quantifiable achievements."
-            )
-            chat.with_model("openai", "gpt-5.2")
+            system_message = "You are an expert CV/Resume writer specializing in the South African job market with deep expertise in ATS (Applicant Tracking Systems). Every CV you create or improve MUST be ATS-friendly with proper formatting, relevant keywords, and clear structure. Provide concise, impactful improvements that focus on quantifiable achievements."
             
             prompt = f"""Improve the following {section} section for a South African job seeker:
 
@@ -42,25 +38,26 @@ Provide an improved version that:
 
 Return ONLY the improved text without any explanations."""
             
-            user_message = UserMessage(text=prompt)
-            response = await chat.send_message(user_message)
+            response = await llm_gateway.complete(
+                prompt,
+                system_message=system_message,
+                session_id=f"resume_improve_{section}",
+                model="gpt-5.2",
+                endpoint="improve_section",
+                reseller_id=reseller_id
+            )
             
             return response
         except Exception as e:
             logger.error(f"Error improving resume section: {str(e)}")
             raise
     
-    async def analyze_resume(self, resume_text: str) -> Dict:
+    async def analyze_resume(self, resume_text: str, reseller_id: Optional[str] = None) -> Dict:
         """
         Analyze a resume and provide detailed feedback.
         """
         try:
-            chat = LlmChat(
-                api_key=self.api_key,
-                session_id="resume_analysis",
-                system_message="You are an expert ATS and recruitment specialist for the South African job market. All CVs MUST be ATS-friendly. Analyze resumes for ATS compatibility, keyword optimization, formatting issues, and provide detailed, actionable feedback that ensures maximum ATS pass-through rates."
-            )
-            chat.with_model("openai", "gpt-5.2")
+            system_message = "You are an expert ATS and recruitment specialist for the South African job market. All CVs MUST be ATS-friendly. Analyze resumes for ATS compatibility, keyword optimization, formatting issues, and provide detailed, actionable feedback that ensures maximum ATS pass-through rates."
             
             prompt = f"""Analyze the following resume for a South African job seeker:
 
@@ -93,8 +90,14 @@ Focus on:
 
 Return ONLY valid JSON without any markdown formatting or explanations."""
             
-            user_message = UserMessage(text=prompt)
-            response = await chat.send_message(user_message)
+            response = await llm_gateway.complete(
+                prompt,
+                system_message=system_message,
+                session_id="resume_analysis",
+                model="gpt-5.2",
+                endpoint="resume_analysis",
+                reseller_id=reseller_id
+            )
             
             # Clean response and parse JSON
             import json
@@ -111,19 +114,11 @@ Return ONLY valid JSON without any markdown formatting or explanations."""
             logger.error(f"Error analyzing resume: {str(e)}")
             raise
     
-    async def generate_cover_letter(self, data: Dict) -> str:
-        """
-        Generate a professional cover letter based on provided information.
-        """
-        try:
-            chat = LlmChat(
-                api_key=self.api_key,
-                session_id="cover_letter_gen",
-                system_message="You are an expert cover letter writer specializing in the South African job market. Create compelling, professional, ATS-friendly cover letters that highlight the candidate's strengths while incorporating relevant keywords for ATS systems."
-            )
-            chat.with_model("openai", "gpt-5.2")
-            
-            prompt = f"""Generate a professional cover letter for a South African job application with the following details:
+    @staticmethod
+    def _cover_letter_messages(data: Dict):
+        system_message = "You are an expert cover letter writer specializing in the South African job market. Create compelling, professional, ATS-friendly cover letters that highlight the candidate's strengths while incorporating relevant keywords for ATS systems."
+        
+        prompt = f"""Generate a professional cover letter for a South African job application with the following details:
 
 Candidate Name: {data.get('fullName')}
 Company: {data.get('companyName')}
@@ -142,26 +137,49 @@ Create a cover letter that:
 6. Uses formal South African business language
 
 Return ONLY the cover letter text without any subject line or additional explanations."""
+        return system_message, prompt
+    
+    async def generate_cover_letter(self, data: Dict, reseller_id: Optional[str] = None) -> str:
+        """
+        Generate a professional cover letter based on provided information.
+        """
+        try:
+            system_message, prompt = self._cover_letter_messages(data)
             
-            user_message = UserMessage(text=prompt)
-            response = await chat.send_message(user_message)
+            response = await llm_gateway.complete(
+                prompt,
+                system_message=system_message,
+                session_id="cover_letter_gen",
+                model="gpt-5.2",
+                endpoint="cover_letter",
+                reseller_id=reseller_id
+            )
             
             return response
         except Exception as e:
             logger.error(f"Error generating cover letter: {str(e)}")
             raise
     
-    async def get_job_match_score(self, resume_text: str, job_description: str) -> Dict:
+    def stream_cover_letter(self, data: Dict, reseller_id: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Generate a cover letter, yielding the text in chunks as it is written.
+        """
+        system_message, prompt = self._cover_letter_messages(data)
+        return llm_gateway.stream(
+            prompt,
+            system_message=system_message,
+            session_id="cover_letter_gen",
+            model="gpt-5.2",
+            endpoint="cover_letter",
+            reseller_id=reseller_id
+        )
+    
+    async def get_job_match_score(self, resume_text: str, job_description: str, reseller_id: Optional[str] = None) -> Dict:
         """
         Calculate how well a resume matches a job description.
         """
         try:
-            chat = LlmChat(
-                api_key=self.api_key,
-                session_id="job_match",
-                system_message="You are an expert recruitment analyst specializing in ATS systems. Compare resumes to job descriptions, focusing on ATS keyword matching, skills alignment, and provide specific ATS-friendly recommendations."
-            )
-            chat.with_model("openai", "gpt-5.2")
+            system_message = "You are an expert recruitment analyst specializing in ATS systems. Compare resumes to job descriptions, focusing on ATS keyword matching, skills alignment, and provide specific ATS-friendly recommendations."
             
             prompt = f"""Compare the following resume to the job description and provide a match analysis:
 
@@ -181,8 +199,14 @@ Provide analysis in JSON format:
 
 Return ONLY valid JSON."""
             
-            user_message = UserMessage(text=prompt)
-            response = await chat.send_message(user_message)
+            response = await llm_gateway.complete(
+                prompt,
+                system_message=system_message,
+                session_id="job_match",
+                model="gpt-5.2",
+                endpoint="job_match",
+                reseller_id=reseller_id
+            )
             
             import json
             clean_response = response.strip()
@@ -196,17 +220,12 @@ Return ONLY valid JSON."""
             logger.error(f"Error calculating job match: {str(e)}")
             raise
 
-    async def ats_resume_check(self, resume_text: str) -> Dict:
+    async def ats_resume_check(self, resume_text: str, reseller_id: Optional[str] = None) -> Dict:
         """
         Comprehensive ATS Resume Check - analyzes resume for ATS compliance and provides detailed feedback.
         """
         try:
-            chat = LlmChat(
-                api_key=self.api_key,
-                session_id="ats_check",
-                system_message="""You are an expert ATS (Applicant Tracking System) analyst with deep knowledge of how modern ATS software parses and scores resumes. Your analysis must be thorough and actionable, helping job seekers optimize their resumes for maximum ATS compatibility."""
-            )
-            chat.with_model("openai", "gpt-5.2")
+            system_message = """You are an expert ATS (Applicant Tracking System) analyst with deep knowledge of how modern ATS software parses and scores resumes. Your analysis must be thorough and actionable, helping job seekers optimize their resumes for maximum ATS compatibility."""
             
             prompt = f"""Perform a comprehensive ATS (Applicant Tracking System) analysis on the following resume:
 
@@ -306,8 +325,14 @@ Provide your analysis in the following JSON format:
 
 Return ONLY valid JSON without any markdown formatting."""
             
-            user_message = UserMessage(text=prompt)
-            response = await chat.send_message(user_message)
+            response = await llm_gateway.complete(
+                prompt,
+                system_message=system_message,
+                session_id="ats_check",
+                model="gpt-5.2",
+                endpoint="ats_check",
+                reseller_id=reseller_id
+            )
             
             import json
             clean_response = response.strip()
@@ -350,256 +375,12 @@ def fallback_ats_analysis(resume_text: str) -> Dict:
     Performs a basic rule-based ATS analysis when AI is unavailable.
     This provides immediate value to users even when API quota is exceeded.
     """
-    import re
-    
-    text_lower = resume_text.lower()
-    text_length = len(resume_text)
-    
-    # Initialize scores
-    scores = {
-        "format_compatibility": 70,
-        "contact_information": 50,
-        "keywords_skills": 50,
-        "work_experience": 50,
-        "education": 50,
-        "overall_structure": 60
-    }
-    
-    findings = {
-        "format_compatibility": [],
-        "contact_information": [],
-        "keywords_skills": [],
-        "work_experience": [],
-        "education": [],
-        "overall_structure": []
-    }
-    
-    detected_skills = []
-    strengths = []
-    critical_issues = []
-    recommendations = []
-    
-    # Contact Information Analysis
-    email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-    phone_pattern = r'[\+]?[(]?[0-9]{1,3}[)]?[-\s\.]?[0-9]{1,4}[-\s\.]?[0-9]{1,4}[-\s\.]?[0-9]{1,9}'
-    
-    has_email = bool(re.search(email_pattern, resume_text))
-    has_phone = bool(re.search(phone_pattern, resume_text))
-    has_linkedin = 'linkedin' in text_lower
-    
-    if has_email:
-        scores["contact_information"] += 20
-        findings["contact_information"].append("✓ Email address detected")
-    else:
-        findings["contact_information"].append("✗ No email address found")
-        critical_issues.append("Missing email address")
-    
-    if has_phone:
-        scores["contact_information"] += 20
-        findings["contact_information"].append("✓ Phone number detected")
-    else:
-        findings["contact_information"].append("✗ No phone number found")
-        critical_issues.append("Missing phone number")
-    
-    if has_linkedin:
-        scores["contact_information"] += 10
-        findings["contact_information"].append("✓ LinkedIn profile mentioned")
-        strengths.append("LinkedIn profile included")
-    else:
-        findings["contact_information"].append("○ Consider adding LinkedIn profile")
-        recommendations.append("Add your LinkedIn profile URL")
-    
-    # Keywords & Skills Analysis
-    common_skills = [
-        'python', 'java', 'javascript', 'sql', 'excel', 'word', 'powerpoint',
-        'management', 'leadership', 'communication', 'teamwork', 'problem solving',
-        'project management', 'data analysis', 'customer service', 'sales',
-        'marketing', 'finance', 'accounting', 'microsoft office', 'sap',
-        'html', 'css', 'react', 'node', 'aws', 'azure', 'agile', 'scrum'
-    ]
-    
-    for skill in common_skills:
-        if skill in text_lower:
-            detected_skills.append(skill.title())
-            scores["keywords_skills"] += 3
-    
-    scores["keywords_skills"] = min(scores["keywords_skills"], 100)
-    
-    if len(detected_skills) > 10:
-        strengths.append(f"Good variety of skills detected ({len(detected_skills)} skills)")
-        findings["keywords_skills"].append(f"✓ {len(detected_skills)} relevant skills detected")
-    elif len(detected_skills) > 5:
-        findings["keywords_skills"].append(f"○ {len(detected_skills)} skills detected - consider adding more")
-        recommendations.append("Add more industry-specific keywords and skills")
-    else:
-        findings["keywords_skills"].append("✗ Few skills detected - add more keywords")
-        critical_issues.append("Insufficient keywords and skills")
-    
-    # Work Experience Analysis
-    experience_keywords = ['experience', 'work history', 'employment', 'career', 'position', 'role']
-    achievement_words = ['achieved', 'improved', 'increased', 'reduced', 'managed', 'led', 'developed', 'created', 'implemented']
-    
-    has_experience_section = any(keyword in text_lower for keyword in experience_keywords)
-    achievement_count = sum(1 for word in achievement_words if word in text_lower)
-    
-    if has_experience_section:
-        scores["work_experience"] += 20
-        findings["work_experience"].append("✓ Work experience section detected")
-    else:
-        findings["work_experience"].append("✗ No clear work experience section")
-        critical_issues.append("Missing or unclear work experience section")
-    
-    if achievement_count > 5:
-        scores["work_experience"] += 30
-        findings["work_experience"].append(f"✓ Strong action verbs used ({achievement_count} found)")
-        strengths.append("Good use of action verbs and achievements")
-    elif achievement_count > 2:
-        scores["work_experience"] += 15
-        findings["work_experience"].append(f"○ Some action verbs used ({achievement_count} found)")
-        recommendations.append("Use more action verbs (achieved, improved, managed)")
-    else:
-        findings["work_experience"].append("✗ Few action verbs - add quantifiable achievements")
-        recommendations.append("Add quantifiable achievements (e.g., 'Increased sales by 20%')")
-    
-    # Education Analysis
-    education_keywords = ['education', 'qualification', 'degree', 'diploma', 'certificate', 'university', 'college', 'matric', 'bachelor', 'master', 'honours']
-    
-    education_count = sum(1 for keyword in education_keywords if keyword in text_lower)
-    
-    if education_count >= 3:
-        scores["education"] += 40
-        findings["education"].append("✓ Education section well documented")
-        strengths.append("Education section is comprehensive")
-    elif education_count >= 1:
-        scores["education"] += 20
-        findings["education"].append("○ Education section present but could be enhanced")
-    else:
-        findings["education"].append("✗ Education section missing or unclear")
-        recommendations.append("Add clear education section with qualifications")
-    
-    # Overall Structure Analysis
-    section_headers = ['experience', 'education', 'skills', 'summary', 'profile', 'objective', 'references', 'contact']
-    sections_found = sum(1 for header in section_headers if header in text_lower)
-    
-    if sections_found >= 5:
-        scores["overall_structure"] += 30
-        findings["overall_structure"].append(f"✓ Well-structured with {sections_found} clear sections")
-        strengths.append("CV has clear, well-defined sections")
-    elif sections_found >= 3:
-        scores["overall_structure"] += 15
-        findings["overall_structure"].append(f"○ {sections_found} sections detected - consider adding more")
-    else:
-        findings["overall_structure"].append("✗ Few clear sections - improve document structure")
-        critical_issues.append("Poor document structure")
-    
-    # Length check
-    if 1500 < text_length < 5000:
-        scores["overall_structure"] += 10
-        findings["overall_structure"].append("✓ CV length is appropriate")
-    elif text_length < 500:
-        findings["overall_structure"].append("✗ CV appears too short")
-        critical_issues.append("CV is too short - add more detail")
-    elif text_length > 8000:
-        findings["overall_structure"].append("✗ CV may be too long")
-        recommendations.append("Consider condensing to 2 pages maximum")
-    
-    # Format compatibility (basic checks)
-    if '|' in resume_text or '\t\t\t' in resume_text:
-        scores["format_compatibility"] -= 10
-        findings["format_compatibility"].append("○ Possible table or complex formatting detected")
-        recommendations.append("Avoid tables - use simple formatting for better ATS parsing")
-    else:
-        findings["format_compatibility"].append("✓ No complex tables detected")
-    
-    # Calculate overall score
-    overall_score = int(sum(scores.values()) / len(scores))
-    
-    # Determine status for each category
-    def get_status(score):
-        if score >= 70:
-            return "pass"
-        elif score >= 50:
-            return "warning"
-        return "fail"
-    
-    # Build checklist
-    checklist = []
-    if not has_email:
-        checklist.append({
-            "item": "Email address missing",
-            "status": "fail",
-            "priority": "high",
-            "recommendation": "Add a professional email address",
-            "impact": "+15% ATS Score"
-        })
-    if not has_phone:
-        checklist.append({
-            "item": "Phone number missing",
-            "status": "fail",
-            "priority": "high",
-            "recommendation": "Add a contact phone number",
-            "impact": "+10% ATS Score"
-        })
-    if len(detected_skills) < 5:
-        checklist.append({
-            "item": "Insufficient keywords",
-            "status": "warning",
-            "priority": "high",
-            "recommendation": "Add more industry-specific skills and keywords",
-            "impact": "+20% ATS Score"
-        })
-    if achievement_count < 3:
-        checklist.append({
-            "item": "Weak action verbs",
-            "status": "warning",
-            "priority": "medium",
-            "recommendation": "Use strong action verbs (achieved, implemented, managed)",
-            "impact": "+10% ATS Score"
-        })
+    from ats_analyzer import analyze_resume
     
-    return {
-        "overall_score": overall_score,
-        "summary": f"Basic ATS analysis complete. Your CV scored {overall_score}/100. {'This is a good foundation!' if overall_score >= 70 else 'There is room for improvement.' if overall_score >= 50 else 'Significant improvements needed.'}",
-        "categories": {
-            "format_compatibility": {
-                "score": min(scores["format_compatibility"], 100),
-                "status": get_status(scores["format_compatibility"]),
-                "findings": findings["format_compatibility"]
-            },
-            "contact_information": {
-                "score": min(scores["contact_information"], 100),
-                "status": get_status(scores["contact_information"]),
-                "findings": findings["contact_information"]
-            },
-            "keywords_skills": {
-                "score": min(scores["keywords_skills"], 100),
-                "status": get_status(scores["keywords_skills"]),
-                "findings": findings["keywords_skills"],
-                "detected_skills": detected_skills[:20]  # Limit to 20 skills
-            },
-            "work_experience": {
-                "score": min(scores["work_experience"], 100),
-                "status": get_status(scores["work_experience"]),
-                "findings": findings["work_experience"]
-            },
-            "education": {
-                "score": min(scores["education"], 100),
-                "status": get_status(scores["education"]),
-                "findings": findings["education"]
-            },
-            "overall_structure": {
-                "score": min(scores["overall_structure"], 100),
-                "status": get_status(scores["overall_structure"]),
-                "findings": findings["overall_structure"]
-            }
-        },
-        "checklist": checklist,
-        "strengths": strengths if strengths else ["CV uploaded successfully"],
-        "critical_issues": critical_issues if critical_issues else [],
-        "recommendations": recommendations[:5] if recommendations else ["Keep your CV updated regularly"],
-        "is_fallback": True,
-        "fallback_notice": "This is a basic analysis. For detailed AI-powered insights, please try again later when the service is available."
-    }
+    analysis = analyze_resume(resume_text)
+    analysis["is_fallback"] = True
+    analysis["fallback_notice"] = "This is a basic analysis. For detailed AI-powered insights, please try again later when the service is available."
+    return analysis
 
 
 # Initialize AI service
@@ -0,0 +1,192 @@
+"""
+Assistant Session Service - Bounded store of AI assistant chat sessions
+
+Each website visitor talking to the assistant has a multi-turn chat object
+holding the conversation so far. Sessions are kept in an LRU capped by
+count (ASSISTANT_MAX_SESSIONS) and by approximate size of the text they hold
+(ASSISTANT_SESSIONS_MAX_BYTES), and are dropped after
+ASSISTANT_SESSION_IDLE_SECONDS without a message.
+
+A session that is not in memory (evicted, created by another worker, or
+after a restart) is rehydrated from the last ASSISTANT_HISTORY_TURNS turns
+persisted in `ai_chat_history`, so any worker can serve any session. A
+session whose persisted turn count no longer matches the local copy (the
+conversation continued on another worker) is rebuilt the same way, and so
+is one whose in-memory chat has grown past twice the history window.
+"""
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from llm_gateway import llm_gateway
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable via environment)
+ASSISTANT_MAX_SESSIONS = int(os.environ.get("ASSISTANT_MAX_SESSIONS", 1000))
+ASSISTANT_SESSIONS_MAX_BYTES = int(os.environ.get("ASSISTANT_SESSIONS_MAX_BYTES", 64 * 1024 * 1024))
+ASSISTANT_SESSION_IDLE_SECONDS = int(os.environ.get("ASSISTANT_SESSION_IDLE_SECONDS", 30 * 60))
+ASSISTANT_HISTORY_TURNS = int(os.environ.get("ASSISTANT_HISTORY_TURNS", 10))
+# Longer persisted messages are cut when a session is rehydrated
+ASSISTANT_HISTORY_MESSAGE_CHARS = 2000
+
+
+class _Session:
+    __slots__ = ("chat", "turns", "chat_turns", "size", "last_used")
+
+    def __init__(self, chat: Any, turns: int, size: int):
+        self.chat = chat
+        self.turns = turns          # turns persisted for the session
+        self.chat_turns = 0         # turns sent on this chat object
+        self.size = size            # approximate bytes of text held
+        self.last_used = time.monotonic()
+
+
+def history_system_message(system_message: str, history: List[Dict[str, Any]]) -> str:
+    """System message carrying the earlier turns of a conversation"""
+    if not history:
+        return system_message
+    lines = [system_message, "", "## Conversation so far"]
+    for turn in history:
+        lines.append(f"User: {turn.get('user_message', '')[:ASSISTANT_HISTORY_MESSAGE_CHARS]}")
+        lines.append(f"Assistant: {turn.get('ai_response', '')[:ASSISTANT_HISTORY_MESSAGE_CHARS]}")
+    lines.append("")
+    lines.append("Continue the conversation from here.")
+    return "\n".join(lines)
+
+
+class AssistantSessionManager:
+    def __init__(
+        self,
+        max_sessions: int = ASSISTANT_MAX_SESSIONS,
+        max_bytes: int = ASSISTANT_SESSIONS_MAX_BYTES,
+        idle_seconds: int = ASSISTANT_SESSION_IDLE_SECONDS,
+        history_turns: int = ASSISTANT_HISTORY_TURNS
+    ):
+        self.db = None
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.history_turns = history_turns
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self.total_bytes = 0
+        self.stats = {
+            "hits": 0, "created": 0, "rehydrated": 0, "rebuilt_stale": 0, "rebuilt_long": 0,
+            "evicted_lru": 0, "evicted_idle": 0, "evicted_memory": 0
+        }
+
+    def set_db(self, database):
+        self.db = database
+
+    async def ensure_indexes(self):
+        await self.db.ai_chat_history.create_index([("session_id", 1), ("created_at", -1)])
+        await self.db.ai_chat_history.create_index("created_at")
+
+    # ---------- eviction ----------
+
+    def _drop(self, session_id: str, reason: Optional[str] = None):
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return
+        self.total_bytes -= session.size
+        if reason:
+            self.stats[f"evicted_{reason}"] += 1
+
+    def _evict_idle(self):
+        # Least recently used first, so stop at the first session still in use
+        cutoff = time.monotonic() - self.idle_seconds
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_used >= cutoff:
+                break
+            self._drop(session_id, "idle")
+
+    def _enforce_limits(self, keep: Optional[str] = None):
+        while len(self._sessions) > self.max_sessions:
+            self._drop(next(iter(self._sessions)), "lru")
+        while self.total_bytes > self.max_bytes and len(self._sessions) > 1:
+            session_id = next(iter(self._sessions))
+            if session_id == keep:
+                break
+            self._drop(session_id, "memory")
+
+    # ---------- sessions ----------
+
+    async def _persisted_turns(self, session_id: str) -> Optional[int]:
+        if self.db is None:
+            return None
+        return await self.db.ai_chat_history.count_documents({"session_id": session_id})
+
+    async def _load_history(self, session_id: str) -> List[Dict[str, Any]]:
+        if self.db is None or self.history_turns <= 0:
+            return []
+        history = await self.db.ai_chat_history.find(
+            {"session_id": session_id},
+            {"_id": 0, "user_message": 1, "ai_response": 1}
+        ).sort("created_at", -1).limit(self.history_turns).to_list(self.history_turns)
+        history.reverse()
+        return history
+
+    async def get(self, session_id: str, system_message: str):
+        """The chat for a session, created or rehydrated from ai_chat_history as needed"""
+        self._evict_idle()
+        persisted = await self._persisted_turns(session_id)
+
+        session = self._sessions.get(session_id)
+        if session is not None:
+            if persisted is not None and persisted != session.turns:
+                self.stats["rebuilt_stale"] += 1
+            elif session.chat_turns >= 2 * max(self.history_turns, 1):
+                self.stats["rebuilt_long"] += 1
+            else:
+                session.last_used = time.monotonic()
+                self._sessions.move_to_end(session_id)
+                self.stats["hits"] += 1
+                return session.chat
+            self._drop(session_id)
+
+        history = await self._load_history(session_id) if persisted else []
+        full_system_message = history_system_message(system_message, history)
+        chat = llm_gateway.new_chat(session_id, full_system_message)
+        if history and session is None:
+            self.stats["rehydrated"] += 1
+        elif session is None:
+            self.stats["created"] += 1
+
+        session = _Session(chat, persisted or 0, len(full_system_message))
+        self._sessions[session_id] = session
+        self.total_bytes += session.size
+        self._enforce_limits(keep=session_id)
+        return chat
+
+    def record_turn(self, session_id: str, user_message: str, ai_response: str):
+        """Account for a completed (and persisted) turn of a session"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return
+        added = len(user_message) + len(ai_response)
+        session.turns += 1
+        session.chat_turns += 1
+        session.size += added
+        self.total_bytes += added
+        self._enforce_limits(keep=session_id)
+
+    def discard(self, session_id: str):
+        self._drop(session_id)
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "approx_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "idle_seconds": self.idle_seconds,
+            "history_turns": self.history_turns
+        }
+
+
+# Global instance
+assistant_sessions = AssistantSessionManager()
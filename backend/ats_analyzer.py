@@ -0,0 +1,298 @@
+"""
+ATS Analyzer - Fast rule-based ATS scoring
+
+Scores a resume against the same categories as the AI ATS check, in
+milliseconds and without any external calls. All patterns are compiled at
+import time, and every keyword dictionary (skills, experience, action
+verbs, education, section headers) is resolved from a single tokenization
+of the lowercased text instead of one substring scan per keyword.
+
+Used as the instant "quick score" of /api/ats-check and as the fallback
+when the AI analysis is unavailable.
+"""
+import re
+from typing import Dict, List, Set
+
+EMAIL_PATTERN = re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
+# A run of digit groups; years and date ranges are rejected by the digit count
+PHONE_PATTERN = re.compile(r"(?<![\w+])(?:\+|00)?\(?\d{1,4}\)?(?:[ .-]?\(?\d{2,5}\)?){1,4}(?!\w)")
+PHONE_MIN_DIGITS = 9
+COMPLEX_FORMAT_PATTERN = re.compile(r"\||\t\t\t")
+
+SKILLS = [
+    "python", "java", "javascript", "sql", "excel", "word", "powerpoint",
+    "management", "leadership", "communication", "teamwork", "problem solving",
+    "project management", "data analysis", "customer service", "sales",
+    "marketing", "finance", "accounting", "microsoft office", "sap",
+    "html", "css", "react", "node", "aws", "azure", "agile", "scrum"
+]
+EXPERIENCE_KEYWORDS = ["experience", "work history", "employment", "career", "position", "role"]
+ACHIEVEMENT_WORDS = ["achieved", "improved", "increased", "reduced", "managed", "led", "developed", "created", "implemented"]
+EDUCATION_KEYWORDS = [
+    "education", "qualification", "degree", "diploma", "certificate", "university",
+    "college", "matric", "bachelor", "master", "honours"
+]
+SECTION_HEADERS = ["experience", "education", "skills", "summary", "profile", "objective", "references", "contact"]
+CONTACT_KEYWORDS = ["linkedin"]
+
+DICTIONARIES = {
+    "skills": SKILLS,
+    "experience": EXPERIENCE_KEYWORDS,
+    "achievements": ACHIEVEMENT_WORDS,
+    "education": EDUCATION_KEYWORDS,
+    "sections": SECTION_HEADERS,
+    "contact": CONTACT_KEYWORDS
+}
+
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_INFLECTIONS = ("", "s", "es", "d", "ed")
+
+_ALL_PHRASES = sorted({phrase for phrases in DICTIONARIES.values() for phrase in phrases})
+
+# Every accepted surface form of a single-word keyword ("roles", "experienced")
+WORD_FORMS = {
+    phrase + suffix: phrase
+    for phrase in _ALL_PHRASES if " " not in phrase
+    for suffix in _INFLECTIONS
+}
+MULTI_WORD_PHRASES = [phrase for phrase in _ALL_PHRASES if " " in phrase]
+
+# Phrases implied by a longer match ("project management" also counts as "management")
+_IMPLIED_PHRASES = {
+    phrase: set(phrase.split()) & WORD_FORMS.keys()
+    for phrase in MULTI_WORD_PHRASES
+}
+
+
+def scan_keywords(text_lower: str) -> Set[str]:
+    """
+    Dictionary phrases present in the text as whole words. The text is
+    tokenized once; single words are resolved with one set intersection and
+    multi-word phrases are looked up in the space-joined token stream.
+    A version number does not hide a keyword ("html5", "css3").
+    """
+    tokens = _TOKEN_PATTERN.findall(text_lower)
+    words = set(tokens)
+    words.update(token.rstrip("0123456789") for token in tokens if token[-1].isdigit())
+    found = {WORD_FORMS[token] for token in WORD_FORMS.keys() & words}
+    joined = f" {' '.join(tokens)} "
+    for phrase in MULTI_WORD_PHRASES:
+        if f" {phrase} " in joined or f" {phrase}s " in joined:
+            found.add(phrase)
+            found.update(_IMPLIED_PHRASES[phrase])
+    return found
+
+
+def has_phone_number(text: str) -> bool:
+    for match in PHONE_PATTERN.finditer(text):
+        if sum(ch.isdigit() for ch in match.group()) >= PHONE_MIN_DIGITS:
+            return True
+    return False
+
+
+def _status(score: int) -> str:
+    if score >= 70:
+        return "pass"
+    elif score >= 50:
+        return "warning"
+    return "fail"
+
+
+def _matched(found: Set[str], phrases: List[str]) -> List[str]:
+    return [phrase for phrase in phrases if phrase in found]
+
+
+def analyze_resume(resume_text: str) -> Dict:
+    """
+    Rule-based ATS analysis in the same shape as the AI result
+    (overall_score, categories, checklist, strengths, ...).
+    """
+    text_lower = resume_text.lower()
+    text_length = len(resume_text)
+    found = scan_keywords(text_lower)
+
+    scores = {
+        "format_compatibility": 70,
+        "contact_information": 50,
+        "keywords_skills": 50,
+        "work_experience": 50,
+        "education": 50,
+        "overall_structure": 60
+    }
+    findings = {category: [] for category in scores}
+    strengths = []
+    critical_issues = []
+    recommendations = []
+
+    # Contact Information
+    has_email = EMAIL_PATTERN.search(resume_text) is not None
+    has_phone = has_phone_number(resume_text)
+    has_linkedin = "linkedin" in found
+
+    if has_email:
+        scores["contact_information"] += 20
+        findings["contact_information"].append("✓ Email address detected")
+    else:
+        findings["contact_information"].append("✗ No email address found")
+        critical_issues.append("Missing email address")
+
+    if has_phone:
+        scores["contact_information"] += 20
+        findings["contact_information"].append("✓ Phone number detected")
+    else:
+        findings["contact_information"].append("✗ No phone number found")
+        critical_issues.append("Missing phone number")
+
+    if has_linkedin:
+        scores["contact_information"] += 10
+        findings["contact_information"].append("✓ LinkedIn profile mentioned")
+        strengths.append("LinkedIn profile included")
+    else:
+        findings["contact_information"].append("○ Consider adding LinkedIn profile")
+        recommendations.append("Add your LinkedIn profile URL")
+
+    # Keywords & Skills
+    detected_skills = [skill.title() for skill in _matched(found, SKILLS)]
+    scores["keywords_skills"] = min(scores["keywords_skills"] + 3 * len(detected_skills), 100)
+
+    if len(detected_skills) > 10:
+        strengths.append(f"Good variety of skills detected ({len(detected_skills)} skills)")
+        findings["keywords_skills"].append(f"✓ {len(detected_skills)} relevant skills detected")
+    elif len(detected_skills) > 5:
+        findings["keywords_skills"].append(f"○ {len(detected_skills)} skills detected - consider adding more")
+        recommendations.append("Add more industry-specific keywords and skills")
+    else:
+        findings["keywords_skills"].append("✗ Few skills detected - add more keywords")
+        critical_issues.append("Insufficient keywords and skills")
+
+    # Work Experience
+    has_experience_section = bool(_matched(found, EXPERIENCE_KEYWORDS))
+    achievement_count = len(_matched(found, ACHIEVEMENT_WORDS))
+
+    if has_experience_section:
+        scores["work_experience"] += 20
+        findings["work_experience"].append("✓ Work experience section detected")
+    else:
+        findings["work_experience"].append("✗ No clear work experience section")
+        critical_issues.append("Missing or unclear work experience section")
+
+    if achievement_count > 5:
+        scores["work_experience"] += 30
+        findings["work_experience"].append(f"✓ Strong action verbs used ({achievement_count} found)")
+        strengths.append("Good use of action verbs and achievements")
+    elif achievement_count > 2:
+        scores["work_experience"] += 15
+        findings["work_experience"].append(f"○ Some action verbs used ({achievement_count} found)")
+        recommendations.append("Use more action verbs (achieved, improved, managed)")
+    else:
+        findings["work_experience"].append("✗ Few action verbs - add quantifiable achievements")
+        recommendations.append("Add quantifiable achievements (e.g., 'Increased sales by 20%')")
+
+    # Education
+    education_count = len(_matched(found, EDUCATION_KEYWORDS))
+
+    if education_count >= 3:
+        scores["education"] += 40
+        findings["education"].append("✓ Education section well documented")
+        strengths.append("Education section is comprehensive")
+    elif education_count >= 1:
+        scores["education"] += 20
+        findings["education"].append("○ Education section present but could be enhanced")
+    else:
+        findings["education"].append("✗ Education section missing or unclear")
+        recommendations.append("Add clear education section with qualifications")
+
+    # Overall Structure
+    sections_found = len(_matched(found, SECTION_HEADERS))
+
+    if sections_found >= 5:
+        scores["overall_structure"] += 30
+        findings["overall_structure"].append(f"✓ Well-structured with {sections_found} clear sections")
+        strengths.append("CV has clear, well-defined sections")
+    elif sections_found >= 3:
+        scores["overall_structure"] += 15
+        findings["overall_structure"].append(f"○ {sections_found} sections detected - consider adding more")
+    else:
+        findings["overall_structure"].append("✗ Few clear sections - improve document structure")
+        critical_issues.append("Poor document structure")
+
+    if 1500 < text_length < 5000:
+        scores["overall_structure"] += 10
+        findings["overall_structure"].append("✓ CV length is appropriate")
+    elif text_length < 500:
+        findings["overall_structure"].append("✗ CV appears too short")
+        critical_issues.append("CV is too short - add more detail")
+    elif text_length > 8000:
+        findings["overall_structure"].append("✗ CV may be too long")
+        recommendations.append("Consider condensing to 2 pages maximum")
+
+    # Format compatibility
+    if COMPLEX_FORMAT_PATTERN.search(resume_text):
+        scores["format_compatibility"] -= 10
+        findings["format_compatibility"].append("○ Possible table or complex formatting detected")
+        recommendations.append("Avoid tables - use simple formatting for better ATS parsing")
+    else:
+        findings["format_compatibility"].append("✓ No complex tables detected")
+
+    overall_score = int(sum(scores.values()) / len(scores))
+
+    checklist = []
+    if not has_email:
+        checklist.append({
+            "item": "Email address missing",
+            "status": "fail",
+            "priority": "high",
+            "recommendation": "Add a professional email address",
+            "impact": "+15% ATS Score"
+        })
+    if not has_phone:
+        checklist.append({
+            "item": "Phone number missing",
+            "status": "fail",
+            "priority": "high",
+            "recommendation": "Add a contact phone number",
+            "impact": "+10% ATS Score"
+        })
+    if len(detected_skills) < 5:
+        checklist.append({
+            "item": "Insufficient keywords",
+            "status": "warning",
+            "priority": "high",
+            "recommendation": "Add more industry-specific skills and keywords",
+            "impact": "+20% ATS Score"
+        })
+    if achievement_count < 3:
+        checklist.append({
+            "item": "Weak action verbs",
+            "status": "warning",
+            "priority": "medium",
+            "recommendation": "Use strong action verbs (achieved, implemented, managed)",
+            "impact": "+10% ATS Score"
+        })
+
+    if overall_score >= 70:
+        verdict = "This is a good foundation!"
+    elif overall_score >= 50:
+        verdict = "There is room for improvement."
+    else:
+        verdict = "Significant improvements needed."
+
+    categories = {}
+    for category, score in scores.items():
+        categories[category] = {
+            "score": min(score, 100),
+            "status": _status(score),
+            "findings": findings[category]
+        }
+    categories["keywords_skills"]["detected_skills"] = detected_skills[:20]
+
+    return {
+        "overall_score": overall_score,
+        "summary": f"Basic ATS analysis complete. Your CV scored {overall_score}/100. {verdict}",
+        "categories": categories,
+        "checklist": checklist,
+        "strengths": strengths if strengths else ["CV uploaded successfully"],
+        "critical_issues": critical_issues,
+        "recommendations": recommendations[:5] if recommendations else ["Keep your CV updated regularly"]
+    }
@@ -0,0 +1,326 @@
+"""
+ATS Cache Service - Shared cache for AI ATS check results
+
+Results are keyed by a hash of the extracted resume text and kept in two
+tiers: a bounded in-memory LRU in front of the `ats_cache` collection,
+which expires documents through a TTL index on `created_at`. Concurrent
+checks of the same resume are coalesced: the first request runs the AI
+analysis and every identical request that arrives while it is in flight
+awaits the same future instead of paying for another LLM call.
+
+Entries also carry a MinHash signature over word shingles of the
+normalized resume, banded for LSH lookup through a multikey index. A
+resume that is not byte-identical to a cached one (a changed date, an
+extra bullet, a PDF re-export) is served the cached analysis when the
+estimated shingle similarity reaches ATS_SIMILARITY_THRESHOLD, and a
+looser ATS_SIMILARITY_FALLBACK_THRESHOLD match is preferred over the
+rule-based fallback when the AI is unavailable. Thresholds are tuned with
+benchmarks/ats_similarity_benchmark.py.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable via environment)
+ATS_CACHE_TTL_SECONDS = int(os.environ.get("ATS_CACHE_TTL_SECONDS", 24 * 3600))
+ATS_CACHE_MEMORY_ENTRIES = int(os.environ.get("ATS_CACHE_MEMORY_ENTRIES", 512))
+ATS_SIMILARITY_ENABLED = os.environ.get("ATS_SIMILARITY_ENABLED", "true").lower() == "true"
+ATS_SIMILARITY_THRESHOLD = float(os.environ.get("ATS_SIMILARITY_THRESHOLD", 0.85))
+ATS_SIMILARITY_FALLBACK_THRESHOLD = float(os.environ.get("ATS_SIMILARITY_FALLBACK_THRESHOLD", 0.6))
+ATS_SIMILARITY_MIN_SHINGLES = int(os.environ.get("ATS_SIMILARITY_MIN_SHINGLES", 40))
+ATS_SIMILARITY_MAX_CANDIDATES = int(os.environ.get("ATS_SIMILARITY_MAX_CANDIDATES", 50))
+
+# MinHash layout: NUM_PERM slots split into LSH_BANDS bands of LSH_ROWS rows.
+# Changing these invalidates the signatures stored in ats_cache.
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+
+# Where a result came from
+SOURCE_MEMORY = "memory"
+SOURCE_MONGO = "mongo"
+SOURCE_COALESCED = "coalesced"
+SOURCE_SIMILAR = "similar"
+SOURCE_COMPUTED = "computed"
+
+
+def resume_cache_key(resume_text: str) -> str:
+    """Cache key for a resume (same hash the ats_cache collection always used)"""
+    return hashlib.md5(resume_text.encode()).hexdigest()
+
+
+# ---------- near-duplicate signatures ----------
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9#+]+(?:[.'][a-z0-9#+]+)*")
+_DIGIT_PATTERN = re.compile(r"\d")
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed seed: signatures must be comparable across processes and restarts
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+
+def resume_shingles(resume_text: str) -> set:
+    """
+    Word shingles of a resume. Digits are masked so changed dates, phone
+    numbers and years of experience do not count as differences.
+    """
+    tokens = _TOKEN_PATTERN.findall(_DIGIT_PATTERN.sub("0", resume_text.lower()))
+    if len(tokens) < SHINGLE_SIZE:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(shingles: set) -> List[int]:
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=4).digest(), "big")
+        for shingle in shingles
+    ]
+    return [
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes) & _MAX_HASH
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def lsh_bands(signature: List[int]) -> List[int]:
+    """One 56-bit key per band (band index included, so bands never collide)"""
+    bands = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        payload = band.to_bytes(1, "big") + b"".join(row.to_bytes(4, "big") for row in rows)
+        bands.append(int.from_bytes(hashlib.blake2b(payload, digest_size=7).digest(), "big"))
+    return bands
+
+
+def resume_signature(resume_text: str, min_shingles: int = ATS_SIMILARITY_MIN_SHINGLES) -> Optional[List[int]]:
+    """MinHash signature of a resume, or None when it is too short to compare reliably"""
+    shingles = resume_shingles(resume_text)
+    if len(shingles) < min_shingles:
+        return None
+    return minhash_signature(shingles)
+
+
+def estimate_similarity(signature: List[int], other: List[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    if not other or len(other) != len(signature):
+        return 0.0
+    return sum(1 for a, b in zip(signature, other) if a == b) / len(signature)
+
+
+class ATSCacheService:
+    def __init__(
+        self,
+        ttl_seconds: int = ATS_CACHE_TTL_SECONDS,
+        max_entries: int = ATS_CACHE_MEMORY_ENTRIES,
+        similarity_threshold: float = ATS_SIMILARITY_THRESHOLD
+    ):
+        self.db = None
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_enabled = ATS_SIMILARITY_ENABLED
+        self.similarity_threshold = similarity_threshold
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any], float]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.stats = {
+            "memory_hits": 0, "mongo_hits": 0, "similar_hits": 0, "misses": 0,
+            "coalesced": 0, "stored": 0, "errors": 0
+        }
+
+    def set_db(self, database):
+        self.db = database
+
+    async def ensure_indexes(self):
+        """Unique key index plus a TTL index so Mongo expires stale results itself"""
+        await self.db.ats_cache.create_index("resume_hash", unique=True)
+        await self.db.ats_cache.create_index("lsh_bands")
+        try:
+            await self.db.ats_cache.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+        except OperationFailure:
+            # An older plain (or differently timed) index on created_at exists
+            await self.db.ats_cache.drop_index("created_at_1")
+            await self.db.ats_cache.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+
+    # ---------- memory tier ----------
+
+    def _memory_get(self, key: str) -> Tuple[Optional[Dict[str, Any]], float]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None, 0.0
+        expires_at, analysis, confidence = entry
+        if expires_at < time.monotonic():
+            del self._memory[key]
+            return None, 0.0
+        self._memory.move_to_end(key)
+        return analysis, confidence
+
+    def _memory_put(
+        self,
+        key: str,
+        analysis: Dict[str, Any],
+        created_at: Optional[datetime] = None,
+        confidence: float = 1.0
+    ):
+        remaining = self.ttl_seconds
+        if created_at is not None:
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            remaining -= (datetime.now(timezone.utc) - created_at).total_seconds()
+        if remaining <= 0:
+            return
+        self._memory[key] = (time.monotonic() + remaining, analysis, confidence)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # ---------- lookup ----------
+
+    async def get(self, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str], float]:
+        """Cached analysis, the tier it came from and its match confidence, or (None, None, 0)"""
+        analysis, confidence = self._memory_get(key)
+        if analysis is not None:
+            self.stats["memory_hits"] += 1
+            return analysis, SOURCE_MEMORY if confidence >= 1.0 else SOURCE_SIMILAR, confidence
+
+        cached = await self.db.ats_cache.find_one({"resume_hash": key}, {"_id": 0, "analysis": 1, "created_at": 1})
+        if cached and cached.get("analysis"):
+            self.stats["mongo_hits"] += 1
+            self._memory_put(key, cached["analysis"], cached.get("created_at"))
+            return cached["analysis"], SOURCE_MONGO, 1.0
+        return None, None, 0.0
+
+    async def put(self, key: str, analysis: Dict[str, Any], signature: Optional[List[int]] = None):
+        self._memory_put(key, analysis)
+        entry = {"resume_hash": key, "analysis": analysis, "created_at": datetime.now(timezone.utc)}
+        if signature:
+            entry["minhash"] = signature
+            entry["lsh_bands"] = lsh_bands(signature)
+        await self.db.ats_cache.update_one({"resume_hash": key}, {"$set": entry}, upsert=True)
+        self.stats["stored"] += 1
+
+    async def _find_by_signature(self, signature: List[int], threshold: float) -> Tuple[Optional[Dict[str, Any]], float]:
+        candidates = self.db.ats_cache.find(
+            {"lsh_bands": {"$in": lsh_bands(signature)}},
+            {"_id": 0, "analysis": 1, "minhash": 1}
+        ).sort("created_at", -1).limit(ATS_SIMILARITY_MAX_CANDIDATES)
+        best, best_similarity = None, 0.0
+        async for candidate in candidates:
+            similarity = estimate_similarity(signature, candidate.get("minhash"))
+            if similarity > best_similarity and candidate.get("analysis"):
+                best, best_similarity = candidate["analysis"], similarity
+        if best_similarity < threshold:
+            return None, best_similarity
+        return best, best_similarity
+
+    async def find_similar(self, resume_text: str, threshold: Optional[float] = None) -> Tuple[Optional[Dict[str, Any]], float]:
+        """Closest cached analysis at or above `threshold` and its estimated similarity"""
+        if not self.similarity_enabled:
+            return None, 0.0
+        signature = await asyncio.to_thread(resume_signature, resume_text)
+        if signature is None:
+            return None, 0.0
+        return await self._find_by_signature(signature, self.similarity_threshold if threshold is None else threshold)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        resume_text: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], str, float]:
+        """
+        Cached analysis for `key`, or the result of `compute()`, which runs at
+        most once per key at a time. With `resume_text`, a near-duplicate
+        cached analysis is returned instead of computing when one is close
+        enough. Returns (analysis, source, match confidence).
+
+        Errors from `compute()` are raised to every waiting caller and nothing
+        is cached, so each caller can fall back.
+        """
+        analysis, source, confidence = await self.get(key)
+        if analysis is not None:
+            return analysis, source, confidence
+
+        task = self._in_flight.get(key)
+        leader = task is None
+        if leader:
+            self.stats["misses"] += 1
+            task = asyncio.ensure_future(self._resolve(key, compute, resume_text))
+            task.add_done_callback(self._task_done)
+            self._in_flight[key] = task
+        else:
+            self.stats["coalesced"] += 1
+
+        # Shielded so one disconnecting client does not cancel the shared call
+        analysis, source, confidence = await asyncio.shield(task)
+        return analysis, source if leader else SOURCE_COALESCED, confidence
+
+    async def _resolve(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        resume_text: Optional[str]
+    ) -> Tuple[Dict[str, Any], str, float]:
+        try:
+            signature = None
+            if resume_text and self.similarity_enabled:
+                signature = await asyncio.to_thread(resume_signature, resume_text)
+                if signature is not None:
+                    match, similarity = await self._find_by_signature(signature, self.similarity_threshold)
+                    if match is not None:
+                        self.stats["similar_hits"] += 1
+                        # Remembered under this resume's key too, so polls and repeats find it
+                        self._memory_put(key, match, confidence=similarity)
+                        return match, SOURCE_SIMILAR, similarity
+            try:
+                analysis = await compute()
+            except Exception:
+                self.stats["errors"] += 1
+                raise
+        finally:
+            self._in_flight.pop(key, None)
+        try:
+            await self.put(key, analysis, signature)
+        except Exception as e:
+            logger.warning(f"Failed to store ATS cache entry {key[:8]}: {str(e)}")
+        return analysis, SOURCE_COMPUTED, 1.0
+
+    @staticmethod
+    def _task_done(task: asyncio.Task):
+        # Retrieve the error so it is not reported as unhandled when every caller left
+        if not task.cancelled():
+            task.exception()
+
+    def is_pending(self, key: str) -> bool:
+        """Whether an analysis for `key` is currently running"""
+        return key in self._in_flight
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "memory_entries": len(self._memory),
+            "memory_max_entries": self.max_entries,
+            "in_flight": len(self._in_flight),
+            "ttl_seconds": self.ttl_seconds,
+            "similarity_enabled": self.similarity_enabled,
+            "similarity_threshold": self.similarity_threshold,
+            "similarity_fallback_threshold": ATS_SIMILARITY_FALLBACK_THRESHOLD
+        }
+
+
+# Global instance
+ats_cache_service = ATSCacheService()
@@ -0,0 +1,148 @@
+"""
+Benchmark for the ATS cache near-duplicate matcher.
+
+Builds a corpus from the repository's sample CVs (test_cv*.txt, test_cv*.pdf
+and test_resume*.txt), derives realistic edits of each one (shifted dates,
+an added or removed bullet, a reworded line, a changed phone number, a PDF
+export of the same text) and reports, for a range of thresholds, how many
+same-CV pairs would be served from cache and how many different-CV pairs
+would wrongly match.
+
+    python backend/benchmarks/ats_similarity_benchmark.py [--thresholds 0.5,0.6,...]
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+from itertools import combinations
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from ats_cache_service import (  # noqa: E402
+    ATS_SIMILARITY_MIN_SHINGLES, ATS_SIMILARITY_THRESHOLD, ATS_SIMILARITY_FALLBACK_THRESHOLD,
+    estimate_similarity, lsh_bands, resume_shingles, resume_signature
+)
+from text_extraction_service import extract_document_text, normalize_whitespace  # noqa: E402
+
+DEFAULT_THRESHOLDS = [0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95]
+
+
+def load_samples():
+    """(group, name, text) for every sample CV; files of the same CV share a group"""
+    samples = []
+    paths = sorted(
+        glob.glob(os.path.join(REPO_DIR, "test_cv*.txt"))
+        + glob.glob(os.path.join(REPO_DIR, "test_cv*.pdf"))
+        + glob.glob(os.path.join(REPO_DIR, "test_resume*.txt"))
+    )
+    for path in paths:
+        name = os.path.basename(path)
+        stem, extension = os.path.splitext(name)
+        with open(path, "rb") as f:
+            content = f.read()
+        text = extract_document_text(content, extension.lstrip("."))["text"]
+        group = re.sub(r"_content$", "", stem)
+        samples.append((group, name, text))
+    return samples
+
+
+def _bullet_lines(lines):
+    return [i for i, line in enumerate(lines) if line.lstrip().startswith(("-", "•", "*"))]
+
+
+def variants(text):
+    """Edits a candidate typically makes before re-uploading the same CV"""
+    lines = text.split("\n")
+    result = {
+        "dates_shifted": re.sub(r"\b(19|20)(\d\d)\b", lambda m: str(int(m.group()) + 1), text),
+        "phone_changed": re.sub(r"\d{3}", "555", text, count=2),
+    }
+    bullets = _bullet_lines(lines)
+    if bullets:
+        added = lines[:]
+        added.insert(bullets[0] + 1, "- Mentored two interns and ran weekly sprint demos")
+        result["bullet_added"] = "\n".join(added)
+        removed = lines[:]
+        del removed[bullets[-1]]
+        result["bullet_removed"] = "\n".join(removed)
+    longest = max(range(len(lines)), key=lambda i: len(lines[i]))
+    reworded = lines[:]
+    reworded[longest] = reworded[longest].replace("Experienced", "Seasoned").replace("and", "&", 1)
+    result["line_reworded"] = "\n".join(reworded)
+    return {name: normalize_whitespace(variant) for name, variant in result.items()}
+
+
+def build_corpus():
+    corpus = []
+    for group, name, text in load_samples():
+        corpus.append((group, name, text))
+        for variant_name, variant in variants(text).items():
+            corpus.append((group, f"{name}:{variant_name}", variant))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--thresholds", default=",".join(str(t) for t in DEFAULT_THRESHOLDS))
+    args = parser.parse_args()
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+
+    corpus = build_corpus()
+    signatures = {}
+    started = time.perf_counter()
+    for _, name, text in corpus:
+        signatures[name] = resume_signature(text)
+    elapsed = time.perf_counter() - started
+
+    skipped = [name for name, signature in signatures.items() if signature is None]
+    usable = [(group, name) for group, name, _ in corpus if signatures[name] is not None]
+    print(f"Corpus: {len(corpus)} documents, {len(usable)} with signatures "
+          f"({len(skipped)} under {ATS_SIMILARITY_MIN_SHINGLES} shingles are only matched exactly)")
+    print(f"Signature time: {elapsed / len(corpus) * 1000:.2f} ms per document\n")
+
+    texts = {name: text for _, name, text in corpus}
+    pairs = []
+    for (group_a, a), (group_b, b) in combinations(usable, 2):
+        estimated = estimate_similarity(signatures[a], signatures[b])
+        shingles_a, shingles_b = resume_shingles(texts[a]), resume_shingles(texts[b])
+        exact = len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+        candidate = bool(set(lsh_bands(signatures[a])) & set(lsh_bands(signatures[b])))
+        pairs.append((group_a == group_b, estimated, exact, candidate, a, b))
+
+    positives = [p for p in pairs if p[0]]
+    negatives = [p for p in pairs if not p[0]]
+    error = sum(abs(p[1] - p[2]) for p in pairs) / max(len(pairs), 1)
+    print(f"Pairs: {len(positives)} same-CV, {len(negatives)} different-CV; "
+          f"mean |estimate - exact Jaccard| = {error:.3f}")
+    if positives:
+        print(f"Same-CV similarity:      min {min(p[1] for p in positives):.3f}")
+    if negatives:
+        print(f"Different-CV similarity: max {max(p[1] for p in negatives):.3f}\n")
+
+    print(f"{'threshold':>9} {'served':>8} {'recall':>7} {'false':>6} {'precision':>9}")
+    for threshold in thresholds:
+        # A pair is served only if LSH surfaces it as a candidate and it clears the threshold
+        served = sum(1 for p in positives if p[3] and p[1] >= threshold)
+        false = sum(1 for p in negatives if p[3] and p[1] >= threshold)
+        recall = served / len(positives) if positives else 0.0
+        precision = served / (served + false) if served + false else 1.0
+        marker = ""
+        if threshold == ATS_SIMILARITY_THRESHOLD:
+            marker = "  <- serve threshold"
+        elif threshold == ATS_SIMILARITY_FALLBACK_THRESHOLD:
+            marker = "  <- fallback threshold"
+        print(f"{threshold:>9.2f} {served:>8} {recall:>7.2f} {false:>6} {precision:>9.2f}{marker}")
+
+    misses = sorted((p for p in positives if p[1] < ATS_SIMILARITY_THRESHOLD), key=lambda p: p[1])
+    if misses:
+        print("\nSame-CV pairs below the serve threshold:")
+        for _, estimated, exact, _, a, b in misses[:10]:
+            print(f"  {estimated:.3f} (exact {exact:.3f})  {a}  ~  {b}")
+
+
+if __name__ == "__main__":
+    main()
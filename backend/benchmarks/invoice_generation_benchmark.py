@@ -0,0 +1,157 @@
+"""
+Benchmark for monthly reseller invoice generation.
+
+Seeds a scratch database with N active resellers (10,000 by default) and
+times, against the same MongoDB:
+
+- the previous per-reseller loop (find_one + insert_one per reseller, local
+  invoice counter), re-implemented here as the baseline
+- invoicing_service.generate_monthly for a fresh period
+- a second generate_monthly for the same period (the idempotent no-op a
+  repeated scheduler run or a double click costs)
+
+Each phase prints its wall time and the commands it sent to the server
+(counted with pymongo command monitoring). Notification emails are left out
+of every run so the numbers compare invoice writes only. The scratch
+database is dropped afterwards.
+
+Database operations per run, batch size 500 (counted per collection call
+against an in-memory Motor stand-in; getMore round trips for large cursors
+come on top when run against a server):
+
+    resellers   legacy loop   legacy rerun   generate_monthly   rerun
+    2,000       4,001         2,001          15                 7
+    10,000      20,001        10,001         63                 23
+
+generate_monthly costs one resellers find, then per batch one find for
+existing invoices, one find_one_and_update to reserve invoice numbers and
+one bulk_write, plus count_documents and update_one to seed the counter.
+Invoice numbers were unique in both runs. Wall times have not been recorded
+yet: they need a MongoDB server, so run the command below against one
+before quoting any.
+
+    MONGO_URL=mongodb://localhost:27017 python backend/benchmarks/invoice_generation_benchmark.py [--resellers 10000] [--batch-size 500]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+from pymongo import monitoring  # noqa: E402
+
+from invoicing_service import InvoicingService  # noqa: E402
+
+DB_NAME = "upshift_invoice_benchmark"
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts the commands (round trips) sent to the server, by name"""
+
+    def __init__(self):
+        self.counts = {}
+
+    def started(self, event):
+        self.counts[event.command_name] = self.counts.get(event.command_name, 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def take(self):
+        counts, self.counts = self.counts, {}
+        return counts
+
+
+async def seed(db, count):
+    await db.resellers.insert_many([
+        {
+            "id": str(uuid.uuid4()),
+            "company_name": f"Reseller {i}",
+            "status": "active",
+            "subscription": {"monthly_fee": 250000},
+            "contact_info": {"email": f"billing{i}@example.com"}
+        }
+        for i in range(count)
+    ])
+
+
+async def legacy_generate(db, period):
+    """The loop the scheduler, admin and scheduler routes each used to run"""
+    now = datetime.now(timezone.utc)
+    resellers = await db.resellers.find({"status": "active"}, {"_id": 0}).to_list(None)
+    invoices_created = 0
+    for reseller in resellers:
+        existing = await db.reseller_invoices.find_one({"reseller_id": reseller["id"], "period": period})
+        if existing:
+            continue
+        monthly_fee = reseller.get("subscription", {}).get("monthly_fee", 250000)
+        await db.reseller_invoices.insert_one({
+            "id": str(uuid.uuid4()),
+            "reseller_id": reseller["id"],
+            "invoice_number": f"INV-{period}-{str(invoices_created + 1).zfill(4)}",
+            "amount": monthly_fee,
+            "period": period,
+            "due_date": (now + timedelta(days=15)).isoformat(),
+            "paid_date": None,
+            "status": "pending",
+            "items": [{"description": f"Monthly SaaS Subscription - {period}", "amount": monthly_fee}],
+            "created_at": now
+        })
+        invoices_created += 1
+    return invoices_created
+
+
+async def timed(label, coro, commands):
+    commands.take()
+    started = time.perf_counter()
+    result = await coro
+    elapsed = time.perf_counter() - started
+    counts = commands.take()
+    detail = ", ".join(f"{name} {count}" for name, count in sorted(counts.items()))
+    print(f"{label:<34} {elapsed:8.2f} s  {sum(counts.values()):6d} commands ({detail})   {result}")
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resellers", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    commands = CommandCounter()
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"), event_listeners=[commands])
+    await client.drop_database(DB_NAME)
+    db = client[DB_NAME]
+    try:
+        await seed(db, args.resellers)
+        service = InvoicingService(batch_size=args.batch_size)
+        service.set_db(db)
+        await service.ensure_indexes()
+        print(f"{args.resellers} active resellers, batch size {args.batch_size}\n")
+
+        legacy = await timed("legacy loop", legacy_generate(db, "2030-01"), commands)
+        legacy_rerun = await timed("legacy loop, invoices exist", legacy_generate(db, "2030-01"), commands)
+        bulk = await timed("generate_monthly", service.generate_monthly("2030-02", notify=False), commands)
+        bulk_rerun = await timed(
+            "generate_monthly, invoices exist", service.generate_monthly("2030-02", notify=False), commands
+        )
+
+        numbers = await db.reseller_invoices.distinct("invoice_number", {"period": "2030-02"})
+        print(f"\nunique invoice numbers for 2030-02: {len(numbers)}")
+        print(f"speed-up: {legacy / bulk:.1f}x first run, {legacy_rerun / bulk_rerun:.1f}x repeated run")
+    finally:
+        await client.drop_database(DB_NAME)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
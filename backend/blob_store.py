@@ -0,0 +1,223 @@
+"""
+Blob Store - Binary object storage for generated files (CV PDFs, images)
+
+Large binaries are kept out of regular Mongo documents: the document holds a
+blob ID and the bytes live in a pluggable backend that can be streamed back
+in chunks.
+
+Backends (BLOB_STORE_BACKEND):
+- gridfs (default): GridFS bucket in the application database
+- local: files under BLOB_STORE_PATH on the local filesystem
+"""
+import asyncio
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent
+
+BLOB_STORE_BACKEND = os.environ.get("BLOB_STORE_BACKEND", "gridfs").lower()
+BLOB_STORE_PATH = Path(os.environ.get("BLOB_STORE_PATH", ROOT_DIR / "uploads" / "blobs"))
+BLOB_STORE_BUCKET = os.environ.get("BLOB_STORE_BUCKET", "blobs")
+BLOB_CHUNK_SIZE = 256 * 1024
+
+
+class BlobNotFoundError(Exception):
+    """Raised when a blob ID does not exist in the store"""
+    pass
+
+
+class BlobInfo:
+    def __init__(self, blob_id: str, length: int, content_type: str, filename: Optional[str] = None):
+        self.blob_id = blob_id
+        self.length = length
+        self.content_type = content_type
+        self.filename = filename
+
+
+class GridFSBlobStore:
+    """Blobs stored as GridFS files keyed by string IDs"""
+
+    def __init__(self, database, bucket_name: str = BLOB_STORE_BUCKET):
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+        self.bucket = AsyncIOMotorGridFSBucket(database, bucket_name=bucket_name)
+
+    async def put(self, data: bytes, filename: str, content_type: str, metadata: Optional[Dict] = None) -> str:
+        blob_id = str(uuid.uuid4())
+        await self.bucket.upload_from_stream_with_id(
+            blob_id,
+            filename,
+            data,
+            chunk_size_bytes=BLOB_CHUNK_SIZE,
+            metadata={"content_type": content_type, **(metadata or {})}
+        )
+        return blob_id
+
+    async def info(self, blob_id: str) -> BlobInfo:
+        from gridfs.errors import NoFile
+        try:
+            grid_out = await self.bucket.open_download_stream(blob_id)
+        except NoFile:
+            raise BlobNotFoundError(blob_id)
+        metadata = grid_out.metadata or {}
+        return BlobInfo(blob_id, grid_out.length, metadata.get("content_type", "application/octet-stream"), grid_out.filename)
+
+    async def get(self, blob_id: str) -> bytes:
+        from gridfs.errors import NoFile
+        try:
+            grid_out = await self.bucket.open_download_stream(blob_id)
+        except NoFile:
+            raise BlobNotFoundError(blob_id)
+        return await grid_out.read()
+
+    async def stream(self, blob_id: str) -> AsyncIterator[bytes]:
+        from gridfs.errors import NoFile
+        try:
+            grid_out = await self.bucket.open_download_stream(blob_id)
+        except NoFile:
+            raise BlobNotFoundError(blob_id)
+        while True:
+            chunk = await grid_out.readchunk()
+            if not chunk:
+                break
+            yield chunk
+
+    async def delete(self, blob_id: str):
+        from gridfs.errors import NoFile
+        try:
+            await self.bucket.delete(blob_id)
+        except NoFile:
+            pass
+
+
+class LocalBlobStore:
+    """Blobs stored as files on the local filesystem"""
+
+    def __init__(self, root: Path = BLOB_STORE_PATH):
+        self.root = Path(root)
+
+    def _path(self, blob_id: str) -> Path:
+        # Blob IDs are generated UUIDs; reject anything that could escape the root
+        if not blob_id or "/" in blob_id or "\\" in blob_id or blob_id.startswith("."):
+            raise BlobNotFoundError(blob_id)
+        return self.root / blob_id[:2] / blob_id
+
+    def _write(self, path: Path, data: bytes, content_type: str):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        path.with_name(path.name + ".type").write_text(content_type)
+
+    async def put(self, data: bytes, filename: str, content_type: str, metadata: Optional[Dict] = None) -> str:
+        blob_id = str(uuid.uuid4())
+        await asyncio.to_thread(self._write, self._path(blob_id), data, content_type)
+        return blob_id
+
+    async def info(self, blob_id: str) -> BlobInfo:
+        path = self._path(blob_id)
+        try:
+            length = (await asyncio.to_thread(path.stat)).st_size
+        except FileNotFoundError:
+            raise BlobNotFoundError(blob_id)
+        type_path = path.with_name(path.name + ".type")
+        content_type = type_path.read_text() if type_path.exists() else "application/octet-stream"
+        return BlobInfo(blob_id, length, content_type)
+
+    async def get(self, blob_id: str) -> bytes:
+        try:
+            return await asyncio.to_thread(self._path(blob_id).read_bytes)
+        except FileNotFoundError:
+            raise BlobNotFoundError(blob_id)
+
+    async def stream(self, blob_id: str) -> AsyncIterator[bytes]:
+        path = self._path(blob_id)
+        try:
+            handle = await asyncio.to_thread(open, path, "rb")
+        except FileNotFoundError:
+            raise BlobNotFoundError(blob_id)
+        try:
+            while True:
+                chunk = await asyncio.to_thread(handle.read, BLOB_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            handle.close()
+
+    async def delete(self, blob_id: str):
+        path = self._path(blob_id)
+        for p in (path, path.with_name(path.name + ".type")):
+            try:
+                await asyncio.to_thread(p.unlink)
+            except FileNotFoundError:
+                pass
+
+
+# Store instance (initialised from server.py)
+blob_store = None
+
+
+def set_db(database):
+    """Create the configured blob store backend"""
+    global blob_store
+    if BLOB_STORE_BACKEND == "local":
+        blob_store = LocalBlobStore()
+    else:
+        blob_store = GridFSBlobStore(database)
+    logger.info(f"Blob store backend: {BLOB_STORE_BACKEND}")
+
+
+def get_blob_store():
+    if blob_store is None:
+        raise RuntimeError("Blob store not initialised")
+    return blob_store
+
+
+async def migrate_document_pdfs(db, batch_size: int = 100, limit: Optional[int] = None) -> Dict:
+    """
+    Move base64 `pdf_content` fields out of user_documents into the blob store.
+
+    Idempotent: only documents that still carry `pdf_content` are touched, and
+    each is rewritten with a `pdf_blob_id` reference in a single update.
+    """
+    import base64
+
+    store = get_blob_store()
+    migrated = 0
+    failed = 0
+    cursor = db.user_documents.find(
+        {"pdf_content": {"$exists": True}},
+        {"_id": 0, "id": 1, "name": 1, "user_id": 1, "pdf_content": 1, "pdf_blob_id": 1},
+        batch_size=batch_size
+    )
+    if limit:
+        cursor = cursor.limit(limit)
+
+    async for document in cursor:
+        try:
+            pdf_bytes = base64.b64decode(document["pdf_content"]) if document.get("pdf_content") else b""
+            blob_id = document.get("pdf_blob_id")
+            if pdf_bytes and not blob_id:
+                blob_id = await store.put(
+                    pdf_bytes,
+                    filename=f"{document.get('name', 'CV')}.pdf",
+                    content_type="application/pdf",
+                    metadata={"user_id": document.get("user_id"), "document_id": document["id"]}
+                )
+            update = {"$unset": {"pdf_content": ""}}
+            if blob_id:
+                update["$set"] = {"pdf_blob_id": blob_id, "file_size": len(pdf_bytes)}
+            await db.user_documents.update_one({"id": document["id"]}, update)
+            migrated += 1
+        except Exception as e:
+            failed += 1
+            logger.error(f"Failed to migrate PDF for document {document.get('id')}: {str(e)}")
+
+    remaining = await db.user_documents.count_documents({"pdf_content": {"$exists": True}})
+    logger.info(f"Document PDF migration: {migrated} migrated, {failed} failed, {remaining} remaining")
+    return {"migrated": migrated, "failed": failed, "remaining": remaining}
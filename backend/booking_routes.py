@@ -415,26 +415,31 @@ async def confirm_booking_payment(
                     booking_time=booking.get("time", "TBD"),
                     meeting_link=meeting_link,
                     amount=amount_formatted,
-                    company_name="UpShift"
+                    company_name="UpShift",
+                    log={
+                        "booking_id": booking_id,
+                        "from_email": email_settings.get("from_email", email_settings.get("smtp_user"))
+                    }
                 )
                 
-                # Log the email to email_logs collection
-                import uuid
-                await db.email_logs.insert_one({
-                    "id": str(uuid.uuid4()),
-                    "type": "booking_confirmation",
-                    "to_email": booking["email"],
-                    "from_email": email_settings.get("from_email", email_settings.get("smtp_user")),
-                    "subject": "Your Strategy Call is Confirmed! - UpShift",
-                    "status": "sent" if email_sent else "failed",
-                    "error": None if email_sent else "Failed to send",
-                    "sent_at": datetime.now(timezone.utc),
-                    "booking_id": booking_id,
-                    "smtp_host": email_settings.get("smtp_host")
-                })
+                # Queued messages are logged by the outbox; log the ones that could not be queued
+                if not email_sent:
+                    import uuid
+                    await db.email_logs.insert_one({
+                        "id": str(uuid.uuid4()),
+                        "type": "booking_confirmation",
+                        "to_email": booking["email"],
+                        "from_email": email_settings.get("from_email", email_settings.get("smtp_user")),
+                        "subject": "Your Strategy Call is Confirmed! - UpShift",
+                        "status": "failed",
+                        "error": "Failed to send",
+                        "sent_at": datetime.now(timezone.utc),
+                        "booking_id": booking_id,
+                        "smtp_host": email_settings.get("smtp_host")
+                    })
                 
                 if email_sent:
-                    logger.info(f"Confirmation email sent to {booking['email']} for booking {booking_id}")
+                    logger.info(f"Confirmation email queued for {booking['email']} for booking {booking_id}")
                 else:
                     logger.warning(f"Failed to send confirmation email for booking {booking_id}")
             else:
@@ -0,0 +1,514 @@
+"""
+Campaign Service - Batched delivery of reseller email campaigns
+
+POST /api/reseller/campaigns/{id}/send marks the campaign "sending" and
+returns; delivery runs in a background task:
+
+1. The audience is streamed from a users cursor into `campaign_recipients`
+   (one document per recipient, unique per campaign and email) with bulk
+   upserts of CAMPAIGN_BATCH_SIZE, so audiences of any size are covered and
+   a resumed campaign never adds a recipient twice.
+2. Pending recipients are claimed CAMPAIGN_BATCH_SIZE at a time (status
+   "sending" with a claim id, so no other task picks them up), their
+   personalised bodies rendered for the whole batch, and sent over the
+   pooled SMTP transport: the reseller's /email-settings account when
+   configured, otherwise the platform account. Sends are spaced to
+   CAMPAIGN_RATE_PER_MINUTE per SMTP host (EMAIL_RATE_LIMITS overrides per
+   host) with at most CAMPAIGN_CONCURRENCY in flight.
+3. Each batch writes the recipients' status (sent / failed with the error)
+   and increments the progress counters on `reseller_campaigns`.
+
+Pause sets the campaign to "paused"; the task stops before its next message
+(in the same process) or at its next lease renewal, and hands unsent claims
+back as pending. Resume waits for a task of this process still finishing
+its in-flight sends before starting a new one, and continues with the
+recipients still pending. When a whole batch fails to connect, the campaign
+pauses itself with the error. The running task holds a lease on the
+campaign, renewed every CAMPAIGN_LEASE_SECONDS / 10 while sending, along
+with its claims; a campaign whose process died is picked up again by
+`recover_stalled` once the lease lapses, and claims left behind are
+returned to pending once they expire.
+"""
+import asyncio
+import html
+import logging
+import os
+import smtplib
+import uuid
+from datetime import datetime, timedelta, timezone
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+
+from email_outbox import EMAIL_RATE_LIMITS, ProviderRateLimiter, parse_rate_limits, permanent_failure
+from smtp_transport import SMTPConfig, smtp_transport
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable via environment)
+CAMPAIGN_BATCH_SIZE = int(os.environ.get("CAMPAIGN_BATCH_SIZE", 100))
+CAMPAIGN_CONCURRENCY = int(os.environ.get("CAMPAIGN_CONCURRENCY", 4))
+CAMPAIGN_RATE_PER_MINUTE = float(os.environ.get("CAMPAIGN_RATE_PER_MINUTE", 120))
+CAMPAIGN_MAX_ATTEMPTS = int(os.environ.get("CAMPAIGN_MAX_ATTEMPTS", 3))
+CAMPAIGN_LEASE_SECONDS = int(os.environ.get("CAMPAIGN_LEASE_SECONDS", 300))
+
+CAMPAIGN_DRAFT = "draft"
+CAMPAIGN_SENDING = "sending"
+CAMPAIGN_PAUSED = "paused"
+CAMPAIGN_SENT = "sent"
+
+RECIPIENT_PENDING = "pending"
+RECIPIENT_SENDING = "sending"
+RECIPIENT_SENT = "sent"
+RECIPIENT_FAILED = "failed"
+
+
+# Result of a message left unsent because the task lost the campaign
+_SKIPPED = object()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def recipient_query(reseller_id: str, audience: str) -> Dict[str, Any]:
+    """Users a campaign for `audience` goes to"""
+    query = {"reseller_id": reseller_id, "role": "customer"}
+    if audience == "active":
+        query["active_tier"] = {"$ne": None}
+    elif audience == "inactive":
+        query["active_tier"] = None
+    elif audience == "new":
+        # Registration stores a datetime; users created elsewhere may carry an ISO string
+        since = _now() - timedelta(days=30)
+        query["$or"] = [{"created_at": {"$gte": since}}, {"created_at": {"$gte": since.isoformat()}}]
+    return query
+
+
+class CampaignSender:
+    def __init__(self):
+        self.db = None
+        self.rate_limiter = ProviderRateLimiter(parse_rate_limits(EMAIL_RATE_LIMITS), CAMPAIGN_RATE_PER_MINUTE)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # campaign_id -> lease held by this process's task; dropped or replaced to stop it
+        self._leases: Dict[str, str] = {}
+        self.stats = {"campaigns_started": 0, "campaigns_completed": 0, "sent": 0, "failed": 0, "auto_paused": 0}
+
+    def set_db(self, database):
+        self.db = database
+
+    async def ensure_indexes(self):
+        await self.db.campaign_recipients.create_index([("campaign_id", 1), ("email", 1)], unique=True)
+        await self.db.campaign_recipients.create_index([("campaign_id", 1), ("status", 1), ("attempts", 1), ("seq", 1)])
+        await self.db.campaign_recipients.create_index([("campaign_id", 1), ("seq", 1)])
+        await self.db.campaign_recipients.create_index([("campaign_id", 1), ("claim_id", 1)], sparse=True)
+
+    # ---------- control ----------
+
+    async def start(self, campaign_id: str, reseller_id: str) -> Optional[Dict[str, Any]]:
+        """Move a draft or paused campaign to sending and start delivery; None if it is in another state"""
+        lease_id = uuid.uuid4().hex
+        campaign = await self.db.reseller_campaigns.find_one_and_update(
+            {"id": campaign_id, "reseller_id": reseller_id, "status": {"$in": [CAMPAIGN_DRAFT, CAMPAIGN_PAUSED]}},
+            {
+                "$set": {
+                    "status": CAMPAIGN_SENDING,
+                    "started_at": _now().isoformat(),
+                    "paused_at": None,
+                    "pause_reason": None,
+                    "lease_id": lease_id,
+                    "lease_until": _now() + timedelta(seconds=CAMPAIGN_LEASE_SECONDS)
+                }
+            },
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if campaign is None:
+            return None
+        await self._spawn(campaign)
+        self.stats["campaigns_started"] += 1
+        return campaign
+
+    async def pause(self, campaign_id: str, reseller_id: str, reason: Optional[str] = None) -> bool:
+        """Stop a sending campaign before its next batch"""
+        result = await self.db.reseller_campaigns.update_one(
+            {"id": campaign_id, "reseller_id": reseller_id, "status": CAMPAIGN_SENDING},
+            {"$set": {"status": CAMPAIGN_PAUSED, "paused_at": _now().isoformat(), "pause_reason": reason}}
+        )
+        if result.modified_count == 1:
+            # A task of this process stops before its next message
+            self._leases.pop(campaign_id, None)
+        return result.modified_count == 1
+
+    async def recover_stalled(self) -> int:
+        """Continue sending campaigns whose process stopped (lease lapsed)"""
+        recovered = 0
+        while True:
+            campaign = await self.db.reseller_campaigns.find_one_and_update(
+                {"status": CAMPAIGN_SENDING, "lease_until": {"$lt": _now()}},
+                {"$set": {"lease_id": uuid.uuid4().hex, "lease_until": _now() + timedelta(seconds=CAMPAIGN_LEASE_SECONDS)}},
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
+            )
+            if campaign is None:
+                return recovered
+            logger.info(f"Resuming stalled campaign {campaign['id']}")
+            await self._spawn(campaign)
+            recovered += 1
+
+    async def _spawn(self, campaign: Dict[str, Any]):
+        campaign_id = campaign["id"]
+        # The new lease makes a previous task of this process stop before its next
+        # message; let it record its in-flight sends before the new task claims
+        self._leases[campaign_id] = campaign["lease_id"]
+        previous = self._tasks.get(campaign_id)
+        if previous is not None and not previous.done():
+            await asyncio.gather(previous, return_exceptions=True)
+
+        task = asyncio.ensure_future(self.run(campaign))
+        self._tasks[campaign_id] = task
+
+        def forget(finished: asyncio.Task):
+            if self._tasks.get(campaign_id) is finished:
+                self._tasks.pop(campaign_id, None)
+                if self._leases.get(campaign_id) == campaign["lease_id"]:
+                    self._leases.pop(campaign_id, None)
+
+        task.add_done_callback(forget)
+
+    async def shutdown(self):
+        # Leases are left to lapse; recover_stalled picks the campaigns up again
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # ---------- delivery ----------
+
+    async def _sender(self, reseller: Dict[str, Any]) -> Tuple[SMTPConfig, str, str]:
+        """SMTP account and From address: the reseller's own, else the platform's"""
+        from email_service import email_service
+
+        brand_name = reseller.get("brand_name") or reseller.get("company_name") or "UpShift"
+        settings = await self.db.reseller_email_settings.find_one({"reseller_id": reseller["id"]}, {"_id": 0})
+        if settings and settings.get("is_configured") and settings.get("smtp_host"):
+            from_email = settings.get("from_email") or settings["smtp_user"]
+            return SMTPConfig.from_settings(settings), from_email, settings.get("from_name") or brand_name
+        if email_service.is_configured:
+            return email_service.smtp_config(), email_service.from_email, brand_name
+        raise smtplib.SMTPException("Email settings not configured")
+
+    async def _load_recipients(self, campaign: Dict[str, Any]) -> int:
+        """Stream the audience into campaign_recipients; returns the number of recipients"""
+        query = recipient_query(campaign["reseller_id"], campaign.get("audience", "all"))
+        cursor = self.db.users.find(
+            query, {"_id": 0, "id": 1, "email": 1, "full_name": 1}
+        ).batch_size(CAMPAIGN_BATCH_SIZE)
+
+        seq = 0
+        batch: List[UpdateOne] = []
+        async for user in cursor:
+            if not user.get("email"):
+                continue
+            seq += 1
+            batch.append(UpdateOne(
+                {"campaign_id": campaign["id"], "email": user["email"].lower()},
+                {"$setOnInsert": {
+                    "campaign_id": campaign["id"],
+                    "email": user["email"].lower(),
+                    "user_id": user.get("id"),
+                    "name": user.get("full_name") or "",
+                    "status": RECIPIENT_PENDING,
+                    "attempts": 0,
+                    "seq": seq,
+                    "error": None,
+                    "sent_at": None
+                }},
+                upsert=True
+            ))
+            if len(batch) >= CAMPAIGN_BATCH_SIZE:
+                await self.db.campaign_recipients.bulk_write(batch, ordered=False)
+                batch = []
+        if batch:
+            await self.db.campaign_recipients.bulk_write(batch, ordered=False)
+
+        total = await self.db.campaign_recipients.count_documents({"campaign_id": campaign["id"]})
+        await self.db.reseller_campaigns.update_one(
+            {"id": campaign["id"]},
+            {"$set": {"recipients": total, "recipients_loaded": True}}
+        )
+        return total
+
+    @staticmethod
+    def render_batch(
+        campaign: Dict[str, Any],
+        reseller: Dict[str, Any],
+        recipients: List[Dict[str, Any]],
+        from_email: str,
+        from_name: str
+    ) -> List[MIMEMultipart]:
+        """Personalised messages for a batch of recipients"""
+        brand_name = reseller.get("brand_name") or reseller.get("company_name") or "UpShift"
+        portal_url = f"https://{reseller['custom_domain']}" if reseller.get("custom_domain") else os.environ.get("FRONTEND_URL", "https://upshift.works")
+        primary_color = (reseller.get("branding") or {}).get("primary_color") or "#1e40af"
+        subject_template = campaign.get("subject") or ""
+        content_template = campaign.get("content") or ""
+
+        messages = []
+        for recipient in recipients:
+            variables = {
+                "customer_name": recipient.get("name") or "there",
+                "first_name": (recipient.get("name") or "there").split(" ")[0],
+                "customer_email": recipient["email"],
+                "brand_name": brand_name,
+                "portal_url": portal_url
+            }
+            subject = subject_template
+            text_body = content_template
+            html_content = html.escape(content_template)
+            for key, value in variables.items():
+                placeholder = f"{{{{{key}}}}}"
+                subject = subject.replace(placeholder, value)
+                text_body = text_body.replace(placeholder, value)
+                html_content = html_content.replace(placeholder, html.escape(value))
+
+            html_body = f"""
+            <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
+                <h2 style="color: {primary_color};">{html.escape(brand_name)}</h2>
+                <div style="color: #374151; line-height: 1.6;">{html_content.replace(chr(10), '<br>')}</div>
+                <hr style="border: none; border-top: 1px solid #e5e7eb; margin: 20px 0;">
+                <p style="color: #6b7280; font-size: 12px;">You are receiving this email as a customer of {html.escape(brand_name)}.</p>
+            </div>
+            """
+
+            msg = MIMEMultipart("alternative")
+            msg["Subject"] = subject
+            msg["From"] = f"{from_name} <{from_email}>"
+            msg["To"] = recipient["email"]
+            msg.attach(MIMEText(text_body, "plain"))
+            msg.attach(MIMEText(html_body, "html"))
+            messages.append(msg)
+        return messages
+
+    def _owns(self, campaign: Dict[str, Any]) -> bool:
+        return self._leases.get(campaign["id"]) == campaign["lease_id"]
+
+    async def _claim(self, campaign: Dict[str, Any]) -> Tuple[str, List[Dict[str, Any]]]:
+        """Mark the next batch of pending recipients as being sent by this task"""
+        campaign_id = campaign["id"]
+        candidates = await self.db.campaign_recipients.find(
+            {"campaign_id": campaign_id, "status": RECIPIENT_PENDING},
+            {"_id": 0, "email": 1}
+        ).sort([("attempts", 1), ("seq", 1)]).limit(CAMPAIGN_BATCH_SIZE).to_list(CAMPAIGN_BATCH_SIZE)
+        if not candidates:
+            return "", []
+        claim_id = uuid.uuid4().hex
+        await self.db.campaign_recipients.update_many(
+            {"campaign_id": campaign_id, "status": RECIPIENT_PENDING, "email": {"$in": [c["email"] for c in candidates]}},
+            {"$set": {
+                "status": RECIPIENT_SENDING,
+                "claim_id": claim_id,
+                "claim_until": _now() + timedelta(seconds=CAMPAIGN_LEASE_SECONDS)
+            }}
+        )
+        recipients = await self.db.campaign_recipients.find(
+            {"campaign_id": campaign_id, "claim_id": claim_id, "status": RECIPIENT_SENDING},
+            {"_id": 0}
+        ).sort([("attempts", 1), ("seq", 1)]).to_list(CAMPAIGN_BATCH_SIZE)
+        return claim_id, recipients
+
+    async def _release_expired_claims(self, campaign_id: str):
+        # Claims of a task that died mid-batch; a live task keeps extending its own
+        await self.db.campaign_recipients.update_many(
+            {"campaign_id": campaign_id, "status": RECIPIENT_SENDING, "claim_until": {"$lt": _now()}},
+            {"$set": {"status": RECIPIENT_PENDING}, "$unset": {"claim_id": "", "claim_until": ""}}
+        )
+
+    async def _send_batch(
+        self,
+        campaign: Dict[str, Any],
+        claim_id: str,
+        config: SMTPConfig,
+        from_email: str,
+        recipients: List[Dict[str, Any]],
+        messages: List[MIMEMultipart]
+    ) -> List[Any]:
+        """Send a rendered batch; returns the error, None or _SKIPPED per recipient"""
+        slots = asyncio.Semaphore(CAMPAIGN_CONCURRENCY)
+        provider = config.host.lower()
+        renew_every = CAMPAIGN_LEASE_SECONDS / 10
+        renewed = asyncio.get_running_loop().time()
+        renewing = asyncio.Lock()
+
+        async def still_ours() -> bool:
+            nonlocal renewed
+            if not self._owns(campaign):
+                return False
+            async with renewing:
+                if asyncio.get_running_loop().time() - renewed >= renew_every:
+                    renewed = asyncio.get_running_loop().time()
+                    if not await self._still_ours(campaign, claim_id):
+                        self._leases.pop(campaign["id"], None)
+            return self._owns(campaign)
+
+        async def send(recipient, msg):
+            async with slots:
+                await self.rate_limiter.acquire(provider)
+                # Paused, resumed or taken over meanwhile: leave the rest unsent
+                if not await still_ours():
+                    return _SKIPPED
+                try:
+                    await smtp_transport.send(config, from_email, [recipient["email"]], msg)
+                except Exception as e:
+                    return e
+                return None
+
+        return await asyncio.gather(*[send(r, m) for r, m in zip(recipients, messages)])
+
+    async def _still_ours(self, campaign: Dict[str, Any], claim_id: Optional[str] = None) -> bool:
+        """Renew the lease (and the batch's claims); False once the campaign was paused or taken over"""
+        until = _now() + timedelta(seconds=CAMPAIGN_LEASE_SECONDS)
+        result = await self.db.reseller_campaigns.update_one(
+            {"id": campaign["id"], "status": CAMPAIGN_SENDING, "lease_id": campaign["lease_id"]},
+            {"$set": {"lease_until": until}}
+        )
+        if result.matched_count == 1 and claim_id:
+            await self.db.campaign_recipients.update_many(
+                {"campaign_id": campaign["id"], "claim_id": claim_id, "status": RECIPIENT_SENDING},
+                {"$set": {"claim_until": until}}
+            )
+        return result.matched_count == 1
+
+    async def run(self, campaign: Dict[str, Any]):
+        """Deliver a campaign until every recipient is done, or it is paused"""
+        campaign_id = campaign["id"]
+        try:
+            reseller = await self.db.resellers.find_one({"id": campaign["reseller_id"]}, {"_id": 0}) or {"id": campaign["reseller_id"]}
+            try:
+                config, from_email, from_name = await self._sender(reseller)
+            except smtplib.SMTPException as e:
+                await self.pause(campaign_id, campaign["reseller_id"], str(e))
+                self.stats["auto_paused"] += 1
+                return
+
+            if not campaign.get("recipients_loaded"):
+                total = await self._load_recipients(campaign)
+                logger.info(f"Campaign {campaign_id}: {total} recipients")
+            await self._release_expired_claims(campaign_id)
+
+            while self._owns(campaign) and await self._still_ours(campaign):
+                claim_id, recipients = await self._claim(campaign)
+                if not recipients:
+                    if await self.db.campaign_recipients.count_documents(
+                        {"campaign_id": campaign_id, "status": RECIPIENT_SENDING}
+                    ):
+                        # Another task's claims are still out; they finish or expire
+                        await asyncio.sleep(5)
+                        await self._release_expired_claims(campaign_id)
+                        continue
+                    await self._complete(campaign, reseller)
+                    return
+
+                messages = self.render_batch(campaign, reseller, recipients, from_email, from_name)
+                errors = await self._send_batch(campaign, claim_id, config, from_email, recipients, messages)
+                await self._record(campaign_id, claim_id, recipients, errors)
+
+                temporary = [e for e in errors if e is not None and e is not _SKIPPED and not permanent_failure(e)]
+                if temporary and len(temporary) == len(recipients):
+                    # Nothing got through: the SMTP account is down or misconfigured
+                    await self.pause(campaign_id, campaign["reseller_id"], f"Sending failed: {str(temporary[0])[:300]}")
+                    self.stats["auto_paused"] += 1
+                    logger.warning(f"Campaign {campaign_id} paused: {str(temporary[0])[:200]}")
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Campaign {campaign_id} failed: {str(e)}")
+            await self.pause(campaign_id, campaign["reseller_id"], f"Sending failed: {str(e)[:300]}")
+
+    async def _record(self, campaign_id: str, claim_id: str, recipients: List[Dict[str, Any]], errors: List[Any]):
+        now = _now()
+        ops = []
+        sent = failed = 0
+        release = {"claim_id": "", "claim_until": ""}
+        for recipient, error in zip(recipients, errors):
+            if error is _SKIPPED:
+                update = {"$set": {"status": RECIPIENT_PENDING}, "$unset": release}
+            elif error is None:
+                sent += 1
+                update = {"$set": {"status": RECIPIENT_SENT, "sent_at": now, "error": None}, "$inc": {"attempts": 1}, "$unset": release}
+            elif permanent_failure(error) or recipient.get("attempts", 0) + 1 >= CAMPAIGN_MAX_ATTEMPTS:
+                failed += 1
+                update = {"$set": {"status": RECIPIENT_FAILED, "error": str(error)[:300]}, "$inc": {"attempts": 1}, "$unset": release}
+            else:
+                # Back to pending, behind recipients with fewer attempts
+                update = {"$set": {"status": RECIPIENT_PENDING, "error": str(error)[:300]}, "$inc": {"attempts": 1}, "$unset": release}
+            ops.append(UpdateOne({"campaign_id": campaign_id, "email": recipient["email"], "claim_id": claim_id}, update))
+        await self.db.campaign_recipients.bulk_write(ops, ordered=False)
+        await self.db.reseller_campaigns.update_one(
+            {"id": campaign_id},
+            {
+                "$inc": {"sent_count": sent, "failed_count": failed},
+                "$set": {"last_batch_at": now.isoformat()}
+            }
+        )
+        self.stats["sent"] += sent
+        self.stats["failed"] += failed
+
+    async def _complete(self, campaign: Dict[str, Any], reseller: Dict[str, Any]):
+        result = await self.db.reseller_campaigns.find_one_and_update(
+            {"id": campaign["id"], "status": CAMPAIGN_SENDING, "lease_id": campaign["lease_id"]},
+            {
+                "$set": {"status": CAMPAIGN_SENT, "sent_at": _now().isoformat()},
+                "$unset": {"lease_id": "", "lease_until": ""}
+            },
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if result is None:
+            return
+        self.stats["campaigns_completed"] += 1
+        await self.db.reseller_activity.insert_one({
+            "id": str(uuid.uuid4()),
+            "reseller_id": campaign["reseller_id"],
+            "type": "email",
+            "title": "Campaign Sent",
+            "description": f"Email campaign '{campaign.get('name')}' sent to {result.get('sent_count', 0)} recipients"
+                           + (f" ({result['failed_count']} failed)" if result.get("failed_count") else ""),
+            "created_at": _now()
+        })
+        logger.info(f"Campaign {campaign['id']} completed: {result.get('sent_count', 0)} sent, {result.get('failed_count', 0)} failed")
+
+    # ---------- progress ----------
+
+    async def progress(self, campaign: Dict[str, Any]) -> Dict[str, Any]:
+        total = campaign.get("recipients") or 0
+        sent = campaign.get("sent_count", 0)
+        failed = campaign.get("failed_count", 0)
+        pending = await self.db.campaign_recipients.count_documents(
+            {"campaign_id": campaign["id"], "status": {"$in": [RECIPIENT_PENDING, RECIPIENT_SENDING]}}
+        ) if campaign.get("recipients_loaded") else total
+        return {
+            "status": campaign.get("status"),
+            "recipients": total,
+            "sent": sent,
+            "failed": failed,
+            "pending": pending,
+            "percent": round(100 * (sent + failed) / total, 1) if total else 0,
+            "pause_reason": campaign.get("pause_reason")
+        }
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "running": sorted(self._tasks),
+            "batch_size": CAMPAIGN_BATCH_SIZE,
+            "concurrency": CAMPAIGN_CONCURRENCY,
+            "rate_per_minute": CAMPAIGN_RATE_PER_MINUTE
+        }
+
+
+# Global instance
+campaign_sender = CampaignSender()
@@ -176,9 +176,16 @@ async def get_documents(current_user = Depends(get_current_customer)):
 @router.delete("/documents/{doc_id}")
 async def delete_document(doc_id: str, current_user = Depends(get_current_customer)):
     user_id = current_user.id
-    result = await db.documents.delete_one({"id": doc_id, "user_id": user_id})
-    if result.deleted_count == 0:
+    document = await db.documents.find_one_and_delete(
+        {"id": doc_id, "user_id": user_id},
+        {"_id": 0, "artifact_id": 1}
+    )
+    if not document:
         raise HTTPException(status_code=404, detail="Document not found")
+    if document.get("artifact_id"):
+        # Generated file can now expire like any unsaved one
+        from generated_artifact_store import generated_artifact_store
+        await generated_artifact_store.unpin(document["artifact_id"], doc_id)
     return {"success": True}
 
 # Job Applications
@@ -382,10 +389,7 @@ async def get_interview_feedback(
     current_user = Depends(get_current_customer)
 ):
     try:
-        from emergentintegrations.llm.chat import chat, LlmModel
-        import os
-        
-        api_key = os.environ.get("EMERGENT_LLM_KEY", "")
+        from llm_gateway import llm_gateway
         
         prompt = f"""You are an expert interview coach. Analyze this interview answer and provide constructive feedback.
 
@@ -406,15 +410,19 @@ Provide feedback in this exact JSON format:
 
 Be encouraging but honest. Focus on specific, actionable feedback."""
 
-        response = await chat(
-            api_key=api_key,
-            model=LlmModel.GPT_4O,
-            messages=[{"role": "user", "content": prompt}],
+        response = await llm_gateway.complete(
+            prompt,
+            system_message="You are an expert interview coach. Respond with JSON only.",
+            session_id=f"interview_feedback_{current_user['id']}",
+            endpoint="interview_feedback",
+            reseller_id=current_user.get("reseller_id"),
             response_format={"type": "json_object"}
         )
         
         import json
-        feedback = json.loads(response)
+        import re
+        json_match = re.search(r'\{.*\}', response, re.DOTALL)
+        feedback = json.loads(json_match.group() if json_match else response)
         
         return feedback
         
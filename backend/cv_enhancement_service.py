@@ -0,0 +1,270 @@
+"""
+CV Enhancement Service - Section-by-section AI enhancement of a whole CV
+
+The fan-out mode of /api/cv/ai-enhance-all. Instead of one large prompt for
+the entire CV, the summary, every experience entry, the skills list and
+every education entry are enhanced by their own short prompt. The prompts
+run concurrently (at most CV_ENHANCE_MAX_PARALLEL per request, and always
+under the LLM gateway's global, endpoint and reseller limits), so latency is
+that of the slowest section rather than of one long generation.
+
+Results are merged in CV order regardless of completion order. A section
+that fails or does not finish within CV_ENHANCE_ALL_TIMEOUT keeps its
+submitted content and is listed in `failed_sections`; the request only
+fails when no section could be enhanced.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from fastapi import HTTPException
+
+from llm_gateway import llm_gateway
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable via environment)
+CV_ENHANCE_MAX_PARALLEL = int(os.environ.get("CV_ENHANCE_MAX_PARALLEL", 4))
+CV_ENHANCE_SECTION_TIMEOUT = float(os.environ.get("CV_ENHANCE_SECTION_TIMEOUT", 40))
+CV_ENHANCE_ALL_TIMEOUT = float(os.environ.get("CV_ENHANCE_ALL_TIMEOUT", 60))
+
+SECTION_SYSTEM_MESSAGE = (
+    "You are an expert CV writer specializing in South African job market. "
+    "Use UK English spelling. Follow the requested output format exactly."
+)
+
+# Merge order of the sections in the response
+SECTION_ORDER = ("summary", "experiences", "skills", "education")
+
+# (section, index within the section or None, enhanced content or None, error or None)
+SectionResult = Tuple[str, Optional[int], Any, Optional[BaseException]]
+
+
+def load_json_response(response: str) -> Any:
+    """Parse a JSON answer, tolerating a markdown code fence around it"""
+    clean_response = response.strip()
+    if clean_response.startswith("```"):
+        clean_response = clean_response.split("```")[1]
+        if clean_response.startswith("json"):
+            clean_response = clean_response[4:]
+    return json.loads(clean_response.strip())
+
+
+def _full_name(cv_data: Dict[str, Any]) -> str:
+    return cv_data.get("full_name") or cv_data.get("fullName") or "Professional"
+
+
+def _context(cv_data: Dict[str, Any]) -> str:
+    job_titles = [exp.get("title", "") for exp in cv_data.get("experiences") or [] if exp.get("title")]
+    skills = [s for s in cv_data.get("skills") or [] if s and s.strip()]
+    return (
+        f"- Name: {_full_name(cv_data)}\n"
+        f"- Job Titles: {', '.join(job_titles) if job_titles else 'Not specified'}\n"
+        f"- Skills: {', '.join(skills) if skills else 'None listed'}"
+    )
+
+
+def _summary_prompt(cv_data: Dict[str, Any]) -> str:
+    return f"""Enhance the professional summary of this CV.
+
+{_context(cv_data)}
+- Current Summary: {cv_data.get('summary') or 'No summary provided'}
+
+Write an enhanced 2-3 sentence professional summary. Return ONLY the summary text."""
+
+
+def _experience_prompt(cv_data: Dict[str, Any], experience: Dict[str, Any]) -> str:
+    return f"""Enhance this work experience entry of a CV.
+
+{_context(cv_data)}
+
+Experience entry:
+{json.dumps(experience, ensure_ascii=False)}
+
+Return ONLY valid JSON:
+{{
+    "title": "<job title>",
+    "company": "<company>",
+    "duration": "<duration>",
+    "description": "<enhanced description with action verbs and metrics>",
+    "achievements": "<3-5 key achievements with quantifiable results>"
+}}"""
+
+
+def _skills_prompt(cv_data: Dict[str, Any]) -> str:
+    return f"""Enhance the skills list of this CV.
+
+{_context(cv_data)}
+
+Return ONLY a JSON array of strings: the current skills with professional, ATS-friendly names, followed by 3-5 additional relevant skills."""
+
+
+def _education_prompt(cv_data: Dict[str, Any], education: Dict[str, Any]) -> str:
+    return f"""Polish this education entry of a CV.
+
+{_context(cv_data)}
+
+Education entry:
+{json.dumps(education, ensure_ascii=False)}
+
+Use the full, standard name of the qualification and institution. Do not invent grades, dates or qualifications.
+Return ONLY valid JSON with the same keys as the entry."""
+
+
+def _parse_text(response: str) -> str:
+    text = response.strip()
+    if not text:
+        raise ValueError("Empty response")
+    return text
+
+
+def _parse_entry(response: str) -> Dict[str, Any]:
+    entry = load_json_response(response)
+    if not isinstance(entry, dict):
+        raise ValueError("Expected a JSON object")
+    return entry
+
+
+def _parse_skills(response: str) -> List[str]:
+    skills = load_json_response(response)
+    if not isinstance(skills, list):
+        raise ValueError("Expected a JSON array")
+    return [str(skill).strip() for skill in skills if str(skill).strip()]
+
+
+def section_jobs(cv_data: Dict[str, Any]) -> List[Tuple[str, Optional[int], str, Any]]:
+    """(section, index, prompt, parser) for every section of the CV worth enhancing"""
+    jobs = [("summary", None, _summary_prompt(cv_data), _parse_text)]
+    for index, experience in enumerate(cv_data.get("experiences") or []):
+        if isinstance(experience, dict) and any(experience.get(key) for key in ("title", "company", "description")):
+            jobs.append(("experiences", index, _experience_prompt(cv_data, experience), _parse_entry))
+    jobs.append(("skills", None, _skills_prompt(cv_data), _parse_skills))
+    for index, education in enumerate(cv_data.get("education") or []):
+        if isinstance(education, dict) and any(str(value).strip() for value in education.values() if value):
+            jobs.append(("education", index, _education_prompt(cv_data, education), _parse_entry))
+    return jobs
+
+
+def describe_error(error: BaseException) -> str:
+    """Reason shown to the user for a section that was not enhanced"""
+    if isinstance(error, HTTPException):
+        return str(error.detail)
+    if isinstance(error, asyncio.TimeoutError):
+        return "Timed out"
+    if isinstance(error, ValueError):
+        return "Could not read the AI response"
+    return "Enhancement failed"
+
+
+async def enhance_sections(cv_data: Dict[str, Any], reseller_id: Optional[str] = None) -> AsyncIterator[SectionResult]:
+    """Enhance every section concurrently, yielding each result as it finishes"""
+    semaphore = asyncio.Semaphore(CV_ENHANCE_MAX_PARALLEL)
+    request_id = uuid4()
+
+    async def run(prompt: str, parse) -> Any:
+        async with semaphore:
+            response = await llm_gateway.complete(
+                prompt,
+                system_message=SECTION_SYSTEM_MESSAGE,
+                session_id=f"cv-enhance-section-{request_id}",
+                endpoint="cv_enhance_all",
+                reseller_id=reseller_id,
+                timeout=CV_ENHANCE_SECTION_TIMEOUT
+            )
+        return parse(response)
+
+    tasks = {}
+    for section, index, prompt, parse in section_jobs(cv_data):
+        tasks[asyncio.ensure_future(run(prompt, parse))] = (section, index)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CV_ENHANCE_ALL_TIMEOUT
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(deadline - loop.time(), 0), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                break
+            for task in done:
+                section, index = tasks[task]
+                error = task.exception()
+                if error is not None:
+                    logger.warning(f"CV section {section}[{index}] enhancement failed: {str(error)[:200]}")
+                    yield section, index, None, error
+                else:
+                    yield section, index, task.result(), None
+        for task in pending:
+            section, index = tasks[task]
+            yield section, index, None, asyncio.TimeoutError()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _dedupe(skills: List[str]) -> List[str]:
+    seen = set()
+    result = []
+    for skill in skills:
+        if skill.lower() not in seen:
+            seen.add(skill.lower())
+            result.append(skill)
+    return result
+
+
+def merge_enhancements(cv_data: Dict[str, Any], results: List[SectionResult]) -> Dict[str, Any]:
+    """
+    Response for /ai-enhance-all from section results. Enhanced entries are
+    laid over the submitted ones by position; failed sections keep their
+    submitted content.
+    """
+    experiences = [dict(entry) if isinstance(entry, dict) else entry for entry in cv_data.get("experiences") or []]
+    education = [dict(entry) if isinstance(entry, dict) else entry for entry in cv_data.get("education") or []]
+    summary = cv_data.get("summary", "")
+    skills = cv_data.get("skills", [])
+    failed = []
+
+    for section, index, content, error in sorted(
+        results, key=lambda result: (SECTION_ORDER.index(result[0]), -1 if result[1] is None else result[1])
+    ):
+        if error is not None:
+            failed.append({"section": section, "index": index, "reason": describe_error(error)})
+        elif section == "summary":
+            summary = content
+        elif section == "skills":
+            skills = _dedupe(content) or skills
+        elif section == "experiences":
+            experiences[index].update({key: value for key, value in content.items() if value})
+        elif section == "education":
+            education[index].update({key: value for key, value in content.items() if key in education[index] and value})
+
+    return {
+        "success": True,
+        "enhanced_summary": summary,
+        "enhanced_experiences": experiences,
+        "enhanced_skills": skills,
+        "enhanced_education": education,
+        "partial": bool(failed),
+        "failed_sections": failed
+    }
+
+
+def raise_if_nothing_enhanced(results: List[SectionResult]):
+    """Fail the request like the single-prompt mode when every section failed"""
+    if not results or any(error is None for _, _, _, error in results):
+        return
+    for _, _, _, error in results:
+        if isinstance(error, HTTPException):
+            raise error
+    raise HTTPException(status_code=500, detail=f"Enhancement failed: {describe_error(results[0][3])}")
+
+
+async def enhance_cv(cv_data: Dict[str, Any], reseller_id: Optional[str] = None) -> Dict[str, Any]:
+    """Fan-out enhancement of a whole CV, merged into the /ai-enhance-all response"""
+    results = [result async for result in enhance_sections(cv_data, reseller_id)]
+    raise_if_nothing_enhanced(results)
+    return merge_enhancements(cv_data, results)
@@ -3,7 +3,7 @@ CV PDF Generation Service - Professional Template-based PDF creation
 Enhanced with photo support, ID number, languages, and improved styling
 """
 from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
+from reportlab.lib.pagesizes import A4, letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch, mm
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, HRFlowable, Image, KeepTogether
@@ -14,6 +14,10 @@ import base64
 
 logger = logging.getLogger(__name__)
 
+# Header photo box (points); photo_service normalizes uploads to this size
+PHOTO_WIDTH = 70
+PHOTO_HEIGHT = 85
+
 # Template Definitions with improved professional styling
 TEMPLATES = {
     'professional': {
@@ -386,13 +390,11 @@ class CVPDFGenerator:
         story = []
         
         # Header Section with optional photo
-        photo_data = cv_data.get('photo')
-        has_photo = photo_data and self._process_photo(photo_data)
+        photo_buffer = self._process_photo(cv_data.get('photo'))
         
-        if has_photo:
+        if photo_buffer:
             # Create header with photo on the left
-            photo_buffer = self._process_photo(photo_data)
-            photo_img = Image(photo_buffer, width=70, height=85)
+            photo_img = Image(photo_buffer, width=PHOTO_WIDTH, height=PHOTO_HEIGHT)
             
             # Build name and contact info
             header_content = []
@@ -655,6 +657,22 @@ class CVPDFGenerator:
         return buffer.getvalue()
 
 
+# Generators are stateless between renders, so each process keeps one per
+# template instead of rebuilding the stylesheet on every request
+_generators = {}
+
+
+def get_cv_generator(template_id='professional'):
+    """Return the cached CVPDFGenerator for a template"""
+    if template_id not in TEMPLATES:
+        template_id = 'professional'
+    generator = _generators.get(template_id)
+    if generator is None:
+        generator = CVPDFGenerator(template_id)
+        _generators[template_id] = generator
+    return generator
+
+
 def generate_cv_pdf(cv_data, template_id='professional'):
     """
     Generate a CV PDF from the provided data using the specified template.
@@ -677,8 +695,115 @@ def generate_cv_pdf(cv_data, template_id='professional'):
         bytes: PDF file content
     """
     try:
-        generator = CVPDFGenerator(template_id)
+        generator = get_cv_generator(template_id)
         return generator.generate_pdf(cv_data)
     except Exception as e:
         logger.error(f"Error generating CV PDF: {str(e)}")
         raise
+
+
+def generate_resume_pdf(resume_data):
+    """
+    Generate a simple resume PDF from a ResumeCreate model.
+    
+    Returns:
+        bytes: PDF file content
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    story = []
+    styles = getSampleStyleSheet()
+    
+    # Custom styles
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor='#2563eb',
+        spaceAfter=12
+    )
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=14,
+        textColor='#1e40af',
+        spaceAfter=6,
+        spaceBefore=12
+    )
+    
+    # Name
+    story.append(Paragraph(resume_data.fullName, title_style))
+    
+    # Contact info
+    contact = f"{resume_data.email} | {resume_data.phone}"
+    if resume_data.city and resume_data.province:
+        contact += f" | {resume_data.city}, {resume_data.province}"
+    story.append(Paragraph(contact, styles['Normal']))
+    story.append(Spacer(1, 0.2*inch))
+    
+    # Summary
+    if resume_data.summary:
+        story.append(Paragraph("PROFESSIONAL SUMMARY", heading_style))
+        story.append(Paragraph(resume_data.summary, styles['Normal']))
+        story.append(Spacer(1, 0.2*inch))
+    
+    # Work Experience
+    if resume_data.experiences:
+        story.append(Paragraph("WORK EXPERIENCE", heading_style))
+        for exp in resume_data.experiences:
+            story.append(Paragraph(f"<b>{exp.title}</b> at {exp.company}", styles['Normal']))
+            story.append(Paragraph(exp.duration, styles['Normal']))
+            story.append(Paragraph(exp.description, styles['Normal']))
+            if exp.achievements:
+                story.append(Paragraph("<b>Key Achievements:</b>", styles['Normal']))
+                story.append(Paragraph(exp.achievements, styles['Normal']))
+            story.append(Spacer(1, 0.1*inch))
+    
+    # Education
+    if resume_data.education:
+        story.append(Paragraph("EDUCATION", heading_style))
+        for edu in resume_data.education:
+            story.append(Paragraph(f"<b>{edu.degree}</b>", styles['Normal']))
+            story.append(Paragraph(f"{edu.institution}, {edu.year}", styles['Normal']))
+            story.append(Spacer(1, 0.1*inch))
+    
+    # Skills
+    if resume_data.skills:
+        story.append(Paragraph("SKILLS", heading_style))
+        skills_text = " • ".join([skill for skill in resume_data.skills if skill])
+        story.append(Paragraph(skills_text, styles['Normal']))
+    
+    # Languages
+    if resume_data.languages:
+        story.append(Spacer(1, 0.1*inch))
+        story.append(Paragraph("LANGUAGES", heading_style))
+        for lang in resume_data.languages:
+            if lang.language:
+                story.append(Paragraph(f"{lang.language}: {lang.proficiency}", styles['Normal']))
+    
+    # References
+    if hasattr(resume_data, 'references') and resume_data.references:
+        story.append(Spacer(1, 0.2*inch))
+        story.append(Paragraph("REFERENCES", heading_style))
+        for ref in resume_data.references:
+            if ref.name:
+                ref_text = f"<b>{ref.name}</b>"
+                if ref.title:
+                    ref_text += f", {ref.title}"
+                if ref.company:
+                    ref_text += f" at {ref.company}"
+                story.append(Paragraph(ref_text, styles['Normal']))
+                
+                contact_info = []
+                if ref.email:
+                    contact_info.append(f"Email: {ref.email}")
+                if ref.phone:
+                    contact_info.append(f"Phone: {ref.phone}")
+                
+                if contact_info:
+                    story.append(Paragraph(" | ".join(contact_info), styles['Normal']))
+                story.append(Spacer(1, 0.1*inch))
+    
+    # Build PDF
+    doc.build(story)
+    return buffer.getvalue()
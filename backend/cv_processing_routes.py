@@ -1,28 +1,26 @@
 """
 CV Processing Routes - Upload, Extract, Analyze, and Enhance CVs
 """
-from fastapi import APIRouter, HTTPException, UploadFile, File, Depends
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Query
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime, timezone
 from uuid import uuid4
 import os
 import logging
-import io
 import re
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# PDF and DOCX processing
-try:
-    import PyPDF2
-    from docx import Document
-except ImportError:
-    PyPDF2 = None
-    Document = None
+from text_extraction_service import text_extraction_service, read_upload
 
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from llm_gateway import llm_gateway, LLMUnavailableError, LLMTimeoutError
+from llm_metrics import llm_metrics, SOURCE_FALLBACK
+from ats_analyzer import analyze_resume
+from event_stream import sse_event, event_stream_response
+from cv_enhancement_service import enhance_cv, enhance_sections, merge_enhancements, raise_if_nothing_enhanced, describe_error
+from job_queue_service import job_queue
 
 logger = logging.getLogger(__name__)
 
@@ -60,70 +58,65 @@ async def get_current_user_with_db(token: str = Depends(oauth2_scheme)):
     return await get_current_user(token, db)
 
 
-def extract_text_from_pdf(file_content: bytes) -> str:
-    """Extract text from PDF file"""
-    try:
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
-    except Exception as e:
-        logger.error(f"Error extracting PDF text: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Could not read PDF: {str(e)}")
+CHECKLIST_CATEGORIES = {
+    "Email address missing": "Formatting",
+    "Phone number missing": "Formatting",
+    "Insufficient keywords": "Keywords",
+    "Weak action verbs": "Achievements"
+}
 
 
-def extract_text_from_docx(file_content: bytes) -> str:
-    """Extract text from DOCX file"""
-    try:
-        doc = Document(io.BytesIO(file_content))
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text.strip()
-    except Exception as e:
-        logger.error(f"Error extracting DOCX text: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Could not read DOCX: {str(e)}")
-
-
-@cv_processing_router.post("/analyze")
-async def analyze_cv(file: UploadFile = File(...)):
-    """
-    Analyze an uploaded CV and provide improvement suggestions.
-    Returns scores and detailed recommendations.
-    """
+def rule_based_cv_analysis(extracted_text: str) -> Dict[str, Any]:
+    """CV analysis scores from the rule-based ATS analyzer (used when the AI service is unavailable)"""
+    analysis = analyze_resume(extracted_text)
+    categories = analysis["categories"]
+    ats_score = int((
+        categories["format_compatibility"]["score"]
+        + categories["contact_information"]["score"]
+        + categories["overall_structure"]["score"]
+    ) / 3)
+    
+    improvements = [
+        {
+            "category": CHECKLIST_CATEGORIES.get(item["item"], "Formatting"),
+            "severity": item["priority"],
+            "issue": item["item"],
+            "suggestion": item["recommendation"],
+            "impact": item["impact"]
+        }
+        for item in analysis["checklist"]
+    ]
+    improvements += [
+        {
+            "category": "Summary",
+            "severity": "low",
+            "issue": "Suggested improvement",
+            "suggestion": recommendation,
+            "impact": "N/A"
+        }
+        for recommendation in analysis["recommendations"]
+    ]
+    
+    return {
+        "overall_score": analysis["overall_score"],
+        "ats_score": ats_score,
+        "impact_score": categories["work_experience"]["score"],
+        "clarity_score": categories["overall_structure"]["score"],
+        "keyword_score": categories["keywords_skills"]["score"],
+        "improvements": improvements[:8],
+        "is_fallback": True
+    }
+
+
+async def analyze_cv_content(content: bytes, filename: str) -> Dict[str, Any]:
+    """Scores and improvement suggestions for an uploaded CV; the analysis is recorded"""
     try:
-        # Validate file type
-        if not file.filename:
-            raise HTTPException(status_code=400, detail="No file provided")
-        
-        file_ext = file.filename.lower().split('.')[-1]
-        if file_ext not in ['pdf', 'docx', 'doc', 'txt']:
-            raise HTTPException(status_code=400, detail="Only PDF, DOCX, and TXT files are supported")
-        
-        # Read file content
-        content = await file.read()
-        
-        # Extract text based on file type
-        if file_ext == 'pdf':
-            extracted_text = extract_text_from_pdf(content)
-        elif file_ext == 'txt':
-            # Handle TXT files directly
-            try:
-                extracted_text = content.decode('utf-8')
-            except UnicodeDecodeError:
-                extracted_text = content.decode('latin-1')
-        else:
-            extracted_text = extract_text_from_docx(content)
+        # Extract text (off the event loop, cached by file hash)
+        extracted_text = await text_extraction_service.extract(content, filename)
         
         if not extracted_text or len(extracted_text) < 50:
             raise HTTPException(status_code=400, detail="Could not extract sufficient text from the CV")
         
-        # Use AI to analyze the CV
-        api_key = os.environ.get("EMERGENT_LLM_KEY")
-        if not api_key:
-            raise HTTPException(status_code=500, detail="AI service not configured")
-        
         analysis_prompt = f"""Analyze this CV/Resume and provide detailed feedback. Return your response in the following JSON format ONLY (no markdown, no explanation, just valid JSON):
 
 {{
@@ -148,50 +141,61 @@ Provide 5-8 specific, actionable improvements. Focus on South African job market
 CV Content:
 {extracted_text[:8000]}"""
 
-        chat = LlmChat(
-            api_key=api_key,
-            session_id=f"cv-analysis-{uuid4()}",
-            system_message="You are an expert CV analyst specializing in South African job market. Always respond with valid JSON only."
-        ).with_model("openai", "gpt-4o")
+        system_message = "You are an expert CV analyst specializing in South African job market. Always respond with valid JSON only."
         
-        response = await chat.send_message(UserMessage(text=analysis_prompt))
+        # Score with the rule-based analyzer while the AI service is unavailable
+        response = None
+        if llm_gateway.is_available():
+            try:
+                response = await llm_gateway.complete(
+                    analysis_prompt,
+                    system_message=system_message,
+                    session_id=f"cv-analysis-{uuid4()}",
+                    endpoint="cv_analysis"
+                )
+            except (LLMUnavailableError, LLMTimeoutError) as e:
+                logger.warning(f"CV analysis falling back to rule-based scoring: {e.detail}")
         
         # Parse the AI response
         import json
-        try:
-            # Clean the response - remove any markdown formatting
-            clean_response = response.strip()
-            if clean_response.startswith("```"):
-                clean_response = clean_response.split("```")[1]
-                if clean_response.startswith("json"):
-                    clean_response = clean_response[4:]
-            clean_response = clean_response.strip()
-            
-            analysis_data = json.loads(clean_response)
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse AI response: {response[:500]}")
-            # Return default scores if parsing fails
-            analysis_data = {
-                "overall_score": 70,
-                "ats_score": 65,
-                "impact_score": 68,
-                "clarity_score": 72,
-                "keyword_score": 60,
-                "improvements": [
-                    {
-                        "category": "Keywords",
-                        "severity": "high",
-                        "issue": "CV analysis completed but detailed parsing failed",
-                        "suggestion": "Please try uploading again or contact support",
-                        "impact": "N/A"
-                    }
-                ]
-            }
+        if response is None:
+            analysis_data = rule_based_cv_analysis(extracted_text)
+            llm_metrics.record_served("cv_analysis", SOURCE_FALLBACK)
+        else:
+            try:
+                # Clean the response - remove any markdown formatting
+                clean_response = response.strip()
+                if clean_response.startswith("```"):
+                    clean_response = clean_response.split("```")[1]
+                    if clean_response.startswith("json"):
+                        clean_response = clean_response[4:]
+                clean_response = clean_response.strip()
+
+                analysis_data = json.loads(clean_response)
+            except json.JSONDecodeError as e:
+                logger.error(f"Failed to parse AI response: {response[:500]}")
+                # Return default scores if parsing fails
+                analysis_data = {
+                    "overall_score": 70,
+                    "ats_score": 65,
+                    "impact_score": 68,
+                    "clarity_score": 72,
+                    "keyword_score": 60,
+                    "improvements": [
+                        {
+                            "category": "Keywords",
+                            "severity": "high",
+                            "issue": "CV analysis completed but detailed parsing failed",
+                            "suggestion": "Please try uploading again or contact support",
+                            "impact": "N/A"
+                        }
+                    ]
+                }
         
         # Save analysis to database
         await db.cv_analyses.insert_one({
             "id": str(uuid4()),
-            "filename": file.filename,
+            "filename": filename,
             "analysis": analysis_data,
             "created_at": datetime.now(timezone.utc)
         })
@@ -214,11 +218,22 @@ CV Content:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 
-@cv_processing_router.post("/extract-and-enhance")
-async def extract_and_enhance_cv(file: UploadFile = File(...)):
+async def _analyze_cv_job(job: Dict[str, Any], content: Optional[bytes]) -> Dict[str, Any]:
+    return await analyze_cv_content(content, job["filename"])
+
+
+job_queue.register("cv_analyze", _analyze_cv_job)
+
+
+@cv_processing_router.post("/analyze")
+async def analyze_cv(
+    file: UploadFile = File(...),
+    run_async: bool = Query(False, alias="async", description="Queue the analysis and return a job ID at once")
+):
     """
-    Extract content from uploaded CV and enhance it with AI.
-    Returns structured data ready to populate the CV builder form.
+    Analyze an uploaded CV and provide improvement suggestions.
+    Returns scores and detailed recommendations.
+    With async=true the analysis runs as a job; poll /api/jobs/{job_id} for the result.
     """
     try:
         # Validate file type
@@ -226,26 +241,34 @@ async def extract_and_enhance_cv(file: UploadFile = File(...)):
             raise HTTPException(status_code=400, detail="No file provided")
         
         file_ext = file.filename.lower().split('.')[-1]
-        if file_ext not in ['pdf', 'docx', 'doc']:
-            raise HTTPException(status_code=400, detail="Only PDF and DOCX files are supported")
+        if file_ext not in ['pdf', 'docx', 'doc', 'txt']:
+            raise HTTPException(status_code=400, detail="Only PDF, DOCX, and TXT files are supported")
         
         # Read file content
-        content = await file.read()
+        content = await read_upload(file)
         
-        # Extract text
-        if file_ext == 'pdf':
-            extracted_text = extract_text_from_pdf(content)
-        else:
-            extracted_text = extract_text_from_docx(content)
+        if run_async:
+            job = await job_queue.submit("cv_analyze", content=content, filename=file.filename)
+            return job_queue.accepted_response(job)
+        
+        return await analyze_cv_content(content, file.filename)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"CV analysis error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+
+async def extract_and_enhance_content(content: bytes, filename: str) -> Dict[str, Any]:
+    """Structured, AI-enhanced CV data extracted from an uploaded CV"""
+    try:
+        # Extract text (off the event loop, cached by file hash)
+        extracted_text = await text_extraction_service.extract(content, filename)
         
         if not extracted_text or len(extracted_text) < 50:
             raise HTTPException(status_code=400, detail="Could not extract sufficient text from the CV")
         
-        # Use AI to extract and enhance
-        api_key = os.environ.get("EMERGENT_LLM_KEY")
-        if not api_key:
-            raise HTTPException(status_code=500, detail="AI service not configured")
-        
         extraction_prompt = f"""Extract information from this CV and enhance it professionally. Return ONLY valid JSON (no markdown, no explanation):
 
 {{
@@ -298,13 +321,14 @@ Important:
 CV Content:
 {extracted_text[:8000]}"""
 
-        chat = LlmChat(
-            api_key=api_key,
-            session_id=f"cv-extract-{uuid4()}",
-            system_message="You are an expert CV writer specializing in South African job market. Extract and enhance CV content. Always respond with valid JSON only."
-        ).with_model("openai", "gpt-4o")
+        system_message = "You are an expert CV writer specializing in South African job market. Extract and enhance CV content. Always respond with valid JSON only."
         
-        response = await chat.send_message(UserMessage(text=extraction_prompt))
+        response = await llm_gateway.complete(
+            extraction_prompt,
+            system_message=system_message,
+            session_id=f"cv-extract-{uuid4()}",
+            endpoint="cv_extract_enhance"
+        )
         
         # Parse the AI response
         import json
@@ -338,6 +362,48 @@ CV Content:
         raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
 
 
+async def _extract_and_enhance_job(job: Dict[str, Any], content: Optional[bytes]) -> Dict[str, Any]:
+    return await extract_and_enhance_content(content, job["filename"])
+
+
+job_queue.register("cv_extract_enhance", _extract_and_enhance_job)
+
+
+@cv_processing_router.post("/extract-and-enhance")
+async def extract_and_enhance_cv(
+    file: UploadFile = File(...),
+    run_async: bool = Query(False, alias="async", description="Queue the extraction and return a job ID at once")
+):
+    """
+    Extract content from uploaded CV and enhance it with AI.
+    Returns structured data ready to populate the CV builder form.
+    With async=true the extraction runs as a job; poll /api/jobs/{job_id} for the result.
+    """
+    try:
+        # Validate file type
+        if not file.filename:
+            raise HTTPException(status_code=400, detail="No file provided")
+        
+        file_ext = file.filename.lower().split('.')[-1]
+        if file_ext not in ['pdf', 'docx', 'doc']:
+            raise HTTPException(status_code=400, detail="Only PDF and DOCX files are supported")
+        
+        # Read file content
+        content = await read_upload(file)
+        
+        if run_async:
+            job = await job_queue.submit("cv_extract_enhance", content=content, filename=file.filename)
+            return job_queue.accepted_response(job)
+        
+        return await extract_and_enhance_content(content, file.filename)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"CV extraction error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
+
+
 class EnhanceSectionRequest(BaseModel):
     section: str
     content: str
@@ -356,10 +422,6 @@ async def enhance_cv_section(
         if not current_user.active_tier:
             raise HTTPException(status_code=403, detail="Please purchase a plan to use AI features")
         
-        api_key = os.environ.get("EMERGENT_LLM_KEY")
-        if not api_key:
-            raise HTTPException(status_code=500, detail="AI service not configured")
-        
         prompts = {
             "summary": f"Enhance this professional summary to be more compelling and impactful. Keep it 2-3 sentences. Context: {request.context or 'General professional'}. Current summary: {request.content}",
             "experience": f"Enhance this job description with action verbs and quantifiable achievements. Make it ATS-friendly. Current: {request.content}",
@@ -369,21 +431,17 @@ async def enhance_cv_section(
         
         prompt = prompts.get(request.section, f"Enhance this CV content professionally: {request.content}")
         
-        chat = LlmChat(
-            api_key=api_key,
-            session_id=f"cv-enhance-{uuid4()}",
-            system_message="You are an expert CV writer. Provide enhanced content only, no explanations."
-        ).with_model("openai", "gpt-4o")
+        system_message = "You are an expert CV writer. Provide enhanced content only, no explanations."
         
-        response = await chat.send_message(UserMessage(text=prompt))
+        response = await llm_gateway.complete(
+            prompt,
+            system_message=system_message,
+            session_id=f"cv-enhance-{uuid4()}",
+            endpoint="cv_section_enhance",
+            reseller_id=current_user.reseller_id
+        )
         
-        # Handle response - could be string or object with text attribute
-        if hasattr(response, 'text'):
-            enhanced_text = response.text.strip()
-        elif hasattr(response, 'content'):
-            enhanced_text = response.content.strip()
-        else:
-            enhanced_text = str(response).strip()
+        enhanced_text = response.strip()
         
         logger.info(f"Section '{request.section}' enhanced for user {current_user.email}")
         
@@ -402,6 +460,25 @@ async def enhance_cv_section(
 
 # Import the PDF service
 from cv_pdf_service import generate_cv_pdf, TEMPLATES
+from pdf_render_service import pdf_render_service
+from pdf_cache_service import pdf_render_cache, make_render_key
+from blob_store import get_blob_store, BlobNotFoundError
+from photo_service import photo_service
+from download_routes import validate_response_mode, build_file_result, KIND_BLOB, KIND_RENDER
+
+
+async def render_cv_pdf(cv_data: Dict[str, Any], template_id: str) -> Tuple[bytes, str]:
+    """
+    Render a CV PDF, reusing the cached bytes when the same CV was rendered before.
+    cv_data is the stored form (photo as a reference); returns the PDF and its cache key.
+    """
+    render_key = make_render_key("cv", template_id, cv_data)
+
+    async def render():
+        render_data = await photo_service.resolve_cv_data(cv_data)
+        return await pdf_render_service.render(generate_cv_pdf, render_data, template_id)
+
+    return await pdf_render_cache.get_or_render(render_key, render), render_key
 
 
 class CVGenerateRequest(BaseModel):
@@ -409,6 +486,7 @@ class CVGenerateRequest(BaseModel):
     cv_data: Dict[str, Any]
     save_to_documents: bool = True
     document_name: Optional[str] = None
+    response_mode: Optional[str] = None  # "url" (default), "file" or "base64" (legacy)
 
 
 @cv_processing_router.get("/templates")
@@ -438,25 +516,37 @@ async def generate_cv_pdf_endpoint(
         if not current_user.active_tier:
             raise HTTPException(status_code=403, detail="Please purchase a plan to generate CVs")
         
+        response_mode = validate_response_mode(request.response_mode)
+        
+        # Normalize the photo once and keep only its reference in cv_data
+        cv_data = await photo_service.prepare_cv_data(request.cv_data, current_user.id)
+        
         # Generate PDF
-        pdf_bytes = generate_cv_pdf(request.cv_data, request.template_id)
+        pdf_bytes, render_key = await render_cv_pdf(cv_data, request.template_id)
         
         # Save to documents if requested
         doc_id = None
+        pdf_blob_id = None
         if request.save_to_documents:
-            import base64
             doc_id = str(uuid4())
             doc_name = request.document_name or f"CV - {request.cv_data.get('full_name', 'Untitled')}"
             
-            # Store document metadata and PDF content
+            # Store the PDF in the blob store and reference it from the document
+            pdf_blob_id = await get_blob_store().put(
+                pdf_bytes,
+                filename=f"{doc_name}.pdf",
+                content_type="application/pdf",
+                metadata={"user_id": current_user.id, "document_id": doc_id}
+            )
+            
             await db.user_documents.insert_one({
                 "id": doc_id,
                 "user_id": current_user.id,
                 "name": doc_name,
                 "type": "cv",
                 "template_id": request.template_id,
-                "cv_data": request.cv_data,
-                "pdf_content": base64.b64encode(pdf_bytes).decode('utf-8'),
+                "cv_data": cv_data,
+                "pdf_blob_id": pdf_blob_id,
                 "file_size": len(pdf_bytes),
                 "created_at": datetime.now(timezone.utc),
                 "updated_at": datetime.now(timezone.utc)
@@ -482,15 +572,21 @@ async def generate_cv_pdf_endpoint(
         except Exception as log_error:
             logger.warning(f"Failed to log activity: {str(log_error)}")
         
-        # Return PDF as base64 for download
-        import base64
-        return {
+        filename = f"{request.cv_data.get('full_name', 'CV').replace(' ', '_')}_CV.pdf"
+        result = {
             "success": True,
-            "pdf_base64": base64.b64encode(pdf_bytes).decode('utf-8'),
-            "filename": f"{request.cv_data.get('full_name', 'CV').replace(' ', '_')}_CV.pdf",
+            "filename": filename,
             "document_id": doc_id,
+            "file_size": len(pdf_bytes),
             "message": "CV generated successfully" + (" and saved to documents" if request.save_to_documents else "")
         }
+        # Saved CVs download from the blob store; unsaved ones from the render cache
+        return build_file_result(
+            result, response_mode, pdf_bytes, filename,
+            kind=KIND_BLOB if pdf_blob_id else KIND_RENDER,
+            ref=pdf_blob_id or render_key,
+            headers={"X-Document-Id": doc_id} if doc_id else None
+        )
         
     except HTTPException:
         raise
@@ -531,7 +627,7 @@ async def get_document(
     try:
         document = await db.user_documents.find_one(
             {"id": doc_id, "user_id": current_user.id},
-            {"_id": 0}
+            {"_id": 0, "pdf_content": 0}
         )
         
         if not document:
@@ -556,17 +652,29 @@ async def update_document(
     try:
         # Verify ownership
         existing = await db.user_documents.find_one(
-            {"id": doc_id, "user_id": current_user.id}
+            {"id": doc_id, "user_id": current_user.id},
+            {"_id": 0, "name": 1, "pdf_blob_id": 1}
         )
         if not existing:
             raise HTTPException(status_code=404, detail="Document not found")
         
+        response_mode = validate_response_mode(request.response_mode)
+        
+        cv_data = await photo_service.prepare_cv_data(request.cv_data, current_user.id)
+        
         # Generate new PDF
-        pdf_bytes = generate_cv_pdf(request.cv_data, request.template_id)
+        pdf_bytes, _ = await render_cv_pdf(cv_data, request.template_id)
         
-        import base64
         doc_name = request.document_name or existing.get("name", f"CV - {request.cv_data.get('full_name', 'Untitled')}")
         
+        store = get_blob_store()
+        pdf_blob_id = await store.put(
+            pdf_bytes,
+            filename=f"{doc_name}.pdf",
+            content_type="application/pdf",
+            metadata={"user_id": current_user.id, "document_id": doc_id}
+        )
+        
         # Update document
         await db.user_documents.update_one(
             {"id": doc_id},
@@ -574,23 +682,34 @@ async def update_document(
                 "$set": {
                     "name": doc_name,
                     "template_id": request.template_id,
-                    "cv_data": request.cv_data,
-                    "pdf_content": base64.b64encode(pdf_bytes).decode('utf-8'),
+                    "cv_data": cv_data,
+                    "pdf_blob_id": pdf_blob_id,
                     "file_size": len(pdf_bytes),
                     "updated_at": datetime.now(timezone.utc)
-                }
+                },
+                "$unset": {"pdf_content": ""}
             }
         )
         
+        # Drop the previous PDF now that the document points at the new one
+        if existing.get("pdf_blob_id"):
+            await store.delete(existing["pdf_blob_id"])
+        
         logger.info(f"Document updated: {doc_id}")
         
-        return {
+        filename = f"{request.cv_data.get('full_name', 'CV').replace(' ', '_')}_CV.pdf"
+        result = {
             "success": True,
-            "pdf_base64": base64.b64encode(pdf_bytes).decode('utf-8'),
-            "filename": f"{request.cv_data.get('full_name', 'CV').replace(' ', '_')}_CV.pdf",
+            "filename": filename,
             "document_id": doc_id,
+            "file_size": len(pdf_bytes),
             "message": "Document updated successfully"
         }
+        return build_file_result(
+            result, response_mode, pdf_bytes, filename,
+            kind=KIND_BLOB, ref=pdf_blob_id,
+            headers={"X-Document-Id": doc_id}
+        )
         
     except HTTPException:
         raise
@@ -606,13 +725,17 @@ async def delete_document(
 ):
     """Delete a document"""
     try:
-        result = await db.user_documents.delete_one(
-            {"id": doc_id, "user_id": current_user.id}
+        document = await db.user_documents.find_one_and_delete(
+            {"id": doc_id, "user_id": current_user.id},
+            {"_id": 0, "pdf_blob_id": 1}
         )
         
-        if result.deleted_count == 0:
+        if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
+        if document.get("pdf_blob_id"):
+            await get_blob_store().delete(document["pdf_blob_id"])
+        
         return {"success": True, "message": "Document deleted"}
         
     except HTTPException:
@@ -627,23 +750,44 @@ async def download_document(
     doc_id: str,
     current_user = Depends(get_current_user_with_db)
 ):
-    """Download document PDF"""
-    from fastapi.responses import Response
+    """Download document PDF (streamed from the blob store)"""
+    from fastapi.responses import Response, StreamingResponse
     import base64
     
     try:
         document = await db.user_documents.find_one(
-            {"id": doc_id, "user_id": current_user.id}
+            {"id": doc_id, "user_id": current_user.id},
+            {"_id": 0, "name": 1, "pdf_blob_id": 1}
         )
         
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        pdf_content = base64.b64decode(document["pdf_content"])
         filename = f"{document.get('name', 'CV').replace(' ', '_')}.pdf"
         
+        if document.get("pdf_blob_id"):
+            store = get_blob_store()
+            try:
+                info = await store.info(document["pdf_blob_id"])
+            except BlobNotFoundError:
+                raise HTTPException(status_code=404, detail="Document PDF not found")
+            
+            return StreamingResponse(
+                store.stream(document["pdf_blob_id"]),
+                media_type="application/pdf",
+                headers={
+                    "Content-Disposition": f'attachment; filename="{filename}"',
+                    "Content-Length": str(info.length)
+                }
+            )
+        
+        # Legacy document that has not been migrated to the blob store yet
+        legacy = await db.user_documents.find_one({"id": doc_id}, {"_id": 0, "pdf_content": 1})
+        if not legacy or not legacy.get("pdf_content"):
+            raise HTTPException(status_code=404, detail="Document PDF not found")
+        
         return Response(
-            content=pdf_content,
+            content=base64.b64decode(legacy["pdf_content"]),
             media_type="application/pdf",
             headers={"Content-Disposition": f'attachment; filename="{filename}"'}
         )
@@ -655,29 +799,20 @@ async def download_document(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@cv_processing_router.post("/ai-enhance-all")
-async def ai_enhance_all_sections(
-    cv_data: Dict[str, Any],
-    current_user = Depends(get_current_user_with_db)
-):
-    """
-    AI enhance all sections of the CV at once.
-    Improves summary, descriptions, achievements, and suggests skills.
-    """
-    try:
-        if not current_user.active_tier:
-            raise HTTPException(status_code=403, detail="Please purchase a plan to use AI features")
-        
-        api_key = os.environ.get("EMERGENT_LLM_KEY")
-        if not api_key:
-            raise HTTPException(status_code=500, detail="AI service not configured")
-        
-        # Build context from existing data
-        job_titles = [exp.get('title', '') for exp in cv_data.get('experiences', []) if exp.get('title')]
-        companies = [exp.get('company', '') for exp in cv_data.get('experiences', []) if exp.get('company')]
-        existing_skills = [s for s in cv_data.get('skills', []) if s and s.strip()]
-        
-        enhance_prompt = f"""Enhance this CV data professionally. Return ONLY valid JSON with the same structure but improved content.
+ENHANCE_ALL_SYSTEM_MESSAGE = "You are an expert CV writer specializing in South African job market. Return only valid JSON."
+
+# fanout: one prompt per section, run concurrently; single: one prompt for the whole CV
+ENHANCE_ALL_MODES = ("fanout", "single")
+ENHANCE_ALL_DEFAULT_MODE = os.environ.get("CV_ENHANCE_ALL_MODE", "fanout")
+
+
+def _enhance_all_prompt(cv_data: Dict[str, Any]) -> str:
+    # Build context from existing data
+    job_titles = [exp.get('title', '') for exp in cv_data.get('experiences', []) if exp.get('title')]
+    companies = [exp.get('company', '') for exp in cv_data.get('experiences', []) if exp.get('company')]
+    existing_skills = [s for s in cv_data.get('skills', []) if s and s.strip()]
+    
+    enhance_prompt = f"""Enhance this CV data professionally. Return ONLY valid JSON with the same structure but improved content.
 
 Current CV Data:
 - Name: {cv_data.get('full_name', 'Professional')}
@@ -691,50 +826,85 @@ Experiences to enhance:
 
 Return JSON with:
 {{
-    "summary": "<enhanced 2-3 sentence professional summary>",
-    "experiences": [
-        {{
-            "title": "<job title>",
-            "company": "<company>",
-            "duration": "<duration>",
-            "description": "<enhanced description with action verbs and metrics>",
-            "achievements": "<3-5 key achievements with quantifiable results>"
-        }}
-    ],
-    "skills": ["<enhanced skill 1>", "<skill 2>", "...", "<suggest 3-5 additional relevant skills>"]
+"summary": "<enhanced 2-3 sentence professional summary>",
+"experiences": [
+    {{
+        "title": "<job title>",
+        "company": "<company>",
+        "duration": "<duration>",
+        "description": "<enhanced description with action verbs and metrics>",
+        "achievements": "<3-5 key achievements with quantifiable results>"
+    }}
+],
+"skills": ["<enhanced skill 1>", "<skill 2>", "...", "<suggest 3-5 additional relevant skills>"]
 }}
 
 Focus on South African job market context. Use UK English spelling."""
+    return enhance_prompt
 
-        chat = LlmChat(
-            api_key=api_key,
-            session_id=f"cv-enhance-all-{uuid4()}",
-            system_message="You are an expert CV writer specializing in South African job market. Return only valid JSON."
-        ).with_model("openai", "gpt-4o")
+
+def _parse_enhance_all(response: str, cv_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Enhanced sections from the AI response, falling back to the submitted ones"""
+    import json
+    try:
+        clean_response = response.strip()
+        if clean_response.startswith("```"):
+            clean_response = clean_response.split("```")[1]
+            if clean_response.startswith("json"):
+                clean_response = clean_response[4:]
+        clean_response = clean_response.strip()
+        
+        enhanced_data = json.loads(clean_response)
+    except json.JSONDecodeError:
+        logger.error(f"Failed to parse enhancement response: {response[:500]}")
+        raise HTTPException(status_code=500, detail="Failed to process AI enhancement")
+    
+    return {
+        "success": True,
+        "enhanced_summary": enhanced_data.get("summary", cv_data.get("summary", "")),
+        "enhanced_experiences": enhanced_data.get("experiences", cv_data.get("experiences", [])),
+        "enhanced_skills": enhanced_data.get("skills", cv_data.get("skills", []))
+    }
+
+
+def _check_enhance_access(current_user, mode: str):
+    if mode not in ENHANCE_ALL_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(ENHANCE_ALL_MODES)}")
+    
+    if not current_user.active_tier:
+        raise HTTPException(status_code=403, detail="Please purchase a plan to use AI features")
+    
+    if not os.environ.get("EMERGENT_LLM_KEY"):
+        raise HTTPException(status_code=500, detail="AI service not configured")
+
+
+@cv_processing_router.post("/ai-enhance-all")
+async def ai_enhance_all_sections(
+    cv_data: Dict[str, Any],
+    mode: str = Query(ENHANCE_ALL_DEFAULT_MODE),
+    current_user = Depends(get_current_user_with_db)
+):
+    """
+    AI enhance all sections of the CV at once.
+    Improves summary, descriptions, achievements, and suggests skills.
+    In fanout mode every section is enhanced concurrently and sections that
+    fail or time out keep their content (listed in failed_sections).
+    """
+    try:
+        _check_enhance_access(current_user, mode)
         
-        response = await chat.send_message(UserMessage(text=enhance_prompt))
+        if mode == "fanout":
+            return await enhance_cv(cv_data, current_user.reseller_id)
         
-        # Parse response
-        import json
-        try:
-            clean_response = response.strip()
-            if clean_response.startswith("```"):
-                clean_response = clean_response.split("```")[1]
-                if clean_response.startswith("json"):
-                    clean_response = clean_response[4:]
-            clean_response = clean_response.strip()
-            
-            enhanced_data = json.loads(clean_response)
-        except json.JSONDecodeError:
-            logger.error(f"Failed to parse enhancement response: {response[:500]}")
-            raise HTTPException(status_code=500, detail="Failed to process AI enhancement")
+        response = await llm_gateway.complete(
+            _enhance_all_prompt(cv_data),
+            system_message=ENHANCE_ALL_SYSTEM_MESSAGE,
+            session_id=f"cv-enhance-all-{uuid4()}",
+            endpoint="cv_enhance_all",
+            reseller_id=current_user.reseller_id
+        )
         
-        return {
-            "success": True,
-            "enhanced_summary": enhanced_data.get("summary", cv_data.get("summary", "")),
-            "enhanced_experiences": enhanced_data.get("experiences", cv_data.get("experiences", [])),
-            "enhanced_skills": enhanced_data.get("skills", cv_data.get("skills", []))
-        }
+        return _parse_enhance_all(response, cv_data)
         
     except HTTPException:
         raise
@@ -742,3 +912,53 @@ Focus on South African job market context. Use UK English spelling."""
         logger.error(f"AI enhance all error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Enhancement failed: {str(e)}")
 
+
+@cv_processing_router.post("/ai-enhance-all/stream")
+async def ai_enhance_all_sections_stream(
+    cv_data: Dict[str, Any],
+    mode: str = Query(ENHANCE_ALL_DEFAULT_MODE),
+    current_user = Depends(get_current_user_with_db)
+):
+    """
+    AI enhance all sections, streaming progress as server-sent events. In
+    fanout mode each section is sent as soon as it is enhanced; in single
+    mode raw chunks are sent while the model writes, then every section.
+    """
+    _check_enhance_access(current_user, mode)
+    
+    async def fanout_events():
+        yield sse_event("start", {"type": "cv_enhance_all", "mode": mode})
+        results = []
+        async for result in enhance_sections(cv_data, current_user.reseller_id):
+            results.append(result)
+            section, index, content, error = result
+            if error is None:
+                yield sse_event("section", {"section": section, "index": index, "content": content})
+            else:
+                yield sse_event("section_failed", {"section": section, "index": index, "reason": describe_error(error)})
+        raise_if_nothing_enhanced(results)
+        yield sse_event("done", merge_enhancements(cv_data, results))
+    
+    if mode == "fanout":
+        return event_stream_response(fanout_events())
+    
+    async def events():
+        yield sse_event("start", {"type": "cv_enhance_all", "mode": mode})
+        parts = []
+        async for chunk in llm_gateway.stream(
+            _enhance_all_prompt(cv_data),
+            system_message=ENHANCE_ALL_SYSTEM_MESSAGE,
+            session_id=f"cv-enhance-all-{uuid4()}",
+            endpoint="cv_enhance_all",
+            reseller_id=current_user.reseller_id
+        ):
+            parts.append(chunk)
+            yield sse_event("chunk", {"text": chunk})
+        
+        result = _parse_enhance_all("".join(parts), cv_data)
+        for section in ("summary", "experiences", "skills"):
+            yield sse_event("section", {"section": section, "content": result[f"enhanced_{section}"]})
+        yield sse_event("done", result)
+    
+    return event_stream_response(events())
+
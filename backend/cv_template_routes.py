@@ -15,6 +15,8 @@ from cv_template_service import (
     get_placeholder_documentation,
     TEMPLATE_CATEGORIES
 )
+from generated_artifact_store import generated_artifact_store, MEDIA_TYPES
+from download_routes import validate_response_mode, content_disposition, create_download_url, KIND_GENERATED
 
 logger = logging.getLogger(__name__)
 
@@ -235,7 +237,7 @@ async def list_all_templates(
         if not include_inactive:
             query["is_active"] = True
         
-        templates = await db.cv_templates.find(query, {"_id": 0}).sort("created_at", -1).to_list(200)
+        templates = await db.cv_templates.find(query, {"_id": 0, "placeholder_index": 0}).sort("created_at", -1).to_list(200)
         
         return {
             "success": True,
@@ -266,7 +268,7 @@ async def list_reseller_templates(
         if not include_inactive:
             query["is_active"] = True
         
-        templates = await db.cv_templates.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
+        templates = await db.cv_templates.find(query, {"_id": 0, "placeholder_index": 0}).sort("created_at", -1).to_list(100)
         
         return {
             "success": True,
@@ -279,6 +281,19 @@ async def list_reseller_templates(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@cv_template_router.get("/storage-usage")
+async def get_generated_storage_usage(
+    user = Depends(get_current_user_with_db)
+):
+    """Get the current user's generated CV storage usage against their quota"""
+    try:
+        usage = await generated_artifact_store.get_usage(user.id)
+        return {"success": True, "usage": usage}
+    except Exception as e:
+        logger.error(f"Error getting generated CV storage usage: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @cv_template_router.get("/{template_id}")
 async def get_template(
     template_id: str,
@@ -391,7 +406,8 @@ async def generate_cv(
         "template_id": "uuid",
         "cv_data": { ... },
         "output_format": "pdf" | "docx",
-        "save_to_documents": true
+        "save_to_documents": true,
+        "response_mode": "url" | "file" | "base64"
     }
     """
     try:
@@ -399,6 +415,7 @@ async def generate_cv(
         cv_data = data.get("cv_data", {})
         output_format = data.get("output_format", "pdf")
         save_to_documents = data.get("save_to_documents", True)
+        response_mode = validate_response_mode(data.get("response_mode"))
         
         if not template_id:
             raise HTTPException(status_code=400, detail="template_id is required")
@@ -429,7 +446,8 @@ async def generate_cv(
             template_id=template_id,
             cv_data=cv_data,
             output_format=output_format,
-            user_id=user.id
+            user_id=user.id,
+            include_base64=response_mode == "base64"
         )
         
         # Save to documents if requested
@@ -437,23 +455,27 @@ async def generate_cv(
             from datetime import datetime, timezone
             from uuid import uuid4
             
+            from photo_service import photo_service
+            
             document = {
-                "id": result.get("document_id", str(uuid4())),
+                "id": str(uuid4()),
+                "artifact_id": result["document_id"],
                 "user_id": user.id,
                 "reseller_id": reseller_id,
                 "document_type": "cv",
                 "name": f"CV - {cv_data.get('full_name', 'Untitled')}",
                 "file_url": result.get("file_url"),
                 "file_path": result.get("file_path"),
-                "format": output_format,
+                "format": result.get("format", output_format),
                 "template_id": template_id,
                 "template_name": result.get("template_used"),
-                "cv_data": cv_data,
+                "cv_data": await photo_service.prepare_cv_data(cv_data, user.id),
                 "created_at": datetime.now(timezone.utc),
                 "updated_at": datetime.now(timezone.utc)
             }
             
             await db.documents.insert_one(document)
+            await generated_artifact_store.pin(result["document_id"], document["id"])
             result["saved_document_id"] = document["id"]
             
             # Record CV creation for limit tracking
@@ -462,6 +484,20 @@ async def generate_cv(
                 cv_limit_service = create_cv_limit_service(db)
                 await cv_limit_service.record_cv_creation(reseller_id, user.id, "cv_generated")
         
+        media_type = MEDIA_TYPES[result["format"]]
+        
+        if response_mode == "file":
+            headers = {
+                "Content-Disposition": content_disposition(result["filename"]),
+                "X-Document-Id": result["document_id"]
+            }
+            if result.get("saved_document_id"):
+                headers["X-Saved-Document-Id"] = result["saved_document_id"]
+            return FileResponse(path=result["file_path"], media_type=media_type, headers=headers)
+        
+        if response_mode == "url":
+            result.update(create_download_url(KIND_GENERATED, result["document_id"], result["filename"], media_type))
+        
         return result
         
     except HTTPException:
@@ -478,27 +514,35 @@ async def download_document(
     document_id: str,
     user = Depends(get_current_user_with_db)
 ):
-    """Download a generated CV document"""
+    """Download a generated CV document (saved document ID or generated artifact ID)"""
     try:
-        # Find the document
-        document = await db.documents.find_one({
-            "id": document_id,
-            "user_id": user.id
-        })
-        
-        if not document:
-            raise HTTPException(status_code=404, detail="Document not found")
+        document = await db.documents.find_one(
+            {"id": document_id, "user_id": user.id},
+            {"_id": 0, "artifact_id": 1, "file_path": 1, "name": 1, "format": 1}
+        )
         
-        file_path = document.get("file_path")
-        if not file_path or not os.path.exists(file_path):
+        # Resolve through the artifact store index
+        artifact_id = document.get("artifact_id") if document else document_id
+        artifact = await generated_artifact_store.resolve(artifact_id, user.id) if artifact_id else None
+        
+        if artifact:
+            file_path = artifact["file_path"]
+            file_format = artifact["format"]
+        elif document and document.get("file_path") and os.path.exists(document["file_path"]):
+            # Documents generated before the artifact store
+            file_path = document["file_path"]
+            file_format = document.get("format", "pdf")
+        elif document:
             raise HTTPException(status_code=404, detail="File not found")
+        else:
+            raise HTTPException(status_code=404, detail="Document not found")
         
-        filename = document.get("name", "CV") + f".{document.get('format', 'pdf')}"
+        name = document.get("name", "CV") if document else os.path.splitext(artifact["filename"])[0]
         
         return FileResponse(
             path=file_path,
-            filename=filename,
-            media_type="application/octet-stream"
+            filename=f"{name}.{file_format}",
+            media_type=MEDIA_TYPES.get(file_format, "application/octet-stream")
         )
         
     except HTTPException:
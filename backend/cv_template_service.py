@@ -2,24 +2,20 @@
 CV Template Service - Handles .docx template upload, management, and document generation
 Supports placeholder replacement and both .docx and PDF output formats
 """
+import asyncio
 import os
-import re
-import io
 import logging
-import shutil
-import subprocess
 from datetime import datetime, timezone
 from typing import Dict, Any, List, Optional
 from uuid import uuid4
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx_conversion_service import docx_conversion_service
+from docx_template_compiler import compile_template, compiled_path_for, compiled_template_cache
+from generated_artifact_store import generated_artifact_store, make_artifact_hash, GENERATED_CV_PATH
 
 logger = logging.getLogger(__name__)
 
 # Template storage paths
 TEMPLATE_STORAGE_PATH = "/app/public/uploads/cv_templates"
-GENERATED_CV_PATH = "/app/public/uploads/generated_cvs"
 
 # Ensure directories exist
 os.makedirs(TEMPLATE_STORAGE_PATH, exist_ok=True)
@@ -183,12 +179,20 @@ class CVTemplateService:
             os.makedirs(storage_dir, exist_ok=True)
             file_path = os.path.join(storage_dir, safe_filename)
             
-            # Save the template file
+            # Compile the template: merge placeholders split across runs and
+            # index where each one lives, so generation is a single pass
+            try:
+                compiled_content, placeholder_index = await asyncio.to_thread(compile_template, file_content)
+            except Exception as e:
+                logger.warning(f"Error compiling template {filename}: {str(e)}")
+                raise ValueError("Could not read the .docx template")
+            placeholders_found = sorted({entry["placeholder"] for entry in placeholder_index})
+            
+            # Save the original and compiled template files
             with open(file_path, 'wb') as f:
                 f.write(file_content)
-            
-            # Validate template has placeholders
-            placeholders_found = self._extract_placeholders(file_content)
+            with open(compiled_path_for(file_path), 'wb') as f:
+                f.write(compiled_content)
             
             # Save preview image if provided
             preview_url = None
@@ -211,6 +215,7 @@ class CVTemplateService:
                 "file_url": f"/uploads/cv_templates/{'resellers/' + reseller_id if reseller_id else 'platform'}/{safe_filename}",
                 "preview_url": preview_url,
                 "placeholders_found": placeholders_found,
+                "placeholder_index": placeholder_index,
                 "uploaded_by": uploaded_by,
                 "reseller_id": reseller_id,
                 "is_platform_template": reseller_id is None,
@@ -237,30 +242,6 @@ class CVTemplateService:
             logger.error(f"Error uploading CV template: {str(e)}")
             raise
     
-    def _extract_placeholders(self, file_content: bytes) -> List[str]:
-        """Extract all placeholders from a docx template"""
-        try:
-            doc = Document(io.BytesIO(file_content))
-            placeholders = set()
-            
-            # Check paragraphs
-            for para in doc.paragraphs:
-                found = re.findall(r'\{\{[A-Z0-9_]+\}\}', para.text)
-                placeholders.update(found)
-            
-            # Check tables
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        for para in cell.paragraphs:
-                            found = re.findall(r'\{\{[A-Z0-9_]+\}\}', para.text)
-                            placeholders.update(found)
-            
-            return list(placeholders)
-        except Exception as e:
-            logger.warning(f"Error extracting placeholders: {str(e)}")
-            return []
-    
     async def get_templates(
         self,
         category: Optional[str] = None,
@@ -288,7 +269,7 @@ class CVTemplateService:
         
         templates = await self.db.cv_templates.find(
             query,
-            {"_id": 0}
+            {"_id": 0, "placeholder_index": 0}
         ).sort("name", 1).to_list(100)
         
         return templates
@@ -319,10 +300,15 @@ class CVTemplateService:
         template_id: str,
         cv_data: Dict[str, Any],
         output_format: str = "pdf",  # "pdf" or "docx"
-        user_id: str = None
+        user_id: str = None,
+        include_base64: bool = False
     ) -> Dict[str, Any]:
         """
         Generate a CV from a template with user data
+
+        The file is kept in the generated artifact store (identical inputs
+        reuse the stored file); its content is only read back into the
+        result as base64 when include_base64 is set.
         """
         try:
             # Get template
@@ -330,72 +316,70 @@ class CVTemplateService:
             if not template:
                 raise ValueError(f"Template not found: {template_id}")
             
-            # Load template document
-            doc = Document(template["file_path"])
+            # Load the compiled template (cached in memory)
+            compiled = await asyncio.to_thread(
+                compiled_template_cache.get,
+                template_id,
+                template["file_path"],
+                template.get("placeholder_index")
+            )
+            if template.get("placeholder_index") is None:
+                # Template uploaded before compilation; keep the index from now on
+                await self.db.cv_templates.update_one(
+                    {"id": template_id},
+                    {"$set": {"placeholder_index": compiled.index, "placeholders_found": compiled.placeholders}}
+                )
             
             # Prepare data for replacement
             replacement_data = self._prepare_replacement_data(cv_data)
             
-            # Replace placeholders in paragraphs
-            for para in doc.paragraphs:
-                self._replace_in_paragraph(para, replacement_data)
-            
-            # Replace placeholders in tables
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        for para in cell.paragraphs:
-                            self._replace_in_paragraph(para, replacement_data)
-            
-            # Generate unique filename
-            output_id = str(uuid4())
-            user_name = cv_data.get("full_name", "CV").replace(" ", "_")
-            
-            # Save the filled document
-            docx_filename = f"{output_id}_{user_name}.docx"
-            docx_path = os.path.join(GENERATED_CV_PATH, docx_filename)
-            doc.save(docx_path)
-            
             result = {
                 "success": True,
-                "document_id": output_id,
                 "template_used": template["name"],
                 "format": output_format
             }
             
-            if output_format == "pdf":
-                # Convert to PDF
-                pdf_filename = f"{output_id}_{user_name}.pdf"
-                pdf_path = os.path.join(GENERATED_CV_PATH, pdf_filename)
+            # Reuse the stored file when the same inputs were generated before
+            content_hash = make_artifact_hash(template, output_format, replacement_data)
+            artifact = await generated_artifact_store.find(user_id, content_hash, output_format)
+            
+            if not artifact:
+                user_name = cv_data.get("full_name", "CV").replace(" ", "_")
                 
-                # Use LibreOffice for conversion (more reliable in server environment)
-                conversion_success = self._convert_to_pdf(docx_path, pdf_path)
+                # Fill the template into a staging file
+                docx_path = generated_artifact_store.staging_path(".docx")
+                await asyncio.to_thread(compiled.save, docx_path, replacement_data)
+                file_path, file_format = docx_path, "docx"
                 
-                if conversion_success and os.path.exists(pdf_path):
-                    result["file_path"] = pdf_path
-                    result["file_url"] = f"/uploads/generated_cvs/{pdf_filename}"
-                    result["filename"] = pdf_filename
+                if output_format == "pdf":
+                    # Use LibreOffice for conversion (more reliable in server environment)
+                    pdf_path = generated_artifact_store.staging_path(".pdf")
+                    conversion_success = await self._convert_to_pdf(docx_path, pdf_path)
                     
-                    # Read PDF content for base64 response
-                    with open(pdf_path, 'rb') as f:
-                        import base64
-                        result["pdf_base64"] = base64.b64encode(f.read()).decode('utf-8')
-                else:
-                    # Fallback to docx if PDF conversion fails
-                    logger.warning("PDF conversion failed, returning docx")
-                    result["format"] = "docx"
-                    result["file_path"] = docx_path
-                    result["file_url"] = f"/uploads/generated_cvs/{docx_filename}"
-                    result["filename"] = docx_filename
-            else:
-                result["file_path"] = docx_path
-                result["file_url"] = f"/uploads/generated_cvs/{docx_filename}"
-                result["filename"] = docx_filename
+                    if conversion_success and os.path.exists(pdf_path):
+                        os.remove(docx_path)
+                        file_path, file_format = pdf_path, "pdf"
+                    else:
+                        # Fallback to docx if PDF conversion fails
+                        logger.warning("PDF conversion failed, returning docx")
                 
-                # Read docx content for base64 response
-                with open(docx_path, 'rb') as f:
-                    import base64
-                    result["docx_base64"] = base64.b64encode(f.read()).decode('utf-8')
+                artifact = await generated_artifact_store.put(
+                    user_id,
+                    content_hash,
+                    file_format,
+                    file_path,
+                    filename=f"{user_name}_CV.{file_format}",
+                    template_id=template_id
+                )
+            
+            result.update(generated_artifact_store.to_result(artifact))
+            
+            if include_base64:
+                # Legacy clients expect the file inlined in the response
+                import base64
+                with open(result["file_path"], 'rb') as f:
+                    encoded = base64.b64encode(f.read()).decode('utf-8')
+                result["pdf_base64" if result["format"] == "pdf" else "docx_base64"] = encoded
             
             # Update template usage count
             await self.db.cv_templates.update_one(
@@ -599,57 +583,9 @@ class CVTemplateService:
         
         return replacements
     
-    def _replace_in_paragraph(self, paragraph, replacements: Dict[str, str]):
-        """Replace placeholders in a paragraph while preserving formatting"""
-        for placeholder, value in replacements.items():
-            if placeholder in paragraph.text:
-                # Handle run-level replacement to preserve formatting
-                for run in paragraph.runs:
-                    if placeholder in run.text:
-                        run.text = run.text.replace(placeholder, value)
-                
-                # Also check full paragraph text (in case placeholder spans runs)
-                if placeholder in paragraph.text:
-                    inline = paragraph.runs
-                    for i, run in enumerate(inline):
-                        if placeholder in run.text:
-                            run.text = run.text.replace(placeholder, value)
-    
-    def _convert_to_pdf(self, docx_path: str, pdf_path: str) -> bool:
-        """Convert docx to PDF using LibreOffice"""
-        try:
-            # Try LibreOffice conversion
-            output_dir = os.path.dirname(pdf_path)
-            result = subprocess.run([
-                'libreoffice',
-                '--headless',
-                '--convert-to', 'pdf',
-                '--outdir', output_dir,
-                docx_path
-            ], capture_output=True, timeout=60)
-            
-            # LibreOffice creates PDF with same name as input
-            expected_pdf = docx_path.replace('.docx', '.pdf')
-            if os.path.exists(expected_pdf) and expected_pdf != pdf_path:
-                shutil.move(expected_pdf, pdf_path)
-            
-            return os.path.exists(pdf_path)
-        except subprocess.TimeoutExpired:
-            logger.error("PDF conversion timed out")
-            return False
-        except FileNotFoundError:
-            logger.warning("LibreOffice not found, trying alternative conversion")
-            # Try docx2pdf as fallback (works on Windows/Mac)
-            try:
-                from docx2pdf import convert
-                convert(docx_path, pdf_path)
-                return os.path.exists(pdf_path)
-            except Exception as e:
-                logger.error(f"docx2pdf conversion failed: {str(e)}")
-                return False
-        except Exception as e:
-            logger.error(f"PDF conversion error: {str(e)}")
-            return False
+    async def _convert_to_pdf(self, docx_path: str, pdf_path: str) -> bool:
+        """Convert docx to PDF on the shared LibreOffice worker pool"""
+        return await docx_conversion_service.convert(docx_path, pdf_path)
 
 
 def get_template_categories():
@@ -0,0 +1,364 @@
+"""
+DOCX Conversion Service - Persistent LibreOffice workers for DOCX -> PDF
+
+Keeps N headless soffice processes running, each with its own user profile
+directory so concurrent conversions never share LibreOffice state. Workers
+listen on a named pipe and are driven over UNO; conversions are queued,
+time-limited and never block the event loop. Dead or hung workers are
+detected by a periodic health check (and on timeout) and restarted.
+
+The UNO bridge (Debian's python3-uno, see the backend Dockerfile in
+docs/SUBDOMAIN_DEPLOYMENT_GUIDE.md) is a deployment dependency. Without
+it each conversion falls back to starting its own `soffice --convert-to`
+subprocess (still off the event loop and with a per-worker profile, but
+paying LibreOffice's startup on every document); startup logs an error
+and get_stats() reports mode "subprocess" so the misconfiguration is seen.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable via environment)
+DOCX_CONVERSION_WORKERS = int(os.environ.get("DOCX_CONVERSION_WORKERS", 2))
+DOCX_CONVERSION_MAX_PENDING = int(os.environ.get("DOCX_CONVERSION_MAX_PENDING", DOCX_CONVERSION_WORKERS * 8))
+DOCX_CONVERSION_TIMEOUT = float(os.environ.get("DOCX_CONVERSION_TIMEOUT", 60))
+DOCX_CONVERSION_HEALTH_INTERVAL = float(os.environ.get("DOCX_CONVERSION_HEALTH_INTERVAL", 30))
+DOCX_CONVERSION_STARTUP_TIMEOUT = float(os.environ.get("DOCX_CONVERSION_STARTUP_TIMEOUT", 30))
+DOCX_CONVERSION_PROFILE_DIR = Path(
+    os.environ.get("DOCX_CONVERSION_PROFILE_DIR", Path(tempfile.gettempdir()) / "upshift_lo_profiles")
+)
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+except ImportError:
+    uno = None
+    PropertyValue = None
+
+
+class ConversionQueueFullError(HTTPException):
+    """Raised when too many conversions are queued"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=503,
+            detail="Document conversion is busy right now. Please try again in a few seconds.",
+            headers={"Retry-After": "5"}
+        )
+
+
+def find_soffice() -> Optional[str]:
+    """Path of the LibreOffice binary, if installed"""
+    return shutil.which("soffice") or shutil.which("libreoffice")
+
+
+def _property(name, value):
+    prop = PropertyValue()
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+
+class ConversionWorker:
+    """One long-lived soffice process with a private profile"""
+
+    def __init__(self, index: int, soffice: str):
+        self.index = index
+        self.soffice = soffice
+        self.profile_dir = DOCX_CONVERSION_PROFILE_DIR / f"{os.getpid()}_{index}"
+        self.pipe_name = f"upshift_lo_{os.getpid()}_{index}"
+        self.process: Optional[subprocess.Popen] = None
+        self.desktop = None
+        self.conversions = 0
+        self.restarts = 0
+
+    @property
+    def uses_uno(self) -> bool:
+        return uno is not None
+
+    def _profile_arg(self) -> str:
+        return f"-env:UserInstallation={self.profile_dir.as_uri()}"
+
+    # ---------- lifecycle (blocking, run in a thread) ----------
+
+    def _start(self):
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        if not self.uses_uno:
+            return
+        self.process = subprocess.Popen(
+            [
+                self.soffice, self._profile_arg(),
+                "--headless", "--invisible", "--nologo", "--nodefault", "--norestore", "--nolockcheck",
+                f"--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext"
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+        local_ctx = uno.getComponentContext()
+        resolver = local_ctx.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local_ctx)
+        deadline = time.monotonic() + DOCX_CONVERSION_STARTUP_TIMEOUT
+        while True:
+            try:
+                ctx = resolver.resolve(f"uno:pipe,name={self.pipe_name};urp;StarOffice.ComponentContext")
+                self.desktop = ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+                return
+            except Exception:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self._stop()
+                    raise RuntimeError(f"LibreOffice worker {self.index} failed to start")
+                time.sleep(0.25)
+
+    def _stop(self):
+        self.desktop = None
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.kill()
+                try:
+                    self.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    pass
+            self.process = None
+
+    def _ping(self) -> bool:
+        if not self.uses_uno:
+            return True
+        if self.process is None or self.process.poll() is not None or self.desktop is None:
+            return False
+        try:
+            self.desktop.getFrames().getCount()
+            return True
+        except Exception:
+            return False
+
+    def _convert_uno(self, docx_path: str, pdf_path: str):
+        document = self.desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(docx_path)), "_blank", 0,
+            (_property("Hidden", True),)
+        )
+        if document is None:
+            raise RuntimeError(f"LibreOffice could not open {docx_path}")
+        try:
+            document.storeToURL(
+                uno.systemPathToFileUrl(os.path.abspath(pdf_path)),
+                (_property("FilterName", "writer_pdf_Export"),)
+            )
+        finally:
+            document.close(True)
+
+    # ---------- async API ----------
+
+    async def start(self):
+        await asyncio.to_thread(self._start)
+
+    async def stop(self):
+        await asyncio.to_thread(self._stop)
+
+    async def restart(self):
+        self.restarts += 1
+        await self.stop()
+        await self.start()
+
+    async def is_healthy(self) -> bool:
+        return await asyncio.to_thread(self._ping)
+
+    async def convert(self, docx_path: str, pdf_path: str):
+        if self.uses_uno:
+            await asyncio.to_thread(self._convert_uno, docx_path, pdf_path)
+        else:
+            await self._convert_subprocess(docx_path, pdf_path)
+        self.conversions += 1
+
+    async def _convert_subprocess(self, docx_path: str, pdf_path: str):
+        with tempfile.TemporaryDirectory(prefix=f"lo_out_{self.index}_") as out_dir:
+            process = await asyncio.create_subprocess_exec(
+                self.soffice, self._profile_arg(), "--headless", "--norestore",
+                "--convert-to", "pdf", "--outdir", out_dir, docx_path,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            try:
+                await process.wait()
+            except asyncio.CancelledError:
+                process.kill()
+                await process.wait()
+                raise
+            produced = Path(out_dir) / (Path(docx_path).stem + ".pdf")
+            if produced.exists():
+                shutil.move(str(produced), pdf_path)
+
+    def get_stats(self) -> dict:
+        return {
+            "index": self.index,
+            "pid": self.process.pid if self.process else None,
+            "conversions": self.conversions,
+            "restarts": self.restarts
+        }
+
+
+class DocxConversionService:
+    def __init__(
+        self,
+        max_workers: int = DOCX_CONVERSION_WORKERS,
+        max_pending: int = DOCX_CONVERSION_MAX_PENDING,
+        timeout: float = DOCX_CONVERSION_TIMEOUT
+    ):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.workers: List[ConversionWorker] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._pending = 0
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self.soffice = None
+        self.stats = {"completed": 0, "failed": 0, "timed_out": 0, "rejected": 0, "fallback": 0}
+
+    @property
+    def available(self) -> bool:
+        return self.soffice is not None
+
+    async def start(self):
+        """Launch the worker processes (called on app startup, otherwise lazily)"""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._idle is not None:
+                return
+            self.soffice = find_soffice()
+            self._idle = asyncio.Queue()
+            if not self.soffice:
+                logger.warning("LibreOffice not found; DOCX to PDF conversion will use docx2pdf")
+                return
+
+            for index in range(self.max_workers):
+                worker = ConversionWorker(index, self.soffice)
+                try:
+                    await worker.start()
+                except Exception as e:
+                    # Keep the worker in the pool; the health check retries it
+                    logger.error(f"Failed to start LibreOffice worker {index}: {str(e)}")
+                self.workers.append(worker)
+                self._idle.put_nowait(worker)
+
+            if uno is None:
+                logger.error(
+                    "Python UNO bridge not importable (install python3-uno and put its dist-packages on the "
+                    "interpreter's path): every DOCX conversion will start a new soffice process"
+                )
+            self._health_task = asyncio.create_task(self._health_loop())
+            logger.info(
+                f"DOCX conversion pool started: {self.max_workers} LibreOffice workers "
+                f"({'UNO' if uno is not None else 'subprocess'} mode), {self.timeout:.0f}s timeout"
+            )
+
+    async def shutdown(self):
+        """Stop all worker processes"""
+        if self._health_task:
+            self._health_task.cancel()
+            self._health_task = None
+        for worker in self.workers:
+            await worker.stop()
+        self.workers = []
+        self._idle = None
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(DOCX_CONVERSION_HEALTH_INTERVAL)
+            # Only idle workers are checked; busy ones are covered by the job timeout
+            for _ in range(self._idle.qsize()):
+                try:
+                    worker = self._idle.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                try:
+                    if not await worker.is_healthy():
+                        logger.warning(f"LibreOffice worker {worker.index} is unhealthy, restarting")
+                        await worker.restart()
+                except Exception as e:
+                    logger.error(f"Failed to restart LibreOffice worker {worker.index}: {str(e)}")
+                finally:
+                    self._idle.put_nowait(worker)
+
+    async def _docx2pdf(self, docx_path: str, pdf_path: str) -> bool:
+        self.stats["fallback"] += 1
+        try:
+            from docx2pdf import convert
+            await asyncio.to_thread(convert, docx_path, pdf_path)
+            return os.path.exists(pdf_path)
+        except Exception as e:
+            logger.error(f"docx2pdf conversion failed: {str(e)}")
+            return False
+
+    async def convert(self, docx_path: str, pdf_path: str, timeout: Optional[float] = None) -> bool:
+        """
+        Convert a DOCX file to PDF. Returns False when the conversion fails or
+        times out; raises ConversionQueueFullError (503) when saturated.
+        """
+        await self.start()
+        if not self.available:
+            return await self._docx2pdf(docx_path, pdf_path)
+
+        if self._pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise ConversionQueueFullError()
+
+        timeout = timeout or self.timeout
+        self._pending += 1
+        worker = None
+        try:
+            worker = await self._idle.get()
+            if not await worker.is_healthy():
+                await worker.restart()
+
+            await asyncio.wait_for(worker.convert(docx_path, pdf_path), timeout=timeout)
+            self.stats["completed"] += 1
+            return os.path.exists(pdf_path)
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            logger.error(f"DOCX conversion timed out after {timeout:.0f}s on worker {worker.index}")
+            await self._recycle(worker)
+            return False
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error(f"DOCX conversion error: {str(e)}")
+            if worker is not None:
+                await self._recycle(worker)
+            return False
+        finally:
+            if worker is not None:
+                self._idle.put_nowait(worker)
+            self._pending -= 1
+
+    async def _recycle(self, worker: ConversionWorker):
+        """Restart a worker after a failed or hung conversion"""
+        try:
+            await worker.restart()
+        except Exception as e:
+            logger.error(f"Failed to restart LibreOffice worker {worker.index}: {str(e)}")
+
+    def get_stats(self) -> dict:
+        return {
+            "available": self.available,
+            "mode": "uno" if uno is not None else "subprocess",
+            "workers": [worker.get_stats() for worker in self.workers],
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "timeout_seconds": self.timeout,
+            **self.stats
+        }
+
+
+# Global instance
+docx_conversion_service = DocxConversionService()
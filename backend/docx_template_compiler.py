@@ -0,0 +1,254 @@
+"""
+DOCX Template Compiler - Pre-parsed CV templates with a placeholder index
+
+Templates are compiled once at upload time:
+- every paragraph in the document body, headers and footers is scanned for
+  {{PLACEHOLDER}} tokens, and tokens that Word split across several runs are
+  merged back into the run where they start (keeping that run's formatting)
+- the index of which paragraph/run holds which placeholder is recorded
+- each XML part is stored as literal fragments split at the placeholders
+
+Generation is then a single substitution pass: the fragments are joined
+with the escaped values and zipped together with the untouched parts, with
+no python-docx parsing or per-paragraph searching.
+"""
+import io
+import logging
+import os
+import re
+import zipfile
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{[A-Z0-9_]+\}\}")
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+W_P = f"{{{W_NS}}}p"
+W_R = f"{{{W_NS}}}r"
+W_T = f"{{{W_NS}}}t"
+
+# Parts that can carry placeholders
+TEXT_PART_PATTERN = re.compile(r"^word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml$")
+
+COMPILED_SUFFIX = ".compiled.docx"
+COMPILED_CACHE_SIZE = int(os.environ.get("CV_TEMPLATE_CACHE_SIZE", 64))
+
+# Run-level markup for characters a value can contain but w:t cannot
+_BREAK_XML = '</w:t><w:br/><w:t xml:space="preserve">'
+_TAB_XML = '</w:t><w:tab/><w:t xml:space="preserve">'
+
+
+def _own_text_nodes(paragraph) -> List:
+    """w:t elements belonging to this paragraph (not to nested text boxes)"""
+    nodes = []
+    for node in paragraph.iter(W_T):
+        parent = node.getparent()
+        while parent is not None and parent.tag != W_P:
+            parent = parent.getparent()
+        if parent is paragraph:
+            nodes.append(node)
+    return nodes
+
+
+def _run_index(paragraph, text_node) -> int:
+    run = text_node.getparent()
+    while run is not None and run.tag != W_R:
+        run = run.getparent()
+    for index, candidate in enumerate(paragraph.iter(W_R)):
+        if candidate is run:
+            return index
+    return -1
+
+
+def _normalize_paragraph(paragraph) -> List[Tuple[int, str]]:
+    """
+    Merge placeholders split across runs into their first run.
+    Returns (run index, placeholder) pairs for the paragraph.
+    """
+    nodes = _own_text_nodes(paragraph)
+    if not nodes:
+        return []
+    full_text = "".join(node.text or "" for node in nodes)
+    if "{{" not in full_text:
+        return []
+
+    found = []
+    for match in PLACEHOLDER_PATTERN.finditer(full_text):
+        start, end = match.span()
+        # Locate the text nodes covering [start, end); the joined text never
+        # changes, so offsets stay valid while earlier matches are merged
+        offset = 0
+        first = last = None
+        for index, node in enumerate(nodes):
+            length = len(node.text or "")
+            if first is None and start < offset + length:
+                first = (index, start - offset)
+            if end <= offset + length:
+                last = (index, end - offset)
+                break
+            offset += length
+
+        first_index, local_start = first
+        last_index, local_end = last
+        first_node = nodes[first_index]
+        if first_index != last_index:
+            tail = (nodes[last_index].text or "")[local_end:]
+            first_node.text = (first_node.text or "")[:local_start] + match.group()
+            for node in nodes[first_index + 1:last_index]:
+                node.text = ""
+            nodes[last_index].text = tail
+        first_node.set(XML_SPACE, "preserve")
+        found.append((_run_index(paragraph, first_node), match.group()))
+    return found
+
+
+class CompiledTemplate:
+    """Zip members plus placeholder-split XML parts of a normalized template"""
+
+    def __init__(self, members: "OrderedDict[str, bytes]", fragments: Dict[str, List[str]], index: List[Dict]):
+        self.members = members
+        self.fragments = fragments
+        self.index = index
+
+    @property
+    def placeholders(self) -> List[str]:
+        return sorted({entry["placeholder"] for entry in self.index})
+
+    def render(self, replacements: Dict[str, str]) -> bytes:
+        """Fill the template in one pass and return the .docx bytes"""
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, data in self.members.items():
+                parts = self.fragments.get(name)
+                if parts is not None:
+                    pieces = []
+                    for position, piece in enumerate(parts):
+                        if position % 2:
+                            value = replacements.get(piece)
+                            piece = _value_xml(value) if value is not None else piece
+                        pieces.append(piece)
+                    data = "".join(pieces).encode("utf-8")
+                archive.writestr(name, data)
+        return output.getvalue()
+
+    def save(self, path: str, replacements: Dict[str, str]):
+        data = self.render(replacements)
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+def _value_xml(value) -> str:
+    text = escape(str(value))
+    return text.replace("\r\n", "\n").replace("\n", _BREAK_XML).replace("\t", _TAB_XML)
+
+
+def _split_fragments(xml_text: str) -> List[str]:
+    """Alternating [literal, placeholder, literal, ...] list for an XML part"""
+    fragments = []
+    position = 0
+    for match in PLACEHOLDER_PATTERN.finditer(xml_text):
+        fragments.append(xml_text[position:match.start()])
+        fragments.append(match.group())
+        position = match.end()
+    fragments.append(xml_text[position:])
+    return fragments
+
+
+def compile_template(file_content: bytes) -> Tuple[bytes, List[Dict]]:
+    """
+    Normalize a .docx template so every placeholder sits in a single run.
+    Returns the normalized .docx bytes and the placeholder location index.
+    """
+    index = []
+    output = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(file_content)) as source, \
+            zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as target:
+        for item in source.infolist():
+            data = source.read(item.filename)
+            if TEXT_PART_PATTERN.match(item.filename):
+                root = etree.fromstring(data)
+                changed = False
+                for paragraph_index, paragraph in enumerate(root.iter(W_P)):
+                    for run_index, placeholder in _normalize_paragraph(paragraph):
+                        changed = True
+                        index.append({
+                            "part": item.filename,
+                            "paragraph": paragraph_index,
+                            "run": run_index,
+                            "placeholder": placeholder
+                        })
+                if changed:
+                    data = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+            target.writestr(item, data)
+    return output.getvalue(), index
+
+
+def load_compiled(compiled_content: bytes, index: List[Dict]) -> CompiledTemplate:
+    """Build the in-memory representation from normalized .docx bytes"""
+    members = OrderedDict()
+    fragments = {}
+    parts_with_placeholders = {entry["part"] for entry in index}
+    with zipfile.ZipFile(io.BytesIO(compiled_content)) as archive:
+        for name in archive.namelist():
+            members[name] = archive.read(name)
+            if name in parts_with_placeholders:
+                fragments[name] = _split_fragments(members[name].decode("utf-8"))
+    return CompiledTemplate(members, fragments, index)
+
+
+def compiled_path_for(file_path: str) -> str:
+    root, _ = os.path.splitext(file_path)
+    return root + COMPILED_SUFFIX
+
+
+class CompiledTemplateCache:
+    """LRU of compiled templates keyed by template ID and compiled file mtime"""
+
+    def __init__(self, max_entries: int = COMPILED_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, CompiledTemplate]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "compiled": 0}
+
+    def get(self, template_id: str, file_path: str, index: Optional[List[Dict]]) -> CompiledTemplate:
+        """
+        Compiled template for a stored template record. Templates uploaded
+        before compilation existed are compiled on first use.
+        """
+        compiled_path = compiled_path_for(file_path)
+        if index is None or not os.path.exists(compiled_path):
+            with open(file_path, "rb") as f:
+                compiled_content, index = compile_template(f.read())
+            with open(compiled_path, "wb") as f:
+                f.write(compiled_content)
+            self.stats["compiled"] += 1
+
+        mtime = os.path.getmtime(compiled_path)
+        cached = self._entries.get(template_id)
+        if cached and cached[0] == mtime:
+            self._entries.move_to_end(template_id)
+            self.stats["hits"] += 1
+            return cached[1]
+
+        self.stats["misses"] += 1
+        with open(compiled_path, "rb") as f:
+            compiled = load_compiled(f.read(), index)
+        self._entries[template_id] = (mtime, compiled)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return compiled
+
+    def invalidate(self, template_id: str):
+        self._entries.pop(template_id, None)
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "entries": len(self._entries), "max_entries": self.max_entries}
+
+
+# Global instance
+compiled_template_cache = CompiledTemplateCache()
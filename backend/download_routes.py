@@ -0,0 +1,174 @@
+"""
+Download Routes - Binary responses and short-lived signed download URLs
+
+Generation endpoints can answer in one of three response modes:
+- url (default): JSON metadata plus a signed `download_url` that is valid for
+  a few minutes and needs no auth header, so the browser can fetch it directly
+- file: the file itself, with Content-Length and Content-Disposition headers
+- base64: legacy JSON payload with the file inlined as base64
+"""
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from jose import JWTError, jwt
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from urllib.parse import quote
+import base64
+import logging
+import os
+
+from auth import SECRET_KEY, ALGORITHM
+
+logger = logging.getLogger(__name__)
+
+download_router = APIRouter(prefix="/api/files", tags=["Downloads"])
+
+DOWNLOAD_URL_TTL_SECONDS = int(os.environ.get("DOWNLOAD_URL_TTL_SECONDS", 300))
+
+RESPONSE_MODES = ("url", "file", "base64")
+DEFAULT_RESPONSE_MODE = "url"
+
+# Signed URL targets
+KIND_BLOB = "blob"            # blob store ID
+KIND_RENDER = "render"        # PDF render cache key
+KIND_GENERATED = "generated"  # generated artifact ID
+
+DOWNLOAD_TOKEN_SUBJECT = "download"
+
+
+def validate_response_mode(response_mode: Optional[str]) -> str:
+    """Normalise a requested response mode, rejecting unknown values"""
+    mode = (response_mode or DEFAULT_RESPONSE_MODE).lower()
+    if mode not in RESPONSE_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"response_mode must be one of: {', '.join(RESPONSE_MODES)}"
+        )
+    return mode
+
+
+def content_disposition(filename: str) -> str:
+    """Attachment header that survives non-ASCII names"""
+    ascii_name = filename.encode("ascii", "ignore").decode("ascii").replace('"', "") or "download"
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def create_download_url(
+    kind: str,
+    ref: str,
+    filename: str,
+    media_type: str = "application/pdf",
+    ttl_seconds: Optional[int] = None
+) -> Dict[str, str]:
+    """Sign a short-lived download URL for a stored file"""
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds or DOWNLOAD_URL_TTL_SECONDS)
+    token = jwt.encode(
+        {
+            "sub": DOWNLOAD_TOKEN_SUBJECT,
+            "kind": kind,
+            "ref": ref,
+            "filename": filename,
+            "media_type": media_type,
+            "exp": expires_at
+        },
+        SECRET_KEY,
+        algorithm=ALGORITHM
+    )
+    return {
+        "download_url": f"/api/files/download/{token}",
+        "download_expires_at": expires_at.isoformat()
+    }
+
+
+def file_response(data: bytes, filename: str, media_type: str = "application/pdf", headers: Optional[Dict[str, str]] = None) -> Response:
+    """Binary response for in-memory file content"""
+    return Response(
+        content=data,
+        media_type=media_type,
+        headers={"Content-Disposition": content_disposition(filename), **(headers or {})}
+    )
+
+
+def build_file_result(
+    result: Dict,
+    response_mode: str,
+    data: bytes,
+    filename: str,
+    kind: str,
+    ref: Optional[str],
+    media_type: str = "application/pdf",
+    base64_field: str = "pdf_base64",
+    headers: Optional[Dict[str, str]] = None
+):
+    """
+    Shape a generation response for the requested mode.
+
+    `result` is the JSON metadata returned in url/base64 modes; in file mode
+    the bytes are returned directly and `headers` carry the metadata.
+    """
+    if response_mode == "file":
+        return file_response(data, filename, media_type, headers)
+    if response_mode == "base64":
+        result[base64_field] = base64.b64encode(data).decode("utf-8")
+    elif ref:
+        result.update(create_download_url(kind, ref, filename, media_type))
+    return result
+
+
+@download_router.get("/download/{token}")
+async def download_signed_file(token: str):
+    """Serve a file referenced by a signed download URL"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=410, detail="Download link is invalid or has expired")
+    if payload.get("sub") != DOWNLOAD_TOKEN_SUBJECT:
+        raise HTTPException(status_code=410, detail="Download link is invalid or has expired")
+
+    kind = payload.get("kind")
+    ref = payload.get("ref") or ""
+    filename = payload.get("filename") or "download"
+    media_type = payload.get("media_type") or "application/octet-stream"
+
+    try:
+        if kind == KIND_BLOB:
+            from blob_store import get_blob_store, BlobNotFoundError
+            store = get_blob_store()
+            try:
+                info = await store.info(ref)
+            except BlobNotFoundError:
+                raise HTTPException(status_code=404, detail="File not found")
+            return StreamingResponse(
+                store.stream(ref),
+                media_type=media_type,
+                headers={
+                    "Content-Disposition": content_disposition(filename),
+                    "Content-Length": str(info.length)
+                }
+            )
+
+        if kind == KIND_RENDER:
+            from pdf_cache_service import pdf_render_cache
+            data = await pdf_render_cache.get(ref)
+            if data is None:
+                raise HTTPException(status_code=410, detail="Download link has expired, please generate the file again")
+            return file_response(data, filename, media_type)
+
+        if kind == KIND_GENERATED:
+            from generated_artifact_store import generated_artifact_store
+            artifact = await generated_artifact_store.resolve(ref)
+            if not artifact:
+                raise HTTPException(status_code=404, detail="File not found")
+            return FileResponse(
+                path=artifact["file_path"],
+                media_type=media_type,
+                headers={"Content-Disposition": content_disposition(filename)}
+            )
+
+        raise HTTPException(status_code=410, detail="Download link is invalid or has expired")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error serving signed download: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,438 @@
+"""
+Email Outbox - Mongo-backed queue for transactional email
+
+Routes and scheduler jobs render a message and call
+`email_service.queue_email(...)`, which inserts it into `email_outbox` and a
+matching `email_logs` entry with status "queued", and returns at once; SMTP
+time is no longer part of the request.
+
+Delivery workers (EMAIL_OUTBOX_WORKERS per API process, so at most that many
+SMTP conversations at a time) claim messages atomically with
+find_one_and_update and send them through the pooled SMTP transport:
+
+- rate limits: messages to one provider (SMTP host) are spaced to
+  EMAIL_RATE_LIMITS, e.g. "smtp.office365.com=30,smtp.gmail.com=20" messages
+  per minute, EMAIL_DEFAULT_RATE_PER_MINUTE for other hosts
+- retries: temporary failures (connection errors, 4xx replies, SMTP not
+  configured) are retried after EMAIL_RETRY_BASE_SECONDS, doubling on each
+  attempt up to EMAIL_RETRY_MAX_SECONDS, for EMAIL_MAX_ATTEMPTS attempts;
+  refused recipients and other 5xx replies fail at once
+- leases: a message whose worker died is claimed again once its lease lapses
+
+Each state change is written back to the message's `email_logs` entry
+(queued, retrying, sent, failed). Delivered and failed messages are removed
+by a TTL index EMAIL_OUTBOX_RETENTION_HOURS later; the log entry stays.
+"""
+import asyncio
+import logging
+import os
+import random
+import smtplib
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable via environment)
+EMAIL_OUTBOX_WORKERS = int(os.environ.get("EMAIL_OUTBOX_WORKERS", 4))
+EMAIL_OUTBOX_POLL_SECONDS = float(os.environ.get("EMAIL_OUTBOX_POLL_SECONDS", 5))
+EMAIL_OUTBOX_LEASE_SECONDS = int(os.environ.get("EMAIL_OUTBOX_LEASE_SECONDS", 120))
+EMAIL_MAX_ATTEMPTS = int(os.environ.get("EMAIL_MAX_ATTEMPTS", 6))
+EMAIL_RETRY_BASE_SECONDS = float(os.environ.get("EMAIL_RETRY_BASE_SECONDS", 30))
+EMAIL_RETRY_MAX_SECONDS = float(os.environ.get("EMAIL_RETRY_MAX_SECONDS", 3600))
+EMAIL_OUTBOX_RETENTION_HOURS = float(os.environ.get("EMAIL_OUTBOX_RETENTION_HOURS", 72))
+EMAIL_DEFAULT_RATE_PER_MINUTE = float(os.environ.get("EMAIL_DEFAULT_RATE_PER_MINUTE", 60))
+EMAIL_RATE_LIMITS = os.environ.get("EMAIL_RATE_LIMITS", "smtp.office365.com=30")
+
+EMAIL_QUEUED = "queued"
+EMAIL_SENDING = "sending"
+EMAIL_SENT = "sent"
+EMAIL_FAILED = "failed"
+EMAIL_STATUSES = (EMAIL_QUEUED, EMAIL_SENDING, EMAIL_SENT, EMAIL_FAILED)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def parse_rate_limits(value: str) -> Dict[str, float]:
+    limits = {}
+    for item in value.split(","):
+        host, _, rate = item.partition("=")
+        if host.strip() and rate.strip():
+            limits[host.strip().lower()] = float(rate)
+    return limits
+
+
+def permanent_failure(error: BaseException) -> bool:
+    # Failing the same way on every attempt; authentication and sender
+    # errors are left to retry since an admin can fix the SMTP settings
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, (smtplib.SMTPAuthenticationError, smtplib.SMTPSenderRefused)):
+        return False
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before attempt `attempts + 1`: exponential with 10% jitter"""
+    delay = min(EMAIL_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), EMAIL_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.9, 1.1)
+
+
+class ProviderRateLimiter:
+    """Spaces sends per provider to its messages-per-minute limit (per process)"""
+
+    def __init__(self, limits: Dict[str, float], default_per_minute: float):
+        self.limits = limits
+        self.default_per_minute = default_per_minute
+        self._next_slot: Dict[str, float] = {}
+        self.waited_seconds = 0.0
+
+    def per_minute(self, provider: str) -> float:
+        return self.limits.get(provider, self.default_per_minute)
+
+    async def acquire(self, provider: str):
+        rate = self.per_minute(provider)
+        if rate <= 0:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(provider, now))
+        self._next_slot[provider] = slot + 60.0 / rate
+        if slot > now:
+            self.waited_seconds += slot - now
+            await asyncio.sleep(slot - now)
+
+
+class EmailOutbox:
+    def __init__(self, workers: int = EMAIL_OUTBOX_WORKERS):
+        self.db = None
+        self.workers = workers
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.rate_limiter = ProviderRateLimiter(parse_rate_limits(EMAIL_RATE_LIMITS), EMAIL_DEFAULT_RATE_PER_MINUTE)
+        self._tasks = []
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._sending = 0
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "retried": 0}
+
+    def set_db(self, database):
+        self.db = database
+
+    async def ensure_indexes(self):
+        await self.db.email_outbox.create_index("id", unique=True)
+        await self.db.email_outbox.create_index([("status", 1), ("run_after", 1)])
+        await self.db.email_outbox.create_index("expires_at", expireAfterSeconds=0)
+        await self.db.email_logs.create_index("id")
+
+    # ---------- enqueueing ----------
+
+    def _message(
+        self,
+        to_email: str,
+        subject: str,
+        html_body: str,
+        text_body: Optional[str],
+        cc: Optional[List[str]],
+        bcc: Optional[List[str]],
+        email_type: str,
+        log: Optional[Dict[str, Any]],
+        now: datetime
+    ):
+        log_id = str(uuid.uuid4())
+        message = {
+            "id": str(uuid.uuid4()),
+            "log_id": log_id,
+            "type": email_type,
+            "status": EMAIL_QUEUED,
+            "to_email": to_email,
+            "cc": cc or [],
+            "bcc": bcc or [],
+            "subject": subject,
+            "html_body": html_body,
+            "text_body": text_body,
+            "attempts": 0,
+            "last_error": None,
+            "created_at": now,
+            "run_after": now,
+            "sent_at": None
+        }
+        log_entry = {
+            **(log or {}),
+            "id": log_id,
+            "outbox_id": message["id"],
+            "type": email_type,
+            "to_email": to_email,
+            "subject": subject,
+            "status": EMAIL_QUEUED,
+            "attempts": 0,
+            "queued_at": now
+        }
+        return message, log_entry
+
+    async def enqueue(
+        self,
+        to_email: str,
+        subject: str,
+        html_body: str,
+        text_body: Optional[str] = None,
+        cc: Optional[List[str]] = None,
+        bcc: Optional[List[str]] = None,
+        email_type: str = "transactional",
+        log: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        Queue a rendered message. `log` holds extra fields for its email_logs
+        entry (invoice_id, reseller_id, sent_by, ...). Returns the outbox ID.
+        """
+        message, log_entry = self._message(to_email, subject, html_body, text_body, cc, bcc, email_type, log, _now())
+        await self.db.email_logs.insert_one(log_entry)
+        await self.db.email_outbox.insert_one(message)
+        self.stats["queued"] += 1
+        self._wake.set()
+        return message["id"]
+
+    async def enqueue_many(self, messages: List[Dict[str, Any]]) -> List[str]:
+        """Queue many messages at once; each dict takes the arguments of `enqueue`"""
+        if not messages:
+            return []
+        now = _now()
+        built = [
+            self._message(
+                m["to_email"], m["subject"], m["html_body"], m.get("text_body"), m.get("cc"), m.get("bcc"),
+                m.get("email_type", "transactional"), m.get("log"), now
+            )
+            for m in messages
+        ]
+        await self.db.email_logs.insert_many([log_entry for _, log_entry in built], ordered=False)
+        await self.db.email_outbox.insert_many([message for message, _ in built], ordered=False)
+        self.stats["queued"] += len(built)
+        self._wake.set()
+        return [message["id"] for message, _ in built]
+
+    # ---------- delivery ----------
+
+    async def claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest due message (or one whose worker's lease lapsed)"""
+        now = _now()
+        return await self.db.email_outbox.find_one_and_update(
+            {"$or": [
+                {"status": EMAIL_QUEUED, "run_after": {"$lte": now}},
+                {"status": EMAIL_SENDING, "lease_until": {"$lt": now}}
+            ]},
+            {
+                "$set": {
+                    "status": EMAIL_SENDING,
+                    "lease_id": uuid.uuid4().hex,
+                    "lease_until": now + timedelta(seconds=EMAIL_OUTBOX_LEASE_SECONDS),
+                    "worker_id": self.worker_id
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("run_after", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _finish(self, message: Dict[str, Any], update: Dict[str, Any], log_update: Dict[str, Any]) -> bool:
+        # Only the current lease holder may finish a message
+        result = await self.db.email_outbox.update_one(
+            {"id": message["id"], "lease_id": message["lease_id"]},
+            {"$set": update, "$unset": {"lease_id": "", "lease_until": ""}}
+        )
+        if result.modified_count != 1:
+            return False
+        await self.db.email_logs.update_one(
+            {"id": message["log_id"]},
+            {"$set": {**log_update, "attempts": message["attempts"]}}
+        )
+        return True
+
+    async def deliver(self, message: Dict[str, Any]):
+        """Send a claimed message and record the outcome"""
+        from email_service import email_service
+
+        self._sending += 1
+        try:
+            provider = (email_service.smtp_host or "unconfigured").lower()
+            await self.rate_limiter.acquire(provider)
+            sent = await email_service.send_email(
+                message["to_email"],
+                message["subject"],
+                message["html_body"],
+                message.get("text_body"),
+                cc=message.get("cc") or None,
+                bcc=message.get("bcc") or None,
+                raise_exceptions=True
+            )
+            if not sent:
+                raise smtplib.SMTPException("Email service not configured")
+        except asyncio.CancelledError:
+            # Shutting down: hand the message back without using up an attempt
+            await self.db.email_outbox.update_one(
+                {"id": message["id"], "lease_id": message["lease_id"]},
+                {"$set": {"status": EMAIL_QUEUED}, "$unset": {"lease_id": "", "lease_until": ""}, "$inc": {"attempts": -1}}
+            )
+            raise
+        except Exception as e:
+            await self._fail(message, e)
+        else:
+            now = _now()
+            if await self._finish(
+                message,
+                {
+                    "status": EMAIL_SENT,
+                    "provider": provider,
+                    "sent_at": now,
+                    "expires_at": now + timedelta(hours=EMAIL_OUTBOX_RETENTION_HOURS)
+                },
+                {"status": EMAIL_SENT, "sent_at": now, "smtp_host": provider, "error": None}
+            ):
+                self.stats["sent"] += 1
+        finally:
+            self._sending -= 1
+
+    async def _fail(self, message: Dict[str, Any], error: BaseException):
+        error_text = str(error)[:500] or type(error).__name__
+        now = _now()
+        if not permanent_failure(error) and message["attempts"] < EMAIL_MAX_ATTEMPTS:
+            run_after = now + timedelta(seconds=retry_delay(message["attempts"]))
+            logger.warning(f"Email {message['id']} to {message['to_email']} attempt {message['attempts']} failed, retrying: {error_text[:200]}")
+            if await self._finish(
+                message,
+                {"status": EMAIL_QUEUED, "last_error": error_text, "run_after": run_after},
+                {"status": "retrying", "error": error_text, "next_attempt_at": run_after}
+            ):
+                self.stats["retried"] += 1
+            return
+
+        logger.error(f"Email {message['id']} to {message['to_email']} failed: {error_text[:200]}")
+        if await self._finish(
+            message,
+            {
+                "status": EMAIL_FAILED,
+                "last_error": error_text,
+                "failed_at": now,
+                "expires_at": now + timedelta(hours=EMAIL_OUTBOX_RETENTION_HOURS)
+            },
+            {"status": EMAIL_FAILED, "error": error_text, "failed_at": now}
+        ):
+            self.stats["failed"] += 1
+
+    async def _work(self):
+        # Checked as well as cancellation: wait_for() can swallow a cancel
+        # that arrives together with a wake-up
+        while not self._stopping:
+            # Cleared before claiming so a message queued meanwhile is not missed
+            self._wake.clear()
+            try:
+                message = await self.claim()
+            except Exception as e:
+                logger.error(f"Failed to claim outbox email: {str(e)}")
+                message = None
+            if message is not None:
+                await self.deliver(message)
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=EMAIL_OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, workers: Optional[int] = None):
+        """Start the delivery workers in the running event loop"""
+        if self._tasks:
+            return
+        self._stopping = False
+        count = self.workers if workers is None else workers
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(count)]
+        if count:
+            logger.info(f"Email outbox workers started: {count} ({self.worker_id})")
+
+    async def shutdown(self):
+        self._stopping = True
+        self._wake.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ---------- admin ----------
+
+    async def retry(self, message_id: str) -> bool:
+        """Queue a failed message again with a fresh set of attempts"""
+        now = _now()
+        message = await self.db.email_outbox.find_one_and_update(
+            {"id": message_id, "status": EMAIL_FAILED},
+            {
+                "$set": {"status": EMAIL_QUEUED, "attempts": 0, "run_after": now},
+                "$unset": {"expires_at": "", "failed_at": ""}
+            },
+            projection={"_id": 0, "log_id": 1}
+        )
+        if message is None:
+            return False
+        await self.db.email_logs.update_one(
+            {"id": message["log_id"]},
+            {"$set": {"status": EMAIL_QUEUED, "queued_at": now}, "$unset": {"failed_at": ""}}
+        )
+        self._wake.set()
+        return True
+
+    async def queue_summary(self, recent_failures: int = 20) -> Dict[str, Any]:
+        """Queue depth per status, age of the oldest waiting message and recent failures"""
+        now = _now()
+        counts = {status: await self.db.email_outbox.count_documents({"status": status}) for status in EMAIL_STATUSES}
+        retrying = await self.db.email_outbox.count_documents({"status": EMAIL_QUEUED, "attempts": {"$gt": 0}})
+        due = await self.db.email_outbox.count_documents({"status": EMAIL_QUEUED, "run_after": {"$lte": now}})
+
+        def age(doc, field):
+            if not doc or not doc.get(field):
+                return None
+            value = doc[field]
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=timezone.utc)
+            return round((now - value).total_seconds(), 1)
+
+        oldest = await self.db.email_outbox.find_one(
+            {"status": {"$in": [EMAIL_QUEUED, EMAIL_SENDING]}},
+            {"_id": 0, "created_at": 1},
+            sort=[("created_at", 1)]
+        )
+        oldest_due = await self.db.email_outbox.find_one(
+            {"status": EMAIL_QUEUED, "run_after": {"$lte": now}},
+            {"_id": 0, "run_after": 1},
+            sort=[("run_after", 1)]
+        )
+        failures = await self.db.email_outbox.find(
+            {"status": EMAIL_FAILED},
+            {"_id": 0, "id": 1, "type": 1, "to_email": 1, "subject": 1, "attempts": 1, "last_error": 1, "failed_at": 1}
+        ).sort("failed_at", -1).limit(recent_failures).to_list(recent_failures)
+
+        return {
+            "depth": counts[EMAIL_QUEUED] + counts[EMAIL_SENDING],
+            "by_status": counts,
+            "due": due,
+            "retrying": retrying,
+            "oldest_pending_age_seconds": age(oldest, "created_at"),
+            "oldest_due_wait_seconds": age(oldest_due, "run_after"),
+            "recent_failures": failures,
+            "workers": self.get_stats()
+        }
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "workers": len(self._tasks),
+            "sending": self._sending,
+            "max_attempts": EMAIL_MAX_ATTEMPTS,
+            "rate_limits_per_minute": {**self.rate_limiter.limits, "default": self.rate_limiter.default_per_minute},
+            "rate_limit_wait_seconds": round(self.rate_limiter.waited_seconds, 1)
+        }
+
+
+# Global instance
+email_outbox = EmailOutbox()
@@ -1,12 +1,14 @@
 import smtplib
-import ssl
 import logging
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 from datetime import datetime
 import os
 
+from smtp_transport import SMTPConfig, smtp_transport
+from email_template_cache import email_template_cache
+
 logger = logging.getLogger(__name__)
 
 
@@ -26,6 +28,7 @@ class EmailService:
     def set_db(self, db):
         """Set the database reference for template lookups"""
         self._db = db
+        email_template_cache.set_db(db)
         logger.info("Email service database reference set")
     
     def configure(self, settings: Dict):
@@ -45,28 +48,12 @@ class EmailService:
         else:
             logger.warning("Email service not fully configured")
     
-    async def get_custom_template(self, template_id: str) -> Optional[Dict]:
-        """Fetch a custom email template from the database"""
-        if not self._db:
-            return None
-        
-        try:
-            template = await self._db.email_templates.find_one(
-                {"template_id": template_id, "is_active": {"$ne": False}},
-                {"_id": 0}
-            )
-            return template
-        except Exception as e:
-            logger.error(f"Error fetching email template {template_id}: {e}")
-            return None
-    
-    def replace_variables(self, text: str, variables: Dict) -> str:
-        """Replace {{variable}} placeholders in text with actual values"""
-        if not text:
-            return text
-        for key, value in variables.items():
-            text = text.replace(f"{{{{{key}}}}}", str(value) if value else "")
-        return text
+    def smtp_config(self, timeout: Optional[float] = None) -> SMTPConfig:
+        """Connection settings of the configured SMTP account"""
+        config = SMTPConfig(self.smtp_host, self.smtp_port, self.smtp_user, self.smtp_password, self.encryption)
+        if timeout is not None:
+            config.timeout = timeout
+        return config
     
     async def send_email(
         self,
@@ -126,24 +113,8 @@ class EmailService:
             if bcc:
                 recipients.extend(bcc)
             
-            # Connect and send based on encryption type
-            if self.encryption == 'ssl':
-                # Use SMTP_SSL for port 465
-                context = ssl.create_default_context()
-                with smtplib.SMTP_SSL(self.smtp_host, self.smtp_port, context=context, timeout=30) as server:
-                    server.login(self.smtp_user, self.smtp_password)
-                    server.sendmail(self.from_email, recipients, msg.as_string())
-            elif self.encryption == 'tls':
-                # Use SMTP with STARTTLS for port 587
-                with smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=30) as server:
-                    server.starttls()
-                    server.login(self.smtp_user, self.smtp_password)
-                    server.sendmail(self.from_email, recipients, msg.as_string())
-            else:
-                # No encryption
-                with smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=30) as server:
-                    server.login(self.smtp_user, self.smtp_password)
-                    server.sendmail(self.from_email, recipients, msg.as_string())
+            # Pooled connection, sent off the event loop
+            await smtp_transport.send(self.smtp_config(), self.from_email, recipients, msg)
             
             logger.info(f"Email sent to {to_email}: {subject}")
             return True
@@ -179,6 +150,35 @@ class EmailService:
                 raise
             return False
     
+    async def queue_email(
+        self,
+        to_email: str,
+        subject: str,
+        html_body: str,
+        text_body: Optional[str] = None,
+        cc: Optional[List[str]] = None,
+        bcc: Optional[List[str]] = None,
+        email_type: str = "transactional",
+        log: Optional[Dict] = None
+    ) -> bool:
+        """Queue an email for background delivery (see email_outbox)
+        
+        Returns False without queueing when SMTP is not configured, like
+        send_email; delivery failures are retried and recorded in email_logs.
+        """
+        from email_outbox import email_outbox
+        
+        if not self.is_configured:
+            logger.error("Email service not configured")
+            return False
+        
+        try:
+            await email_outbox.enqueue(to_email, subject, html_body, text_body, cc, bcc, email_type, log)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to queue email to {to_email}: {str(e)}")
+            return False
+    
     async def send_invoice_reminder(
         self,
         to_email: str,
@@ -187,9 +187,15 @@ class EmailService:
         amount: str,
         due_date: str,
         payment_link: str,
-        is_overdue: bool = False
+        is_overdue: bool = False,
+        queue: bool = True,
+        log: Optional[Dict] = None
     ) -> bool:
-        """Send invoice payment reminder email"""
+        """Send invoice payment reminder email
+        
+        Queued for background delivery unless `queue` is False, in which case
+        it is sent at once and SMTP exceptions are raised to the caller.
+        """
         
         if is_overdue:
             subject = f"OVERDUE: Invoice {invoice_number} - Payment Required"
@@ -275,7 +281,9 @@ class EmailService:
         The UpShift Team
         """
         
-        return await self.send_email(to_email, subject, html_body, text_body)
+        if not queue:
+            return await self.send_email(to_email, subject, html_body, text_body)
+        return await self.queue_email(to_email, subject, html_body, text_body, email_type="invoice_reminder", log=log)
     
     async def send_invoice_created(
         self,
@@ -285,10 +293,23 @@ class EmailService:
         amount: str,
         period: str,
         due_date: str,
-        payment_link: str
+        payment_link: str,
+        log: Optional[Dict] = None
     ) -> bool:
         """Send new invoice notification email"""
-        
+        subject, html_body = self.render_invoice_created(reseller_name, invoice_number, amount, period, due_date, payment_link)
+        return await self.queue_email(to_email, subject, html_body, email_type="invoice_created", log=log)
+    
+    def render_invoice_created(
+        self,
+        reseller_name: str,
+        invoice_number: str,
+        amount: str,
+        period: str,
+        due_date: str,
+        payment_link: str
+    ) -> Tuple[str, str]:
+        """Subject and HTML body of the new invoice notification"""
         subject = f"New Invoice: {invoice_number} for {period}"
         
         html_body = f"""
@@ -340,7 +361,7 @@ class EmailService:
         </html>
         """
         
-        return await self.send_email(to_email, subject, html_body)
+        return subject, html_body
     
     async def send_booking_confirmation(
         self,
@@ -350,7 +371,8 @@ class EmailService:
         booking_time: str,
         meeting_link: str,
         amount: str,
-        company_name: str = "UpShift"
+        company_name: str = "UpShift",
+        log: Optional[Dict] = None
     ) -> bool:
         """Send booking confirmation email after successful payment"""
         subject = f"Your Strategy Call is Confirmed! - {company_name}"
@@ -425,7 +447,7 @@ class EmailService:
         </html>
         """
         
-        return await self.send_email(to_email, subject, html_body)
+        return await self.queue_email(to_email, subject, html_body, email_type="booking_confirmation", log=log)
     
     async def send_welcome_email(
         self,
@@ -519,7 +541,11 @@ If you have any questions, feel free to reach out to our support team.
 © {datetime.now().year} {platform_name}
         """
         
-        return await self.send_email(to_email, subject, html_body, text_body, raise_exceptions=False)
+        return await self.queue_email(to_email, subject, html_body, text_body, email_type="welcome")
+    
+    async def send_generic_email(self, to_email: str, subject: str, message: str) -> bool:
+        """Send a notification whose HTML body the caller has already rendered"""
+        return await self.queue_email(to_email, subject, message, email_type="generic")
     
     async def test_connection(self) -> Dict:
         """Test SMTP connection"""
@@ -527,9 +553,7 @@ If you have any questions, feel free to reach out to our support team.
             return {"success": False, "error": "Email service not configured"}
         
         try:
-            with smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=10) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
+            await smtp_transport.verify(self.smtp_config(timeout=10))
             return {"success": True, "message": "SMTP connection successful"}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -595,7 +619,7 @@ If you have any questions, feel free to reach out to our support team.
         </html>
         """
         
-        return await self.send_email(to_email, subject, html_body, raise_exceptions=False)
+        return await self.queue_email(to_email, subject, html_body, email_type="proposal_accepted")
     
     async def send_contract_created_email(
         self,
@@ -613,7 +637,7 @@ If you have any questions, feel free to reach out to our support team.
         platform_name = self.platform_name or platform_name
         
         # Check for custom template
-        custom_template = await self.get_custom_template("contract_created")
+        custom_template = await email_template_cache.get("contract_created")
         
         variables = {
             "platform_name": platform_name,
@@ -627,14 +651,14 @@ If you have any questions, feel free to reach out to our support team.
         }
         
         # Use custom subject if available
-        if custom_template and custom_template.get("subject"):
-            subject = self.replace_variables(custom_template["subject"], variables)
+        if custom_template and custom_template.subject:
+            subject = custom_template.render_subject(variables)
         else:
             subject = f"📄 New Contract: {contract_title} - Review Required"
         
         # Use custom body if available
-        if custom_template and custom_template.get("body_html"):
-            html_body = self.replace_variables(custom_template["body_html"], variables)
+        if custom_template and custom_template.body_html:
+            html_body = custom_template.render_body(variables)
         else:
             html_body = f"""
             <!DOCTYPE html>
@@ -685,7 +709,7 @@ If you have any questions, feel free to reach out to our support team.
             </html>
             """
         
-        return await self.send_email(to_email, subject, html_body, raise_exceptions=False)
+        return await self.queue_email(to_email, subject, html_body, email_type="contract_created")
     
     async def send_contract_signed_email(
         self,
@@ -744,7 +768,7 @@ If you have any questions, feel free to reach out to our support team.
         </html>
         """
         
-        return await self.send_email(to_email, subject, html_body, raise_exceptions=False)
+        return await self.queue_email(to_email, subject, html_body, email_type="contract_signed")
     
     async def send_milestone_funded_email(
         self,
@@ -761,7 +785,7 @@ If you have any questions, feel free to reach out to our support team.
         platform_name = self.platform_name or platform_name
         
         # Check for custom template
-        custom_template = await self.get_custom_template("milestone_funded")
+        custom_template = await email_template_cache.get("milestone_funded")
         
         # Determine currency from amount string or default
         currency = "USD"
@@ -784,8 +808,8 @@ If you have any questions, feel free to reach out to our support team.
             message = f"Your payment for milestone <strong>'{milestone_title}'</strong> was successful. The funds are now held in escrow and will be released when you approve the contractor's work."
         
         # Use custom subject if available
-        if custom_template and custom_template.get("subject"):
-            subject = self.replace_variables(custom_template["subject"], variables)
+        if custom_template and custom_template.subject:
+            subject = custom_template.render_subject(variables)
         else:
             if is_contractor:
                 subject = f"💰 Milestone Funded: {milestone_title}"
@@ -793,8 +817,8 @@ If you have any questions, feel free to reach out to our support team.
                 subject = f"✅ Payment Successful: {milestone_title}"
         
         # Use custom body if available
-        if custom_template and custom_template.get("body_html"):
-            html_body = self.replace_variables(custom_template["body_html"], variables)
+        if custom_template and custom_template.body_html:
+            html_body = custom_template.render_body(variables)
         else:
             html_body = f"""
             <!DOCTYPE html>
@@ -840,7 +864,7 @@ If you have any questions, feel free to reach out to our support team.
             </html>
             """
         
-        return await self.send_email(to_email, subject, html_body, raise_exceptions=False)
+        return await self.queue_email(to_email, subject, html_body, email_type="milestone_funded")
     
     async def send_payment_released_email(
         self,
@@ -856,7 +880,7 @@ If you have any questions, feel free to reach out to our support team.
         platform_name = self.platform_name or platform_name
         
         # Check for custom template
-        custom_template = await self.get_custom_template("payment_released")
+        custom_template = await email_template_cache.get("payment_released")
         
         # Determine currency from amount string or default
         currency = "USD"
@@ -874,14 +898,14 @@ If you have any questions, feel free to reach out to our support team.
         }
         
         # Use custom subject if available
-        if custom_template and custom_template.get("subject"):
-            subject = self.replace_variables(custom_template["subject"], variables)
+        if custom_template and custom_template.subject:
+            subject = custom_template.render_subject(variables)
         else:
             subject = f"💸 Payment Released: {amount} - {milestone_title}"
         
         # Use custom body if available
-        if custom_template and custom_template.get("body_html"):
-            html_body = self.replace_variables(custom_template["body_html"], variables)
+        if custom_template and custom_template.body_html:
+            html_body = custom_template.render_body(variables)
         else:
             html_body = f"""
             <!DOCTYPE html>
@@ -936,7 +960,7 @@ If you have any questions, feel free to reach out to our support team.
             </html>
             """
         
-        return await self.send_email(to_email, subject, html_body, raise_exceptions=False)
+        return await self.queue_email(to_email, subject, html_body, email_type="payment_released")
     
     async def send_new_proposal_notification_email(
         self,
@@ -958,7 +982,7 @@ If you have any questions, feel free to reach out to our support team.
             cover_letter_preview = cover_letter_preview[:200] + "..."
         
         # Check for custom template
-        custom_template = await self.get_custom_template("new_proposal")
+        custom_template = await email_template_cache.get("new_proposal")
         
         variables = {
             "platform_name": platform_name,
@@ -972,14 +996,14 @@ If you have any questions, feel free to reach out to our support team.
         }
         
         # Use custom subject if available
-        if custom_template and custom_template.get("subject"):
-            subject = self.replace_variables(custom_template["subject"], variables)
+        if custom_template and custom_template.subject:
+            subject = custom_template.render_subject(variables)
         else:
             subject = f"📬 New Proposal: {job_title}"
         
         # Use custom body if available
-        if custom_template and custom_template.get("body_html"):
-            html_body = self.replace_variables(custom_template["body_html"], variables)
+        if custom_template and custom_template.body_html:
+            html_body = custom_template.render_body(variables)
         else:
             html_body = f"""
             <!DOCTYPE html>
@@ -1037,7 +1061,7 @@ If you have any questions, feel free to reach out to our support team.
             </html>
             """
         
-        return await self.send_email(to_email, subject, html_body, raise_exceptions=False)
+        return await self.queue_email(to_email, subject, html_body, email_type="new_proposal_notification")
 
     async def send_employer_welcome_email(
         self,
@@ -1052,7 +1076,7 @@ If you have any questions, feel free to reach out to our support team.
         login_url = login_url or "https://upshift.works/login"
         
         # Check for custom template
-        custom_template = await self.get_custom_template("employer_welcome")
+        custom_template = await email_template_cache.get("employer_welcome")
         
         variables = {
             "platform_name": platform_name,
@@ -1064,14 +1088,14 @@ If you have any questions, feel free to reach out to our support team.
         }
         
         # Use custom subject if available
-        if custom_template and custom_template.get("subject"):
-            subject = self.replace_variables(custom_template["subject"], variables)
+        if custom_template and custom_template.subject:
+            subject = custom_template.render_subject(variables)
         else:
             subject = f"Welcome to {platform_name} - Your Employer Account"
         
         # Use custom body if available
-        if custom_template and custom_template.get("body_html"):
-            html_body = self.replace_variables(custom_template["body_html"], variables)
+        if custom_template and custom_template.body_html:
+            html_body = custom_template.render_body(variables)
         else:
             html_body = f"""
             <!DOCTYPE html>
@@ -1141,7 +1165,7 @@ If you have any questions, feel free to reach out to our support team.
             </html>
             """
         
-        return await self.send_email(to_email, subject, html_body, raise_exceptions=False)
+        return await self.queue_email(to_email, subject, html_body, email_type="employer_welcome")
 
     async def send_employer_password_reset_email(
         self,
@@ -1198,7 +1222,7 @@ If you have any questions, feel free to reach out to our support team.
         </html>
         """
         
-        return await self.send_email(to_email, subject, html_body, raise_exceptions=False)
+        return await self.queue_email(to_email, subject, html_body, email_type="employer_password_reset")
 
     async def send_employer_suspended_email(
         self,
@@ -1260,7 +1284,7 @@ If you have any questions, feel free to reach out to our support team.
         </html>
         """
         
-        return await self.send_email(to_email, subject, html_body, raise_exceptions=False)
+        return await self.queue_email(to_email, subject, html_body, email_type="employer_suspended")
 
     async def send_employer_reactivated_email(
         self,
@@ -1325,7 +1349,7 @@ If you have any questions, feel free to reach out to our support team.
         </html>
         """
         
-        return await self.send_email(to_email, subject, html_body, raise_exceptions=False)
+        return await self.queue_email(to_email, subject, html_body, email_type="employer_reactivated")
 
     async def send_employer_subscription_update_email(
         self,
@@ -1398,7 +1422,7 @@ If you have any questions, feel free to reach out to our support team.
         </html>
         """
         
-        return await self.send_email(to_email, subject, html_body, raise_exceptions=False)
+        return await self.queue_email(to_email, subject, html_body, email_type="employer_subscription_update")
 
 # Global instance
 email_service = EmailService()
@@ -0,0 +1,174 @@
+"""
+Email Template Cache - Compiled, in-memory copies of admin-customised templates
+
+Super admins override the subject and HTML body of platform emails through
+email_templates_routes; the overrides live in `email_templates`. Sending an
+email used to fetch the override from Mongo and substitute each
+{{variable}} with its own str.replace pass over the whole body.
+
+Overrides are now compiled once into Jinja2 templates (sandboxed, since they
+are edited through the API) and kept in memory keyed by template_id and the
+document's `version`, which every PUT increments:
+
+- PUT and DELETE in email_templates_routes invalidate the entry at once
+- other API processes notice within EMAIL_TEMPLATE_CACHE_TTL_SECONDS, when
+  the cached version is compared with the stored one (a projected find_one);
+  an unchanged template is not recompiled
+- "no override" is cached too, so most sends skip Mongo entirely
+
+Subjects render without escaping; values substituted into HTML bodies are
+HTML-escaped. Missing variables and None render as empty strings.
+"""
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from jinja2 import TemplateSyntaxError
+from jinja2.sandbox import SandboxedEnvironment
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable via environment)
+EMAIL_TEMPLATE_CACHE_TTL_SECONDS = float(os.environ.get("EMAIL_TEMPLATE_CACHE_TTL_SECONDS", 60))
+
+
+def _finalize(value: Any) -> Any:
+    return "" if value is None else value
+
+
+_text_env = SandboxedEnvironment(autoescape=False, keep_trailing_newline=True, finalize=_finalize)
+_html_env = SandboxedEnvironment(autoescape=True, keep_trailing_newline=True, finalize=_finalize)
+
+
+def compile_template(source: Optional[str], html: bool = False):
+    """Compile a template string; None for an empty one. Raises TemplateSyntaxError."""
+    if not source:
+        return None
+    return (_html_env if html else _text_env).from_string(source)
+
+
+def render_string(source: Optional[str], variables: Dict[str, Any], html: bool = False) -> Optional[str]:
+    """Render a one-off template string (defaults and previews of unsaved text)"""
+    template = compile_template(source, html)
+    return template.render(variables) if template else source
+
+
+def template_version(document: Optional[Dict]) -> Optional[int]:
+    """Version of a stored override (templates saved before versioning count as 0)"""
+    return None if document is None else int(document.get("version") or 0)
+
+
+@dataclass
+class CompiledEmailTemplate:
+    """A stored override, compiled; subject and body_html are None when not customised"""
+    template_id: str
+    version: int
+    is_active: bool
+    subject: Any = None
+    body_html: Any = None
+
+    def render_subject(self, variables: Dict[str, Any]) -> Optional[str]:
+        return self.subject.render(variables) if self.subject else None
+
+    def render_body(self, variables: Dict[str, Any]) -> Optional[str]:
+        return self.body_html.render(variables) if self.body_html else None
+
+
+class EmailTemplateCache:
+    """Compiled email template overrides keyed by template_id and version"""
+
+    def __init__(self, ttl_seconds: float = EMAIL_TEMPLATE_CACHE_TTL_SECONDS):
+        self.db = None
+        self.ttl_seconds = ttl_seconds
+        # template_id -> (checked_at, compiled override or None when not customised)
+        self._entries: Dict[str, Tuple[float, Optional[CompiledEmailTemplate]]] = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "revalidated": 0,
+            "compiled": 0,
+            "invalidations": 0,
+            "compile_errors": 0
+        }
+
+    def set_db(self, database):
+        self.db = database
+
+    def invalidate(self, template_id: Optional[str] = None):
+        """Drop one template (or all) so the next send reloads it"""
+        if template_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(template_id, None)
+        self._stats["invalidations"] += 1
+
+    def _compile(self, document: Dict) -> Optional[CompiledEmailTemplate]:
+        template_id = document["template_id"]
+        try:
+            compiled = CompiledEmailTemplate(
+                template_id=template_id,
+                version=template_version(document),
+                is_active=document.get("is_active", True) is not False,
+                subject=compile_template(document.get("subject")),
+                body_html=compile_template(document.get("body_html"), html=True)
+            )
+        except TemplateSyntaxError as e:
+            # Saved before templates were validated; send the built-in email instead
+            self._stats["compile_errors"] += 1
+            logger.error(f"Email template {template_id} does not compile (line {e.lineno}): {e.message}")
+            return None
+        self._stats["compiled"] += 1
+        return compiled
+
+    async def load(self, template_id: str) -> Optional[CompiledEmailTemplate]:
+        """Compiled override for a template, active or not; None when not customised"""
+        entry = self._entries.get(template_id)
+        now = time.monotonic()
+        if entry and now - entry[0] < self.ttl_seconds:
+            self._stats["hits"] += 1
+            return entry[1]
+        if self.db is None:
+            return None
+
+        try:
+            cached = entry[1] if entry else None
+            if cached is not None:
+                # Only recompile when the stored version moved on
+                current = await self.db.email_templates.find_one(
+                    {"template_id": template_id},
+                    {"_id": 0, "version": 1, "is_active": 1}
+                )
+                if current is not None and template_version(current) == cached.version:
+                    cached.is_active = current.get("is_active", True) is not False
+                    self._entries[template_id] = (now, cached)
+                    self._stats["revalidated"] += 1
+                    return cached
+
+            self._stats["misses"] += 1
+            document = await self.db.email_templates.find_one({"template_id": template_id}, {"_id": 0})
+        except Exception as e:
+            logger.error(f"Error fetching email template {template_id}: {e}")
+            return entry[1] if entry else None
+
+        compiled = self._compile(document) if document else None
+        self._entries[template_id] = (now, compiled)
+        return compiled
+
+    async def get(self, template_id: str) -> Optional[CompiledEmailTemplate]:
+        """Compiled override to send with; None when not customised or deactivated"""
+        compiled = await self.load(template_id)
+        return compiled if compiled and compiled.is_active else None
+
+    def get_stats(self) -> dict:
+        return {
+            **self._stats,
+            "cached": len(self._entries),
+            "customised": sum(1 for _, compiled in self._entries.values() if compiled),
+            "ttl_seconds": self.ttl_seconds
+        }
+
+
+# Global email template cache
+email_template_cache = EmailTemplateCache()
@@ -10,6 +10,10 @@ from datetime import datetime, timezone
 import uuid
 import logging
 
+from jinja2 import TemplateSyntaxError
+
+from email_template_cache import compile_template, email_template_cache, render_string
+
 logger = logging.getLogger(__name__)
 
 email_templates_router = APIRouter(prefix="/api/email-templates", tags=["Email Templates"])
@@ -236,6 +240,13 @@ def get_email_templates_routes(db, get_current_user):
                 "category": DEFAULT_TEMPLATES[template_id].get("category", "general")
             }
             
+            # Reject templates that would fail at send time
+            try:
+                compile_template(data.subject)
+                compile_template(data.body_html, html=True)
+            except TemplateSyntaxError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid template syntax on line {e.lineno}: {e.message}")
+            
             if data.subject is not None:
                 update_data["subject"] = data.subject
             if data.body_html is not None:
@@ -246,9 +257,10 @@ def get_email_templates_routes(db, get_current_user):
             # Upsert the template customization
             await db.email_templates.update_one(
                 {"template_id": template_id},
-                {"$set": update_data},
+                {"$set": update_data, "$inc": {"version": 1}},
                 upsert=True
             )
+            email_template_cache.invalidate(template_id)
             
             logger.info(f"Email template {template_id} updated by {current_user.email}")
             
@@ -273,6 +285,7 @@ def get_email_templates_routes(db, get_current_user):
                 raise HTTPException(status_code=404, detail="Template not found")
             
             result = await db.email_templates.delete_one({"template_id": template_id})
+            email_template_cache.invalidate(template_id)
             
             if result.deleted_count == 0:
                 return {"success": True, "message": "Template was already using defaults"}
@@ -301,27 +314,17 @@ def get_email_templates_routes(db, get_current_user):
             
             default = DEFAULT_TEMPLATES[template_id]
             
-            # Get customization
-            custom = await db.email_templates.find_one(
-                {"template_id": template_id},
-                {"_id": 0}
-            )
-            
-            # Use custom subject if available, otherwise default
-            subject = custom.get("subject") if custom else default["subject"]
-            
-            # Get preview data
+            # Same compiled template the emails are sent with
+            custom = await email_template_cache.load(template_id)
             preview_data = get_preview_data(template_id)
             
-            # Replace variables in subject
-            for var, value in preview_data.items():
-                subject = subject.replace(f"{{{{{var}}}}}", str(value))
+            # Use custom subject if available, otherwise default
+            subject = custom.render_subject(preview_data) if custom else None
+            if subject is None:
+                subject = render_string(default["subject"], preview_data)
             
             # If custom body exists, use it
-            body_html = custom.get("body_html") if custom else None
-            if body_html:
-                for var, value in preview_data.items():
-                    body_html = body_html.replace(f"{{{{{var}}}}}", str(value))
+            body_html = custom.render_body(preview_data) if custom else None
             
             return {
                 "success": True,
@@ -355,27 +358,21 @@ def get_email_templates_routes(db, get_current_user):
             
             default = DEFAULT_TEMPLATES[template_id]
             
-            # Get customization
-            custom = await db.email_templates.find_one(
-                {"template_id": template_id},
-                {"_id": 0}
-            )
+            # Same compiled template the emails are sent with
+            custom = await email_template_cache.load(template_id)
+            preview_data = get_preview_data(template_id)
             
             # Use custom subject if available
-            subject = custom.get("subject") if custom else default["subject"]
-            
-            # Get preview data and replace variables
-            preview_data = get_preview_data(template_id)
-            for var, value in preview_data.items():
-                subject = subject.replace(f"{{{{{var}}}}}", str(value))
+            subject = custom.render_subject(preview_data) if custom else None
+            if subject is None:
+                subject = render_string(default["subject"], preview_data)
             
             subject = f"[TEST] {subject}"
             
             # Generate body
-            body_html = custom.get("body_html") if custom else generate_default_body(template_id, preview_data)
-            if body_html:
-                for var, value in preview_data.items():
-                    body_html = body_html.replace(f"{{{{{var}}}}}", str(value))
+            body_html = custom.render_body(preview_data) if custom else None
+            if body_html is None:
+                body_html = render_string(generate_default_body(template_id, preview_data), preview_data, html=True)
             
             # Send test email
             result = await email_service.send_email(
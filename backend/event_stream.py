@@ -0,0 +1,78 @@
+"""
+Event Stream - Server-sent events for long AI generations
+
+Streaming endpoints build an async generator of `sse_event(...)` strings and
+return it through `event_stream_response`. The generator runs as its own
+task and feeds the response through a queue, so the generation finishes and
+its result is persisted even when the client disconnects halfway. While the
+model is thinking, comment lines keep proxies from closing the connection.
+
+Events sent by the AI endpoints:
+- start: the request was accepted
+- chunk: {"text": ...} a piece of generated text
+- section: {"section": ..., "content": ...} a finished section
+- section_failed: {"section": ..., "reason": ...} a section left as submitted
+- status: {"job_id": ..., "status": ...} a queued job changed state
+- done: the same payload the non-streaming endpoint returns
+- error: {"status_code": ..., "detail": ...}
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Any, AsyncIterator, Set
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
+
+# Generations whose client went away but that still have to finish
+_running: Set[asyncio.Task] = set()
+
+
+def sse_event(event: str, data: Any) -> str:
+    """One server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def event_stream_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """Stream `events` as text/event-stream; errors are sent as an `error` event"""
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for event in events:
+                await queue.put(event)
+        except HTTPException as e:
+            await queue.put(sse_event("error", {"status_code": e.status_code, "detail": e.detail}))
+        except Exception as e:
+            logger.error(f"Event stream error: {str(e)}")
+            await queue.put(sse_event("error", {"status_code": 500, "detail": str(e)}))
+        finally:
+            await queue.put(None)
+
+    task = asyncio.ensure_future(produce())
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+
+    async def consume():
+        # Sent at once so headers and the first byte do not wait for the model
+        yield ": connected\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                break
+            yield event
+
+    return StreamingResponse(
+        consume(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
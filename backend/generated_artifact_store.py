@@ -0,0 +1,290 @@
+"""
+Generated Artifact Store - Lifecycle management for template-generated CVs
+
+Files produced by CVTemplateService.generate_cv_from_template live under
+GENERATED_CV_PATH and are tracked in the `generated_artifacts` collection:
+- deduplication: artifacts are keyed by a content hash of the generation
+  inputs (template, output format, filled-in values); identical requests
+  reuse the stored file instead of regenerating it, and the file itself is
+  content-addressed so users generating the same output share one copy
+- TTL: unsaved artifacts expire after GENERATED_CV_TTL_HOURS of not being
+  accessed and are removed by a scheduler job; artifacts saved to a user's
+  documents are pinned until the document is deleted
+- quota: each user's unpinned artifacts are capped at GENERATED_CV_USER_QUOTA_BYTES,
+  evicting the least recently used ones first
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+GENERATED_CV_PATH = "/app/public/uploads/generated_cvs"
+GENERATED_CV_URL = "/uploads/generated_cvs"
+
+# Configuration (overridable via environment)
+GENERATED_CV_TTL_HOURS = float(os.environ.get("GENERATED_CV_TTL_HOURS", 24))
+GENERATED_CV_USER_QUOTA_BYTES = int(os.environ.get("GENERATED_CV_USER_QUOTA_BYTES", 50 * 1024 * 1024))
+GENERATED_CV_GC_BATCH = int(os.environ.get("GENERATED_CV_GC_BATCH", 500))
+
+MEDIA_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+}
+
+
+def make_artifact_hash(template: Dict[str, Any], output_format: str, replacements: Dict[str, str]) -> str:
+    """Content hash of everything that determines a generated file"""
+    payload = json.dumps(
+        {
+            "template_id": template.get("id"),
+            "template_file": template.get("filename"),
+            "format": output_format,
+            "values": replacements
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GeneratedArtifactStore:
+    def __init__(self, root: str = GENERATED_CV_PATH):
+        self.db = None
+        self.root = root
+        self.stats = {"hits": 0, "misses": 0, "quota_evictions": 0}
+
+    def set_db(self, database):
+        self.db = database
+
+    async def ensure_indexes(self):
+        await self.db.generated_artifacts.create_index("id", unique=True)
+        await self.db.generated_artifacts.create_index([("user_id", 1), ("content_hash", 1)])
+        await self.db.generated_artifacts.create_index([("pinned", 1), ("expires_at", 1)])
+        await self.db.generated_artifacts.create_index("path")
+
+    # ---------- paths ----------
+
+    def relative_path(self, content_hash: str, file_format: str) -> str:
+        return f"{content_hash[:2]}/{content_hash}.{file_format}"
+
+    def absolute_path(self, relative_path: str) -> str:
+        return os.path.join(self.root, relative_path)
+
+    def staging_path(self, suffix: str) -> str:
+        """Scratch location for a file that is about to be stored"""
+        staging_dir = os.path.join(self.root, "tmp")
+        os.makedirs(staging_dir, exist_ok=True)
+        return os.path.join(staging_dir, f"{uuid4()}{suffix}")
+
+    def _expiry(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(hours=GENERATED_CV_TTL_HOURS)
+
+    def to_result(self, artifact: Dict[str, Any]) -> Dict[str, Any]:
+        """Fields generate_cv_from_template returns for an artifact"""
+        return {
+            "document_id": artifact["id"],
+            "format": artifact["format"],
+            "file_path": self.absolute_path(artifact["path"]),
+            "file_url": f"{GENERATED_CV_URL}/{artifact['path']}",
+            "filename": artifact["filename"],
+            "file_size": artifact["size"]
+        }
+
+    # ---------- store / lookup ----------
+
+    async def find(self, user_id: Optional[str], content_hash: str, file_format: str) -> Optional[Dict[str, Any]]:
+        """A stored artifact for identical inputs, if its file still exists"""
+        artifact = await self.db.generated_artifacts.find_one(
+            {"user_id": user_id, "content_hash": content_hash, "format": file_format},
+            {"_id": 0}
+        )
+        if not artifact or not os.path.exists(self.absolute_path(artifact["path"])):
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        await self._touch(artifact)
+        return artifact
+
+    async def put(
+        self,
+        user_id: Optional[str],
+        content_hash: str,
+        file_format: str,
+        source_path: str,
+        filename: str,
+        template_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Move a freshly generated file into the store and index it"""
+        relative_path = self.relative_path(content_hash, file_format)
+        target = self.absolute_path(relative_path)
+        size = await asyncio.to_thread(self._move_into_place, source_path, target)
+
+        now = datetime.now(timezone.utc)
+        artifact = {
+            "id": str(uuid4()),
+            "user_id": user_id,
+            "content_hash": content_hash,
+            "format": file_format,
+            "template_id": template_id,
+            "path": relative_path,
+            "filename": filename,
+            "size": size,
+            "pinned": False,
+            "created_at": now,
+            "last_accessed_at": now,
+            "expires_at": self._expiry()
+        }
+        await self.db.generated_artifacts.insert_one(artifact)
+        artifact.pop("_id", None)
+
+        if user_id:
+            await self._enforce_quota(user_id, keep_id=artifact["id"])
+        return artifact
+
+    def _move_into_place(self, source_path: str, target: str) -> int:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.exists(target):
+            # Same content already stored (e.g. by another user)
+            os.remove(source_path)
+        else:
+            shutil.move(source_path, target)
+        return os.path.getsize(target)
+
+    async def _touch(self, artifact: Dict[str, Any]):
+        update = {"last_accessed_at": datetime.now(timezone.utc)}
+        if not artifact.get("pinned"):
+            update["expires_at"] = self._expiry()
+        await self.db.generated_artifacts.update_one({"id": artifact["id"]}, {"$set": update})
+
+    async def resolve(self, artifact_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Artifact record (with absolute file_path) for a download, or None"""
+        query = {"id": artifact_id}
+        if user_id is not None:
+            query["user_id"] = user_id
+        artifact = await self.db.generated_artifacts.find_one(query, {"_id": 0})
+        if not artifact:
+            return None
+        file_path = self.absolute_path(artifact["path"])
+        if not os.path.exists(file_path):
+            return None
+        await self._touch(artifact)
+        artifact["file_path"] = file_path
+        artifact["media_type"] = MEDIA_TYPES.get(artifact["format"], "application/octet-stream")
+        return artifact
+
+    async def pin(self, artifact_id: str, document_id: str):
+        """Keep an artifact for as long as a saved document references it"""
+        await self.db.generated_artifacts.update_one(
+            {"id": artifact_id},
+            {"$set": {"pinned": True, "expires_at": None}, "$addToSet": {"document_ids": document_id}}
+        )
+
+    async def unpin(self, artifact_id: str, document_id: str):
+        """Let an artifact expire normally once no saved document references it"""
+        await self.db.generated_artifacts.update_one({"id": artifact_id}, {"$pull": {"document_ids": document_id}})
+        await self.db.generated_artifacts.update_one(
+            {"id": artifact_id, "document_ids": {"$size": 0}},
+            {"$set": {"pinned": False, "expires_at": self._expiry()}}
+        )
+
+    # ---------- quota / garbage collection ----------
+
+    async def get_usage(self, user_id: str) -> Dict[str, int]:
+        pipeline = [
+            {"$match": {"user_id": user_id}},
+            {"$group": {
+                "_id": "$pinned",
+                "bytes": {"$sum": "$size"},
+                "count": {"$sum": 1}
+            }}
+        ]
+        usage = {"pinned_bytes": 0, "pinned_count": 0, "unpinned_bytes": 0, "unpinned_count": 0}
+        async for group in self.db.generated_artifacts.aggregate(pipeline):
+            prefix = "pinned" if group["_id"] else "unpinned"
+            usage[f"{prefix}_bytes"] = group["bytes"]
+            usage[f"{prefix}_count"] = group["count"]
+        usage["quota_bytes"] = GENERATED_CV_USER_QUOTA_BYTES
+        return usage
+
+    async def _enforce_quota(self, user_id: str, keep_id: str):
+        """Evict the user's least recently used unpinned artifacts over quota"""
+        usage = await self.get_usage(user_id)
+        excess = usage["unpinned_bytes"] - GENERATED_CV_USER_QUOTA_BYTES
+        if excess <= 0:
+            return
+        cursor = self.db.generated_artifacts.find(
+            {"user_id": user_id, "pinned": False, "id": {"$ne": keep_id}},
+            {"_id": 0, "id": 1, "path": 1, "size": 1}
+        ).sort("last_accessed_at", 1)
+        async for artifact in cursor:
+            if excess <= 0:
+                break
+            await self._delete(artifact)
+            excess -= artifact.get("size", 0)
+            self.stats["quota_evictions"] += 1
+
+    async def _delete(self, artifact: Dict[str, Any]):
+        """Remove an index entry and its file once nothing else references it"""
+        await self.db.generated_artifacts.delete_one({"id": artifact["id"]})
+        if not await self.db.generated_artifacts.find_one({"path": artifact["path"]}, {"_id": 1}):
+            try:
+                await asyncio.to_thread(os.remove, self.absolute_path(artifact["path"]))
+            except FileNotFoundError:
+                pass
+
+    async def collect_garbage(self) -> Dict[str, int]:
+        """Delete expired unpinned artifacts and stale staging files"""
+        now = datetime.now(timezone.utc)
+        removed = 0
+        freed = 0
+        while True:
+            expired = await self.db.generated_artifacts.find(
+                {"pinned": False, "expires_at": {"$lte": now}},
+                {"_id": 0, "id": 1, "path": 1, "size": 1}
+            ).to_list(GENERATED_CV_GC_BATCH)
+            if not expired:
+                break
+            for artifact in expired:
+                await self._delete(artifact)
+                removed += 1
+                freed += artifact.get("size", 0)
+
+        staging_removed = await asyncio.to_thread(self._sweep_staging)
+        logger.info(f"Generated CV cleanup: {removed} artifacts removed, {freed} bytes freed, {staging_removed} staging files removed")
+        return {"removed": removed, "bytes_freed": freed, "staging_removed": staging_removed}
+
+    def _sweep_staging(self) -> int:
+        """Remove scratch files left behind by interrupted generations"""
+        staging_dir = os.path.join(self.root, "tmp")
+        if not os.path.isdir(staging_dir):
+            return 0
+        cutoff = datetime.now().timestamp() - GENERATED_CV_TTL_HOURS * 3600
+        removed = 0
+        for entry in os.scandir(staging_dir):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "ttl_hours": GENERATED_CV_TTL_HOURS,
+            "user_quota_bytes": GENERATED_CV_USER_QUOTA_BYTES
+        }
+
+
+# Global instance
+generated_artifact_store = GeneratedArtifactStore()
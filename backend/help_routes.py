@@ -13,6 +13,8 @@ from reportlab.lib.units import inch
 from reportlab.lib.colors import HexColor
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
 
+from pdf_render_service import pdf_render_service
+
 help_router = APIRouter(prefix="/api/help", tags=["Help Center"])
 
 logger = logging.getLogger(__name__)
@@ -509,24 +511,25 @@ def generate_manual_pdf():
     
     # Build PDF
     doc.build(story)
-    buffer.seek(0)
     
-    return buffer
+    return buffer.getvalue()
 
 
 @help_router.get("/user-manual/pdf")
 async def download_user_manual_pdf():
     """Generate and download the user manual as a PDF"""
     try:
-        pdf_buffer = generate_manual_pdf()
+        pdf_bytes = await pdf_render_service.render(generate_manual_pdf)
         
         return StreamingResponse(
-            pdf_buffer,
+            io.BytesIO(pdf_bytes),
             media_type="application/pdf",
             headers={
                 "Content-Disposition": f"attachment; filename=UpShift_User_Manual.pdf"
             }
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating user manual PDF: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate PDF: {str(e)}")
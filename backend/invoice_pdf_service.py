@@ -306,3 +306,13 @@ class InvoicePDFGenerator:
 
 
 invoice_pdf_generator = InvoicePDFGenerator()
+
+
+def generate_customer_invoice_pdf(invoice, reseller=None, reseller_settings=None):
+    """Render a reseller-to-customer invoice and return the PDF bytes"""
+    return invoice_pdf_generator.generate_customer_invoice_pdf(invoice, reseller, reseller_settings).getvalue()
+
+
+def generate_reseller_invoice_pdf(invoice, reseller=None, platform_settings=None):
+    """Render a platform-to-reseller invoice and return the PDF bytes"""
+    return invoice_pdf_generator.generate_reseller_invoice_pdf(invoice, reseller, platform_settings).getvalue()
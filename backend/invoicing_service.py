@@ -0,0 +1,226 @@
+"""
+Invoicing Service - Monthly SaaS invoices for resellers
+
+One engine behind the scheduled job (server.auto_generate_monthly_invoices),
+the admin "Generate invoices" button and the scheduler route. A run for a
+period ("YYYY-MM") is idempotent and safe to start twice:
+
+- a unique (reseller_id, period) index on `reseller_invoices`; invoices are
+  written with bulk upserts ($setOnInsert), so an existing invoice is never
+  touched and a concurrent run cannot create a second one
+- active resellers are streamed from a cursor in batches of
+  INVOICE_BATCH_SIZE; each batch costs one lookup of existing invoices, one
+  sequence reservation and one bulk_write
+- invoice numbers INV-YYYY-MM-NNNN come from an atomic per-period counter in
+  `invoice_sequences` ($inc by the number of invoices a batch needs), seeded
+  past invoices numbered by the old per-run counter
+- notification emails for the invoices a run created are queued through the
+  email outbox with one insert per batch
+"""
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable via environment)
+INVOICE_BATCH_SIZE = int(os.environ.get("INVOICE_BATCH_SIZE", 500))
+INVOICE_DUE_DAYS = int(os.environ.get("INVOICE_DUE_DAYS", 15))
+DEFAULT_MONTHLY_FEE = 250000  # cents, R2,500.00
+
+_INVOICE_INDEX = "reseller_period_unique"
+_RESELLER_FIELDS = {"_id": 0, "id": 1, "company_name": 1, "subscription.monthly_fee": 1, "contact_info.email": 1}
+
+
+def current_period(now: Optional[datetime] = None) -> str:
+    now = now or datetime.now(timezone.utc)
+    return f"{now.year}-{str(now.month).zfill(2)}"
+
+
+def invoice_number(period: str, sequence: int) -> str:
+    return f"INV-{period}-{str(sequence).zfill(4)}"
+
+
+class InvoicingService:
+    """Generates each period's reseller invoices in bulk"""
+
+    def __init__(self, batch_size: int = INVOICE_BATCH_SIZE):
+        self.db = None
+        self.batch_size = batch_size
+        self.stats = {"runs": 0, "invoices_created": 0, "emails_queued": 0}
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def set_db(self, database):
+        self.db = database
+
+    async def ensure_indexes(self):
+        """Unique (reseller_id, period), replacing the earlier non-unique index"""
+        invoices = self.db.reseller_invoices
+        existing = await invoices.index_information()
+        legacy = existing.get("reseller_id_1_period_1")
+        if legacy and not legacy.get("unique"):
+            await invoices.drop_index("reseller_id_1_period_1")
+        try:
+            await invoices.create_index([("reseller_id", 1), ("period", 1)], unique=True, name=_INVOICE_INDEX)
+        except (DuplicateKeyError, OperationFailure) as e:
+            # Duplicate invoices from before the index existed; keep lookups fast until they are cleaned up
+            logger.error(f"Cannot create unique reseller invoice index, remove duplicate (reseller_id, period) invoices: {e}")
+            await invoices.create_index([("reseller_id", 1), ("period", 1)])
+
+    async def _seed_sequence(self, period: str):
+        # Invoices numbered by the old per-run counter never exceed the period's invoice count
+        existing = await self.db.reseller_invoices.count_documents({"period": period})
+        try:
+            await self.db.invoice_sequences.update_one({"_id": period}, {"$max": {"seq": existing}}, upsert=True)
+        except DuplicateKeyError:
+            # Another run created the counter first
+            await self.db.invoice_sequences.update_one({"_id": period}, {"$max": {"seq": existing}})
+
+    async def reserve_numbers(self, period: str, count: int) -> int:
+        """Atomically reserve `count` invoice numbers for a period; returns the first"""
+        counter = await self.db.invoice_sequences.find_one_and_update(
+            {"_id": period},
+            {"$inc": {"seq": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter["seq"] - count + 1
+
+    def _invoice(self, reseller: Dict, period: str, number: str, now: datetime, due_date: datetime) -> Dict[str, Any]:
+        monthly_fee = (reseller.get("subscription") or {}).get("monthly_fee", DEFAULT_MONTHLY_FEE)
+        return {
+            "id": str(uuid.uuid4()),
+            "invoice_number": number,
+            "amount": monthly_fee,
+            "due_date": due_date.isoformat(),
+            "paid_date": None,
+            "status": "pending",
+            "items": [
+                {
+                    "description": f"Monthly SaaS Subscription - {period}",
+                    "amount": monthly_fee
+                }
+            ],
+            "created_at": now
+        }
+
+    async def _write_batch(self, resellers: List[Dict], period: str, now: datetime, due_date: datetime) -> List[tuple]:
+        """Create the batch's missing invoices; (reseller, invoice) for those this run inserted"""
+        ids = [r["id"] for r in resellers]
+        invoiced = await self.db.reseller_invoices.find(
+            {"period": period, "reseller_id": {"$in": ids}},
+            {"_id": 0, "reseller_id": 1}
+        ).to_list(None)
+        invoiced_ids = {i["reseller_id"] for i in invoiced}
+        missing = [r for r in resellers if r["id"] not in invoiced_ids]
+        if not missing:
+            return []
+
+        first = await self.reserve_numbers(period, len(missing))
+        invoices = [
+            self._invoice(reseller, period, invoice_number(period, first + i), now, due_date)
+            for i, reseller in enumerate(missing)
+        ]
+        operations = [
+            UpdateOne({"reseller_id": reseller["id"], "period": period}, {"$setOnInsert": invoice}, upsert=True)
+            for reseller, invoice in zip(missing, invoices)
+        ]
+        try:
+            result = await self.db.reseller_invoices.bulk_write(operations, ordered=False)
+            inserted = set(result.upserted_ids)
+        except BulkWriteError as e:
+            # A concurrent run inserted some of these first; the unique index rejected ours
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+            inserted = {upsert["index"] for upsert in e.details.get("upserted", [])}
+        return [(missing[i], invoices[i]) for i in sorted(inserted)]
+
+    async def _queue_emails(self, created: List[tuple], period: str, due_date: datetime, sent_by: str) -> int:
+        from email_outbox import email_outbox
+        from email_service import email_service
+
+        if not email_service.is_configured:
+            return 0
+        frontend_url = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
+        payment_link = f"{frontend_url}/reseller-dashboard/invoices"
+        messages = []
+        for reseller, invoice in created:
+            contact_email = (reseller.get("contact_info") or {}).get("email")
+            if not contact_email:
+                continue
+            subject, html_body = email_service.render_invoice_created(
+                reseller_name=reseller.get("company_name", ""),
+                invoice_number=invoice["invoice_number"],
+                amount=f"R {invoice['amount'] / 100:,.2f}",
+                period=period,
+                due_date=due_date.strftime("%d %B %Y"),
+                payment_link=payment_link
+            )
+            messages.append({
+                "to_email": contact_email,
+                "subject": subject,
+                "html_body": html_body,
+                "email_type": "invoice_created",
+                "log": {"invoice_id": invoice["id"], "reseller_id": reseller["id"], "sent_by": sent_by}
+            })
+        try:
+            await email_outbox.enqueue_many(messages)
+        except Exception as e:
+            logger.error(f"Failed to queue invoice emails for {period}: {e}")
+            return 0
+        return len(messages)
+
+    async def generate_monthly(self, period: Optional[str] = None, notify: bool = True, sent_by: str = "system") -> Dict[str, Any]:
+        """Invoice every active reseller that has no invoice for the period yet"""
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        period = period or current_period(now)
+        due_date = now + timedelta(days=INVOICE_DUE_DAYS)
+        await self._seed_sequence(period)
+
+        scanned = created = emails_queued = 0
+        cursor = self.db.resellers.find({"status": "active"}, _RESELLER_FIELDS).batch_size(self.batch_size)
+        batch: List[Dict] = []
+
+        async def flush():
+            nonlocal created, emails_queued
+            inserted = await self._write_batch(batch, period, now, due_date)
+            created += len(inserted)
+            if notify and inserted:
+                emails_queued += await self._queue_emails(inserted, period, due_date, sent_by)
+            batch.clear()
+
+        async for reseller in cursor:
+            scanned += 1
+            batch.append(reseller)
+            if len(batch) >= self.batch_size:
+                await flush()
+        if batch:
+            await flush()
+
+        self.stats["runs"] += 1
+        self.stats["invoices_created"] += created
+        self.stats["emails_queued"] += emails_queued
+        self.last_run = {
+            "period": period,
+            "resellers_scanned": scanned,
+            "invoices_created": created,
+            "emails_queued": emails_queued,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "finished_at": datetime.now(timezone.utc).isoformat()
+        }
+        logger.info(f"Invoices for {period}: {created} created for {scanned} active resellers, {emails_queued} emails queued")
+        return {"period": period, "invoices_created": created, "emails_sent": emails_queued, "resellers_scanned": scanned}
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "batch_size": self.batch_size, "last_run": self.last_run}
+
+
+# Global invoicing service
+invoicing_service = InvoicingService()
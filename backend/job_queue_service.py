@@ -0,0 +1,372 @@
+"""
+Job Queue Service - Mongo-backed queue for long-running AI document processing
+
+Endpoints that extract an upload and then wait on one or more LLM calls
+(CV analysis, CV extract-and-enhance, CV data extraction, the ATS checker
+and the LinkedIn URL import) accept `?async=true`. The request is then
+validated, its upload stored in the blob store, and a job document inserted
+into `ai_jobs`; the response (202) carries the job ID and the URLs to poll
+(GET /api/jobs/{job_id}) or follow as server-sent events
+(GET /api/jobs/{job_id}/events).
+
+Workers claim queued jobs atomically with find_one_and_update, so any number
+of them can share the collection: AI_JOB_WORKERS run inside each API
+process, and `python job_worker.py` runs them in a process of their own (set
+AI_JOB_WORKERS=0 on the API to leave all processing to it). A claimed job
+holds a lease that its worker renews while it runs; a job whose worker died
+is claimed again once the lease lapses, up to AI_JOB_MAX_ATTEMPTS attempts.
+AI failures (5xx) are retried after a delay, request errors (4xx) are not.
+
+The result, or the error, is stored on the job document. Jobs are removed
+by a TTL index AI_JOB_RETENTION_HOURS after they finish, and their uploads
+as soon as they finish.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable via environment)
+AI_JOB_WORKERS = int(os.environ.get("AI_JOB_WORKERS", 4))
+AI_JOB_POLL_SECONDS = float(os.environ.get("AI_JOB_POLL_SECONDS", 2))
+AI_JOB_LEASE_SECONDS = int(os.environ.get("AI_JOB_LEASE_SECONDS", 300))
+AI_JOB_MAX_ATTEMPTS = int(os.environ.get("AI_JOB_MAX_ATTEMPTS", 3))
+AI_JOB_RETRY_DELAY_SECONDS = int(os.environ.get("AI_JOB_RETRY_DELAY_SECONDS", 15))
+AI_JOB_RETENTION_HOURS = float(os.environ.get("AI_JOB_RETENTION_HOURS", 24))
+# Queued jobs nobody picked up within this time are failed
+AI_JOB_QUEUE_TIMEOUT_SECONDS = int(os.environ.get("AI_JOB_QUEUE_TIMEOUT_SECONDS", 3600))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_FINISHED = (JOB_COMPLETED, JOB_FAILED)
+
+# handler(job document, uploaded file bytes or None) -> result stored on the job
+JobHandler = Callable[[Dict[str, Any], Optional[bytes]], Awaitable[Dict[str, Any]]]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _job_error(error: BaseException) -> Dict[str, Any]:
+    if isinstance(error, HTTPException):
+        return {"status_code": error.status_code, "detail": error.detail}
+    return {"status_code": 500, "detail": "Processing failed. Please try again."}
+
+
+def _retryable(error: BaseException) -> bool:
+    # Bad uploads and access errors fail the same way on every attempt
+    return not isinstance(error, HTTPException) or error.status_code >= 500
+
+
+class JobQueue:
+    def __init__(self, workers: int = AI_JOB_WORKERS):
+        self.db = None
+        self.workers = workers
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks = []
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._running = 0
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "retried": 0, "expired": 0}
+
+    def set_db(self, database):
+        self.db = database
+
+    async def ensure_indexes(self):
+        await self.db.ai_jobs.create_index("id", unique=True)
+        await self.db.ai_jobs.create_index([("status", 1), ("run_after", 1)])
+        await self.db.ai_jobs.create_index("expires_at", expireAfterSeconds=0)
+
+    def register(self, job_type: str, handler: JobHandler):
+        """Register the coroutine that processes jobs of `job_type`"""
+        self._handlers[job_type] = handler
+
+    # ---------- submission and status ----------
+
+    async def submit(
+        self,
+        job_type: str,
+        payload: Optional[Dict[str, Any]] = None,
+        content: Optional[bytes] = None,
+        filename: Optional[str] = None,
+        user_id: Optional[str] = None,
+        reseller_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Queue a job; an uploaded file is kept in the blob store until the job finishes"""
+        from blob_store import get_blob_store
+
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        job_id = str(uuid.uuid4())
+        blob_id = None
+        if content is not None:
+            blob_id = await get_blob_store().put(
+                content, filename or job_id, "application/octet-stream", {"job_id": job_id}
+            )
+
+        now = _now()
+        job = {
+            "id": job_id,
+            "type": job_type,
+            "status": JOB_QUEUED,
+            "payload": payload or {},
+            "filename": filename,
+            "blob_id": blob_id,
+            "user_id": user_id,
+            "reseller_id": reseller_id,
+            "attempts": 0,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "run_after": now,
+            "started_at": None,
+            "completed_at": None,
+            # Pushed back when the job finishes; bounds a job that is never processed
+            "expires_at": now + timedelta(hours=AI_JOB_RETENTION_HOURS)
+        }
+        await self.db.ai_jobs.insert_one(dict(job))
+        self.stats["submitted"] += 1
+        self._wake.set()
+        logger.info(f"Queued {job_type} job {job_id}")
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.db.ai_jobs.find_one({"id": job_id}, {"_id": 0, "payload": 0})
+
+    @staticmethod
+    def to_status(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Public view of a job: its state, and the result or error once finished"""
+        status = {
+            "success": True,
+            "job_id": job["id"],
+            "type": job["type"],
+            "status": job["status"],
+            "attempts": job.get("attempts", 0),
+            "created_at": job.get("created_at"),
+            "started_at": job.get("started_at"),
+            "completed_at": job.get("completed_at")
+        }
+        if job["status"] == JOB_COMPLETED:
+            status["result"] = job.get("result")
+        elif job["status"] == JOB_FAILED:
+            status["error"] = job.get("error")
+        return status
+
+    @staticmethod
+    def accepted_response(job: Dict[str, Any]) -> JSONResponse:
+        """202 response for an endpoint called with ?async=true"""
+        return JSONResponse(status_code=202, content={
+            "success": True,
+            "job_id": job["id"],
+            "status": job["status"],
+            "status_url": f"/api/jobs/{job['id']}",
+            "events_url": f"/api/jobs/{job['id']}/events"
+        })
+
+    # ---------- processing ----------
+
+    async def claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest runnable job (or one whose worker's lease lapsed)"""
+        now = _now()
+        return await self.db.ai_jobs.find_one_and_update(
+            {
+                "type": {"$in": list(self._handlers)},
+                "$or": [
+                    {"status": JOB_QUEUED, "run_after": {"$lte": now}},
+                    {"status": JOB_RUNNING, "lease_until": {"$lt": now}, "attempts": {"$lt": AI_JOB_MAX_ATTEMPTS}}
+                ]
+            },
+            {
+                "$set": {
+                    "status": JOB_RUNNING,
+                    "lease_id": uuid.uuid4().hex,
+                    "lease_until": now + timedelta(seconds=AI_JOB_LEASE_SECONDS),
+                    "worker_id": self.worker_id,
+                    "started_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("run_after", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _renew_lease(self, job: Dict[str, Any]):
+        while True:
+            await asyncio.sleep(AI_JOB_LEASE_SECONDS / 3)
+            await self.db.ai_jobs.update_one(
+                {"id": job["id"], "lease_id": job["lease_id"]},
+                {"$set": {"lease_until": _now() + timedelta(seconds=AI_JOB_LEASE_SECONDS)}}
+            )
+
+    async def _finish(self, job: Dict[str, Any], update: Dict[str, Any]) -> bool:
+        # Only the current lease holder may finish a job
+        result = await self.db.ai_jobs.update_one(
+            {"id": job["id"], "lease_id": job["lease_id"]},
+            {"$set": update, "$unset": {"lease_id": "", "lease_until": ""}}
+        )
+        return result.modified_count == 1
+
+    async def _delete_upload(self, job: Dict[str, Any]):
+        from blob_store import get_blob_store
+        if not job.get("blob_id"):
+            return
+        try:
+            await get_blob_store().delete(job["blob_id"])
+        except Exception as e:
+            logger.warning(f"Failed to delete upload of job {job['id']}: {str(e)}")
+
+    async def run(self, job: Dict[str, Any]):
+        """Process a claimed job and store its result or error"""
+        from blob_store import get_blob_store
+
+        self._running += 1
+        renewer = asyncio.ensure_future(self._renew_lease(job))
+        started = time.monotonic()
+        try:
+            content = await get_blob_store().get(job["blob_id"]) if job.get("blob_id") else None
+            result = await self._handlers[job["type"]](job, content)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back without using up an attempt
+            await self.db.ai_jobs.update_one(
+                {"id": job["id"], "lease_id": job["lease_id"]},
+                {"$set": {"status": JOB_QUEUED}, "$unset": {"lease_id": "", "lease_until": ""}, "$inc": {"attempts": -1}}
+            )
+            raise
+        except Exception as e:
+            await self._fail(job, e)
+        else:
+            now = _now()
+            if await self._finish(job, {
+                "status": JOB_COMPLETED,
+                "result": result,
+                "error": None,
+                "completed_at": now,
+                "expires_at": now + timedelta(hours=AI_JOB_RETENTION_HOURS)
+            }):
+                self.stats["completed"] += 1
+                await self._delete_upload(job)
+            logger.info(f"{job['type']} job {job['id']} completed in {time.monotonic() - started:.1f}s")
+        finally:
+            renewer.cancel()
+            self._running -= 1
+
+    async def _fail(self, job: Dict[str, Any], error: BaseException):
+        error_info = _job_error(error)
+        if _retryable(error) and job["attempts"] < AI_JOB_MAX_ATTEMPTS:
+            logger.warning(f"{job['type']} job {job['id']} attempt {job['attempts']} failed, retrying: {str(error)[:200]}")
+            if await self._finish(job, {
+                "status": JOB_QUEUED,
+                "error": error_info,
+                "run_after": _now() + timedelta(seconds=AI_JOB_RETRY_DELAY_SECONDS * job["attempts"])
+            }):
+                self.stats["retried"] += 1
+            return
+
+        logger.error(f"{job['type']} job {job['id']} failed: {str(error)[:200]}")
+        now = _now()
+        if await self._finish(job, {
+            "status": JOB_FAILED,
+            "error": error_info,
+            "completed_at": now,
+            "expires_at": now + timedelta(hours=AI_JOB_RETENTION_HOURS)
+        }):
+            self.stats["failed"] += 1
+            await self._delete_upload(job)
+
+    async def _work(self):
+        # Checked as well as cancellation: wait_for() can swallow a cancel
+        # that arrives together with a wake-up
+        while not self._stopping:
+            # Cleared before claiming so a submission made meanwhile is not missed
+            self._wake.clear()
+            try:
+                job = await self.claim()
+            except Exception as e:
+                logger.error(f"Failed to claim AI job: {str(e)}")
+                job = None
+            if job is not None:
+                await self.run(job)
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=AI_JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, workers: Optional[int] = None):
+        """Start the worker tasks in the running event loop"""
+        if self._tasks:
+            return
+        self._stopping = False
+        count = self.workers if workers is None else workers
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(count)]
+        if count:
+            logger.info(f"AI job workers started: {count} ({self.worker_id})")
+
+    async def shutdown(self):
+        self._stopping = True
+        self._wake.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ---------- retention ----------
+
+    async def collect_garbage(self) -> Dict[str, int]:
+        """Fail jobs that were never picked up or ran out of attempts, and drop their uploads"""
+        now = _now()
+        expired = await self.db.ai_jobs.find(
+            {"$or": [
+                {"status": JOB_QUEUED, "created_at": {"$lt": now - timedelta(seconds=AI_JOB_QUEUE_TIMEOUT_SECONDS)}},
+                {"status": JOB_RUNNING, "lease_until": {"$lt": now}, "attempts": {"$gte": AI_JOB_MAX_ATTEMPTS}}
+            ]},
+            {"_id": 0, "id": 1, "status": 1, "blob_id": 1}
+        ).to_list(1000)
+
+        for job in expired:
+            reason = "The job was not processed in time" if job["status"] == JOB_QUEUED else "The job did not complete"
+            result = await self.db.ai_jobs.update_one(
+                {"id": job["id"], "status": job["status"]},
+                {
+                    "$set": {
+                        "status": JOB_FAILED,
+                        "error": {"status_code": 504, "detail": f"{reason}. Please try again."},
+                        "completed_at": now,
+                        "expires_at": now + timedelta(hours=AI_JOB_RETENTION_HOURS)
+                    },
+                    "$unset": {"lease_id": "", "lease_until": ""}
+                }
+            )
+            if result.modified_count:
+                self.stats["expired"] += 1
+                await self._delete_upload(job)
+        return {"expired": len(expired)}
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "workers": len(self._tasks),
+            "running": self._running,
+            "job_types": sorted(self._handlers),
+            "max_attempts": AI_JOB_MAX_ATTEMPTS,
+            "retention_hours": AI_JOB_RETENTION_HOURS
+        }
+
+
+# Global instance
+job_queue = JobQueue()
@@ -0,0 +1,97 @@
+"""
+Job Routes - Status of queued AI document processing jobs
+
+Jobs are created by the AI endpoints called with ?async=true (see
+job_queue_service). A job submitted by a signed-in user can only be read
+with that user's token; anonymous jobs (the free CV analysis and ATS
+checker) are addressed by their unguessable ID alone.
+"""
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+
+from event_stream import sse_event, event_stream_response
+from job_queue_service import job_queue, JOB_COMPLETED, JOB_FAILED
+
+logger = logging.getLogger(__name__)
+
+job_router = APIRouter(prefix="/api/jobs", tags=["Jobs"])
+
+AI_JOB_EVENTS_POLL_SECONDS = float(os.environ.get("AI_JOB_EVENTS_POLL_SECONDS", 1))
+AI_JOB_EVENTS_MAX_SECONDS = float(os.environ.get("AI_JOB_EVENTS_MAX_SECONDS", 600))
+
+# Database reference
+db = None
+
+def set_db(database):
+    global db
+    db = database
+
+
+async def _optional_user_id(request: Request) -> Optional[str]:
+    """ID of the signed-in user, or None for anonymous requests"""
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return None
+    from auth import get_current_user
+    try:
+        user = await get_current_user(auth_header.split(" ", 1)[1], db)
+    except HTTPException:
+        return None
+    return user.id
+
+
+async def _get_job(job_id: str, request: Request) -> dict:
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    if job.get("user_id") and job["user_id"] != await _optional_user_id(request):
+        # Not revealing that the job exists
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+
+@job_router.get("/{job_id}")
+async def get_job_status(job_id: str, request: Request):
+    """Status of a job, with its result or error once it has finished"""
+    return job_queue.to_status(await _get_job(job_id, request))
+
+
+@job_router.get("/{job_id}/events")
+async def stream_job_status(job_id: str, request: Request):
+    """
+    Server-sent events for a job: `status` on every state change, then
+    `done` with the result or `error` with the failure.
+    """
+    job = await _get_job(job_id, request)
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + AI_JOB_EVENTS_MAX_SECONDS
+        current = job
+        last_status = None
+        while True:
+            if current is None:
+                raise HTTPException(status_code=404, detail="Job not found or expired")
+            if current["status"] != last_status:
+                last_status = current["status"]
+                yield sse_event("status", {
+                    "job_id": job_id,
+                    "status": last_status,
+                    "attempts": current.get("attempts", 0)
+                })
+            if last_status == JOB_COMPLETED:
+                yield sse_event("done", current.get("result"))
+                return
+            if last_status == JOB_FAILED:
+                yield sse_event("error", current.get("error"))
+                return
+            if loop.time() >= deadline:
+                raise HTTPException(status_code=504, detail=f"Job is still {last_status}; poll /api/jobs/{job_id} for its result")
+            await asyncio.sleep(AI_JOB_EVENTS_POLL_SECONDS)
+            current = await job_queue.get(job_id)
+
+    return event_stream_response(events())
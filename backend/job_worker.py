@@ -0,0 +1,47 @@
+"""
+Job Worker - Runs AI job queue workers in a process of their own
+
+    python job_worker.py [--workers N]
+
+Uses the same environment as the API (MONGO_URL, DB_NAME, AI keys). Importing
+the server module wires the database into every service and registers the
+job handlers of the route modules; no HTTP server is started. Run the API
+with AI_JOB_WORKERS=0 to leave all job processing to these processes.
+"""
+import argparse
+import asyncio
+import logging
+import signal
+
+import server  # noqa: F401
+from job_queue_service import job_queue, AI_JOB_WORKERS
+from llm_metrics import llm_metrics
+from text_extraction_service import text_extraction_service
+
+logger = logging.getLogger(__name__)
+
+
+async def main(workers: int):
+    await job_queue.ensure_indexes()
+    text_extraction_service.start()
+    llm_metrics.start()
+    job_queue.start(workers)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    logger.info("Stopping AI job workers")
+    # Jobs still running are handed back to the queue
+    await job_queue.shutdown()
+    await llm_metrics.shutdown()
+    text_extraction_service.shutdown()
+    server.client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process queued AI jobs")
+    parser.add_argument("--workers", type=int, default=AI_JOB_WORKERS or 4, help="Concurrent jobs in this process")
+    asyncio.run(main(parser.parse_args().workers))
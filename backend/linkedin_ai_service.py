@@ -1,10 +1,11 @@
-from emergentintegrations.llm.chat import LlmChat, UserMessage
 import os
 from dotenv import load_dotenv
 from typing import Dict, List, Optional
 import logging
 import json
 
+from llm_gateway import llm_gateway
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -17,19 +18,14 @@ class LinkedInAIService:
         if not self.api_key:
             raise ValueError("EMERGENT_LLM_KEY not found in environment variables")
     
-    async def convert_linkedin_to_resume(self, linkedin_data: Dict) -> Dict:
+    async def convert_linkedin_to_resume(self, linkedin_data: Dict, reseller_id: Optional[str] = None) -> Dict:
         """
         Convert LinkedIn profile data to a professional resume format.
         """
         try:
-            chat = LlmChat(
-                api_key=self.api_key,
-                session_id="linkedin_to_resume",
-                system_message="""You are an expert CV/Resume writer specializing in the South African job market. 
+            system_message = """You are an expert CV/Resume writer specializing in the South African job market. 
                 You excel at converting LinkedIn profiles into professional, ATS-friendly resumes. 
                 Create resumes that are well-structured, keyword-optimized, and highlight achievements."""
-            )
-            chat.with_model("openai", "gpt-5.2")
             
             prompt = f"""Convert the following LinkedIn profile data into a professional, ATS-friendly resume:
 
@@ -83,8 +79,14 @@ Provide the resume in the following JSON format:
 
 Return ONLY valid JSON without markdown formatting."""
             
-            user_message = UserMessage(text=prompt)
-            response = await chat.send_message(user_message)
+            response = await llm_gateway.complete(
+                prompt,
+                system_message=system_message,
+                session_id="linkedin_to_resume",
+                model="gpt-5.2",
+                endpoint="linkedin_to_resume",
+                reseller_id=reseller_id
+            )
             
             # Clean and parse JSON
             clean_response = response.strip()
@@ -100,20 +102,15 @@ Return ONLY valid JSON without markdown formatting."""
             logger.error(f"Error converting LinkedIn to resume: {str(e)}")
             raise
     
-    async def create_linkedin_profile(self, user_data: Dict) -> Dict:
+    async def create_linkedin_profile(self, user_data: Dict, reseller_id: Optional[str] = None) -> Dict:
         """
         Create LinkedIn profile content from scratch based on user's background.
         """
         try:
-            chat = LlmChat(
-                api_key=self.api_key,
-                session_id="create_linkedin",
-                system_message="""You are an expert LinkedIn profile strategist and personal branding consultant 
+            system_message = """You are an expert LinkedIn profile strategist and personal branding consultant 
                 specializing in the South African job market. You create compelling LinkedIn profiles that 
                 attract recruiters and showcase professional value. Focus on keyword optimization, 
                 storytelling, and professional positioning."""
-            )
-            chat.with_model("openai", "gpt-5.2")
             
             prompt = f"""Create a complete, professional LinkedIn profile based on the following information:
 
@@ -158,8 +155,14 @@ Provide the profile in the following JSON format:
 
 Return ONLY valid JSON without markdown formatting."""
             
-            user_message = UserMessage(text=prompt)
-            response = await chat.send_message(user_message)
+            response = await llm_gateway.complete(
+                prompt,
+                system_message=system_message,
+                session_id="create_linkedin",
+                model="gpt-5.2",
+                endpoint="linkedin_create_profile",
+                reseller_id=reseller_id
+            )
             
             clean_response = response.strip()
             if clean_response.startswith('```json'):
@@ -174,20 +177,15 @@ Return ONLY valid JSON without markdown formatting."""
             logger.error(f"Error creating LinkedIn profile: {str(e)}")
             raise
     
-    async def enhance_linkedin_profile(self, current_profile: Dict, target_role: Optional[str] = None) -> Dict:
+    async def enhance_linkedin_profile(self, current_profile: Dict, target_role: Optional[str] = None, reseller_id: Optional[str] = None) -> Dict:
         """
         Analyze and enhance existing LinkedIn profile sections.
         """
         try:
-            chat = LlmChat(
-                api_key=self.api_key,
-                session_id="enhance_linkedin",
-                system_message="""You are an expert LinkedIn profile optimizer and career strategist 
+            system_message = """You are an expert LinkedIn profile optimizer and career strategist 
                 specializing in the South African job market. You analyze profiles for weaknesses 
                 and provide specific, actionable improvements that increase profile views, 
                 connection requests, and recruiter engagement."""
-            )
-            chat.with_model("openai", "gpt-5.2")
             
             target_info = f"\nTARGET ROLE: {target_role}" if target_role else ""
             
@@ -260,8 +258,14 @@ Provide analysis in the following JSON format:
 
 Return ONLY valid JSON without markdown formatting."""
             
-            user_message = UserMessage(text=prompt)
-            response = await chat.send_message(user_message)
+            response = await llm_gateway.complete(
+                prompt,
+                system_message=system_message,
+                session_id="enhance_linkedin",
+                model="gpt-5.2",
+                endpoint="linkedin_enhance_profile",
+                reseller_id=reseller_id
+            )
             
             clean_response = response.strip()
             if clean_response.startswith('```json'):
@@ -276,18 +280,13 @@ Return ONLY valid JSON without markdown formatting."""
             logger.error(f"Error enhancing LinkedIn profile: {str(e)}")
             raise
     
-    async def generate_linkedin_section(self, section_type: str, user_info: Dict) -> Dict:
+    async def generate_linkedin_section(self, section_type: str, user_info: Dict, reseller_id: Optional[str] = None) -> Dict:
         """
         Generate a specific LinkedIn section (headline, about, experience description).
         """
         try:
-            chat = LlmChat(
-                api_key=self.api_key,
-                session_id=f"linkedin_section_{section_type}",
-                system_message="""You are an expert LinkedIn copywriter specializing in the South African job market. 
+            system_message = """You are an expert LinkedIn copywriter specializing in the South African job market. 
                 You write compelling, keyword-optimized content that attracts recruiters and showcases professional value."""
-            )
-            chat.with_model("openai", "gpt-5.2")
             
             section_prompts = {
                 "headline": f"""Generate 5 compelling LinkedIn headlines for:
@@ -309,8 +308,14 @@ Return JSON: {{"description": "full description", "achievements": ["bullet point
             prompt = section_prompts.get(section_type, section_prompts["headline"])
             prompt += "\n\nReturn ONLY valid JSON without markdown formatting."
             
-            user_message = UserMessage(text=prompt)
-            response = await chat.send_message(user_message)
+            response = await llm_gateway.complete(
+                prompt,
+                system_message=system_message,
+                session_id=f"linkedin_section_{section_type}",
+                model="gpt-5.2",
+                endpoint="linkedin_section",
+                reseller_id=reseller_id
+            )
             
             clean_response = response.strip()
             if clean_response.startswith('```json'):
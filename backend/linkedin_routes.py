@@ -6,6 +6,7 @@ from auth import get_current_user, oauth2_scheme
 from linkedin_service import linkedin_oauth_service
 from linkedin_ai_service import linkedin_ai_service
 from linkedin_scraper_service import linkedin_scraper_service
+from job_queue_service import job_queue
 import logging
 
 logger = logging.getLogger(__name__)
@@ -170,7 +171,9 @@ async def convert_linkedin_to_resume(
     """
     try:
         linkedin_dict = profile_data.dict()
-        result = await linkedin_ai_service.convert_linkedin_to_resume(linkedin_dict)
+        result = await linkedin_ai_service.convert_linkedin_to_resume(
+            linkedin_dict, reseller_id=getattr(current_user, "reseller_id", None)
+        )
         return {
             "success": True,
             "resume": result
@@ -189,7 +192,9 @@ async def create_linkedin_profile(
     """
     try:
         user_data = request.dict()
-        result = await linkedin_ai_service.create_linkedin_profile(user_data)
+        result = await linkedin_ai_service.create_linkedin_profile(
+            user_data, reseller_id=getattr(current_user, "reseller_id", None)
+        )
         return {
             "success": True,
             "profile": result
@@ -215,7 +220,8 @@ async def enhance_linkedin_profile(
         }
         result = await linkedin_ai_service.enhance_linkedin_profile(
             profile_data, 
-            request.target_role
+            request.target_role,
+            reseller_id=getattr(current_user, "reseller_id", None)
         )
         return {
             "success": True,
@@ -244,7 +250,8 @@ async def generate_linkedin_section(
         user_info = request.dict()
         result = await linkedin_ai_service.generate_linkedin_section(
             request.section_type,
-            user_info
+            user_info,
+            reseller_id=getattr(current_user, "reseller_id", None)
         )
         return {
             "success": True,
@@ -258,42 +265,67 @@ async def generate_linkedin_section(
 
 # ==================== Premium LinkedIn Tools (Tier 2 & 3 Only) ====================
 
+async def import_linkedin_profile(linkedin_url: str, user_id: str, user_email: str, reseller_id: Optional[str] = None) -> Dict:
+    """Scrape a public LinkedIn profile and log the import"""
+    result = await linkedin_scraper_service.scrape_profile(linkedin_url)
+    
+    if not result.get("success"):
+        raise HTTPException(
+            status_code=400,
+            detail=result.get("error", "Failed to import LinkedIn profile")
+        )
+    
+    # Log the import for analytics
+    await db.activity_logs.insert_one({
+        "user_id": user_id,
+        "user_email": user_email,
+        "action": "linkedin_import",
+        "details": {
+            "source_url": result.get("source_url"),
+            "success": True
+        },
+        "reseller_id": reseller_id
+    })
+    
+    return {
+        "success": True,
+        "profile": result.get("profile"),
+        "source_url": result.get("source_url"),
+        "message": "Profile data imported successfully. Review and edit as needed."
+    }
+
+
+async def _import_linkedin_profile_job(job: Dict, content: Optional[bytes]) -> Dict:
+    payload = job["payload"]
+    return await import_linkedin_profile(payload["linkedin_url"], job["user_id"], payload["user_email"], job.get("reseller_id"))
+
+
+job_queue.register("linkedin_import", _import_linkedin_profile_job)
+
+
 @router.post("/import-from-url")
 async def import_from_linkedin_url(
     request: LinkedInUrlRequest,
+    run_async: bool = Query(False, alias="async", description="Queue the import and return a job ID at once"),
     current_user: dict = Depends(check_premium_tier)
 ):
     """
     Import profile data from a public LinkedIn URL.
     PREMIUM FEATURE: Requires Professional (tier-2) or Executive Elite (tier-3) plan.
+    With async=true the import runs as a job; poll /api/jobs/{job_id} for the result.
     """
     try:
-        result = await linkedin_scraper_service.scrape_profile(request.linkedin_url)
-        
-        if not result.get("success"):
-            raise HTTPException(
-                status_code=400,
-                detail=result.get("error", "Failed to import LinkedIn profile")
+        reseller_id = getattr(current_user, "reseller_id", None)
+        if run_async:
+            job = await job_queue.submit(
+                "linkedin_import",
+                payload={"linkedin_url": request.linkedin_url, "user_email": current_user.email},
+                user_id=current_user.id,
+                reseller_id=reseller_id
             )
+            return job_queue.accepted_response(job)
         
-        # Log the import for analytics
-        await db.activity_logs.insert_one({
-            "user_id": current_user.id,
-            "user_email": current_user.email,
-            "action": "linkedin_import",
-            "details": {
-                "source_url": result.get("source_url"),
-                "success": True
-            },
-            "reseller_id": getattr(current_user, "reseller_id", None)
-        })
-        
-        return {
-            "success": True,
-            "profile": result.get("profile"),
-            "source_url": result.get("source_url"),
-            "message": "Profile data imported successfully. Review and edit as needed."
-        }
+        return await import_linkedin_profile(request.linkedin_url, current_user.id, current_user.email, reseller_id)
         
     except HTTPException:
         raise
@@ -333,7 +365,7 @@ async def generate_linkedin_content(
             "education": cv_data.get("education", []),
             "work_history": cv_data.get("experiences", []),
             "career_goals": ""
-        })
+        }, reseller_id=getattr(current_user, "reseller_id", None))
         
         # Format for easy copy/paste
         formatted_content = {
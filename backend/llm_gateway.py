@@ -0,0 +1,734 @@
+"""
+LLM Gateway - The single path for every LLM call in the backend
+
+Every AI feature (AI service, AI content, CV processing, assistant chat,
+LinkedIn tools, talent pool / remote jobs / proposals AI endpoints) sends
+its prompts through `llm_gateway`, which applies one policy to all of them:
+- concurrency limits: a global semaphore, one per endpoint and one per
+  tenant (reseller), so a slow provider or one busy reseller cannot tie up
+  every request worker; waiting for a slot is bounded by LLM_QUEUE_TIMEOUT
+- deadlines: each call has an overall deadline covering queueing, retries
+  and backoff
+- retries: transient provider errors (timeouts, rate limits, 5xx,
+  connection resets) are retried with exponential backoff and jitter
+- circuit breaker: after LLM_BREAKER_FAILURES consecutive provider failures
+  calls fail fast with a 503 for LLM_BREAKER_COOLDOWN seconds, then a single
+  probe decides whether to close it again; endpoints with a rule-based
+  fallback (ATS check, CV analysis) switch to it while the circuit is open
+- response cache: single prompts to deterministic endpoints are answered
+  from llm_response_cache before any limit is taken
+- metrics: every call is recorded in llm_metrics with its latency, sizes
+  and outcome
+- streaming: stream()/stream_send() yield tokens as the provider produces
+  them through litellm (LlmChat has no streaming API), under the same
+  limits, deadline and breaker; the gateway keeps each chat's turns so
+  streamed and sent messages share one conversation
+
+Gateway errors subclass HTTPException, so routes that re-raise
+HTTPException return 503/504/429 responses without extra handling.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import weakref
+from typing import AsyncIterator, Dict, List, Optional, Union
+
+import litellm
+from dotenv import load_dotenv
+from emergentintegrations.llm.chat import LlmChat, UserMessage
+from fastapi import HTTPException
+
+from llm_response_cache import llm_response_cache, prompt_cache_key, estimate_tokens, SOURCE_COMPUTED
+from llm_metrics import (
+    llm_metrics, OUTCOME_OK, OUTCOME_ERROR, OUTCOME_TIMEOUT, OUTCOME_REJECTED, OUTCOME_CANCELLED, SOURCE_CACHE
+)
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_limits(value: str) -> Dict[str, float]:
+    """'ats_check=4,assistant_chat=16' -> {'ats_check': 4.0, 'assistant_chat': 16.0}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, number = item.partition("=")
+        try:
+            limits[name.strip()] = float(number)
+        except ValueError:
+            logger.warning(f"Ignoring invalid LLM limit setting: {item}")
+    return limits
+
+
+# Configuration (overridable via environment)
+LLM_DEFAULT_PROVIDER = os.environ.get("LLM_DEFAULT_PROVIDER", "openai")
+LLM_DEFAULT_MODEL = os.environ.get("LLM_DEFAULT_MODEL", "gpt-4o")
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 32))
+LLM_ENDPOINT_CONCURRENCY = int(os.environ.get("LLM_ENDPOINT_CONCURRENCY", 8))
+LLM_RESELLER_CONCURRENCY = int(os.environ.get("LLM_RESELLER_CONCURRENCY", 6))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", 10))
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 90))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 2))
+LLM_RETRY_BASE_DELAY = float(os.environ.get("LLM_RETRY_BASE_DELAY", 0.5))
+LLM_RETRY_MAX_DELAY = float(os.environ.get("LLM_RETRY_MAX_DELAY", 8))
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", 30))
+# OpenAI-compatible proxy that universal (sk-emergent-) keys are sent to when streaming,
+# the endpoint LlmChat itself uses for them
+LLM_PROXY_URL = os.environ.get("LLM_PROXY_URL", "https://integrations.emergentagent.com/llm")
+
+# Per-endpoint overrides, e.g. LLM_ENDPOINT_LIMITS="ats_check=4,assistant_chat=16"
+LLM_ENDPOINT_LIMITS = _parse_limits(os.environ.get("LLM_ENDPOINT_LIMITS", ""))
+LLM_ENDPOINT_TIMEOUTS = {
+    "assistant_chat": 45,
+    "ats_check": 60,
+    **_parse_limits(os.environ.get("LLM_ENDPOINT_TIMEOUTS", ""))
+}
+
+# Substrings of provider error messages
+_TRANSIENT_MARKERS = (
+    "timeout", "timed out", "rate limit", "rate_limit", "429", "500", "502", "503", "504",
+    "bad gateway", "service unavailable", "overloaded", "connection", "temporarily"
+)
+_NON_RETRYABLE_MARKERS = ("quota", "insufficient", "billing", "credit", "402", "401", "invalid api key")
+_CLIENT_ERROR_MARKERS = ("context length", "maximum context", "content policy", "content_filter", "invalid request", "400")
+
+
+class LLMGatewayError(HTTPException):
+    """Base class for errors raised by the gateway itself"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[int] = None):
+        headers = {"Retry-After": str(retry_after)} if retry_after else None
+        super().__init__(status_code=status_code, detail=detail, headers=headers)
+
+
+class LLMUnavailableError(LLMGatewayError):
+    """Circuit open or no capacity: the AI service is temporarily unavailable"""
+
+    def __init__(self, detail: str = "The AI service is temporarily unavailable. Please try again in a few minutes.", retry_after: int = 30):
+        super().__init__(503, detail, retry_after)
+
+
+class LLMTimeoutError(LLMGatewayError):
+    """The call did not finish before its deadline"""
+
+    def __init__(self, detail: str = "The AI service timed out. Please try again."):
+        super().__init__(504, detail)
+
+
+class LLMQuotaError(LLMGatewayError):
+    """The tenant already has its maximum number of AI requests running"""
+
+    def __init__(self, detail: str = "Too many AI requests are running for your account. Please try again shortly.", retry_after: int = 5):
+        super().__init__(429, detail, retry_after)
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Whether a provider error is worth retrying"""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    message = str(error).lower()
+    if any(marker in message for marker in _NON_RETRYABLE_MARKERS):
+        return False
+    return any(marker in message for marker in _TRANSIENT_MARKERS)
+
+
+def call_outcome(error: BaseException) -> str:
+    """Metrics outcome of a call that raised `error`"""
+    if isinstance(error, LLMTimeoutError):
+        return OUTCOME_TIMEOUT
+    if isinstance(error, (LLMUnavailableError, LLMQuotaError)):
+        return OUTCOME_REJECTED
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        return OUTCOME_CANCELLED
+    return OUTCOME_ERROR
+
+
+def _message_chars(message: Union[str, UserMessage]) -> int:
+    text = message if isinstance(message, str) else getattr(message, "text", "")
+    return len(text or "")
+
+
+def _litellm_params(spec: Dict) -> Dict:
+    """litellm arguments for a chat's provider, model and key"""
+    params = {"model": f"{spec['provider']}/{spec['model']}", "api_key": spec["api_key"]}
+    if spec["api_key"].startswith("sk-emergent-"):
+        params.update(api_base=LLM_PROXY_URL, custom_llm_provider="openai")
+        if spec["provider"] == "openai":
+            params["model"] = spec["model"]
+    return params
+
+
+class _CompletionChat:
+    """One-shot chat sent through litellm, for provider options LlmChat does not expose"""
+
+    def __init__(self, spec: Dict, **options):
+        self.spec = spec
+        self.options = options
+
+    async def send_message(self, message: Union[str, UserMessage]) -> str:
+        text = message if isinstance(message, str) else message.text
+        response = await litellm.acompletion(
+            messages=self.spec["messages"] + [{"role": "user", "content": text}],
+            **_litellm_params(self.spec),
+            **self.options
+        )
+        return response.choices[0].message.content or ""
+
+
+def is_provider_failure(error: Exception) -> bool:
+    """Whether an error says the provider is unhealthy (counts toward the breaker)"""
+    if is_transient_error(error):
+        return True
+    message = str(error).lower()
+    if any(marker in message for marker in _NON_RETRYABLE_MARKERS):
+        return True
+    # Bad requests (prompt too long, content filtered) are the caller's problem
+    return not any(marker in message for marker in _CLIENT_ERROR_MARKERS)
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead; moves OPEN -> HALF_OPEN after the cooldown"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def allow_peek(self) -> bool:
+        """Like allow() but without claiming the half-open probe"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at >= self.cooldown
+        return not self._probe_in_flight
+
+    def retry_after(self) -> int:
+        remaining = self.cooldown - (time.monotonic() - self.opened_at)
+        return max(1, int(remaining + 0.999))
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("LLM circuit breaker closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(f"LLM circuit breaker opened after {self.failures} consecutive failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """A half-open probe ended without a provider verdict (e.g. bad request)"""
+        self._probe_in_flight = False
+
+    def get_stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "failure_threshold": self.failure_threshold,
+            "cooldown_seconds": self.cooldown,
+            "times_opened": self.times_opened,
+            "retry_after_seconds": self.retry_after() if self.state == self.OPEN else 0
+        }
+
+
+class _Limiter:
+    """Semaphore that tracks how many callers hold or wait for it"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+
+    async def acquire(self, timeout: float) -> bool:
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=max(timeout, 0.001))
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self.semaphore.release()
+
+    def get_stats(self) -> dict:
+        return {"limit": self.limit, "active": self.active, "waiting": self.waiting}
+
+
+class LLMGateway:
+    def __init__(self):
+        self.api_key = os.environ.get("EMERGENT_LLM_KEY")
+        self.breaker = CircuitBreaker()
+        self._global: Optional[_Limiter] = None
+        self._endpoints: Dict[str, _Limiter] = {}
+        self._resellers: Dict[str, _Limiter] = {}
+        self.stats = {
+            "calls": 0, "succeeded": 0, "failed": 0, "retried": 0, "timed_out": 0,
+            "rejected_busy": 0, "rejected_quota": 0, "rejected_circuit": 0, "streamed": 0
+        }
+        self.endpoint_stats: Dict[str, Dict[str, int]] = {}
+        # Provider settings and turns of each chat created by new_chat(): the model
+        # for metrics of send(), the rest to stream the chat through litellm
+        self._chat_specs: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    # ---------- limits ----------
+
+    def _global_limiter(self) -> _Limiter:
+        if self._global is None:
+            self._global = _Limiter(LLM_MAX_CONCURRENCY)
+        return self._global
+
+    def _endpoint_limiter(self, endpoint: str) -> _Limiter:
+        limiter = self._endpoints.get(endpoint)
+        if limiter is None:
+            limiter = _Limiter(int(LLM_ENDPOINT_LIMITS.get(endpoint, LLM_ENDPOINT_CONCURRENCY)))
+            self._endpoints[endpoint] = limiter
+        return limiter
+
+    def _reseller_limiter(self, reseller_id: str) -> _Limiter:
+        limiter = self._resellers.get(reseller_id)
+        if limiter is None:
+            limiter = _Limiter(LLM_RESELLER_CONCURRENCY)
+            self._resellers[reseller_id] = limiter
+        return limiter
+
+    def _count(self, endpoint: str, key: str):
+        self.stats[key] += 1
+        counters = self.endpoint_stats.setdefault(endpoint, {})
+        counters[key] = counters.get(key, 0) + 1
+
+    def is_available(self) -> bool:
+        """False while the circuit breaker is open (use the rule-based fallback)"""
+        return self.breaker.allow_peek()
+
+    # ---------- calls ----------
+
+    def new_chat(
+        self,
+        session_id: str,
+        system_message: str,
+        model: str = LLM_DEFAULT_MODEL,
+        provider: str = LLM_DEFAULT_PROVIDER,
+        api_key: Optional[str] = None
+    ) -> LlmChat:
+        """A chat object for multi-turn conversations sent through send()"""
+        spec = self._new_spec(system_message, model, provider, api_key)
+        chat = LlmChat(api_key=spec["api_key"], session_id=session_id, system_message=system_message).with_model(provider, model)
+        try:
+            self._chat_specs[chat] = spec
+        except TypeError:
+            pass
+        return chat
+
+    def _new_spec(self, system_message: str, model: str, provider: str, api_key: Optional[str]) -> Dict:
+        api_key = api_key or self.api_key or os.environ.get("EMERGENT_LLM_KEY")
+        if not api_key:
+            raise HTTPException(status_code=500, detail="AI service not configured")
+        return {
+            "provider": provider,
+            "model": model,
+            "api_key": api_key,
+            "messages": [{"role": "system", "content": system_message}],
+            # Set once a turn was streamed: LlmChat's own history lacks it from then on
+            "streamed": False
+        }
+
+    def _chat_spec(self, chat) -> Optional[Dict]:
+        try:
+            return self._chat_specs.get(chat)
+        except TypeError:
+            return None
+
+    def _chat_model(self, chat) -> str:
+        spec = self._chat_spec(chat)
+        return spec["model"] if spec else "unknown"
+
+    async def complete(
+        self,
+        prompt: str,
+        *,
+        system_message: str,
+        endpoint: str,
+        session_id: Optional[str] = None,
+        model: str = LLM_DEFAULT_MODEL,
+        provider: str = LLM_DEFAULT_PROVIDER,
+        reseller_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        api_key: Optional[str] = None,
+        cache: bool = True,
+        response_format: Optional[Dict] = None
+    ) -> str:
+        """
+        Send a single prompt and return the response text. Responses of
+        endpoints with a cache TTL are served from llm_response_cache unless
+        `cache` is False. `response_format` (e.g. {"type": "json_object"}) is
+        passed to the provider.
+        """
+        session_id = session_id or endpoint
+
+        def chat_factory():
+            # A fresh chat per attempt, so a retry never replays a half-recorded turn
+            if response_format:
+                return _CompletionChat(
+                    self._new_spec(system_message, model, provider, api_key), response_format=response_format
+                )
+            return self.new_chat(session_id, system_message, model, provider, api_key)
+
+        def call():
+            return self._call(
+                chat_factory, prompt, endpoint, reseller_id, timeout, max_retries,
+                model=model, prompt_chars=len(system_message) + len(prompt)
+            )
+
+        if not cache or not llm_response_cache.ttl_for(endpoint):
+            return await call()
+        started = time.monotonic()
+        response, source = await llm_response_cache.get_or_compute(
+            prompt_cache_key(
+                provider, f"{model}:{json.dumps(response_format, sort_keys=True)}" if response_format else model,
+                system_message, prompt
+            ),
+            endpoint,
+            call,
+            input_tokens=estimate_tokens(system_message) + estimate_tokens(prompt)
+        )
+        if source != SOURCE_COMPUTED:
+            llm_metrics.record_served(
+                endpoint, SOURCE_CACHE, reseller_id=reseller_id,
+                latency_ms=(time.monotonic() - started) * 1000, response=response
+            )
+        return response
+
+    async def send(
+        self,
+        chat: LlmChat,
+        message: Union[str, UserMessage],
+        *,
+        endpoint: str,
+        reseller_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_retries: int = 0
+    ) -> str:
+        """
+        Send a message on an existing (multi-turn) chat. Not retried by
+        default, since the chat may already have recorded the failed turn.
+        """
+        spec = self._chat_spec(chat)
+        if spec and spec["streamed"]:
+            # The conversation continues from turns only the gateway holds
+            return "".join([chunk async for chunk in self.stream_send(
+                chat, message, endpoint=endpoint, reseller_id=reseller_id, timeout=timeout
+            )])
+        response = await self._call(
+            lambda: chat, message, endpoint, reseller_id, timeout, max_retries,
+            model=self._chat_model(chat), prompt_chars=_message_chars(message)
+        )
+        if spec:
+            spec["messages"] += [
+                {"role": "user", "content": message if isinstance(message, str) else message.text},
+                {"role": "assistant", "content": response}
+            ]
+        return response
+
+    def stream(
+        self,
+        prompt: str,
+        *,
+        system_message: str,
+        endpoint: str,
+        session_id: Optional[str] = None,
+        model: str = LLM_DEFAULT_MODEL,
+        provider: str = LLM_DEFAULT_PROVIDER,
+        reseller_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+        api_key: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Send a single prompt and yield the response text in chunks as the
+        provider produces them. Same limits, deadline and breaker as complete().
+        """
+        session_id = session_id or endpoint
+        chat = self.new_chat(session_id, system_message, model, provider, api_key)
+        return self._stream(chat, prompt, endpoint, reseller_id, timeout, len(system_message))
+
+    def stream_send(
+        self,
+        chat: LlmChat,
+        message: Union[str, UserMessage],
+        *,
+        endpoint: str,
+        reseller_id: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """Streaming counterpart of send() for multi-turn chats"""
+        return self._stream(chat, message, endpoint, reseller_id, timeout)
+
+    async def _stream(self, chat, message, endpoint, reseller_id, timeout, system_chars: int = 0) -> AsyncIterator[str]:
+        started = time.monotonic()
+        outcome = OUTCOME_ERROR
+        completion_chars = 0
+        chunks = self._stream_chunks(chat, message, endpoint, reseller_id, timeout)
+        try:
+            async for text in chunks:
+                completion_chars += len(text)
+                yield text
+            outcome = OUTCOME_OK
+        except BaseException as e:
+            outcome = call_outcome(e)
+            raise
+        finally:
+            # Release the limits now when the caller stops reading early
+            await chunks.aclose()
+            llm_metrics.record(
+                endpoint,
+                model=self._chat_model(chat),
+                outcome=outcome,
+                latency_ms=(time.monotonic() - started) * 1000,
+                prompt_chars=system_chars + _message_chars(message),
+                completion_chars=completion_chars,
+                reseller_id=reseller_id
+            )
+
+    @staticmethod
+    def _streamable(spec: Optional[Dict], message) -> bool:
+        # Attachments are only understood by LlmChat
+        return spec is not None and not getattr(message, "file_contents", None)
+
+    @staticmethod
+    async def _provider_stream(spec: Dict, messages: List[Dict[str, str]], timeout: float) -> AsyncIterator[str]:
+        """Tokens of a completion as the provider produces them"""
+        response = await litellm.acompletion(messages=messages, stream=True, timeout=timeout, **_litellm_params(spec))
+        try:
+            async for part in response:
+                text = part.choices[0].delta.content if part.choices else None
+                if text:
+                    yield text
+        finally:
+            close = getattr(response, "aclose", None)
+            if close is not None:
+                await close()
+
+    async def _stream_chunks(self, chat, message, endpoint, reseller_id, timeout) -> AsyncIterator[str]:
+        timeout = timeout or LLM_ENDPOINT_TIMEOUTS.get(endpoint, LLM_TIMEOUT)
+        deadline = time.monotonic() + timeout
+        self._count(endpoint, "calls")
+        self._count(endpoint, "streamed")
+        if isinstance(message, str):
+            message = UserMessage(text=message)
+
+        acquired = await self._acquire(endpoint, reseller_id, deadline)
+        try:
+            spec = self._chat_spec(chat)
+            if not self._streamable(spec, message):
+                # Not a gateway chat, or a message with attachments: deliver the whole response as one chunk
+                yield await self._send_with_retries(lambda: chat, message, endpoint, deadline, 0)
+                return
+
+            if not self.breaker.allow():
+                self._count(endpoint, "rejected_circuit")
+                raise LLMUnavailableError(retry_after=self.breaker.retry_after())
+            turn = {"role": "user", "content": message.text}
+            chunks = self._provider_stream(spec, spec["messages"] + [turn], timeout)
+            parts = []
+            try:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        if remaining <= 0:
+                            raise asyncio.TimeoutError()
+                        text = await asyncio.wait_for(chunks.__anext__(), timeout=remaining)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        self.breaker.record_failure()
+                        self._count(endpoint, "timed_out")
+                        logger.warning(f"LLM stream for {endpoint} hit its deadline")
+                        raise LLMTimeoutError()
+                    except (HTTPException, asyncio.CancelledError):
+                        raise
+                    except Exception as e:
+                        if is_provider_failure(e):
+                            self.breaker.record_failure()
+                        else:
+                            self.breaker.release_probe()
+                        self._count(endpoint, "failed")
+                        raise
+                    parts.append(text)
+                    yield text
+            except (HTTPException, asyncio.CancelledError, GeneratorExit):
+                # Ended by the caller (or a gateway error) without a provider verdict
+                self.breaker.release_probe()
+                raise
+            finally:
+                await chunks.aclose()
+            self.breaker.record_success()
+            self._count(endpoint, "succeeded")
+            # Keep the turn for the chat's next message
+            spec["messages"] += [turn, {"role": "assistant", "content": "".join(parts)}]
+            spec["streamed"] = True
+        finally:
+            self._release(acquired)
+
+    async def _acquire(self, endpoint: str, reseller_id: Optional[str], deadline: float) -> List[_Limiter]:
+        """Take the reseller, endpoint and global slots (in that order) or raise"""
+        if not self.breaker.allow_peek():
+            self._count(endpoint, "rejected_circuit")
+            raise LLMUnavailableError(retry_after=self.breaker.retry_after())
+
+        acquired = []
+        try:
+            if reseller_id:
+                limiter = self._reseller_limiter(reseller_id)
+                if not await limiter.acquire(min(LLM_QUEUE_TIMEOUT, deadline - time.monotonic())):
+                    self._count(endpoint, "rejected_quota")
+                    raise LLMQuotaError()
+                acquired.append(limiter)
+            for limiter in (self._endpoint_limiter(endpoint), self._global_limiter()):
+                if not await limiter.acquire(min(LLM_QUEUE_TIMEOUT, deadline - time.monotonic())):
+                    self._count(endpoint, "rejected_busy")
+                    raise LLMUnavailableError(
+                        "The AI service is busy right now. Please try again in a few seconds.",
+                        retry_after=5
+                    )
+                acquired.append(limiter)
+        except BaseException:
+            self._release(acquired)
+            raise
+        return acquired
+
+    @staticmethod
+    def _release(acquired: List[_Limiter]):
+        for limiter in reversed(acquired):
+            limiter.release()
+
+    async def _call(
+        self, chat_factory, message, endpoint, reseller_id, timeout, max_retries,
+        model: str = "unknown", prompt_chars: int = 0
+    ) -> str:
+        timeout = timeout or LLM_ENDPOINT_TIMEOUTS.get(endpoint, LLM_TIMEOUT)
+        max_retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+        started = time.monotonic()
+        deadline = started + timeout
+        self._count(endpoint, "calls")
+
+        outcome = OUTCOME_ERROR
+        response = None
+        try:
+            acquired = await self._acquire(endpoint, reseller_id, deadline)
+            try:
+                if isinstance(message, str):
+                    message = UserMessage(text=message)
+                response = await self._send_with_retries(chat_factory, message, endpoint, deadline, max_retries)
+                outcome = OUTCOME_OK
+                return response
+            finally:
+                self._release(acquired)
+        except BaseException as e:
+            outcome = call_outcome(e)
+            raise
+        finally:
+            llm_metrics.record(
+                endpoint,
+                model=model,
+                outcome=outcome,
+                latency_ms=(time.monotonic() - started) * 1000,
+                prompt_chars=prompt_chars,
+                completion_chars=len(response) if isinstance(response, str) else 0,
+                reseller_id=reseller_id
+            )
+
+    async def _send_with_retries(self, chat_factory, message, endpoint, deadline, max_retries) -> str:
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self._count(endpoint, "rejected_circuit")
+                raise LLMUnavailableError(retry_after=self.breaker.retry_after())
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count(endpoint, "timed_out")
+                raise LLMTimeoutError()
+            try:
+                response = await asyncio.wait_for(chat_factory().send_message(message), timeout=remaining)
+            except asyncio.TimeoutError:
+                self.breaker.record_failure()
+                self._count(endpoint, "timed_out")
+                logger.warning(f"LLM call for {endpoint} hit its deadline")
+                raise LLMTimeoutError()
+            except (HTTPException, asyncio.CancelledError):
+                self.breaker.release_probe()
+                raise
+            except Exception as e:
+                if is_provider_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release_probe()
+
+                delay = min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * (2 ** attempt)) * random.uniform(0.5, 1.0)
+                if attempt < max_retries and is_transient_error(e) and time.monotonic() + delay < deadline:
+                    attempt += 1
+                    self._count(endpoint, "retried")
+                    logger.warning(f"LLM call for {endpoint} failed ({str(e)[:200]}), retry {attempt}/{max_retries} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                self._count(endpoint, "failed")
+                raise
+            else:
+                self.breaker.record_success()
+                self._count(endpoint, "succeeded")
+                return response
+
+    def get_stats(self) -> dict:
+        return {
+            "available": self.is_available(),
+            "circuit_breaker": self.breaker.get_stats(),
+            "global": self._global_limiter().get_stats(),
+            "endpoints": {name: limiter.get_stats() for name, limiter in self._endpoints.items()},
+            "resellers_active": sum(1 for limiter in self._resellers.values() if limiter.active or limiter.waiting),
+            "reseller_limit": LLM_RESELLER_CONCURRENCY,
+            "queue_timeout_seconds": LLM_QUEUE_TIMEOUT,
+            "default_timeout_seconds": LLM_TIMEOUT,
+            "max_retries": LLM_MAX_RETRIES,
+            **self.stats,
+            "by_endpoint": self.endpoint_stats
+        }
+
+
+# Global instance
+llm_gateway = LLMGateway()
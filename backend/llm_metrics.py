@@ -0,0 +1,422 @@
+"""
+LLM Metrics - Usage, size and latency of every LLM call per endpoint and tenant
+
+The gateway records each call it makes (and each answer served from the
+response cache) with its gateway endpoint, the HTTP route that triggered it,
+the reseller, the model, estimated prompt and completion tokens, latency and
+outcome. Endpoints with a rule-based fallback or their own result cache
+(ATS check, CV analysis) record the answers they serve without the provider.
+
+Two views are kept:
+- in-process counters and histograms, exported in the Prometheus text format
+  at GET /metrics (per process; labels exclude the reseller on histograms to
+  bound series cardinality)
+- daily rollups in the `llm_usage_daily` collection, one document per day,
+  endpoint, route, reseller, model, outcome and source, incremented every
+  LLM_METRICS_FLUSH_SECONDS; the admin dashboard reads these
+"""
+import asyncio
+import contextvars
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable via environment)
+LLM_METRICS_FLUSH_SECONDS = float(os.environ.get("LLM_METRICS_FLUSH_SECONDS", 60))
+LLM_METRICS_RETENTION_DAYS = int(os.environ.get("LLM_METRICS_RETENTION_DAYS", 400))
+
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 20000, 40000, 60000, 120000)
+TOKEN_BUCKETS = (64, 256, 1024, 2048, 4096, 8192, 16384, 32768)
+
+# Outcomes
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_REJECTED = "rejected"
+OUTCOME_CANCELLED = "cancelled"
+
+# Where an answer came from
+SOURCE_PROVIDER = "provider"
+SOURCE_CACHE = "cache"
+SOURCE_FALLBACK = "fallback"
+
+# Route for calls made outside an HTTP request (scheduler, job workers)
+ROUTE_BACKGROUND = "background"
+PLATFORM = "platform"
+
+_ROLLUP_KEY = ("date", "endpoint", "route", "reseller_id", "model", "outcome", "source")
+
+# ASGI scope of the request being served, set by LLMRouteMiddleware
+_request_scope: contextvars.ContextVar = contextvars.ContextVar("llm_request_scope", default=None)
+
+
+class LLMRouteMiddleware:
+    """Remembers the current request so LLM calls can be attributed to their route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+def current_route() -> str:
+    """Path template of the route being served (the router fills it in after routing)"""
+    scope = _request_scope.get()
+    if scope is None:
+        return ROUTE_BACKGROUND
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("path", ROUTE_BACKGROUND)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, cumulative count) pairs, ending with +Inf"""
+        pairs, running = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            pairs.append((str(bound), running))
+        pairs.append(("+Inf", self.count))
+        return pairs
+
+
+def latency_bucket(latency_ms: float) -> str:
+    """Upper bound of the latency bucket holding `latency_ms`"""
+    for bound in LATENCY_BUCKETS_MS:
+        if latency_ms <= bound:
+            return str(bound)
+    return "+Inf"
+
+
+def bucket_percentile(buckets: Dict[str, int], quantile: float) -> Optional[float]:
+    """Approximate percentile (the bucket's upper bound) from rollup bucket counts"""
+    total = sum(buckets.values())
+    if not total:
+        return None
+    target, running = quantile * total, 0
+    for bound in [str(b) for b in LATENCY_BUCKETS_MS] + ["+Inf"]:
+        running += buckets.get(bound, 0)
+        if running >= target:
+            return float(bound) if bound != "+Inf" else float(LATENCY_BUCKETS_MS[-1])
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}"
+
+
+class LLMMetrics:
+    def __init__(self):
+        self.db = None
+        # (endpoint, route, model, outcome, source) -> calls
+        self.requests: Dict[Tuple, int] = {}
+        # (reseller, outcome) -> calls, (reseller, direction) -> tokens
+        self.reseller_requests: Dict[Tuple, int] = {}
+        self.reseller_tokens: Dict[Tuple, int] = {}
+        # (endpoint, direction) -> tokens
+        self.tokens: Dict[Tuple, int] = {}
+        # (endpoint, source) -> latency histogram; (endpoint, direction) -> token histogram
+        self.latency: Dict[Tuple, Histogram] = {}
+        self.token_sizes: Dict[Tuple, Histogram] = {}
+        # Rollup increments not yet written to Mongo
+        self._pending: Dict[Tuple, Dict[str, Any]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self.stats = {"recorded": 0, "flushes": 0, "flush_errors": 0, "rollups_written": 0}
+
+    def set_db(self, database):
+        self.db = database
+
+    async def ensure_indexes(self):
+        await self.db.llm_usage_daily.create_index([(field, 1) for field in _ROLLUP_KEY], unique=True)
+        await self.db.llm_usage_daily.create_index("day", expireAfterSeconds=LLM_METRICS_RETENTION_DAYS * 86400)
+
+    # ---------- recording ----------
+
+    def record(
+        self,
+        endpoint: str,
+        *,
+        model: str,
+        outcome: str,
+        latency_ms: float,
+        prompt_chars: int = 0,
+        completion_chars: int = 0,
+        reseller_id: Optional[str] = None,
+        source: str = SOURCE_PROVIDER
+    ):
+        """Record one LLM call (or one answer served without calling the provider)"""
+        route = current_route()
+        reseller = reseller_id or PLATFORM
+        # About four characters per token, as estimated for the response cache
+        prompt_tokens = (prompt_chars + 3) // 4
+        completion_tokens = (completion_chars + 3) // 4
+        self.stats["recorded"] += 1
+
+        key = (endpoint, route, model, outcome, source)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        self.reseller_requests[(reseller, outcome)] = self.reseller_requests.get((reseller, outcome), 0) + 1
+        self._histogram(self.latency, (endpoint, source), LATENCY_BUCKETS_MS).observe(latency_ms)
+        if source == SOURCE_PROVIDER:
+            # Only provider calls cost tokens
+            for direction, count in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+                if count:
+                    self.tokens[(endpoint, direction)] = self.tokens.get((endpoint, direction), 0) + count
+                    self.reseller_tokens[(reseller, direction)] = self.reseller_tokens.get((reseller, direction), 0) + count
+                    self._histogram(self.token_sizes, (endpoint, direction), TOKEN_BUCKETS).observe(count)
+
+        day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        rollup = self._pending.setdefault(
+            (day, endpoint, route, reseller_id, model, outcome, source),
+            {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "prompt_chars": 0,
+             "completion_chars": 0, "latency_ms_sum": 0.0, "latency_ms_max": 0.0, "latency_buckets": {}}
+        )
+        rollup["calls"] += 1
+        rollup["prompt_tokens"] += prompt_tokens
+        rollup["completion_tokens"] += completion_tokens
+        rollup["prompt_chars"] += prompt_chars
+        rollup["completion_chars"] += completion_chars
+        rollup["latency_ms_sum"] += latency_ms
+        rollup["latency_ms_max"] = max(rollup["latency_ms_max"], latency_ms)
+        bucket = latency_bucket(latency_ms)
+        rollup["latency_buckets"][bucket] = rollup["latency_buckets"].get(bucket, 0) + 1
+
+    def record_served(
+        self,
+        endpoint: str,
+        source: str,
+        *,
+        reseller_id: Optional[str] = None,
+        latency_ms: float = 0.0,
+        response: Optional[str] = None
+    ):
+        """Record an answer served from a cache or a rule-based fallback"""
+        self.record(
+            endpoint,
+            model=source,
+            outcome=OUTCOME_OK,
+            latency_ms=latency_ms,
+            completion_chars=len(response) if isinstance(response, str) else 0,
+            reseller_id=reseller_id,
+            source=source
+        )
+
+    @staticmethod
+    def _histogram(histograms: Dict[Tuple, Histogram], key: Tuple, buckets: Tuple) -> Histogram:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram(buckets)
+        return histogram
+
+    # ---------- daily rollups ----------
+
+    async def flush(self) -> int:
+        """Write pending rollup increments to llm_usage_daily"""
+        if not self._pending or self.db is None:
+            return 0
+        from pymongo import UpdateOne
+
+        pending, self._pending = self._pending, {}
+        now = datetime.now(timezone.utc)
+        operations = []
+        for key, rollup in pending.items():
+            increments = {field: rollup[field] for field in (
+                "calls", "prompt_tokens", "completion_tokens", "prompt_chars", "completion_chars", "latency_ms_sum"
+            )}
+            for bound, count in rollup["latency_buckets"].items():
+                increments[f"latency_buckets.{bound}"] = count
+            operations.append(UpdateOne(
+                dict(zip(_ROLLUP_KEY, key)),
+                {
+                    "$inc": increments,
+                    "$max": {"latency_ms_max": rollup["latency_ms_max"]},
+                    "$set": {"updated_at": now},
+                    "$setOnInsert": {"day": datetime.strptime(key[0], "%Y-%m-%d").replace(tzinfo=timezone.utc)}
+                },
+                upsert=True
+            ))
+        try:
+            await self.db.llm_usage_daily.bulk_write(operations, ordered=False)
+        except Exception as e:
+            # Keep the increments for the next flush rather than losing them
+            self.stats["flush_errors"] += 1
+            logger.error(f"Failed to write LLM usage rollups: {str(e)}")
+            for key, rollup in pending.items():
+                self._merge_pending(key, rollup)
+            return 0
+        self.stats["flushes"] += 1
+        self.stats["rollups_written"] += len(operations)
+        return len(operations)
+
+    def _merge_pending(self, key: Tuple, rollup: Dict[str, Any]):
+        current = self._pending.get(key)
+        if current is None:
+            self._pending[key] = rollup
+            return
+        for field in ("calls", "prompt_tokens", "completion_tokens", "prompt_chars", "completion_chars", "latency_ms_sum"):
+            current[field] += rollup[field]
+        current["latency_ms_max"] = max(current["latency_ms_max"], rollup["latency_ms_max"])
+        for bound, count in rollup["latency_buckets"].items():
+            current["latency_buckets"][bound] = current["latency_buckets"].get(bound, 0) + count
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(LLM_METRICS_FLUSH_SECONDS)
+            await self.flush()
+
+    def start(self):
+        if self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._flush_periodically())
+
+    async def shutdown(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+    async def usage_report(self, days: int = 30, group_by: str = "endpoint", endpoint: Optional[str] = None) -> Dict[str, Any]:
+        """Usage totals per `group_by` (endpoint, route, reseller_id, model or date) over the last `days` days"""
+        since = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        query = {"date": {"$gte": since}}
+        if endpoint:
+            query["endpoint"] = endpoint
+        groups: Dict[str, Dict[str, Any]] = {}
+        async for rollup in self.db.llm_usage_daily.find(query, {"_id": 0}):
+            name = rollup.get(group_by) or (PLATFORM if group_by == "reseller_id" else "unknown")
+            group = groups.setdefault(name, {
+                group_by: name, "calls": 0, "errors": 0, "timeouts": 0, "rejected": 0, "cache_hits": 0,
+                "fallbacks": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_ms_sum": 0.0,
+                "provider_calls": 0, "latency_ms_max": 0.0, "latency_buckets": {}
+            })
+            calls = rollup.get("calls", 0)
+            group["calls"] += calls
+            outcome, source = rollup.get("outcome"), rollup.get("source")
+            if outcome == OUTCOME_ERROR:
+                group["errors"] += calls
+            elif outcome == OUTCOME_TIMEOUT:
+                group["timeouts"] += calls
+            elif outcome == OUTCOME_REJECTED:
+                group["rejected"] += calls
+            if source == SOURCE_CACHE:
+                group["cache_hits"] += calls
+            elif source == SOURCE_FALLBACK:
+                group["fallbacks"] += calls
+            else:
+                # Latency figures describe provider calls only
+                group["provider_calls"] += calls
+                group["prompt_tokens"] += rollup.get("prompt_tokens", 0)
+                group["completion_tokens"] += rollup.get("completion_tokens", 0)
+                group["latency_ms_sum"] += rollup.get("latency_ms_sum", 0.0)
+                group["latency_ms_max"] = max(group["latency_ms_max"], rollup.get("latency_ms_max", 0.0))
+                for bound, count in (rollup.get("latency_buckets") or {}).items():
+                    group["latency_buckets"][bound] = group["latency_buckets"].get(bound, 0) + count
+
+        rows = []
+        for group in groups.values():
+            buckets = group.pop("latency_buckets")
+            latency_sum = group.pop("latency_ms_sum")
+            provider_calls = group["provider_calls"]
+            failed = group["errors"] + group["timeouts"] + group["rejected"]
+            rows.append({
+                **group,
+                "error_rate": round(failed / group["calls"], 4) if group["calls"] else 0.0,
+                "cache_hit_rate": round(group["cache_hits"] / group["calls"], 4) if group["calls"] else 0.0,
+                "avg_latency_ms": round(latency_sum / provider_calls, 1) if provider_calls else None,
+                "p50_latency_ms": bucket_percentile(buckets, 0.5),
+                "p95_latency_ms": bucket_percentile(buckets, 0.95),
+                "latency_ms_max": round(group["latency_ms_max"], 1)
+            })
+        rows.sort(key=lambda row: row["calls"], reverse=True)
+        return {
+            "days": days,
+            "since": since,
+            "group_by": group_by,
+            "totals": {
+                field: sum(row[field] for row in rows)
+                for field in ("calls", "errors", "timeouts", "rejected", "cache_hits", "fallbacks", "prompt_tokens", "completion_tokens")
+            },
+            "rows": rows
+        }
+
+    # ---------- export ----------
+
+    def render_prometheus(self) -> str:
+        """Counters and histograms of this process in the Prometheus text format"""
+        lines = [
+            "# HELP llm_requests_total LLM calls and answers served without the provider",
+            "# TYPE llm_requests_total counter"
+        ]
+        names = ("endpoint", "route", "model", "outcome", "source")
+        for key, count in sorted(self.requests.items()):
+            lines.append(f"llm_requests_total{_labels(names, key)} {count}")
+
+        lines += ["# HELP llm_tokens_total Estimated tokens sent to and received from the provider",
+                  "# TYPE llm_tokens_total counter"]
+        for key, count in sorted(self.tokens.items()):
+            lines.append(f"llm_tokens_total{_labels(('endpoint', 'direction'), key)} {count}")
+
+        lines += ["# HELP llm_reseller_requests_total LLM calls per reseller",
+                  "# TYPE llm_reseller_requests_total counter"]
+        for key, count in sorted(self.reseller_requests.items()):
+            lines.append(f"llm_reseller_requests_total{_labels(('reseller', 'outcome'), key)} {count}")
+
+        lines += ["# HELP llm_reseller_tokens_total Estimated provider tokens per reseller",
+                  "# TYPE llm_reseller_tokens_total counter"]
+        for key, count in sorted(self.reseller_tokens.items()):
+            lines.append(f"llm_reseller_tokens_total{_labels(('reseller', 'direction'), key)} {count}")
+
+        for name, help_text, histograms, label_names in (
+            ("llm_latency_ms", "LLM call latency in milliseconds", self.latency, ("endpoint", "source")),
+            ("llm_tokens", "Estimated tokens per provider call", self.token_sizes, ("endpoint", "direction"))
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for key, histogram in sorted(histograms.items()):
+                for le, count in histogram.cumulative():
+                    bucket_labels = _labels(label_names, key, 'le="' + le + '"')
+                    lines.append(f"{name}_bucket{bucket_labels} {count}")
+                lines.append(f"{name}_sum{_labels(label_names, key)} {round(histogram.total, 3)}")
+                lines.append(f"{name}_count{_labels(label_names, key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "pending_rollups": len(self._pending),
+            "series": len(self.requests),
+            "flush_seconds": LLM_METRICS_FLUSH_SECONDS
+        }
+
+
+# Global instance
+llm_metrics = LLMMetrics()
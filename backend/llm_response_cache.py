@@ -0,0 +1,278 @@
+"""
+LLM Response Cache - Prompt-keyed cache for deterministic AI endpoints
+
+Endpoints whose output is a pure function of their prompt (section
+improvements, skill suggestions, CV summaries, LinkedIn sections) are
+answered from this cache when the same model, system prompt and user prompt
+were seen recently. Entries live in a bounded in-memory LRU in front of the
+`llm_response_cache` collection, which expires documents through a TTL
+index on `expires_at`. Identical prompts that arrive while the first one is
+still in flight share its call.
+
+Only endpoints listed in LLM_CACHE_TTLS are cached, each with its own TTL;
+an endpoint set to 0 is opted out, and callers pass cache=False to
+llm_gateway.complete() for a single call that should vary. Every hit
+records the estimated tokens and provider latency it saved.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_ttls(value: str) -> Dict[str, int]:
+    """'cv_skills=3600,cv_summary=0' -> {'cv_skills': 3600, 'cv_summary': 0}"""
+    ttls = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, seconds = item.partition("=")
+        try:
+            ttls[name.strip()] = int(seconds)
+        except ValueError:
+            logger.warning(f"Ignoring invalid LLM cache TTL setting: {item}")
+    return ttls
+
+
+# Configuration (overridable via environment)
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_MEMORY_ENTRIES = int(os.environ.get("LLM_CACHE_MEMORY_ENTRIES", 1024))
+
+# Cached endpoints (gateway endpoint names) and their TTLs in seconds,
+# e.g. LLM_CACHE_TTLS="cv_summary=3600,linkedin_section=0"
+LLM_CACHE_TTLS = {
+    "improve_section": 24 * 3600,
+    "resume_skills": 7 * 24 * 3600,
+    "cv_builder_skills": 7 * 24 * 3600,
+    "cv_skills": 7 * 24 * 3600,
+    "cv_summary": 24 * 3600,
+    "job_skills_suggest": 7 * 24 * 3600,
+    "talent_skills_improve": 24 * 3600,
+    "linkedin_section": 24 * 3600,
+    **_parse_ttls(os.environ.get("LLM_CACHE_TTLS", ""))
+}
+
+# Where a response came from
+SOURCE_MEMORY = "memory"
+SOURCE_MONGO = "mongo"
+SOURCE_COALESCED = "coalesced"
+SOURCE_COMPUTED = "computed"
+
+_HIT_COUNTERS = {SOURCE_MEMORY: "memory_hits", SOURCE_MONGO: "mongo_hits", SOURCE_COALESCED: "coalesced"}
+
+
+def prompt_cache_key(provider: str, model: str, system_message: str, prompt: str) -> str:
+    """Cache key for a prompt: a hash of the model and both prompts"""
+    digest = hashlib.sha256()
+    for part in (provider, model, system_message, prompt):
+        digest.update(part.encode())
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+
+class LLMResponseCache:
+    def __init__(self, max_entries: int = LLM_CACHE_MEMORY_ENTRIES):
+        self.db = None
+        self.enabled = LLM_CACHE_ENABLED
+        self.max_entries = max_entries
+        # key -> (expires monotonic, response, tokens, latency_ms)
+        self._memory: "OrderedDict[str, Tuple[float, str, int, float]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.stats = {
+            "memory_hits": 0, "mongo_hits": 0, "coalesced": 0, "misses": 0,
+            "stored": 0, "errors": 0, "tokens_saved": 0, "latency_saved_ms": 0.0
+        }
+        self.endpoint_stats: Dict[str, Dict[str, float]] = {}
+
+    def set_db(self, database):
+        self.db = database
+
+    async def ensure_indexes(self):
+        await self.db.llm_response_cache.create_index("key", unique=True)
+        await self.db.llm_response_cache.create_index("expires_at", expireAfterSeconds=0)
+
+    def ttl_for(self, endpoint: str) -> int:
+        """TTL in seconds for an endpoint, 0 when its responses are not cached"""
+        if not self.enabled:
+            return 0
+        return LLM_CACHE_TTLS.get(endpoint, 0)
+
+    # ---------- memory tier ----------
+
+    def _memory_get(self, key: str) -> Optional[Tuple[str, int, float]]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires_at, response, tokens, latency_ms = entry
+        if expires_at < time.monotonic():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return response, tokens, latency_ms
+
+    def _memory_put(self, key: str, response: str, tokens: int, latency_ms: float, ttl_seconds: float):
+        if ttl_seconds <= 0:
+            return
+        self._memory[key] = (time.monotonic() + ttl_seconds, response, tokens, latency_ms)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # ---------- lookup ----------
+
+    async def get(self, key: str) -> Tuple[Optional[str], Optional[str], int, float]:
+        """Cached response, its tier, and the tokens and latency it cost, or (None, None, 0, 0)"""
+        entry = self._memory_get(key)
+        if entry is not None:
+            return entry[0], SOURCE_MEMORY, entry[1], entry[2]
+        if self.db is None:
+            return None, None, 0, 0.0
+
+        cached = await self.db.llm_response_cache.find_one(
+            {"key": key},
+            {"_id": 0, "response": 1, "tokens": 1, "latency_ms": 1, "expires_at": 1}
+        )
+        if not cached or cached.get("response") is None:
+            return None, None, 0, 0.0
+        expires_at = cached["expires_at"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        if remaining <= 0:
+            # Expired but not yet removed by the TTL monitor
+            return None, None, 0, 0.0
+        tokens, latency_ms = cached.get("tokens", 0), cached.get("latency_ms", 0.0)
+        self._memory_put(key, cached["response"], tokens, latency_ms, remaining)
+        return cached["response"], SOURCE_MONGO, tokens, latency_ms
+
+    async def put(self, key: str, endpoint: str, response: str, tokens: int, latency_ms: float, ttl_seconds: int):
+        self._memory_put(key, response, tokens, latency_ms, ttl_seconds)
+        if self.db is None:
+            return
+        now = datetime.now(timezone.utc)
+        await self.db.llm_response_cache.update_one(
+            {"key": key},
+            {
+                "$set": {
+                    "key": key,
+                    "endpoint": endpoint,
+                    "response": response,
+                    "tokens": tokens,
+                    "latency_ms": latency_ms,
+                    "created_at": now,
+                    "expires_at": now + timedelta(seconds=ttl_seconds)
+                },
+                "$setOnInsert": {"hits": 0}
+            },
+            upsert=True
+        )
+        self.stats["stored"] += 1
+
+    def _endpoint_stats(self, endpoint: str) -> Dict[str, float]:
+        if endpoint not in self.endpoint_stats:
+            self.endpoint_stats[endpoint] = {"hits": 0, "misses": 0, "tokens_saved": 0, "latency_saved_ms": 0.0}
+        return self.endpoint_stats[endpoint]
+
+    def _record_hit(self, key: str, endpoint: str, source: str, tokens: int, latency_ms: float):
+        self.stats[_HIT_COUNTERS[source]] += 1
+        self.stats["tokens_saved"] += tokens
+        self.stats["latency_saved_ms"] += latency_ms
+        endpoint_stats = self._endpoint_stats(endpoint)
+        endpoint_stats["hits"] += 1
+        endpoint_stats["tokens_saved"] += tokens
+        endpoint_stats["latency_saved_ms"] += latency_ms
+        if self.db is not None and source != SOURCE_COALESCED:
+            # Per-entry savings for reporting; not worth delaying the response for
+            task = asyncio.ensure_future(self.db.llm_response_cache.update_one(
+                {"key": key},
+                {"$inc": {"hits": 1, "tokens_saved": tokens}}
+            ))
+            task.add_done_callback(self._task_done)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        endpoint: str,
+        compute: Callable[[], Awaitable[str]],
+        input_tokens: int = 0
+    ) -> Tuple[str, str]:
+        """
+        Cached response for `key`, or the result of `compute()`, which runs at
+        most once per key at a time. Returns (response, source). Errors from
+        `compute()` reach every waiting caller and nothing is cached.
+        """
+        response, source, tokens, latency_ms = await self.get(key)
+        if response is not None:
+            self._record_hit(key, endpoint, source, tokens, latency_ms)
+            return response, source
+
+        task = self._in_flight.get(key)
+        leader = task is None
+        if leader:
+            self.stats["misses"] += 1
+            self._endpoint_stats(endpoint)["misses"] += 1
+            task = asyncio.ensure_future(self._resolve(key, endpoint, compute, input_tokens))
+            task.add_done_callback(self._task_done)
+            self._in_flight[key] = task
+
+        # Shielded so one disconnecting client does not cancel the shared call
+        response, tokens, latency_ms = await asyncio.shield(task)
+        if leader:
+            return response, SOURCE_COMPUTED
+        self._record_hit(key, endpoint, SOURCE_COALESCED, tokens, latency_ms)
+        return response, SOURCE_COALESCED
+
+    async def _resolve(
+        self,
+        key: str,
+        endpoint: str,
+        compute: Callable[[], Awaitable[str]],
+        input_tokens: int
+    ) -> Tuple[str, int, float]:
+        started = time.monotonic()
+        try:
+            response = await compute()
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+        latency_ms = round((time.monotonic() - started) * 1000, 1)
+        tokens = input_tokens + estimate_tokens(response) if isinstance(response, str) else input_tokens
+        if isinstance(response, str) and response.strip():
+            try:
+                await self.put(key, endpoint, response, tokens, latency_ms, self.ttl_for(endpoint))
+            except Exception as e:
+                logger.warning(f"Failed to store LLM cache entry for {endpoint}: {str(e)}")
+        return response, tokens, latency_ms
+
+    @staticmethod
+    def _task_done(task: asyncio.Task):
+        # Retrieve the error so it is not reported as unhandled when every caller left
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "latency_saved_ms": round(self.stats["latency_saved_ms"], 1),
+            "enabled": self.enabled,
+            "memory_entries": len(self._memory),
+            "memory_max_entries": self.max_entries,
+            "in_flight": len(self._in_flight),
+            "ttl_seconds": {endpoint: ttl for endpoint, ttl in LLM_CACHE_TTLS.items() if ttl > 0},
+            "by_endpoint": self.endpoint_stats
+        }
+
+
+# Global instance
+llm_response_cache = LLMResponseCache()
@@ -0,0 +1,208 @@
+"""
+PDF Render Cache - Content-addressed cache for generated CV/resume PDFs
+
+Renders are keyed by a SHA-256 over the canonical JSON of
+(kind, template_id, data), so regenerating an unchanged CV (preview,
+download, save) returns the stored bytes instead of re-rendering.
+Two LRU tiers, each bounded by a byte budget:
+- memory: hot PDFs kept in-process
+- disk: larger spill-over shared across workers on the same host
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent
+
+# Configuration (overridable via environment)
+PDF_CACHE_MEMORY_BYTES = int(os.environ.get("PDF_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+PDF_CACHE_DISK_BYTES = int(os.environ.get("PDF_CACHE_DISK_BYTES", 512 * 1024 * 1024))
+PDF_CACHE_DIR = Path(os.environ.get("PDF_CACHE_DIR", ROOT_DIR / "cache" / "pdf_renders"))
+
+
+def make_render_key(kind: str, template_id: Optional[str], data: Any) -> str:
+    """Canonical content hash for a render request"""
+    payload = json.dumps(
+        {"kind": kind, "template_id": template_id, "data": data},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PDFRenderCache:
+    def __init__(
+        self,
+        memory_budget: int = PDF_CACHE_MEMORY_BYTES,
+        disk_budget: int = PDF_CACHE_DISK_BYTES,
+        cache_dir: Path = PDF_CACHE_DIR
+    ):
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.cache_dir = Path(cache_dir)
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: Optional["OrderedDict[str, int]"] = None  # key -> size, loaded lazily
+        self._disk_bytes = 0
+        self._disk_lock = asyncio.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    # ---------- memory tier ----------
+
+    def _memory_get(self, key: str) -> Optional[bytes]:
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+        return data
+
+    def _memory_put(self, key: str, data: bytes):
+        if len(data) > self.memory_budget:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_budget:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.stats["evictions"] += 1
+
+    # ---------- disk tier ----------
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.pdf"
+
+    def _load_disk_index(self):
+        """Build the disk LRU index from file access times (oldest first)"""
+        index = OrderedDict()
+        total = 0
+        if self.cache_dir.exists():
+            entries = []
+            for path in self.cache_dir.glob("*/*.pdf"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, path.stem, stat.st_size))
+            for _, key, size in sorted(entries):
+                index[key] = size
+                total += size
+        self._disk = index
+        self._disk_bytes = total
+
+    def _disk_read(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # refresh LRU position across restarts
+            return data
+        except OSError:
+            return None
+
+    def _disk_write(self, key: str, data: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def _disk_delete(self, key: str):
+        try:
+            self._path(key).unlink()
+        except OSError:
+            pass
+
+    async def _disk_get(self, key: str) -> Optional[bytes]:
+        async with self._disk_lock:
+            if self._disk is None:
+                await asyncio.to_thread(self._load_disk_index)
+            if key not in self._disk:
+                return None
+            self._disk.move_to_end(key)
+        data = await asyncio.to_thread(self._disk_read, key)
+        if data is None:
+            async with self._disk_lock:
+                self._disk_bytes -= self._disk.pop(key, 0)
+        return data
+
+    async def _disk_put(self, key: str, data: bytes):
+        if len(data) > self.disk_budget:
+            return
+        try:
+            await asyncio.to_thread(self._disk_write, key, data)
+        except OSError as e:
+            logger.warning(f"PDF cache disk write failed: {str(e)}")
+            return
+
+        evicted = []
+        async with self._disk_lock:
+            if self._disk is None:
+                await asyncio.to_thread(self._load_disk_index)
+            self._disk_bytes -= self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            while self._disk_bytes > self.disk_budget and len(self._disk) > 1:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            await asyncio.to_thread(self._disk_delete, old_key)
+            self.stats["evictions"] += 1
+
+    # ---------- public API ----------
+
+    async def get(self, key: str) -> Optional[bytes]:
+        data = self._memory_get(key)
+        if data is not None:
+            self.stats["memory_hits"] += 1
+            return data
+
+        data = await self._disk_get(key)
+        if data is not None:
+            self.stats["disk_hits"] += 1
+            self._memory_put(key, data)
+            return data
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, data: bytes):
+        self.stats["stores"] += 1
+        self._memory_put(key, data)
+        await self._disk_put(key, data)
+
+    async def get_or_render(self, key: str, render: Callable[[], Awaitable[bytes]]) -> bytes:
+        """Return cached bytes for key, rendering and storing them on a miss"""
+        data = await self.get(key)
+        if data is not None:
+            return data
+        data = await render()
+        await self.put(key, data)
+        return data
+
+    def get_stats(self) -> dict:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "memory_budget": self.memory_budget,
+            "disk_entries": len(self._disk) if self._disk is not None else None,
+            "disk_bytes": self._disk_bytes,
+            "disk_budget": self.disk_budget
+        }
+
+
+# Global instance
+pdf_render_cache = PDFRenderCache()
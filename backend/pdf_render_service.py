@@ -0,0 +1,195 @@
+"""
+PDF Render Service - Shared process pool for CPU-bound ReportLab rendering
+
+Every PDF producer (CV, resume, invoice, contract, user manual) hands its
+render function to this service instead of building the document on the
+event loop. Renders run in a pool of warm worker processes, the number of
+queued jobs is bounded (callers get a 503 when saturated) and every job has
+a timeout. A running job cannot be cancelled, so a timeout recycles the pool:
+its workers are terminated and fresh ones started, and jobs that were lost
+with them are resubmitted once.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable via environment)
+PDF_RENDER_WORKERS = int(os.environ.get("PDF_RENDER_WORKERS", 0)) or (os.cpu_count() or 1)
+PDF_RENDER_MAX_PENDING = int(os.environ.get("PDF_RENDER_MAX_PENDING", PDF_RENDER_WORKERS * 4))
+PDF_RENDER_TIMEOUT = float(os.environ.get("PDF_RENDER_TIMEOUT", 30))
+
+
+class RenderQueueFullError(HTTPException):
+    """Raised when the render queue is saturated"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=503,
+            detail="PDF rendering is busy right now. Please try again in a few seconds.",
+            headers={"Retry-After": "5"}
+        )
+
+
+class RenderTimeoutError(HTTPException):
+    """Raised when a render job exceeds its timeout"""
+
+    def __init__(self, timeout: float):
+        super().__init__(
+            status_code=504,
+            detail=f"PDF rendering took longer than {timeout:.0f} seconds. Please try again."
+        )
+
+
+def _warm_worker():
+    """
+    Worker initializer - preload ReportLab fonts, stylesheets and the
+    per-template CV generators so the first job in a fresh worker does not
+    pay the import and setup cost.
+    """
+    try:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.lib.styles import getSampleStyleSheet
+        import cv_pdf_service
+        import invoice_pdf_service  # noqa: F401
+        import contract_pdf_service  # noqa: F401
+
+        for font_name in (
+            "Helvetica", "Helvetica-Bold", "Helvetica-Oblique", "Helvetica-BoldOblique",
+            "Times-Roman", "Times-Bold"
+        ):
+            pdfmetrics.getFont(font_name)
+        getSampleStyleSheet()
+
+        for template_id in cv_pdf_service.TEMPLATES:
+            cv_pdf_service.get_cv_generator(template_id)
+    except Exception as e:
+        logger.warning(f"PDF render worker warm-up failed: {str(e)}")
+
+
+class PDFRenderService:
+    def __init__(
+        self,
+        max_workers: int = PDF_RENDER_WORKERS,
+        max_pending: int = PDF_RENDER_MAX_PENDING,
+        timeout: float = PDF_RENDER_TIMEOUT
+    ):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self.stats = {"completed": 0, "rejected": 0, "timed_out": 0, "failed": 0, "recycled": 0}
+
+    def start(self):
+        """Start the worker pool (called on app startup, otherwise lazily)"""
+        if self._executor is None:
+            # Spawn rather than fork: the API process holds Motor threads and
+            # sockets that must not be duplicated into the workers
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker
+            )
+            # Spin up all workers now so they are warm before the first request
+            for _ in range(self.max_workers):
+                self._executor.submit(int)
+            logger.info(
+                f"PDF render pool started: {self.max_workers} workers, "
+                f"max {self.max_pending} pending jobs, {self.timeout:.0f}s timeout"
+            )
+        return self._executor
+
+    def shutdown(self):
+        """Stop the worker pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _recycle(self, executor: ProcessPoolExecutor, reason: str):
+        """Replace a pool, terminating its workers and whatever they are still running"""
+        if self._executor is not executor:
+            # Already replaced by another job
+            return
+        logger.warning(f"Restarting PDF render pool: {reason}")
+        self._executor = None
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        # Jobs still queued on the old pool fail with BrokenProcessPool once its workers are gone
+        executor.shutdown(wait=False)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        self.stats["recycled"] += 1
+        self.start()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def render(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run a picklable, module-level render function in the worker pool.
+
+        Raises RenderQueueFullError (503) when too many jobs are queued and
+        RenderTimeoutError (504) when the job exceeds its timeout.
+        """
+        if self._pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            logger.warning(f"PDF render queue full ({self._pending} pending), rejecting {fn.__name__}")
+            raise RenderQueueFullError()
+
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        loop = asyncio.get_running_loop()
+
+        self._pending += 1
+        try:
+            for attempt in range(2):
+                executor = self.start()
+                try:
+                    future = loop.run_in_executor(executor, _call, fn, args, kwargs)
+                    result = await asyncio.wait_for(future, timeout=max(deadline - time.monotonic(), 0.001))
+                except asyncio.TimeoutError:
+                    self.stats["timed_out"] += 1
+                    logger.error(f"PDF render {fn.__name__} timed out after {timeout:.0f}s")
+                    # Stop the job: it would otherwise keep a worker busy beyond the pending limit
+                    self._recycle(executor, f"{fn.__name__} timed out")
+                    raise RenderTimeoutError(timeout)
+                except BrokenProcessPool:
+                    self._recycle(executor, "a worker process died")
+                    if attempt == 0:
+                        # Lost with the pool (e.g. recycled after another job's timeout): retry on the new one
+                        continue
+                    self.stats["failed"] += 1
+                    raise
+
+                self.stats["completed"] += 1
+                return result
+        finally:
+            self._pending -= 1
+
+    def get_stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "timeout_seconds": self.timeout,
+            **self.stats
+        }
+
+
+def _call(fn, args, kwargs):
+    """Trampoline so keyword arguments survive run_in_executor"""
+    return fn(*args, **kwargs)
+
+
+# Global instance
+pdf_render_service = PDFRenderService()
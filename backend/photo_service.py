@@ -0,0 +1,261 @@
+"""
+CV Photo Service - Normalize profile photos once on ingest
+
+Clients send CV photos as `data:image/...;base64` strings, often straight
+from a phone camera. On ingest the photo is decoded, auto-oriented from its
+EXIF data, centre-cropped to the template photo box, downscaled and
+recompressed as JPEG, then kept in the blob store. The stored `cv_data`
+carries a `cv-photo:<id>` reference instead of the inline image, and the
+renderer gets the compact image from an in-memory cache.
+"""
+import base64
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from io import BytesIO
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+from cv_pdf_service import PHOTO_WIDTH, PHOTO_HEIGHT
+
+logger = logging.getLogger(__name__)
+
+PHOTO_REF_PREFIX = "cv-photo:"
+
+# Configuration (overridable via environment)
+PHOTO_DPI = int(os.environ.get("CV_PHOTO_DPI", 220))
+PHOTO_JPEG_QUALITY = int(os.environ.get("CV_PHOTO_JPEG_QUALITY", 85))
+PHOTO_MAX_UPLOAD_BYTES = int(os.environ.get("CV_PHOTO_MAX_UPLOAD_BYTES", 15 * 1024 * 1024))
+PHOTO_MAX_PIXELS = int(os.environ.get("CV_PHOTO_MAX_PIXELS", 50_000_000))
+PHOTO_CACHE_BYTES = int(os.environ.get("CV_PHOTO_CACHE_BYTES", 16 * 1024 * 1024))
+
+# Pixel size of the photo box at the target print resolution
+PHOTO_SIZE_PX = (round(PHOTO_WIDTH / 72 * PHOTO_DPI), round(PHOTO_HEIGHT / 72 * PHOTO_DPI))
+
+
+def normalize_photo(image_data: bytes, size=PHOTO_SIZE_PX, quality: int = PHOTO_JPEG_QUALITY) -> bytes:
+    """
+    Decode, auto-orient, crop to the photo box aspect ratio, downscale and
+    recompress an image as JPEG. Runs in the render worker pool.
+    """
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = PHOTO_MAX_PIXELS
+    with Image.open(BytesIO(image_data)) as img:
+        # Let the decoder skip resolution we are going to throw away anyway
+        img.draft("RGB", (size[0] * 2, size[1] * 2))
+        img = ImageOps.exif_transpose(img)
+
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+
+        # Never upscale small photos, only crop them to the box aspect ratio
+        scale = min(1.0, img.width / size[0], img.height / size[1])
+        target = (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+        img = ImageOps.fit(img, target, method=Image.LANCZOS, centering=(0.5, 0.4))
+
+        output = BytesIO()
+        img.save(output, format="JPEG", quality=quality, optimize=True, progressive=True)
+        return output.getvalue()
+
+
+def decode_data_uri(photo: str) -> Optional[bytes]:
+    """Bytes of a `data:image/...;base64,` string, or None if it is not one"""
+    if not isinstance(photo, str) or not photo.startswith("data:image") or "," not in photo:
+        return None
+    return base64.b64decode(photo.split(",", 1)[1])
+
+
+def get_photo_id(photo: Any) -> Optional[str]:
+    """Photo ID from a `cv-photo:<id>` reference"""
+    if isinstance(photo, str) and photo.startswith(PHOTO_REF_PREFIX):
+        return photo[len(PHOTO_REF_PREFIX):]
+    return None
+
+
+class PhotoService:
+    def __init__(self, cache_budget: int = PHOTO_CACHE_BYTES):
+        self.db = None
+        self.cache_budget = cache_budget
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._cache_bytes = 0
+        self.stats = {"ingested": 0, "deduplicated": 0, "bytes_in": 0, "bytes_out": 0, "cache_hits": 0, "cache_misses": 0}
+
+    def set_db(self, database):
+        self.db = database
+
+    async def ensure_indexes(self):
+        await self.db.cv_photos.create_index([("user_id", 1), ("source_hash", 1)])
+        await self.db.cv_photos.create_index("id", unique=True)
+
+    # ---------- compact image cache ----------
+
+    def _cache_get(self, photo_id: str) -> Optional[bytes]:
+        data = self._cache.get(photo_id)
+        if data is not None:
+            self._cache.move_to_end(photo_id)
+        return data
+
+    def _cache_put(self, photo_id: str, data: bytes):
+        if photo_id in self._cache:
+            self._cache_bytes -= len(self._cache.pop(photo_id))
+        self._cache[photo_id] = data
+        self._cache_bytes += len(data)
+        while self._cache_bytes > self.cache_budget and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted)
+
+    # ---------- ingest / resolve ----------
+
+    async def ingest(self, photo: str, user_id: Optional[str]) -> Optional[str]:
+        """
+        Normalize an inline photo and return its `cv-photo:<id>` reference.
+        The same source image sent again by the same user reuses the stored
+        photo. Returns None when the photo cannot be decoded.
+        """
+        from blob_store import get_blob_store
+        from pdf_render_service import pdf_render_service
+
+        try:
+            raw = decode_data_uri(photo)
+        except Exception:
+            raw = None
+        if not raw:
+            return None
+        if len(raw) > PHOTO_MAX_UPLOAD_BYTES:
+            logger.warning(f"CV photo rejected for user {user_id}: {len(raw)} bytes exceeds limit")
+            return None
+
+        source_hash = hashlib.sha256(raw).hexdigest()
+        existing = await self.db.cv_photos.find_one(
+            {"user_id": user_id, "source_hash": source_hash},
+            {"_id": 0, "id": 1}
+        )
+        if existing:
+            self.stats["deduplicated"] += 1
+            return PHOTO_REF_PREFIX + existing["id"]
+
+        try:
+            normalized = await pdf_render_service.render(normalize_photo, raw)
+        except Exception as e:
+            logger.warning(f"Failed to normalize CV photo for user {user_id}: {str(e)}")
+            return None
+
+        photo_id = str(uuid4())
+        blob_id = await get_blob_store().put(
+            normalized,
+            filename=f"{photo_id}.jpg",
+            content_type="image/jpeg",
+            metadata={"user_id": user_id, "photo_id": photo_id}
+        )
+        await self.db.cv_photos.insert_one({
+            "id": photo_id,
+            "user_id": user_id,
+            "source_hash": source_hash,
+            "blob_id": blob_id,
+            "source_size": len(raw),
+            "size": len(normalized),
+            "created_at": datetime.now(timezone.utc)
+        })
+        self._cache_put(photo_id, normalized)
+
+        self.stats["ingested"] += 1
+        self.stats["bytes_in"] += len(raw)
+        self.stats["bytes_out"] += len(normalized)
+        logger.info(f"CV photo normalized for user {user_id}: {len(raw)} -> {len(normalized)} bytes")
+        return PHOTO_REF_PREFIX + photo_id
+
+    async def get_photo(self, photo_id: str) -> Optional[bytes]:
+        """Compact JPEG for a photo ID (memory cache, then blob store)"""
+        from blob_store import get_blob_store, BlobNotFoundError
+
+        data = self._cache_get(photo_id)
+        if data is not None:
+            self.stats["cache_hits"] += 1
+            return data
+        self.stats["cache_misses"] += 1
+
+        record = await self.db.cv_photos.find_one({"id": photo_id}, {"_id": 0, "blob_id": 1})
+        if not record:
+            return None
+        try:
+            data = await get_blob_store().get(record["blob_id"])
+        except BlobNotFoundError:
+            return None
+        self._cache_put(photo_id, data)
+        return data
+
+    async def prepare_cv_data(self, cv_data: Dict[str, Any], user_id: Optional[str]) -> Dict[str, Any]:
+        """
+        Copy of cv_data for storage: an inline photo is normalized and replaced
+        by its reference. Photos that fail to decode are dropped.
+        """
+        photo = cv_data.get("photo")
+        if not photo or get_photo_id(photo):
+            return cv_data
+        stored = dict(cv_data)
+        stored["photo"] = await self.ingest(photo, user_id)
+        return stored
+
+    async def resolve_cv_data(self, cv_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of stored cv_data for rendering, with the compact photo inlined"""
+        photo_id = get_photo_id(cv_data.get("photo"))
+        if not photo_id:
+            return cv_data
+        data = await self.get_photo(photo_id)
+        resolved = dict(cv_data)
+        resolved["photo"] = f"data:image/jpeg;base64,{base64.b64encode(data).decode('utf-8')}" if data else None
+        return resolved
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "cache_entries": len(self._cache),
+            "cache_bytes": self._cache_bytes,
+            "cache_budget": self.cache_budget,
+            "photo_size_px": list(PHOTO_SIZE_PX)
+        }
+
+
+# Global instance
+photo_service = PhotoService()
+
+
+async def migrate_document_photos(db, batch_size: int = 100, limit: Optional[int] = None) -> Dict:
+    """
+    Replace inline base64 photos in saved CV documents (user_documents and
+    template-generated documents) with normalized photo references.
+    """
+    migrated = 0
+    failed = 0
+    inline_photo = {"cv_data.photo": {"$regex": "^data:image"}}
+    for collection in (db.user_documents, db.documents):
+        cursor = collection.find(
+            inline_photo,
+            {"_id": 0, "id": 1, "user_id": 1, "cv_data.photo": 1},
+            batch_size=batch_size
+        )
+        if limit:
+            cursor = cursor.limit(limit)
+        async for document in cursor:
+            try:
+                reference = await photo_service.ingest(document["cv_data"]["photo"], document.get("user_id"))
+                await collection.update_one({"id": document["id"]}, {"$set": {"cv_data.photo": reference}})
+                migrated += 1
+            except Exception as e:
+                failed += 1
+                logger.error(f"Failed to migrate CV photo for document {document.get('id')}: {str(e)}")
+
+    remaining = (
+        await db.user_documents.count_documents(inline_photo) +
+        await db.documents.count_documents(inline_photo)
+    )
+    logger.info(f"CV photo migration: {migrated} migrated, {failed} failed, {remaining} remaining")
+    return {"migrated": migrated, "failed": failed, "remaining": remaining}
@@ -50,28 +50,14 @@ class AIProposalRequest(BaseModel):
     tone: str = "professional"  # professional, friendly, confident
 
 
-def get_proposals_routes(db, get_current_user):
-    """Factory function to create proposals routes with database dependency"""
-    
-    # ==================== AI ENDPOINTS ====================
+PROPOSAL_SYSTEM_MESSAGE = "You are an expert career coach specializing in remote job applications."
+
+
+def _proposal_prompt(data: AIProposalRequest) -> str:
+    job_skills_str = ", ".join(data.required_skills) if data.required_skills else "Not specified"
+    user_skills_str = ", ".join(data.user_skills) if data.user_skills else "Not specified"
     
-    @proposals_router.post("/ai/generate-proposal")
-    async def ai_generate_proposal(
-        data: AIProposalRequest,
-        current_user = Depends(get_current_user)
-    ):
-        """AI-powered proposal/cover letter generator"""
-        try:
-            from emergentintegrations.llm.chat import LlmChat, UserMessage
-            
-            EMERGENT_LLM_KEY = os.environ.get("EMERGENT_LLM_KEY")
-            if not EMERGENT_LLM_KEY:
-                raise HTTPException(status_code=500, detail="AI service not configured")
-            
-            job_skills_str = ", ".join(data.required_skills) if data.required_skills else "Not specified"
-            user_skills_str = ", ".join(data.user_skills) if data.user_skills else "Not specified"
-            
-            prompt = f"""You are an expert career coach helping a job seeker write a compelling proposal for a remote job.
+    prompt = f"""You are an expert career coach helping a job seeker write a compelling proposal for a remote job.
 
 Job Information:
 - Title: {data.job_title}
@@ -96,19 +82,32 @@ Instructions:
 8. Focus on value the candidate can bring
 
 Write ONLY the proposal text, no additional commentary or headers."""
+    return prompt
 
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=f"proposal-gen-{current_user.id}",
-                system_message="You are an expert career coach specializing in remote job applications."
-            ).with_model("openai", "gpt-4o")
+
+def get_proposals_routes(db, get_current_user):
+    """Factory function to create proposals routes with database dependency"""
+    
+    # ==================== AI ENDPOINTS ====================
+    
+    @proposals_router.post("/ai/generate-proposal")
+    async def ai_generate_proposal(
+        data: AIProposalRequest,
+        current_user = Depends(get_current_user)
+    ):
+        """AI-powered proposal/cover letter generator"""
+        try:
+            from llm_gateway import llm_gateway
             
-            response = await chat.send_message(UserMessage(text=prompt))
+            response = await llm_gateway.complete(
+                _proposal_prompt(data),
+                system_message=PROPOSAL_SYSTEM_MESSAGE,
+                session_id=f"proposal-gen-{current_user.id}",
+                endpoint="proposal_generate",
+                reseller_id=current_user.reseller_id
+            )
             
-            if hasattr(response, 'text'):
-                proposal = response.text.strip()
-            else:
-                proposal = str(response).strip()
+            proposal = response.strip()
             
             logger.info(f"AI proposal generated for user {current_user.email}")
             
@@ -120,6 +119,36 @@ Write ONLY the proposal text, no additional commentary or headers."""
             logger.error(f"Error generating AI proposal: {e}")
             raise HTTPException(status_code=500, detail="Failed to generate proposal. Please try again.")
     
+    @proposals_router.post("/ai/generate-proposal/stream")
+    async def ai_generate_proposal_stream(
+        data: AIProposalRequest,
+        current_user = Depends(get_current_user)
+    ):
+        """AI proposal generator, streaming the text as server-sent events"""
+        from llm_gateway import llm_gateway
+        from event_stream import sse_event, event_stream_response
+        
+        if not os.environ.get("EMERGENT_LLM_KEY"):
+            raise HTTPException(status_code=500, detail="AI service not configured")
+        
+        async def events():
+            yield sse_event("start", {"type": "proposal"})
+            parts = []
+            async for chunk in llm_gateway.stream(
+                _proposal_prompt(data),
+                system_message=PROPOSAL_SYSTEM_MESSAGE,
+                session_id=f"proposal-gen-{current_user.id}",
+                endpoint="proposal_generate",
+                reseller_id=current_user.reseller_id
+            ):
+                parts.append(chunk)
+                yield sse_event("chunk", {"text": chunk})
+            
+            logger.info(f"AI proposal generated for user {current_user.email}")
+            yield sse_event("done", {"success": True, "proposal": "".join(parts).strip()})
+        
+        return event_stream_response(events())
+    
     @proposals_router.post("/ai/improve-proposal")
     async def ai_improve_proposal(
         data: dict,
@@ -127,11 +156,7 @@ Write ONLY the proposal text, no additional commentary or headers."""
     ):
         """AI-powered proposal improvement"""
         try:
-            from emergentintegrations.llm.chat import LlmChat, UserMessage
-            
-            EMERGENT_LLM_KEY = os.environ.get("EMERGENT_LLM_KEY")
-            if not EMERGENT_LLM_KEY:
-                raise HTTPException(status_code=500, detail="AI service not configured")
+            from llm_gateway import llm_gateway
             
             current_proposal = data.get("current_proposal", "")
             job_title = data.get("job_title", "")
@@ -155,18 +180,17 @@ Instructions:
 
 Return ONLY the improved proposal text."""
 
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=f"proposal-improve-{current_user.id}",
-                system_message="You are an expert career coach."
-            ).with_model("openai", "gpt-4o")
+            system_message = "You are an expert career coach."
             
-            response = await chat.send_message(UserMessage(text=prompt))
+            response = await llm_gateway.complete(
+                prompt,
+                system_message=system_message,
+                session_id=f"proposal-improve-{current_user.id}",
+                endpoint="proposal_improve",
+                reseller_id=current_user.reseller_id
+            )
             
-            if hasattr(response, 'text'):
-                improved = response.text.strip()
-            else:
-                improved = str(response).strip()
+            improved = response.strip()
             
             return {"success": True, "improved_proposal": improved}
             
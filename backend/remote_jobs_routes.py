@@ -10,7 +10,6 @@ from datetime import datetime, timezone
 from bson import ObjectId
 import uuid
 import logging
-import os
 
 logger = logging.getLogger(__name__)
 
@@ -83,11 +82,7 @@ def get_remote_jobs_routes(db, get_current_user):
     ):
         """AI-powered job description generator from bullet points"""
         try:
-            from emergentintegrations.llm.chat import LlmChat, UserMessage
-            
-            EMERGENT_LLM_KEY = os.environ.get("EMERGENT_LLM_KEY")
-            if not EMERGENT_LLM_KEY:
-                raise HTTPException(status_code=500, detail="AI service not configured")
+            from llm_gateway import llm_gateway
             
             bullet_points_str = "\n".join([f"• {bp}" for bp in data.bullet_points]) if data.bullet_points else "No specific details provided"
             skills_str = ", ".join(data.required_skills) if data.required_skills else "Not specified"
@@ -115,18 +110,17 @@ Instructions:
 
 Write ONLY the job description, no additional commentary."""
 
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=f"job-desc-{current_user.id}",
-                system_message="You are an expert HR professional specializing in remote job postings."
-            ).with_model("openai", "gpt-4o")
+            system_message = "You are an expert HR professional specializing in remote job postings."
             
-            response = await chat.send_message(UserMessage(text=prompt))
+            response = await llm_gateway.complete(
+                prompt,
+                system_message=system_message,
+                session_id=f"job-desc-{current_user.id}",
+                endpoint="job_description_generate",
+                reseller_id=current_user.reseller_id
+            )
             
-            if hasattr(response, 'text'):
-                description = response.text.strip()
-            else:
-                description = str(response).strip()
+            description = response.strip()
             
             logger.info(f"AI job description generated for user {current_user.email}")
             
@@ -145,11 +139,7 @@ Write ONLY the job description, no additional commentary."""
     ):
         """AI-powered skill suggestions based on job title and description"""
         try:
-            from emergentintegrations.llm.chat import LlmChat, UserMessage
-            
-            EMERGENT_LLM_KEY = os.environ.get("EMERGENT_LLM_KEY")
-            if not EMERGENT_LLM_KEY:
-                raise HTTPException(status_code=500, detail="AI service not configured")
+            from llm_gateway import llm_gateway
             
             prompt = f"""You are an expert HR professional and recruiter specializing in remote work.
 
@@ -169,18 +159,17 @@ Instructions:
 Return as JSON in this exact format:
 {{"required": ["skill1", "skill2", ...], "preferred": ["skill1", "skill2", ...]}}"""
 
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=f"job-skills-{current_user.id}",
-                system_message="You are an expert recruiter specializing in remote positions."
-            ).with_model("openai", "gpt-4o")
+            system_message = "You are an expert recruiter specializing in remote positions."
             
-            response = await chat.send_message(UserMessage(text=prompt))
+            response = await llm_gateway.complete(
+                prompt,
+                system_message=system_message,
+                session_id=f"job-skills-{current_user.id}",
+                endpoint="job_skills_suggest",
+                reseller_id=current_user.reseller_id
+            )
             
-            if hasattr(response, 'text'):
-                response_text = response.text.strip()
-            else:
-                response_text = str(response).strip()
+            response_text = response.strip()
             
             # Parse JSON response
             import json
@@ -4,6 +4,7 @@ from typing import List, Optional
 from datetime import datetime, timezone, timedelta
 from pydantic import BaseModel
 import uuid
+import io
 import logging
 
 from reseller_models import (
@@ -12,7 +13,8 @@ from reseller_models import (
     ResellerInvoice, InvoiceResponse, WhiteLabelConfig
 )
 from auth import UserResponse, get_password_hash
-from invoice_pdf_service import invoice_pdf_generator
+from invoice_pdf_service import generate_customer_invoice_pdf
+from pdf_render_service import pdf_render_service
 
 logger = logging.getLogger(__name__)
 
@@ -1475,7 +1477,7 @@ async def test_reseller_email_connection(context: dict = Depends(get_current_res
     """Test reseller's email connection"""
     try:
         import smtplib
-        import ssl
+        from smtp_transport import SMTPConfig, smtp_transport
         
         reseller = context["reseller"]
         
@@ -1488,22 +1490,7 @@ async def test_reseller_email_connection(context: dict = Depends(get_current_res
             return {"success": False, "error": "Email settings not configured. Please enter SMTP host and username."}
         
         try:
-            encryption = settings.get("encryption", "tls")
-            
-            if encryption == "ssl":
-                # Use SSL from the start (port 465)
-                context = ssl.create_default_context()
-                with smtplib.SMTP_SSL(settings["smtp_host"], settings["smtp_port"], context=context, timeout=10) as server:
-                    server.login(settings["smtp_user"], settings["smtp_password"])
-            elif encryption == "tls":
-                # Start plain, then upgrade to TLS (port 587)
-                with smtplib.SMTP(settings["smtp_host"], settings["smtp_port"], timeout=10) as server:
-                    server.starttls()
-                    server.login(settings["smtp_user"], settings["smtp_password"])
-            else:
-                # No encryption (not recommended)
-                with smtplib.SMTP(settings["smtp_host"], settings["smtp_port"], timeout=10) as server:
-                    server.login(settings["smtp_user"], settings["smtp_password"])
+            await smtp_transport.verify(SMTPConfig.from_settings(settings, timeout=10))
             
             return {"success": True, "message": "SMTP connection successful! Your email settings are working."}
         except smtplib.SMTPAuthenticationError:
@@ -1523,9 +1510,9 @@ async def send_reseller_test_email(
 ):
     """Send a test email using reseller's SMTP settings"""
     try:
-        import smtplib
         from email.mime.text import MIMEText
         from email.mime.multipart import MIMEMultipart
+        from smtp_transport import SMTPConfig, smtp_transport
         
         reseller = context["reseller"]
         
@@ -1557,10 +1544,7 @@ async def send_reseller_test_email(
         
         msg.attach(MIMEText(html_body, 'html'))
         
-        with smtplib.SMTP(settings["smtp_host"], settings["smtp_port"]) as server:
-            server.starttls()
-            server.login(settings["smtp_user"], settings["smtp_password"])
-            server.sendmail(from_email, [to_email], msg.as_string())
+        await smtp_transport.send(SMTPConfig.from_settings(settings), from_email, [to_email], msg)
         
         logger.info(f"Test email sent by reseller {reseller['id']} to {to_email}")
         
@@ -1934,7 +1918,8 @@ async def send_customer_invoice_reminder(
                 amount=formatted_amount,
                 due_date=due_date,
                 payment_link=payment_link,
-                is_overdue=is_overdue
+                is_overdue=is_overdue,
+                queue=False  # The reseller waits for the SMTP outcome
             )
             
             if email_sent:
@@ -2300,7 +2285,8 @@ async def download_customer_invoice_pdf(
         )
         
         # Generate PDF with reseller branding
-        pdf_buffer = invoice_pdf_generator.generate_customer_invoice_pdf(
+        pdf_bytes = await pdf_render_service.render(
+            generate_customer_invoice_pdf,
             invoice=invoice,
             reseller=reseller,
             reseller_settings=reseller_settings
@@ -2309,7 +2295,7 @@ async def download_customer_invoice_pdf(
         filename = f"invoice_{invoice.get('invoice_number', invoice_id)}.pdf"
         
         return StreamingResponse(
-            pdf_buffer,
+            io.BytesIO(pdf_bytes),
             media_type="application/pdf",
             headers={
                 "Content-Disposition": f"attachment; filename={filename}"
@@ -2472,19 +2458,11 @@ async def create_campaign(campaign_data: dict, context: dict = Depends(get_curre
     try:
         reseller = context["reseller"]
         
+        from campaign_service import recipient_query
+        
         # Count recipients based on audience
         audience = campaign_data.get("audience", "all")
-        recipient_query = {"reseller_id": reseller["id"], "role": "customer"}
-        
-        if audience == "active":
-            recipient_query["active_tier"] = {"$ne": None}
-        elif audience == "inactive":
-            recipient_query["active_tier"] = None
-        elif audience == "new":
-            thirty_days_ago = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat()
-            recipient_query["created_at"] = {"$gte": thirty_days_ago}
-        
-        recipients_count = await db.users.count_documents(recipient_query)
+        recipients_count = await db.users.count_documents(recipient_query(reseller["id"], audience))
         
         campaign = {
             "id": str(uuid.uuid4()),
@@ -2513,8 +2491,10 @@ async def create_campaign(campaign_data: dict, context: dict = Depends(get_curre
 
 @reseller_router.post("/campaigns/{campaign_id}/send", response_model=dict)
 async def send_campaign(campaign_id: str, context: dict = Depends(get_current_reseller_admin)):
-    """Send an email campaign"""
+    """Start sending an email campaign; delivery runs in the background (see campaign_service)"""
     try:
+        from campaign_service import campaign_sender
+        
         reseller = context["reseller"]
         
         campaign = await db.reseller_campaigns.find_one(
@@ -2528,45 +2508,140 @@ async def send_campaign(campaign_id: str, context: dict = Depends(get_current_re
         if campaign.get("status") == "sent":
             raise HTTPException(status_code=400, detail="Campaign already sent")
         
-        # Get recipients
-        audience = campaign.get("audience", "all")
-        recipient_query = {"reseller_id": reseller["id"], "role": "customer"}
+        started = await campaign_sender.start(campaign_id, reseller["id"])
+        if started is None:
+            raise HTTPException(status_code=409, detail=f"Campaign is already {campaign.get('status')}")
         
-        if audience == "active":
-            recipient_query["active_tier"] = {"$ne": None}
-        elif audience == "inactive":
-            recipient_query["active_tier"] = None
+        logger.info(f"Campaign {campaign_id} sending started by reseller {reseller['id']}")
         
-        recipients = await db.users.find(recipient_query, {"_id": 0, "email": 1, "full_name": 1}).to_list(1000)
+        return {
+            "success": True,
+            "status": started["status"],
+            "recipients_count": started.get("recipients", 0),
+            "progress_url": f"/api/reseller/campaigns/{campaign_id}/progress"
+        }
         
-        # TODO: Actually send emails via email service
-        # For now, mark as sent
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error sending campaign: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@reseller_router.post("/campaigns/{campaign_id}/pause", response_model=dict)
+async def pause_campaign(campaign_id: str, context: dict = Depends(get_current_reseller_admin)):
+    """Pause a campaign that is being sent; it stops after the current batch"""
+    try:
+        from campaign_service import campaign_sender
         
-        await db.reseller_campaigns.update_one(
-            {"id": campaign_id},
-            {"$set": {
-                "status": "sent",
-                "sent_at": datetime.now(timezone.utc).isoformat(),
-                "recipients": len(recipients)
-            }}
+        reseller = context["reseller"]
+        
+        if not await campaign_sender.pause(campaign_id, reseller["id"], "Paused by reseller"):
+            raise HTTPException(status_code=409, detail="Campaign is not being sent")
+        
+        return {"success": True, "status": "paused"}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error pausing campaign: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@reseller_router.post("/campaigns/{campaign_id}/resume", response_model=dict)
+async def resume_campaign(campaign_id: str, context: dict = Depends(get_current_reseller_admin)):
+    """Continue sending a paused campaign to the recipients still pending"""
+    try:
+        from campaign_service import campaign_sender
+        
+        reseller = context["reseller"]
+        
+        campaign = await db.reseller_campaigns.find_one(
+            {"id": campaign_id, "reseller_id": reseller["id"]},
+            {"_id": 0, "status": 1}
         )
         
-        # Log activity
-        await db.reseller_activity.insert_one({
-            "id": str(uuid.uuid4()),
-            "reseller_id": reseller["id"],
-            "type": "email",
-            "title": "Campaign Sent",
-            "description": f"Email campaign '{campaign.get('name')}' sent to {len(recipients)} recipients",
-            "created_at": datetime.now(timezone.utc)
-        })
+        if not campaign:
+            raise HTTPException(status_code=404, detail="Campaign not found")
+        
+        if campaign.get("status") != "paused":
+            raise HTTPException(status_code=409, detail="Campaign is not paused")
         
-        return {"success": True, "recipients_count": len(recipients)}
+        started = await campaign_sender.start(campaign_id, reseller["id"])
+        if started is None:
+            raise HTTPException(status_code=409, detail="Campaign is not paused")
+        
+        return {"success": True, "status": started["status"]}
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error sending campaign: {str(e)}")
+        logger.error(f"Error resuming campaign: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@reseller_router.get("/campaigns/{campaign_id}/progress", response_model=dict)
+async def get_campaign_progress(campaign_id: str, context: dict = Depends(get_current_reseller_admin)):
+    """Delivery progress of a campaign"""
+    try:
+        from campaign_service import campaign_sender
+        
+        reseller = context["reseller"]
+        
+        campaign = await db.reseller_campaigns.find_one(
+            {"id": campaign_id, "reseller_id": reseller["id"]},
+            {"_id": 0}
+        )
+        
+        if not campaign:
+            raise HTTPException(status_code=404, detail="Campaign not found")
+        
+        return {"success": True, "campaign_id": campaign_id, **await campaign_sender.progress(campaign)}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching campaign progress: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@reseller_router.get("/campaigns/{campaign_id}/recipients", response_model=dict)
+async def get_campaign_recipients(
+    campaign_id: str,
+    status: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    context: dict = Depends(get_current_reseller_admin)
+):
+    """Delivery status per recipient of a campaign"""
+    try:
+        reseller = context["reseller"]
+        
+        campaign = await db.reseller_campaigns.find_one(
+            {"id": campaign_id, "reseller_id": reseller["id"]},
+            {"_id": 0, "id": 1}
+        )
+        
+        if not campaign:
+            raise HTTPException(status_code=404, detail="Campaign not found")
+        
+        query = {"campaign_id": campaign_id}
+        if status:
+            query["status"] = status
+        
+        limit = max(1, min(limit, 500))
+        recipients = await db.campaign_recipients.find(
+            query,
+            {"_id": 0, "campaign_id": 0}
+        ).sort("seq", 1).skip(max(skip, 0)).limit(limit).to_list(limit)
+        total = await db.campaign_recipients.count_documents(query)
+        
+        return {"recipients": recipients, "total": total}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching campaign recipients: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
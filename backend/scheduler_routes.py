@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Request
 from typing import Optional, List
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from pydantic import BaseModel
 import uuid
 import logging
@@ -312,22 +312,12 @@ async def send_payment_reminders(
                 amount=amount,
                 due_date=due_date_str,
                 payment_link=payment_link,
-                is_overdue=is_overdue
+                is_overdue=is_overdue,
+                log={"invoice_id": invoice["id"], "reseller_id": reseller["id"], "sent_by": admin.id}
             )
             
             if success:
                 sent_count += 1
-                # Log the reminder
-                await db.email_logs.insert_one({
-                    "id": str(uuid.uuid4()),
-                    "type": "invoice_reminder",
-                    "invoice_id": invoice["id"],
-                    "reseller_id": reseller["id"],
-                    "to_email": contact_email,
-                    "status": "sent",
-                    "sent_at": datetime.now(timezone.utc),
-                    "sent_by": admin.id
-                })
             else:
                 failed_count += 1
         
@@ -387,21 +377,12 @@ async def send_single_reminder(
             amount=amount,
             due_date=due_date_str,
             payment_link=payment_link,
-            is_overdue=is_overdue
+            is_overdue=is_overdue,
+            log={"invoice_id": invoice["id"], "reseller_id": reseller["id"], "sent_by": admin.id}
         )
         
         if success:
-            await db.email_logs.insert_one({
-                "id": str(uuid.uuid4()),
-                "type": "invoice_reminder",
-                "invoice_id": invoice["id"],
-                "reseller_id": reseller["id"],
-                "to_email": contact_email,
-                "status": "sent",
-                "sent_at": datetime.now(timezone.utc),
-                "sent_by": admin.id
-            })
-            return {"success": True, "message": f"Reminder sent to {contact_email}"}
+            return {"success": True, "message": f"Reminder queued for delivery to {contact_email}"}
         else:
             return {"success": False, "error": "Failed to send email"}
     except HTTPException:
@@ -416,88 +397,22 @@ async def generate_monthly_invoices_job(
 ):
     """Generate monthly invoices and send notifications"""
     try:
-        import os
-        
-        now = datetime.now(timezone.utc)
-        period = f"{now.year}-{str(now.month).zfill(2)}"
-        
-        # Get all active resellers
-        resellers = await db.resellers.find(
-            {"status": "active"},
-            {"_id": 0}
-        ).to_list(None)
-        
-        invoices_created = 0
-        emails_sent = 0
+        from invoicing_service import invoicing_service
         
         # Load email settings
         settings = await db.platform_settings.find_one({"type": "email"}, {"_id": 0})
         if settings:
             email_service.configure(settings)
         
-        for reseller in resellers:
-            # Check if invoice already exists for this period
-            existing = await db.reseller_invoices.find_one({
-                "reseller_id": reseller["id"],
-                "period": period
-            })
-            
-            if existing:
-                continue
-            
-            # Create invoice
-            invoice_number = f"INV-{period}-{str(invoices_created + 1).zfill(4)}"
-            monthly_fee = reseller.get("subscription", {}).get("monthly_fee", 250000)
-            due_date = now + timedelta(days=15)
-            
-            invoice = {
-                "id": str(uuid.uuid4()),
-                "reseller_id": reseller["id"],
-                "invoice_number": invoice_number,
-                "amount": monthly_fee,
-                "period": period,
-                "due_date": due_date.isoformat(),
-                "paid_date": None,
-                "status": "pending",
-                "items": [
-                    {
-                        "description": f"Monthly SaaS Subscription - {period}",
-                        "amount": monthly_fee
-                    }
-                ],
-                "created_at": now
-            }
-            
-            await db.reseller_invoices.insert_one(invoice)
-            invoices_created += 1
-            
-            # Send email notification if email is configured
-            if email_service.is_configured:
-                contact_email = reseller.get("contact_info", {}).get("email")
-                if contact_email:
-                    amount = f"R {monthly_fee / 100:,.2f}"
-                    payment_link = f"{os.environ.get('FRONTEND_URL', 'http://localhost:3000')}/reseller-dashboard/invoices"
-                    
-                    success = await email_service.send_invoice_created(
-                        to_email=contact_email,
-                        reseller_name=reseller["company_name"],
-                        invoice_number=invoice_number,
-                        amount=amount,
-                        period=period,
-                        due_date=due_date.strftime("%d %B %Y"),
-                        payment_link=payment_link
-                    )
-                    
-                    if success:
-                        emails_sent += 1
-        
-        logger.info(f"Monthly invoices generated: {invoices_created}, emails sent: {emails_sent}")
+        result = await invoicing_service.generate_monthly(sent_by=admin.id)
+        
+        logger.info(f"Monthly invoices generated: {result['invoices_created']}, emails queued: {result['emails_sent']}")
         
         return {
             "success": True,
-            "period": period,
-            "invoices_created": invoices_created,
-            "emails_sent": emails_sent
+            "period": result["period"],
+            "invoices_created": result["invoices_created"],
+            "emails_sent": result["emails_sent"]
         }
     except Exception as e:
         logger.error(f"Error generating monthly invoices: {str(e)}")
@@ -518,5 +433,19 @@ async def get_email_logs(
     return {"logs": logs, "total": len(logs)}
 
 
+@scheduler_router.get("/job-runs")
+async def get_job_runs(
+    job: Optional[str] = None,
+    limit: int = 50,
+    admin = Depends(get_current_super_admin)
+):
+    """Get recent runs of the subscription expiry and reseller trial jobs"""
+    from account_expiry_service import account_expiry
+    
+    runs = await account_expiry.recent_runs(job, min(limit, 200))
+    
+    return {"runs": runs, "total": len(runs)}
+
+
 # Import os at the top for environment variables
 import os
@@ -1,25 +1,25 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Depends, status, Request
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Depends, status, Request, Query, BackgroundTasks
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordRequestForm
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel
+import hmac
 import os
 import logging
 from pathlib import Path
 from typing import List, Optional
 import io
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
 from datetime import datetime, timezone, timedelta
 import uuid
 
 from models import Resume, ResumeCreate, CoverLetter, CoverLetterCreate, ResumeAnalysisResult
 from ai_service import ai_service
+from cv_pdf_service import generate_resume_pdf as render_resume_pdf
+from pdf_render_service import pdf_render_service
+from pdf_cache_service import pdf_render_cache, make_render_key
 from odoo_integration import odoo_integration
 from auth import (
     Token, UserRegister, UserLogin, UserResponse, UserInDB,
@@ -47,6 +47,14 @@ from customer_routes import router as customer_router, set_db as set_customer_db
 from content_routes import content_router, set_db as set_content_db
 from cv_template_routes import cv_template_router, set_db as set_cv_template_db
 from help_routes import help_router, set_db as set_help_db
+from download_routes import download_router
+from photo_service import photo_service
+from docx_conversion_service import docx_conversion_service
+from generated_artifact_store import generated_artifact_store
+from text_extraction_service import text_extraction_service
+from ats_cache_service import ats_cache_service
+from llm_response_cache import llm_response_cache
+from assistant_session_service import assistant_sessions
 from talent_pool_routes import get_talent_pool_routes
 from remote_jobs_routes import get_remote_jobs_routes, remote_jobs_router
 from proposals_routes import get_proposals_routes
@@ -59,6 +67,15 @@ from websocket_service import get_websocket_routes, create_notification
 from employer_management_routes import get_employer_management_routes
 from email_templates_routes import get_email_templates_routes
 from push_routes import get_push_routes, send_push_notification
+from blob_store import set_db as set_blob_store_db
+from job_queue_service import job_queue
+from llm_metrics import llm_metrics, LLMRouteMiddleware
+from smtp_transport import smtp_transport
+from email_outbox import email_outbox
+from campaign_service import campaign_sender
+from invoicing_service import invoicing_service
+from account_expiry_service import account_expiry
+from job_routes import job_router, set_db as set_job_db
 
 # Initialize scheduler
 scheduler = AsyncIOScheduler()
@@ -85,6 +102,18 @@ set_customer_db(db)
 set_content_db(db)
 set_cv_template_db(db)
 set_help_db(db)
+set_job_db(db)
+set_blob_store_db(db)
+photo_service.set_db(db)
+generated_artifact_store.set_db(db)
+ats_cache_service.set_db(db)
+llm_response_cache.set_db(db)
+llm_metrics.set_db(db)
+job_queue.set_db(db)
+email_outbox.set_db(db)
+campaign_sender.set_db(db)
+invoicing_service.set_db(db)
+account_expiry.set_db(db)
 
 # Create the main app without a prefix
 app = FastAPI(title="UpShift API", description="AI-Powered Resume and Cover Letter Platform")
@@ -716,17 +745,17 @@ async def forgot_password(data: dict):
             """
             
             try:
-                email_sent = await email_service.send_email(
+                email_sent = await email_service.queue_email(
                     to_email=email,
                     subject="Reset Your Password - UpShift",
                     html_body=html_body,
                     text_body=f"Reset your password by visiting: {reset_url}\n\nThis link expires in 24 hours.",
-                    raise_exceptions=False
+                    email_type="password_reset"
                 )
                 if email_sent:
-                    logger.info(f"Password reset email sent to: {email}")
+                    logger.info(f"Password reset email queued for: {email}")
                 else:
-                    email_error = "SMTP authentication or delivery failed"
+                    email_error = "Email could not be queued for delivery"
                     logger.warning(f"Password reset email failed for {email}: {email_error}")
             except Exception as email_err:
                 email_error = str(email_err)
@@ -1413,111 +1442,18 @@ async def get_all_resumes(user_id: str = None):
 async def generate_resume_pdf(resume_data: ResumeCreate):
     """Generate PDF from resume data"""
     try:
-        # Create PDF in memory
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        story = []
-        styles = getSampleStyleSheet()
-        
-        # Custom styles
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor='#2563eb',
-            spaceAfter=12
+        pdf_bytes = await pdf_render_cache.get_or_render(
+            make_render_key("resume", None, resume_data.dict()),
+            lambda: pdf_render_service.render(render_resume_pdf, resume_data)
         )
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=14,
-            textColor='#1e40af',
-            spaceAfter=6,
-            spaceBefore=12
-        )
-        
-        # Name
-        story.append(Paragraph(resume_data.fullName, title_style))
-        
-        # Contact info
-        contact = f"{resume_data.email} | {resume_data.phone}"
-        if resume_data.city and resume_data.province:
-            contact += f" | {resume_data.city}, {resume_data.province}"
-        story.append(Paragraph(contact, styles['Normal']))
-        story.append(Spacer(1, 0.2*inch))
-        
-        # Summary
-        if resume_data.summary:
-            story.append(Paragraph("PROFESSIONAL SUMMARY", heading_style))
-            story.append(Paragraph(resume_data.summary, styles['Normal']))
-            story.append(Spacer(1, 0.2*inch))
-        
-        # Work Experience
-        if resume_data.experiences:
-            story.append(Paragraph("WORK EXPERIENCE", heading_style))
-            for exp in resume_data.experiences:
-                story.append(Paragraph(f"<b>{exp.title}</b> at {exp.company}", styles['Normal']))
-                story.append(Paragraph(exp.duration, styles['Normal']))
-                story.append(Paragraph(exp.description, styles['Normal']))
-                if exp.achievements:
-                    story.append(Paragraph("<b>Key Achievements:</b>", styles['Normal']))
-                    story.append(Paragraph(exp.achievements, styles['Normal']))
-                story.append(Spacer(1, 0.1*inch))
-        
-        # Education
-        if resume_data.education:
-            story.append(Paragraph("EDUCATION", heading_style))
-            for edu in resume_data.education:
-                story.append(Paragraph(f"<b>{edu.degree}</b>", styles['Normal']))
-                story.append(Paragraph(f"{edu.institution}, {edu.year}", styles['Normal']))
-                story.append(Spacer(1, 0.1*inch))
-        
-        # Skills
-        if resume_data.skills:
-            story.append(Paragraph("SKILLS", heading_style))
-            skills_text = " • ".join([skill for skill in resume_data.skills if skill])
-            story.append(Paragraph(skills_text, styles['Normal']))
-        
-        # Languages
-        if resume_data.languages:
-            story.append(Spacer(1, 0.1*inch))
-            story.append(Paragraph("LANGUAGES", heading_style))
-            for lang in resume_data.languages:
-                if lang.language:
-                    story.append(Paragraph(f"{lang.language}: {lang.proficiency}", styles['Normal']))
-        
-        # References
-        if hasattr(resume_data, 'references') and resume_data.references:
-            story.append(Spacer(1, 0.2*inch))
-            story.append(Paragraph("REFERENCES", heading_style))
-            for ref in resume_data.references:
-                if ref.name:
-                    ref_text = f"<b>{ref.name}</b>"
-                    if ref.title:
-                        ref_text += f", {ref.title}"
-                    if ref.company:
-                        ref_text += f" at {ref.company}"
-                    story.append(Paragraph(ref_text, styles['Normal']))
-                    
-                    contact_info = []
-                    if ref.email:
-                        contact_info.append(f"Email: {ref.email}")
-                    if ref.phone:
-                        contact_info.append(f"Phone: {ref.phone}")
-                    
-                    if contact_info:
-                        story.append(Paragraph(" | ".join(contact_info), styles['Normal']))
-                    story.append(Spacer(1, 0.1*inch))
-        
-        # Build PDF
-        doc.build(story)
-        buffer.seek(0)
         
         return StreamingResponse(
-            buffer,
+            io.BytesIO(pdf_bytes),
             media_type="application/pdf",
             headers={"Content-Disposition": f"attachment; filename={resume_data.fullName}_Resume.pdf"}
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating PDF: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1539,7 +1475,9 @@ async def improve_resume_section(
         if not section or not content:
             raise HTTPException(status_code=400, detail="Section and content are required")
         
-        improved_text = await ai_service.improve_resume_section(section, content, context)
+        improved_text = await ai_service.improve_resume_section(
+            section, content, context, reseller_id=current_user.reseller_id
+        )
         
         logger.info(f"AI improvement requested by user {current_user.email}")
         
@@ -1568,7 +1506,7 @@ async def analyze_resume(
             resume_text = "PDF text extraction would go here"
         
         # Analyze with AI
-        analysis = await ai_service.analyze_resume(resume_text)
+        analysis = await ai_service.analyze_resume(resume_text, reseller_id=current_user.reseller_id)
         
         logger.info(f"Resume analysis requested by user {current_user.email}")
         
@@ -1593,7 +1531,9 @@ async def calculate_job_match(
         if not resume_text or not job_description:
             raise HTTPException(status_code=400, detail="Both resume text and job description are required")
         
-        match_result = await ai_service.get_job_match_score(resume_text, job_description)
+        match_result = await ai_service.get_job_match_score(
+            resume_text, job_description, reseller_id=current_user.reseller_id
+        )
         
         logger.info(f"Job match analysis requested by user {current_user.email}")
         
@@ -1607,9 +1547,178 @@ async def calculate_job_match(
 
 # ==================== ATS Resume Checker (FREE) ====================
 
+ATS_CHECK_MODES = ("full", "quick")
+
+
+async def _run_ats_analysis(resume_hash: str, resume_text: str) -> dict:
+    """
+    AI ATS analysis through the shared cache, falling back to a close cached
+    match or the rule-based analyzer when the AI call fails
+    """
+    from ai_service import QuotaExceededError, AIServiceError, fallback_ats_analysis
+    from ats_cache_service import ats_cache_service, SOURCE_COMPUTED, ATS_SIMILARITY_FALLBACK_THRESHOLD
+    from llm_metrics import SOURCE_CACHE, SOURCE_FALLBACK
+    
+    result = {
+        "analysis": None,
+        "used_cache": False,
+        "used_fallback": False,
+        "match_confidence": None,
+        "notice": None
+    }
+    
+    # Try AI analysis (or an identical / near-identical cached one), fall back if it fails
+    try:
+        analysis, cache_source, confidence = await ats_cache_service.get_or_compute(
+            resume_hash,
+            lambda: ai_service.ats_resume_check(resume_text),
+            resume_text=resume_text
+        )
+        result["analysis"] = analysis
+        result["used_cache"] = cache_source != SOURCE_COMPUTED
+        if result["used_cache"]:
+            result["match_confidence"] = round(confidence, 3)
+            logger.info(f"ATS check using {cache_source} result for hash: {resume_hash[:8]} (confidence: {result['match_confidence']})")
+        
+    except QuotaExceededError as qe:
+        logger.warning(f"ATS quota exceeded, using fallback analysis: {str(qe)}")
+        result["notice"] = "AI service temporarily unavailable. Showing basic analysis results."
+        
+    except AIServiceError as ae:
+        logger.warning(f"AI service error, using fallback analysis: {str(ae)}")
+        result["notice"] = str(ae)
+        
+    except Exception as e:
+        logger.error(f"Unexpected error in ATS check, using fallback: {str(e)}")
+        result["notice"] = "Unable to perform full AI analysis. Showing basic analysis results."
+    
+    if result["used_cache"]:
+        # Answered without an AI call (the gateway records the calls it makes)
+        llm_metrics.record_served("ats_check", SOURCE_CACHE)
+    
+    if result["analysis"] is None:
+        # Prefer a looser near-duplicate AI analysis over the rule-based checker
+        analysis = None
+        try:
+            analysis, confidence = await ats_cache_service.find_similar(
+                resume_text, ATS_SIMILARITY_FALLBACK_THRESHOLD
+            )
+        except Exception as similar_error:
+            logger.warning(f"ATS similar-result lookup failed: {similar_error}")
+        if analysis is not None:
+            result["analysis"] = analysis
+            result["used_cache"] = True
+            result["match_confidence"] = round(confidence, 3)
+            result["notice"] = "AI service temporarily unavailable. Showing results from a closely matching earlier analysis."
+            llm_metrics.record_served("ats_check", SOURCE_CACHE)
+        else:
+            result["analysis"] = fallback_ats_analysis(resume_text)
+            result["used_fallback"] = True
+            llm_metrics.record_served("ats_check", SOURCE_FALLBACK)
+    
+    return result
+
+
+async def _save_ats_history(user_id: str, filename: str, analysis: dict, used_fallback: bool):
+    """Save an ATS result to the user's history and log the activity"""
+    try:
+        # Extract score - AI may return it as 'overall_score' or 'score'
+        score = analysis.get("overall_score", analysis.get("score", 0))
+        ats_result = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "filename": filename,
+            "score": score,
+            "analysis": analysis,
+            "used_fallback": used_fallback,
+            "created_at": datetime.now(timezone.utc)
+        }
+        await db.ats_results.insert_one(ats_result)
+        logger.info(f"ATS result saved for user: {user_id}, score: {score}")
+        
+        # Log activity
+        try:
+            activity_service = get_activity_service(db)
+            user = await db.users.find_one({"id": user_id}, {"_id": 0, "reseller_id": 1})
+            reseller_id = user.get("reseller_id") if user else None
+            await activity_service.log_activity(
+                user_id=user_id,
+                activity_type="ats_check",
+                description=f"ATS Check Score: {score}% for {filename}",
+                metadata={"score": score, "filename": filename},
+                reseller_id=reseller_id
+            )
+        except Exception as log_error:
+            logger.warning(f"Failed to log ATS activity: {log_error}")
+            
+    except Exception as save_error:
+        logger.warning(f"Failed to save ATS result: {save_error}")
+
+
+async def _complete_ats_analysis(resume_hash: str, resume_text: str, user_id: Optional[str], filename: str):
+    """Background half of a quick-score check: run the full analysis and record it"""
+    result = await _run_ats_analysis(resume_hash, resume_text)
+    if user_id:
+        await _save_ats_history(user_id, filename, result["analysis"], result["used_fallback"])
+    logger.info(f"Background ATS analysis finished for hash: {resume_hash[:8]} (fallback: {result['used_fallback']})")
+
+
+async def _extract_resume_text(content: bytes, filename: str) -> str:
+    """Text of an uploaded resume (off the event loop, cached by file hash)"""
+    from text_extraction_service import text_extraction_service
+    
+    resume_text = await text_extraction_service.extract(content, filename, lenient=True)
+    if not resume_text or len(resume_text.strip()) < 50:
+        raise HTTPException(
+            status_code=400, 
+            detail="Could not extract text from the uploaded file. Please ensure the file contains readable text."
+        )
+    return resume_text
+
+
+async def _ats_check_response(filename: str, result: dict, user_id: Optional[str]) -> dict:
+    """Record a finished ATS check in the user's history and build the response"""
+    # Save to history if user is logged in
+    if user_id:
+        await _save_ats_history(user_id, filename, result["analysis"], result["used_fallback"])
+    
+    logger.info(f"ATS check performed for file: {filename} (cache: {result['used_cache']}, fallback: {result['used_fallback']})")
+    
+    response_data = {
+        "success": True,
+        "filename": filename,
+        "analysis": result["analysis"],
+        "saved_to_history": user_id is not None,
+        "used_cache": result["used_cache"],
+        "used_fallback": result["used_fallback"]
+    }
+    
+    if result["match_confidence"] is not None:
+        response_data["match_confidence"] = result["match_confidence"]
+    if result["notice"]:
+        response_data["notice"] = result["notice"]
+    
+    return response_data
+
+
+async def _ats_check_job(job: dict, content: Optional[bytes]) -> dict:
+    """Full ATS check submitted with async=true"""
+    from ats_cache_service import resume_cache_key
+    
+    resume_text = await _extract_resume_text(content, job["filename"])
+    result = await _run_ats_analysis(resume_cache_key(resume_text), resume_text)
+    return await _ats_check_response(job["filename"], result, job["user_id"])
+
+
+job_queue.register("ats_check", _ats_check_job)
+
+
 @api_router.post("/ats-check")
 async def ats_resume_check(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    mode: str = Query("full", description="full waits for the AI analysis; quick returns the rule-based score immediately"),
+    run_async: bool = Query(False, alias="async", description="Queue a full check and return a job ID at once"),
     request: Request = None
 ):
     """
@@ -1619,13 +1728,19 @@ async def ats_resume_check(
     Features:
     - Caching: Similar resumes use cached results to reduce API calls
     - Fallback: Basic rule-based analysis when AI quota is exceeded
+    - Quick score (mode=quick): instant rule-based score while the AI analysis
+      runs in the background; poll /ats-check/result/{result_key} for it
+    - Job (async=true, full mode): returns a job ID at once; poll
+      /api/jobs/{job_id} for the result
     """
     try:
-        import PyPDF2
-        import io
-        import hashlib
-        from datetime import timezone
-        from ai_service import QuotaExceededError, AIServiceError, fallback_ats_analysis
+        from text_extraction_service import read_upload
+        from ats_cache_service import ats_cache_service, resume_cache_key
+        from ats_analyzer import analyze_resume
+        
+        mode = (mode or "full").lower()
+        if mode not in ATS_CHECK_MODES:
+            raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(ATS_CHECK_MODES)}")
         
         # Try to get current user (optional - for saving history)
         current_user_id = None
@@ -1648,136 +1763,48 @@ async def ats_resume_check(
             logger.debug(f"ATS check: User not authenticated - {auth_error}")
             pass  # User not logged in, that's fine
         
-        # Read file content
-        content = await file.read()
-        resume_text = ""
+        content = await read_upload(file)
         
-        # Extract text based on file type
-        if file.filename.lower().endswith('.pdf'):
-            try:
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
-                for page in pdf_reader.pages:
-                    resume_text += page.extract_text() or ""
-            except Exception as pdf_error:
-                logger.warning(f"PDF extraction failed: {pdf_error}, trying as text")
-                resume_text = content.decode('utf-8', errors='ignore')
-        elif file.filename.lower().endswith(('.txt', '.doc', '.docx')):
-            resume_text = content.decode('utf-8', errors='ignore')
-        else:
-            # Try to decode as text
-            resume_text = content.decode('utf-8', errors='ignore')
-        
-        if not resume_text or len(resume_text.strip()) < 50:
-            raise HTTPException(
-                status_code=400, 
-                detail="Could not extract text from the uploaded file. Please ensure the file contains readable text."
-            )
+        if run_async and mode == "full":
+            job = await job_queue.submit("ats_check", content=content, filename=file.filename, user_id=current_user_id)
+            return job_queue.accepted_response(job)
         
-        # Generate hash for caching
-        resume_hash = hashlib.md5(resume_text.encode()).hexdigest()
+        resume_text = await _extract_resume_text(content, file.filename)
         
-        # Check cache first (results valid for 24 hours)
-        cached_result = await db.ats_cache.find_one({
-            "resume_hash": resume_hash,
-            "created_at": {"$gte": datetime.now(timezone.utc) - timedelta(hours=24)}
-        }, {"_id": 0})
+        # Cached or in-flight results for the same resume are shared
+        resume_hash = resume_cache_key(resume_text)
         
-        analysis = None
-        used_cache = False
-        used_fallback = False
-        error_message = None
-        
-        if cached_result:
-            analysis = cached_result.get("analysis")
-            used_cache = True
-            logger.info(f"ATS check using cached result for hash: {resume_hash[:8]}")
-        else:
-            # Try AI analysis, fall back to basic analysis if quota exceeded
-            try:
-                analysis = await ai_service.ats_resume_check(resume_text)
-                
-                # Cache the successful result
-                await db.ats_cache.update_one(
-                    {"resume_hash": resume_hash},
-                    {
-                        "$set": {
-                            "resume_hash": resume_hash,
-                            "analysis": analysis,
-                            "created_at": datetime.now(timezone.utc)
-                        }
-                    },
-                    upsert=True
+        if mode == "quick":
+            cached_analysis, cache_source, confidence = await ats_cache_service.get(resume_hash)
+            if cached_analysis is None:
+                # Score instantly; the AI analysis completes after the response is sent
+                background_tasks.add_task(
+                    _complete_ats_analysis, resume_hash, resume_text, current_user_id, file.filename
                 )
-                logger.info(f"ATS check result cached for hash: {resume_hash[:8]}")
-                
-            except QuotaExceededError as qe:
-                logger.warning(f"ATS quota exceeded, using fallback analysis: {str(qe)}")
-                analysis = fallback_ats_analysis(resume_text)
-                used_fallback = True
-                error_message = "AI service temporarily unavailable. Showing basic analysis results."
-                
-            except AIServiceError as ae:
-                logger.warning(f"AI service error, using fallback analysis: {str(ae)}")
-                analysis = fallback_ats_analysis(resume_text)
-                used_fallback = True
-                error_message = str(ae)
-                
-            except Exception as e:
-                logger.error(f"Unexpected error in ATS check, using fallback: {str(e)}")
-                analysis = fallback_ats_analysis(resume_text)
-                used_fallback = True
-                error_message = "Unable to perform full AI analysis. Showing basic analysis results."
-        
-        # Save to history if user is logged in
-        if current_user_id:
-            try:
-                # Extract score - AI may return it as 'overall_score' or 'score'
-                score = analysis.get("overall_score", analysis.get("score", 0))
-                ats_result = {
-                    "id": str(uuid.uuid4()),
-                    "user_id": current_user_id,
+                logger.info(f"ATS quick score for file: {file.filename}, full analysis queued for hash: {resume_hash[:8]}")
+                return {
+                    "success": True,
                     "filename": file.filename,
-                    "score": score,
-                    "analysis": analysis,
-                    "used_fallback": used_fallback,
-                    "created_at": datetime.now(timezone.utc)
+                    "analysis": analyze_resume(resume_text),
+                    "is_quick_score": True,
+                    "analysis_status": "pending",
+                    "result_key": resume_hash,
+                    "saved_to_history": current_user_id is not None,
+                    "used_cache": False,
+                    "used_fallback": False,
+                    "notice": "This is an instant score. The full AI analysis is in progress."
                 }
-                await db.ats_results.insert_one(ats_result)
-                logger.info(f"ATS result saved for user: {current_user_id}, score: {score}")
-                
-                # Log activity
-                try:
-                    activity_service = get_activity_service(db)
-                    user = await db.users.find_one({"id": current_user_id}, {"_id": 0, "reseller_id": 1})
-                    reseller_id = user.get("reseller_id") if user else None
-                    await activity_service.log_activity(
-                        user_id=current_user_id,
-                        activity_type="ats_check",
-                        description=f"ATS Check Score: {score}% for {file.filename}",
-                        metadata={"score": score, "filename": file.filename},
-                        reseller_id=reseller_id
-                    )
-                except Exception as log_error:
-                    logger.warning(f"Failed to log ATS activity: {log_error}")
-                    
-            except Exception as save_error:
-                logger.warning(f"Failed to save ATS result: {save_error}")
-        
-        logger.info(f"ATS check performed for file: {file.filename} (cache: {used_cache}, fallback: {used_fallback})")
-        
-        response_data = {
-            "success": True,
-            "filename": file.filename,
-            "analysis": analysis,
-            "saved_to_history": current_user_id is not None,
-            "used_cache": used_cache,
-            "used_fallback": used_fallback
-        }
-        
-        if error_message:
-            response_data["notice"] = error_message
+            result = {
+                "analysis": cached_analysis,
+                "used_cache": True,
+                "used_fallback": False,
+                "match_confidence": round(confidence, 3),
+                "notice": None
+            }
+        else:
+            result = await _run_ats_analysis(resume_hash, resume_text)
         
-        return response_data
+        return await _ats_check_response(file.filename, result, current_user_id)
         
     except HTTPException:
         raise
@@ -1803,6 +1830,25 @@ async def ats_resume_check(
             )
 
 
+@api_router.get("/ats-check/result/{result_key}")
+async def get_ats_check_result(result_key: str):
+    """Full AI analysis for a quick-score check, once the background analysis has finished"""
+    from ats_cache_service import ats_cache_service
+    
+    analysis, _, confidence = await ats_cache_service.get(result_key)
+    if analysis is not None:
+        return {
+            "success": True,
+            "analysis_status": "complete",
+            "analysis": analysis,
+            "match_confidence": round(confidence, 3)
+        }
+    if ats_cache_service.is_pending(result_key):
+        return {"success": True, "analysis_status": "pending"}
+    # Not cached and not running: the AI call failed (the quick score stands) or the result expired
+    return {"success": True, "analysis_status": "unavailable"}
+
+
 # ==================== Cover Letter Endpoints ====================
 
 @api_router.post("/cover-letters/generate", response_model=CoverLetter)
@@ -1813,29 +1859,9 @@ async def generate_cover_letter(
     """Generate AI cover letter (Requires Professional or Elite tier)"""
     try:
         # Generate cover letter with AI
-        generated_content = await ai_service.generate_cover_letter(data.dict())
-        
-        # Create cover letter object
-        cover_letter = CoverLetter(
-            **data.dict(),
-            generated_content=generated_content
-        )
-        cover_letter.user_id = current_user.id
-        
-        # Save to MongoDB
-        await db.cover_letters.insert_one(cover_letter.dict())
-        logger.info(f"Cover letter created for user {current_user.email}")
+        generated_content = await ai_service.generate_cover_letter(data.dict(), reseller_id=current_user.reseller_id)
         
-        # Placeholder: Sync to Odoo
-        odoo_id = await odoo_integration.create_cover_letter_record(cover_letter.dict())
-        if odoo_id:
-            cover_letter.odoo_record_id = odoo_id
-            await db.cover_letters.update_one(
-                {"id": cover_letter.id},
-                {"$set": {"odoo_record_id": odoo_id}}
-            )
-        
-        return cover_letter
+        return await _save_cover_letter(data, generated_content, current_user)
     except HTTPException:
         raise
     except Exception as e:
@@ -1843,6 +1869,51 @@ async def generate_cover_letter(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@api_router.post("/cover-letters/generate/stream")
+async def generate_cover_letter_stream(
+    data: CoverLetterCreate,
+    current_user: UserResponse = Depends(check_tier_dep(['tier-2', 'tier-3']))
+):
+    """Generate AI cover letter, streaming the text as server-sent events"""
+    from event_stream import sse_event, event_stream_response
+    
+    async def events():
+        yield sse_event("start", {"type": "cover_letter"})
+        parts = []
+        async for chunk in ai_service.stream_cover_letter(data.dict(), reseller_id=current_user.reseller_id):
+            parts.append(chunk)
+            yield sse_event("chunk", {"text": chunk})
+        cover_letter = await _save_cover_letter(data, "".join(parts), current_user)
+        yield sse_event("done", cover_letter.dict())
+    
+    return event_stream_response(events())
+
+
+async def _save_cover_letter(data: CoverLetterCreate, generated_content: str, current_user: UserResponse) -> CoverLetter:
+    """Save a generated cover letter and sync it to Odoo"""
+    # Create cover letter object
+    cover_letter = CoverLetter(
+        **data.dict(),
+        generated_content=generated_content
+    )
+    cover_letter.user_id = current_user.id
+    
+    # Save to MongoDB
+    await db.cover_letters.insert_one(cover_letter.dict())
+    logger.info(f"Cover letter created for user {current_user.email}")
+    
+    # Placeholder: Sync to Odoo
+    odoo_id = await odoo_integration.create_cover_letter_record(cover_letter.dict())
+    if odoo_id:
+        cover_letter.odoo_record_id = odoo_id
+        await db.cover_letters.update_one(
+            {"id": cover_letter.id},
+            {"$set": {"odoo_record_id": odoo_id}}
+        )
+    
+    return cover_letter
+
+
 @api_router.get("/cover-letters/{letter_id}", response_model=CoverLetter)
 async def get_cover_letter(letter_id: str):
     """Get a specific cover letter by ID"""
@@ -1948,6 +2019,8 @@ app.include_router(customer_router)
 app.include_router(content_router)
 app.include_router(cv_template_router)
 app.include_router(help_router)
+app.include_router(job_router)
+app.include_router(download_router)
 
 # Initialize and include talent pool router
 talent_pool_router = get_talent_pool_routes(db, get_current_user_dep)
@@ -2008,18 +2081,51 @@ app.include_router(email_templates_router_instance)
 push_router_instance = get_push_routes(db, get_current_user_dep)
 app.include_router(push_router_instance)
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """
+    LLM call counters and latency histograms of this process, in the Prometheus text format.
+
+    Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; a super admin's own
+    token works too. Only METRICS_PUBLIC=true opens the endpoint to anyone.
+    """
+    if os.environ.get("METRICS_PUBLIC", "").lower() != "true":
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        metrics_token = os.environ.get("METRICS_TOKEN")
+        if scheme.lower() != "bearer" or not token:
+            raise HTTPException(status_code=401, detail="Metrics token required", headers={"WWW-Authenticate": "Bearer"})
+        if not (metrics_token and hmac.compare_digest(token.encode(), metrics_token.encode())):
+            user = await get_current_user(token, db)
+            if user.role != "super_admin":
+                raise HTTPException(status_code=403, detail="Super admin access required")
+    return PlainTextResponse(llm_metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+# Attributes LLM calls to the route that made them (see llm_metrics)
+app.add_middleware(LLMRouteMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Content-Disposition", "Content-Length", "X-Document-Id", "X-Saved-Document-Id"],
 )
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     scheduler.shutdown()
+    await job_queue.shutdown()
+    await llm_metrics.shutdown()
+    # Messages being sent are handed back to the outbox
+    await email_outbox.shutdown()
+    await campaign_sender.shutdown()
+    await smtp_transport.shutdown()
+    pdf_render_service.shutdown()
+    await docx_conversion_service.shutdown()
+    text_extraction_service.shutdown()
     client.close()
 
 
@@ -2032,7 +2138,17 @@ async def startup_event():
         await db.users.create_index("role")
         await db.resellers.create_index("subdomain", unique=True)
         await db.resellers.create_index("custom_domain", sparse=True)
-        await db.reseller_invoices.create_index([("reseller_id", 1), ("period", 1)])
+        await photo_service.ensure_indexes()
+        await generated_artifact_store.ensure_indexes()
+        await ats_cache_service.ensure_indexes()
+        await llm_response_cache.ensure_indexes()
+        await assistant_sessions.ensure_indexes()
+        await job_queue.ensure_indexes()
+        await llm_metrics.ensure_indexes()
+        await email_outbox.ensure_indexes()
+        await campaign_sender.ensure_indexes()
+        await invoicing_service.ensure_indexes()
+        await account_expiry.ensure_indexes()
         
         # Create default super admin if not exists
         default_admin_email = "admin@upshift.works"
@@ -2066,6 +2182,23 @@ async def startup_event():
         # Set database reference for email template lookups
         email_service.set_db(db)
         
+        # Start warm PDF render workers and LibreOffice conversion workers
+        pdf_render_service.start()
+        await docx_conversion_service.start()
+        text_extraction_service.start()
+        
+        # Start in-process AI job workers (AI_JOB_WORKERS=0 leaves jobs to job_worker.py)
+        job_queue.start()
+        
+        # Write LLM usage rollups periodically
+        llm_metrics.start()
+        
+        # Keep pooled SMTP connections alive between emails
+        smtp_transport.start()
+        
+        # Deliver queued emails in the background (EMAIL_OUTBOX_WORKERS=0 disables)
+        email_outbox.start()
+        
         # Start the scheduler
         scheduler.add_job(
             auto_generate_monthly_invoices,
@@ -2112,8 +2245,29 @@ async def startup_event():
             replace_existing=True
         )
         
+        scheduler.add_job(
+            auto_cleanup_generated_cvs,
+            CronTrigger(minute=15),  # Run hourly
+            id='generated_cv_cleanup',
+            replace_existing=True
+        )
+        
+        scheduler.add_job(
+            auto_cleanup_ai_jobs,
+            CronTrigger(minute=45),  # Run hourly
+            id='ai_job_cleanup',
+            replace_existing=True
+        )
+        
+        scheduler.add_job(
+            auto_recover_email_campaigns,
+            CronTrigger(minute='*/5'),  # Run every 5 minutes
+            id='email_campaign_recovery',
+            replace_existing=True
+        )
+        
         scheduler.start()
-        logger.info("Background scheduler started with invoice, reminder, subscription check, demo reset, and reseller trial jobs")
+        logger.info("Background scheduler started with invoice, reminder, subscription check, demo reset, reseller trial, generated CV, AI job cleanup and campaign recovery jobs")
         
         # Initialize demo reseller account on startup
         await initialize_demo_account_on_startup()
@@ -2126,94 +2280,14 @@ async def startup_event():
 async def auto_generate_monthly_invoices():
     """Automatically generate monthly invoices for all active resellers"""
     try:
-        from datetime import timedelta, timezone
-        
-        now = datetime.now(timezone.utc)
-        period = f"{now.year}-{str(now.month).zfill(2)}"
-        
-        # Get all active resellers
-        resellers = await db.resellers.find(
-            {"status": "active"},
-            {"_id": 0}
-        ).to_list(None)
-        
-        invoices_created = 0
-        emails_sent = 0
-        
         # Load email settings
         settings = await db.platform_settings.find_one({"key": "email"}, {"_id": 0})
         if settings:
             email_service.configure(settings)
         
-        for reseller in resellers:
-            # Check if invoice already exists for this period
-            existing = await db.reseller_invoices.find_one({
-                "reseller_id": reseller["id"],
-                "period": period
-            })
-            
-            if existing:
-                continue
-            
-            # Create invoice
-            invoice_number = f"INV-{period}-{str(invoices_created + 1).zfill(4)}"
-            monthly_fee = reseller.get("subscription", {}).get("monthly_fee", 250000)
-            due_date = now + timedelta(days=15)
-            
-            invoice = {
-                "id": str(uuid.uuid4()),
-                "reseller_id": reseller["id"],
-                "invoice_number": invoice_number,
-                "amount": monthly_fee,
-                "period": period,
-                "due_date": due_date.isoformat(),
-                "paid_date": None,
-                "status": "pending",
-                "items": [
-                    {
-                        "description": f"Monthly SaaS Subscription - {period}",
-                        "amount": monthly_fee
-                    }
-                ],
-                "created_at": now
-            }
-            
-            await db.reseller_invoices.insert_one(invoice)
-            invoices_created += 1
-            
-            # Send email notification if email is configured
-            if email_service.is_configured:
-                contact_email = reseller.get("contact_info", {}).get("email")
-                if contact_email:
-                    amount = f"R {monthly_fee / 100:,.2f}"
-                    frontend_url = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
-                    payment_link = f"{frontend_url}/reseller-dashboard/invoices"
-                    
-                    success = await email_service.send_invoice_created(
-                        to_email=contact_email,
-                        reseller_name=reseller["company_name"],
-                        invoice_number=invoice_number,
-                        amount=amount,
-                        period=period,
-                        due_date=due_date.strftime("%d %B %Y"),
-                        payment_link=payment_link
-                    )
-                    
-                    if success:
-                        emails_sent += 1
-                        # Log the email
-                        await db.email_logs.insert_one({
-                            "id": str(uuid.uuid4()),
-                            "type": "invoice_created",
-                            "invoice_id": invoice["id"],
-                            "reseller_id": reseller["id"],
-                            "to_email": contact_email,
-                            "status": "sent",
-                            "sent_at": now,
-                            "sent_by": "system"
-                        })
+        result = await invoicing_service.generate_monthly()
         
-        logger.info(f"[AUTO] Monthly invoices generated: {invoices_created}, emails sent: {emails_sent}")
+        logger.info(f"[AUTO] Monthly invoices generated: {result['invoices_created']}, emails queued: {result['emails_sent']}")
         
     except Exception as e:
         logger.error(f"[AUTO] Error generating monthly invoices: {str(e)}")
@@ -2267,7 +2341,7 @@ async def auto_send_payment_reminders():
                     existing_log = await db.email_logs.find_one({
                         "invoice_id": invoice["id"],
                         "type": "invoice_reminder",
-                        "sent_at": {"$gte": today_start}
+                        "$or": [{"sent_at": {"$gte": today_start}}, {"queued_at": {"$gte": today_start}}]
                     })
                     
                     if existing_log:
@@ -2299,22 +2373,17 @@ async def auto_send_payment_reminders():
                         amount=amount,
                         due_date=due_date_str,
                         payment_link=payment_link,
-                        is_overdue=is_overdue
-                    )
-                    
-                    if success:
-                        sent_count += 1
-                        await db.email_logs.insert_one({
-                            "id": str(uuid.uuid4()),
-                            "type": "invoice_reminder",
+                        is_overdue=is_overdue,
+                        log={
                             "invoice_id": invoice["id"],
                             "reseller_id": reseller["id"],
-                            "to_email": contact_email,
                             "schedule_name": schedule["name"],
-                            "status": "sent",
-                            "sent_at": now,
                             "sent_by": "system"
-                        })
+                        }
+                    )
+                    
+                    if success:
+                        sent_count += 1
                     
                     break  # Only send one reminder per invoice per day
         
@@ -2328,99 +2397,10 @@ async def auto_send_payment_reminders():
 async def auto_suspend_expired_subscriptions():
     """Automatically suspend accounts with expired subscriptions"""
     try:
-        now = datetime.now(timezone.utc)
-        
-        # Find all active users with expired subscriptions
-        expired_users = await db.users.find({
-            "status": "active",
-            "active_tier": {"$ne": None},
-            "subscription_expires_at": {"$lt": now},
-            "role": "customer"  # Only suspend customer accounts, not admins
-        }).to_list(None)
+        run = await account_expiry.suspend_expired_subscriptions()
         
-        suspended_count = 0
-        email_sent_count = 0
-        
-        for user in expired_users:
-            try:
-                # Suspend the account
-                await db.users.update_one(
-                    {"id": user["id"]},
-                    {
-                        "$set": {
-                            "status": "suspended",
-                            "active_tier": None,
-                            "suspended_at": now,
-                            "suspension_reason": "subscription_expired"
-                        }
-                    }
-                )
-                suspended_count += 1
-                
-                # Send suspension notification email
-                if email_service.is_configured:
-                    try:
-                        # Get reseller subdomain for correct resubscribe link
-                        reseller_path = ""
-                        if user.get("reseller_id"):
-                            reseller = await db.resellers.find_one(
-                                {"id": user["reseller_id"]},
-                                {"_id": 0, "subdomain": 1}
-                            )
-                            if reseller and reseller.get("subdomain"):
-                                reseller_path = f"/partner/{reseller['subdomain']}"
-                        
-                        frontend_url = os.environ.get('FRONTEND_URL', os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:3000')).rstrip('/')
-                        pricing_link = f"{frontend_url}{reseller_path}/pricing"
-                        
-                        html_body = f'''
-                        <html>
-                        <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-                            <div style="text-align: center; margin-bottom: 30px;">
-                                <h1 style="color: #dc2626;">Subscription Expired</h1>
-                            </div>
-                            <p>Hi {user.get('full_name', 'there').split()[0]},</p>
-                            <p>Your subscription has expired and your account access has been temporarily suspended.</p>
-                            <p><strong>What this means:</strong></p>
-                            <ul>
-                                <li>You can still log in to view your account</li>
-                                <li>Premium features (CV Builder, AI tools, etc.) are now disabled</li>
-                                <li>Your saved documents remain safe</li>
-                            </ul>
-                            <p><strong>To reactivate your account:</strong></p>
-                            <div style="text-align: center; margin: 30px 0;">
-                                <a href="{pricing_link}" style="background: linear-gradient(135deg, #1e40af, #7c3aed); color: white; padding: 14px 28px; text-decoration: none; border-radius: 8px; font-weight: bold;">
-                                    Resubscribe Now
-                                </a>
-                            </div>
-                            <p>If you have any questions, please don't hesitate to contact our support team.</p>
-                            <hr style="margin: 30px 0; border: none; border-top: 1px solid #eee;">
-                            <p style="color: #888; font-size: 12px;">This email was sent by UpShift.</p>
-                        </body>
-                        </html>
-                        '''
-                        
-                        email_sent = await email_service.send_email(
-                            to_email=user["email"],
-                            subject="Your Subscription Has Expired - Action Required",
-                            html_body=html_body,
-                            text_body=f"Hi {user.get('full_name', 'there')}, your subscription has expired. Visit {pricing_link} to resubscribe.",
-                            raise_exceptions=False
-                        )
-                        
-                        if email_sent:
-                            email_sent_count += 1
-                            
-                    except Exception as email_error:
-                        logger.warning(f"Failed to send suspension email to {user['email']}: {email_error}")
-                
-                logger.info(f"[AUTO] Suspended account: {user['email']} (subscription expired)")
-                
-            except Exception as user_error:
-                logger.error(f"[AUTO] Failed to suspend user {user.get('email')}: {user_error}")
-        
-        if suspended_count > 0:
-            logger.info(f"[AUTO] Suspended {suspended_count} expired subscriptions, {email_sent_count} emails sent")
+        if run["updated"] > 0:
+            logger.info(f"[AUTO] Suspended {run['updated']} of {run['processed']} expired subscriptions, {run['emails_queued']} emails queued")
         
     except Exception as e:
         logger.error(f"[AUTO] Error suspending expired subscriptions: {str(e)}")
@@ -2477,111 +2457,12 @@ async def initialize_demo_account_on_startup():
 async def auto_send_reseller_trial_reminders():
     """Send email reminders to resellers 3 days before trial expiry."""
     try:
-        from email_service import send_email
-        
         logger.info("[AUTO] Checking for reseller trial expiry reminders...")
-        now = datetime.now(timezone.utc)
-        
-        # Find resellers with trials expiring in 3 days
-        three_days_later = now + timedelta(days=3)
-        
-        # Get all resellers in trial status
-        trial_resellers = await db.resellers.find({
-            "status": "trial",
-            "is_demo_account": {"$ne": True}
-        }, {"_id": 0}).to_list(100)
         
-        reminder_count = 0
-        
-        for reseller in trial_resellers:
-            try:
-                subscription = reseller.get("subscription", {})
-                trial_end = subscription.get("trial_end_date")
-                
-                if not trial_end:
-                    continue
-                
-                # Parse trial end date
-                if isinstance(trial_end, str):
-                    trial_end_dt = datetime.fromisoformat(trial_end.replace('Z', '+00:00'))
-                else:
-                    trial_end_dt = trial_end
-                
-                # Check if trial ends in approximately 3 days (between 2.5 and 3.5 days)
-                days_until_expiry = (trial_end_dt - now).total_seconds() / 86400
-                
-                if 2.5 <= days_until_expiry <= 3.5:
-                    # Check if we already sent this reminder
-                    reminder_key = f"trial_reminder_3day_{reseller['id']}"
-                    existing_reminder = await db.notifications.find_one({"key": reminder_key})
-                    
-                    if existing_reminder:
-                        continue
-                    
-                    # Get owner user
-                    owner = await db.users.find_one({"id": reseller.get("owner_user_id")}, {"_id": 0})
-                    if not owner:
-                        continue
-                    
-                    # Send reminder email
-                    upgrade_url = f"{os.environ.get('REACT_APP_BACKEND_URL', '')}/reseller-dashboard/subscription"
-                    
-                    email_html = f"""
-                    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                        <div style="background: linear-gradient(135deg, #1e40af 0%, #7c3aed 100%); padding: 30px; text-align: center;">
-                            <h1 style="color: white; margin: 0;">Trial Ending Soon</h1>
-                        </div>
-                        <div style="padding: 30px; background: #f9fafb;">
-                            <p>Hi {owner.get('full_name', 'there')},</p>
-                            
-                            <p>Your <strong>{reseller.get('brand_name', reseller.get('company_name'))}</strong> reseller trial ends in <strong>3 days</strong>.</p>
-                            
-                            <p>To continue using your white-label platform without interruption:</p>
-                            
-                            <div style="text-align: center; margin: 30px 0;">
-                                <a href="{upgrade_url}" style="background: #1e40af; color: white; padding: 15px 30px; text-decoration: none; border-radius: 8px; font-weight: bold;">
-                                    Upgrade Now
-                                </a>
-                            </div>
-                            
-                            <p>After your trial ends:</p>
-                            <ul>
-                                <li>Your partner portal will be temporarily disabled</li>
-                                <li>Your customers won't be able to access the platform</li>
-                                <li>All your data will be preserved</li>
-                            </ul>
-                            
-                            <p>Questions? Reply to this email or contact our support team.</p>
-                            
-                            <p>Best regards,<br>The UpShift Team</p>
-                        </div>
-                    </div>
-                    """
-                    
-                    await send_email(
-                        to_email=owner['email'],
-                        subject=f"Your {reseller.get('brand_name', 'reseller')} trial ends in 3 days",
-                        html_body=email_html,
-                        text_body=f"Hi {owner.get('full_name', 'there')}, your reseller trial ends in 3 days. Visit {upgrade_url} to upgrade and continue using your white-label platform."
-                    )
-                    
-                    # Record that we sent this reminder
-                    await db.notifications.insert_one({
-                        "key": reminder_key,
-                        "reseller_id": reseller['id'],
-                        "type": "trial_reminder",
-                        "sent_at": now,
-                        "days_before_expiry": 3
-                    })
-                    
-                    reminder_count += 1
-                    logger.info(f"[AUTO] Sent trial reminder to reseller: {reseller.get('company_name')}")
-                    
-            except Exception as e:
-                logger.error(f"[AUTO] Error processing reseller {reseller.get('id')}: {str(e)}")
+        run = await account_expiry.send_trial_reminders()
         
-        if reminder_count > 0:
-            logger.info(f"[AUTO] Sent {reminder_count} reseller trial reminders")
+        if run["updated"] > 0:
+            logger.info(f"[AUTO] Queued {run['updated']} reseller trial reminders ({run['processed']} trials ending soon)")
             
     except Exception as e:
         logger.error(f"[AUTO] Error sending reseller trial reminders: {str(e)}")
@@ -2590,110 +2471,40 @@ async def auto_send_reseller_trial_reminders():
 async def auto_suspend_expired_reseller_trials():
     """Suspend reseller accounts with expired trials."""
     try:
-        from email_service import send_email
-        
         logger.info("[AUTO] Checking for expired reseller trials...")
-        now = datetime.now(timezone.utc)
-        
-        # Get all resellers in trial status
-        trial_resellers = await db.resellers.find({
-            "status": "trial",
-            "is_demo_account": {"$ne": True}
-        }, {"_id": 0}).to_list(100)
         
-        suspended_count = 0
+        run = await account_expiry.suspend_expired_trials()
         
-        for reseller in trial_resellers:
-            try:
-                subscription = reseller.get("subscription", {})
-                trial_end = subscription.get("trial_end_date")
-                
-                if not trial_end:
-                    continue
-                
-                # Parse trial end date
-                if isinstance(trial_end, str):
-                    trial_end_dt = datetime.fromisoformat(trial_end.replace('Z', '+00:00'))
-                else:
-                    trial_end_dt = trial_end
-                
-                # Check if trial has expired
-                if trial_end_dt < now:
-                    # Suspend the reseller
-                    await db.resellers.update_one(
-                        {"id": reseller['id']},
-                        {
-                            "$set": {
-                                "status": "suspended",
-                                "subscription.status": "trial_expired",
-                                "subscription.suspended_at": now.isoformat(),
-                                "subscription.suspension_reason": "trial_expired",
-                                "updated_at": now
-                            }
-                        }
-                    )
-                    
-                    # Get owner user
-                    owner = await db.users.find_one({"id": reseller.get("owner_user_id")}, {"_id": 0})
-                    
-                    if owner:
-                        # Send suspension notification email
-                        upgrade_url = f"{os.environ.get('REACT_APP_BACKEND_URL', '')}/reseller-dashboard/subscription"
-                        
-                        email_html = f"""
-                        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                            <div style="background: #dc2626; padding: 30px; text-align: center;">
-                                <h1 style="color: white; margin: 0;">Trial Period Ended</h1>
-                            </div>
-                            <div style="padding: 30px; background: #f9fafb;">
-                                <p>Hi {owner.get('full_name', 'there')},</p>
-                                
-                                <p>Your free trial for <strong>{reseller.get('brand_name', reseller.get('company_name'))}</strong> has ended.</p>
-                                
-                                <p>Your reseller account has been temporarily suspended. This means:</p>
-                                <ul>
-                                    <li>Your partner portal is currently offline</li>
-                                    <li>Your customers cannot access the platform</li>
-                                    <li>All your data is safely preserved</li>
-                                </ul>
-                                
-                                <p>To reactivate your account immediately:</p>
-                                
-                                <div style="text-align: center; margin: 30px 0;">
-                                    <a href="{upgrade_url}" style="background: #1e40af; color: white; padding: 15px 30px; text-decoration: none; border-radius: 8px; font-weight: bold;">
-                                        Subscribe Now
-                                    </a>
-                                </div>
-                                
-                                <p>Choose from our plans:</p>
-                                <ul>
-                                    <li><strong>Starter</strong> - R2,499/month (1,000 CVs)</li>
-                                    <li><strong>Professional</strong> - R4,999/month (3,500 CVs)</li>
-                                    <li><strong>Enterprise</strong> - Custom pricing (Unlimited)</li>
-                                </ul>
-                                
-                                <p>Questions? Reply to this email or contact our support team.</p>
-                                
-                                <p>Best regards,<br>The UpShift Team</p>
-                            </div>
-                        </div>
-                        """
-                        
-                        await send_email(
-                            to_email=owner['email'],
-                            subject=f"Your {reseller.get('brand_name', 'reseller')} trial has ended - Account suspended",
-                            html_body=email_html,
-                            text_body=f"Hi {owner.get('full_name', 'there')}, your reseller trial has ended and your account has been suspended. Visit {upgrade_url} to subscribe and reactivate your platform."
-                        )
-                    
-                    suspended_count += 1
-                    logger.info(f"[AUTO] Suspended reseller due to expired trial: {reseller.get('company_name')}")
-                    
-            except Exception as e:
-                logger.error(f"[AUTO] Error suspending reseller {reseller.get('id')}: {str(e)}")
-        
-        if suspended_count > 0:
-            logger.info(f"[AUTO] Suspended {suspended_count} resellers with expired trials")
+        if run["updated"] > 0:
+            logger.info(f"[AUTO] Suspended {run['updated']} of {run['processed']} resellers with expired trials")
             
     except Exception as e:
         logger.error(f"[AUTO] Error suspending expired reseller trials: {str(e)}")
+
+
+async def auto_cleanup_generated_cvs():
+    """Remove expired template-generated CV files and their index entries"""
+    try:
+        await generated_artifact_store.collect_garbage()
+    except Exception as e:
+        logger.error(f"[AUTO] Error cleaning up generated CVs: {str(e)}")
+
+
+async def auto_cleanup_ai_jobs():
+    """Fail AI jobs that were never processed and remove their uploads"""
+    try:
+        result = await job_queue.collect_garbage()
+        if result["expired"]:
+            logger.info(f"[AUTO] Expired {result['expired']} AI jobs")
+    except Exception as e:
+        logger.error(f"[AUTO] Error cleaning up AI jobs: {str(e)}")
+
+
+async def auto_recover_email_campaigns():
+    """Continue sending campaigns whose process stopped mid-way"""
+    try:
+        recovered = await campaign_sender.recover_stalled()
+        if recovered:
+            logger.info(f"[AUTO] Resumed {recovered} stalled email campaigns")
+    except Exception as e:
+        logger.error(f"[AUTO] Error recovering email campaigns: {str(e)}")
@@ -0,0 +1,370 @@
+"""
+SMTP Transport - Pooled SMTP connections that never block the event loop
+
+smtplib is blocking, so every SMTP conversation runs on a small thread pool
+of its own. Authenticated connections are kept per SMTP configuration (the
+platform settings and each reseller's /email-settings get separate pools,
+keyed by host, port, user, encryption and a hash of the password):
+
+- reuse: a connection goes back to its pool after a message and the next
+  message skips connect, STARTTLS and AUTH; it is recycled after
+  SMTP_MAX_MESSAGES_PER_CONNECTION messages
+- health: a connection idle for SMTP_NOOP_AFTER_SECONDS is checked with NOOP
+  before reuse, and the keepalive loop NOOPs idle connections and closes the
+  ones idle for SMTP_IDLE_SECONDS
+- reconnect: a send on a reused connection the server dropped is retried
+  once on a fresh connection
+- bounded: at most SMTP_POOL_SIZE conversations per configuration; callers
+  wait up to SMTP_ACQUIRE_TIMEOUT_SECONDS for a free slot
+
+smtplib exceptions reach the caller unchanged, so existing handlers for
+SMTPAuthenticationError, SMTPRecipientsRefused, etc. keep working.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import smtplib
+import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import Message
+from typing import Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable via environment)
+SMTP_POOL_SIZE = int(os.environ.get("SMTP_POOL_SIZE", 4))
+SMTP_MAX_THREADS = int(os.environ.get("SMTP_MAX_THREADS", 16))
+SMTP_TIMEOUT_SECONDS = float(os.environ.get("SMTP_TIMEOUT_SECONDS", 30))
+SMTP_ACQUIRE_TIMEOUT_SECONDS = float(os.environ.get("SMTP_ACQUIRE_TIMEOUT_SECONDS", 60))
+SMTP_NOOP_AFTER_SECONDS = float(os.environ.get("SMTP_NOOP_AFTER_SECONDS", 15))
+SMTP_IDLE_SECONDS = float(os.environ.get("SMTP_IDLE_SECONDS", 120))
+SMTP_KEEPALIVE_SECONDS = float(os.environ.get("SMTP_KEEPALIVE_SECONDS", 30))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.environ.get("SMTP_MAX_MESSAGES_PER_CONNECTION", 100))
+
+# Errors after which the message was not delivered and the connection is gone
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+# Errors about one message; the connection stays usable
+_MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+class SMTPConfig:
+    """Connection settings of one SMTP account"""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        encryption: str = "tls",
+        timeout: float = SMTP_TIMEOUT_SECONDS
+    ):
+        self.host = host
+        self.port = int(port)
+        self.user = user
+        self.password = password
+        self.encryption = encryption or "tls"
+        self.timeout = timeout
+
+    @classmethod
+    def from_settings(cls, settings: Dict, timeout: float = SMTP_TIMEOUT_SECONDS) -> "SMTPConfig":
+        """From a platform_settings or reseller_email_settings document"""
+        return cls(
+            host=settings.get("smtp_host") or "smtp.office365.com",
+            port=settings.get("smtp_port") or 587,
+            user=settings.get("smtp_user"),
+            password=settings.get("smtp_password"),
+            encryption=settings.get("encryption", "tls"),
+            timeout=timeout
+        )
+
+    @property
+    def key(self) -> Tuple:
+        # Changed credentials get a new pool instead of failing AUTH on the old one
+        password_hash = hashlib.sha256((self.password or "").encode()).hexdigest()[:16]
+        return (self.host, self.port, self.user or "", self.encryption, password_hash)
+
+    @property
+    def label(self) -> str:
+        return f"{self.user or 'anonymous'}@{self.host}:{self.port}"
+
+    def connect(self) -> smtplib.SMTP:
+        """Open and authenticate a connection (blocking)"""
+        if self.encryption == "ssl":
+            server = smtplib.SMTP_SSL(self.host, self.port, context=ssl.create_default_context(), timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.encryption == "tls":
+                server.starttls(context=ssl.create_default_context())
+            if self.user and self.password:
+                server.login(self.user, self.password)
+        except BaseException:
+            _close_quietly(server)
+            raise
+        return server
+
+
+def _close_quietly(server: smtplib.SMTP):
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+
+class _Connection:
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.messages = 0
+
+
+class SMTPPool:
+    """Connections of one SMTP configuration"""
+
+    def __init__(self, config: SMTPConfig, size: int):
+        self.config = config
+        self.size = size
+        self._idle: List[_Connection] = []
+        self._slots = asyncio.Semaphore(size)
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self.stats = {
+            "sent": 0,
+            "failed": 0,
+            "connections_opened": 0,
+            "connections_reused": 0,
+            "reconnects": 0,
+            "health_check_failures": 0
+        }
+
+    def _take_idle(self) -> Optional[_Connection]:
+        # Most recently used first, so surplus connections age out
+        while self._idle:
+            conn = self._idle.pop()
+            if time.monotonic() - conn.last_used < SMTP_IDLE_SECONDS:
+                return conn
+            _close_quietly(conn.server)
+        return None
+
+    def _checked(self, conn: Optional[_Connection]) -> _Connection:
+        """A live connection: `conn` if it answers NOOP, else a new one (blocking)"""
+        if conn is not None:
+            if time.monotonic() - conn.last_used < SMTP_NOOP_AFTER_SECONDS:
+                self.stats["connections_reused"] += 1
+                return conn
+            try:
+                if conn.server.noop()[0] == 250:
+                    self.stats["connections_reused"] += 1
+                    return conn
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.stats["health_check_failures"] += 1
+            _close_quietly(conn.server)
+        conn = _Connection(self.config.connect())
+        self.stats["connections_opened"] += 1
+        return conn
+
+    def _send_blocking(self, conn: Optional[_Connection], from_addr: str, recipients: List[str], message: str):
+        conn = self._checked(conn)
+        try:
+            refused = conn.server.sendmail(from_addr, recipients, message)
+        except _MESSAGE_ERRORS as e:
+            # smtplib has already sent RSET (or closed the socket on a 421)
+            if conn.server.sock is not None:
+                e.pooled_connection = conn
+            else:
+                _close_quietly(conn.server)
+            raise
+        except BaseException:
+            _close_quietly(conn.server)
+            raise
+        conn.messages += 1
+        conn.last_used = time.monotonic()
+        return conn, refused
+
+    async def send(self, from_addr: str, recipients: List[str], message: str, executor) -> Dict:
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=SMTP_ACQUIRE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.stats["failed"] += 1
+            raise smtplib.SMTPException(f"No free SMTP connection to {self.config.label} after {SMTP_ACQUIRE_TIMEOUT_SECONDS:.0f}s")
+
+        loop = asyncio.get_running_loop()
+        self.in_use += 1
+        self.last_used = time.monotonic()
+        try:
+            conn = self._take_idle()
+            try:
+                try:
+                    conn, refused = await loop.run_in_executor(
+                        executor, self._send_blocking, conn, from_addr, recipients, message
+                    )
+                except _CONNECTION_ERRORS as e:
+                    if conn is None:
+                        raise
+                    # The server dropped a connection that sat in the pool
+                    logger.info(f"SMTP connection to {self.config.label} lost ({e}), reconnecting")
+                    self.stats["reconnects"] += 1
+                    conn, refused = await loop.run_in_executor(
+                        executor, self._send_blocking, None, from_addr, recipients, message
+                    )
+            except _MESSAGE_ERRORS as e:
+                self._release(getattr(e, "pooled_connection", None))
+                self.stats["failed"] += 1
+                raise
+            except BaseException:
+                self.stats["failed"] += 1
+                raise
+            self._release(conn)
+            self.stats["sent"] += 1
+            return refused
+        finally:
+            self.in_use -= 1
+            self._slots.release()
+
+    def _release(self, conn: Optional[_Connection]):
+        if conn is None:
+            return
+        if conn.messages >= SMTP_MAX_MESSAGES_PER_CONNECTION:
+            _close_quietly(conn.server)
+            return
+        conn.last_used = time.monotonic()
+        self._idle.append(conn)
+
+    def keepalive_blocking(self, conns: List[_Connection]) -> List[_Connection]:
+        """NOOP idle connections; returns the ones still alive (blocking)"""
+        alive = []
+        for conn in conns:
+            if time.monotonic() - conn.last_used >= SMTP_IDLE_SECONDS:
+                _close_quietly(conn.server)
+                continue
+            try:
+                if conn.server.noop()[0] == 250:
+                    alive.append(conn)
+                    continue
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.stats["health_check_failures"] += 1
+            _close_quietly(conn.server)
+        return alive
+
+    def close_blocking(self, conns: List[_Connection]):
+        for conn in conns:
+            _close_quietly(conn.server)
+
+    def get_stats(self) -> Dict:
+        return {
+            "server": self.config.label,
+            "encryption": self.config.encryption,
+            "size": self.size,
+            "in_use": self.in_use,
+            "idle": len(self._idle),
+            **self.stats
+        }
+
+
+class SMTPTransport:
+    """Pools per SMTP configuration, shared by every sender in the process"""
+
+    def __init__(self, pool_size: int = SMTP_POOL_SIZE, max_threads: int = SMTP_MAX_THREADS):
+        self.pool_size = pool_size
+        self.max_threads = max_threads
+        self._pools: Dict[Tuple, SMTPPool] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._keepalive_task: Optional[asyncio.Task] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix="smtp")
+        return self._executor
+
+    def _pool(self, config: SMTPConfig) -> SMTPPool:
+        pool = self._pools.get(config.key)
+        if pool is None:
+            pool = SMTPPool(config, self.pool_size)
+            self._pools[config.key] = pool
+        return pool
+
+    async def send(
+        self,
+        config: SMTPConfig,
+        from_addr: str,
+        recipients: List[str],
+        message: Union[str, Message]
+    ) -> Dict:
+        """
+        Send one message over a pooled connection. Returns the recipients
+        the server refused (like smtplib.sendmail); raises smtplib errors.
+        """
+        if isinstance(message, Message):
+            message = message.as_string()
+        return await self._pool(config).send(from_addr, recipients, message, self.executor)
+
+    async def verify(self, config: SMTPConfig):
+        """Connect and authenticate on a fresh connection; raises smtplib errors"""
+        loop = asyncio.get_running_loop()
+        server = await loop.run_in_executor(self.executor, config.connect)
+        await loop.run_in_executor(self.executor, _close_quietly, server)
+
+    async def keepalive(self):
+        """NOOP idle connections, close expired ones and drop unused pools"""
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        for key, pool in list(self._pools.items()):
+            idle, pool._idle = pool._idle, []
+            alive = await loop.run_in_executor(self.executor, pool.keepalive_blocking, idle)
+            # Connections returned while the NOOPs ran are newer; keep them last
+            pool._idle = alive + pool._idle
+            if not pool._idle and not pool.in_use and now - pool.last_used >= SMTP_IDLE_SECONDS:
+                del self._pools[key]
+
+    async def _keepalive_loop(self):
+        while True:
+            await asyncio.sleep(SMTP_KEEPALIVE_SECONDS)
+            try:
+                await self.keepalive()
+            except Exception as e:
+                logger.error(f"SMTP keepalive error: {str(e)}")
+
+    def start(self):
+        if self._keepalive_task is None:
+            self._keepalive_task = asyncio.ensure_future(self._keepalive_loop())
+
+    async def shutdown(self):
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+            try:
+                await self._keepalive_task
+            except asyncio.CancelledError:
+                pass
+            self._keepalive_task = None
+        loop = asyncio.get_running_loop()
+        for pool in list(self._pools.values()):
+            idle, pool._idle = pool._idle, []
+            await loop.run_in_executor(self.executor, pool.close_blocking, idle)
+        self._pools.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def get_stats(self) -> Dict:
+        return {
+            "pool_size": self.pool_size,
+            "max_threads": self.max_threads,
+            "noop_after_seconds": SMTP_NOOP_AFTER_SECONDS,
+            "idle_seconds": SMTP_IDLE_SECONDS,
+            "pools": [pool.get_stats() for pool in self._pools.values()]
+        }
+
+
+# Global instance
+smtp_transport = SMTPTransport()
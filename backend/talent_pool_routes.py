@@ -107,11 +107,7 @@ def get_talent_pool_routes(db, get_current_user):
     ):
         """AI-powered skill suggestions for talent pool profile"""
         try:
-            from emergentintegrations.llm.chat import LlmChat, UserMessage
-            
-            EMERGENT_LLM_KEY = os.environ.get("EMERGENT_LLM_KEY")
-            if not EMERGENT_LLM_KEY:
-                raise HTTPException(status_code=500, detail="AI service not configured")
+            from llm_gateway import llm_gateway
             
             current_skills_str = ", ".join(data.current_skills) if data.current_skills else "None provided"
             
@@ -135,18 +131,17 @@ Example output: ["Project Management", "Data Analysis", "Team Leadership", "Pyth
 
 Generate skills now:"""
 
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=f"talent-skills-{current_user.id}",
-                system_message="You are an expert career advisor specializing in talent optimization."
-            ).with_model("openai", "gpt-4o")
+            system_message = "You are an expert career advisor specializing in talent optimization."
             
-            response = await chat.send_message(UserMessage(text=prompt))
+            response = await llm_gateway.complete(
+                prompt,
+                system_message=system_message,
+                session_id=f"talent-skills-{current_user.id}",
+                endpoint="talent_skills_improve",
+                reseller_id=current_user.reseller_id
+            )
             
-            if hasattr(response, 'text'):
-                response_text = response.text.strip()
-            else:
-                response_text = str(response).strip()
+            response_text = response.strip()
             
             # Parse JSON array
             import json
@@ -178,11 +173,7 @@ Generate skills now:"""
     ):
         """AI-powered bio generation/improvement for talent pool profile"""
         try:
-            from emergentintegrations.llm.chat import LlmChat, UserMessage
-            
-            EMERGENT_LLM_KEY = os.environ.get("EMERGENT_LLM_KEY")
-            if not EMERGENT_LLM_KEY:
-                raise HTTPException(status_code=500, detail="AI service not configured")
+            from llm_gateway import llm_gateway
             
             skills_str = ", ".join(data.skills) if data.skills else "Not specified"
             
@@ -229,18 +220,17 @@ Instructions:
 
 Write ONLY the bio text, no explanations or quotes."""
 
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=f"talent-bio-{current_user.id}",
-                system_message="You are an expert career advisor specializing in personal branding for job seekers."
-            ).with_model("openai", "gpt-4o")
+            system_message = "You are an expert career advisor specializing in personal branding for job seekers."
             
-            response = await chat.send_message(UserMessage(text=prompt))
+            response = await llm_gateway.complete(
+                prompt,
+                system_message=system_message,
+                session_id=f"talent-bio-{current_user.id}",
+                endpoint="talent_bio_improve",
+                reseller_id=current_user.reseller_id
+            )
             
-            if hasattr(response, 'text'):
-                bio_text = response.text.strip()
-            else:
-                bio_text = str(response).strip()
+            bio_text = response.strip()
             
             # Clean up response
             bio_text = bio_text.strip('"\'')
@@ -262,11 +252,7 @@ Write ONLY the bio text, no explanations or quotes."""
     ):
         """AI-powered professional summary generation/improvement for talent pool profile"""
         try:
-            from emergentintegrations.llm.chat import LlmChat, UserMessage
-            
-            EMERGENT_LLM_KEY = os.environ.get("EMERGENT_LLM_KEY")
-            if not EMERGENT_LLM_KEY:
-                raise HTTPException(status_code=500, detail="AI service not configured")
+            from llm_gateway import llm_gateway
             
             skills_str = ", ".join(data.skills) if data.skills else "Not specified"
             
@@ -318,18 +304,17 @@ Instructions:
 
 Write ONLY the summary text, no explanations or quotes."""
 
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=f"talent-summary-{current_user.id}",
-                system_message="You are an expert career advisor specializing in professional branding and talent profiles."
-            ).with_model("openai", "gpt-4o")
+            system_message = "You are an expert career advisor specializing in professional branding and talent profiles."
             
-            response = await chat.send_message(UserMessage(text=prompt))
+            response = await llm_gateway.complete(
+                prompt,
+                system_message=system_message,
+                session_id=f"talent-summary-{current_user.id}",
+                endpoint="talent_summary_improve",
+                reseller_id=current_user.reseller_id
+            )
             
-            if hasattr(response, 'text'):
-                summary_text = response.text.strip()
-            else:
-                summary_text = str(response).strip()
+            summary_text = response.strip()
             
             # Clean up response
             summary_text = summary_text.strip('"\'')
@@ -1037,11 +1022,11 @@ Write ONLY the summary text, no explanations or quotes."""
                     </html>
                     """
                     
-                    await email_service.send_email(
+                    await email_service.queue_email(
                         to_email=profile["contact_email"],
                         subject=f"New Contact Request from {recruiter_name} - UpShift Talent Pool",
                         html_body=html_body,
-                        raise_exceptions=False
+                        email_type="talent_contact_request"
                     )
                     logger.info(f"Contact request notification sent to {profile['contact_email']}")
                 except Exception as email_error:
@@ -1226,11 +1211,11 @@ Write ONLY the summary text, no explanations or quotes."""
                         
                         subject = f"Contact Request Update: {candidate_name} - UpShift Talent Pool"
                     
-                    await email_service.send_email(
+                    await email_service.queue_email(
                         to_email=request["recruiter_email"],
                         subject=subject,
                         html_body=html_body,
-                        raise_exceptions=False
+                        email_type="talent_contact_response"
                     )
                     logger.info(f"Contact response notification sent to {request['recruiter_email']}")
                 except Exception as email_error:
@@ -0,0 +1,167 @@
+"""
+Tests for the rule-based ATS analyzer (ats_analyzer.py)
+
+Pure functions, no server needed:
+1. Scores match the substring-based fallback_ats_analysis it replaced on a
+   resume without embedded keywords, and differ only where that one matched
+   inside words
+2. Keywords match whole words ("java" is not found in "javascript"), with
+   simple inflections, version numbers and multi-word phrases
+3. Phone numbers are detected, years and date ranges are not
+"""
+
+import os
+import sys
+
+# Add backend to path for imports
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from ats_analyzer import analyze_resume, has_phone_number, scan_keywords  # noqa: E402
+
+SAMPLE_RESUME = """Naledi Mokoena
+Project Manager
+naledi.mokoena@example.co.za | +27 82 555 0143 | linkedin.com/in/naledimokoena
+
+PROFILE
+Results-driven project manager with eight years of experience delivering finance and
+customer service systems for retail banks in Johannesburg.
+
+EXPERIENCE
+Senior Project Manager, Ubuntu Bank (2019 - 2024)
+- Led a team of 12 analysts and developers through an agile rollout
+- Managed a R40 million portfolio and reduced delivery time by 30%
+- Implemented scrum ceremonies across four product teams
+- Improved customer service scores from 72% to 91%
+
+Project Coordinator, Karoo Retail (2016 - 2019)
+- Developed reporting in Excel and SQL for the sales and marketing teams
+- Created the accounting month-end checklist and increased accuracy
+
+EDUCATION
+Bachelor of Commerce (Honours), University of Pretoria, 2015
+Project Management Professional certificate, 2018
+
+SKILLS
+Project management, leadership, communication, teamwork, problem solving,
+data analysis, Microsoft Office, PowerPoint, Word, SAP, Python, Azure
+
+REFERENCES
+Available on request
+"""
+
+# Scores of the previous substring-based fallback_ats_analysis (ai_service.py)
+BASELINE_SAMPLE_SCORES = {
+    "format_compatibility": 60,
+    "contact_information": 100,
+    "keywords_skills": 100,
+    "work_experience": 100,
+    "education": 90,
+    "overall_structure": 90
+}
+BASELINE_SAMPLE_OVERALL = 90
+
+# test_resume.txt scored 81 there, keywords_skills 77: "java" was counted inside "JavaScript"
+BASELINE_TEST_RESUME_SCORES = {
+    "format_compatibility": 70,
+    "contact_information": 90,
+    "keywords_skills": 77,
+    "work_experience": 85,
+    "education": 90,
+    "overall_structure": 75
+}
+
+
+def _scores(result):
+    return {category: details["score"] for category, details in result["categories"].items()}
+
+
+class TestBaselineEquivalence:
+    """Same scores as the analyzer this one replaced"""
+
+    def test_sample_resume_scores_match_baseline(self):
+        result = analyze_resume(SAMPLE_RESUME)
+
+        assert _scores(result) == BASELINE_SAMPLE_SCORES
+        assert result["overall_score"] == BASELINE_SAMPLE_OVERALL
+        assert result["summary"] == (
+            f"Basic ATS analysis complete. Your CV scored {BASELINE_SAMPLE_OVERALL}/100. This is a good foundation!"
+        )
+        assert "Missing email address" not in result["critical_issues"]
+        assert "LinkedIn profile included" in result["strengths"]
+
+    def test_repository_sample_differs_only_by_embedded_keyword(self):
+        with open(os.path.join(os.path.dirname(BACKEND_DIR), "test_resume.txt")) as f:
+            text = f.read()
+        result = analyze_resume(text)
+
+        # One skill fewer (3 points each)
+        expected = dict(BASELINE_TEST_RESUME_SCORES, keywords_skills=BASELINE_TEST_RESUME_SCORES["keywords_skills"] - 3)
+        assert _scores(result) == expected
+        assert "java" in text.lower()
+        assert "java" not in scan_keywords(text.lower())
+
+    def test_result_shape(self):
+        result = analyze_resume(SAMPLE_RESUME)
+
+        assert set(result) >= {"overall_score", "summary", "categories", "checklist", "strengths", "critical_issues", "recommendations"}
+        for details in result["categories"].values():
+            assert details["status"] in ("pass", "warning", "fail")
+            assert details["findings"]
+
+
+class TestWholeWordMatching:
+    """Keywords are matched as whole words"""
+
+    def test_java_not_found_in_javascript(self):
+        found = scan_keywords("senior javascript developer")
+
+        assert "javascript" in found
+        assert "java" not in found
+
+    def test_java_and_javascript_both_found(self):
+        found = scan_keywords("java and javascript")
+
+        assert {"java", "javascript"} <= found
+
+    def test_keyword_inside_longer_word_not_found(self):
+        found = scan_keywords("skilled in postgresql; password resets; salesforce admin")
+
+        assert "led" not in found
+        assert "sql" not in found
+        assert "word" not in found
+        assert "sales" not in found
+
+    def test_inflections(self):
+        found = scan_keywords("managed budgets, previous roles and careers")
+
+        assert {"managed", "role", "career"} <= found
+
+    def test_version_numbers(self):
+        found = scan_keywords("html5, css3 and python3")
+
+        assert {"html", "css", "python"} <= found
+
+    def test_multi_word_phrase_implies_its_words(self):
+        found = scan_keywords("led project management for data analysis teams")
+
+        assert {"project management", "management", "data analysis"} <= found
+        assert "problem solving" not in found
+
+    def test_multi_word_phrase_across_punctuation_and_case(self):
+        found = scan_keywords("Customer-Service awards".lower())
+
+        assert "customer service" in found
+
+
+class TestPhoneNumbers:
+    """Phone numbers vs years"""
+
+    def test_phone_formats(self):
+        assert has_phone_number("+27 82 555 0143")
+        assert has_phone_number("(011) 555-0143")
+        assert has_phone_number("0825550143")
+
+    def test_years_and_date_ranges_are_not_phones(self):
+        assert not has_phone_number("Ubuntu Bank (2019 - 2024)")
+        assert not has_phone_number("2016-2019, 2015")
@@ -0,0 +1,182 @@
+"""
+Tests for the fan-out merge of /api/cv/ai-enhance-all (cv_enhancement_service.py)
+
+No LLM calls: section results are built by hand, and the end-to-end test
+replaces llm_gateway.complete with canned answers that finish out of order.
+1. Sections are merged in CV order whatever order they completed in
+2. A failed section keeps its submitted content and is listed in failed_sections
+3. The request fails only when every section failed
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi import HTTPException
+
+# Add backend to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv_enhancement_service  # noqa: E402
+from cv_enhancement_service import enhance_cv, merge_enhancements, raise_if_nothing_enhanced  # noqa: E402
+from llm_gateway import LLMUnavailableError  # noqa: E402
+
+CV_DATA = {
+    "full_name": "Thandi Nkosi",
+    "summary": "Developer.",
+    "experiences": [
+        {"title": "Developer", "company": "Acme", "duration": "2019-2021", "description": "Wrote code."},
+        {"title": "Senior Developer", "company": "Globex", "duration": "2021-2024", "description": "Led a team."}
+    ],
+    "skills": ["Python", "SQL"],
+    "education": [
+        {"degree": "BSc", "institution": "UCT"},
+        {"degree": "MSc", "institution": "Wits"}
+    ]
+}
+
+
+def _experience(description):
+    return {"description": description, "achievements": f"Achieved: {description}"}
+
+
+class TestSectionOrdering:
+    """Results merged in CV order"""
+
+    def test_out_of_order_results_merge_in_cv_order(self):
+        results = [
+            ("education", 1, {"degree": "MSc Computer Science", "grade": "Distinction"}, None),
+            ("experiences", 1, _experience("Led a team of six."), None),
+            ("skills", None, ["Python", "python", "Docker"], None),
+            ("summary", None, "Experienced developer.", None),
+            ("experiences", 0, _experience("Built billing APIs."), None),
+            ("education", 0, {"degree": "BSc Computer Science"}, None)
+        ]
+
+        merged = merge_enhancements(CV_DATA, results)
+
+        assert merged["success"] is True
+        assert merged["partial"] is False
+        assert merged["failed_sections"] == []
+        assert merged["enhanced_summary"] == "Experienced developer."
+        assert [e["description"] for e in merged["enhanced_experiences"]] == ["Built billing APIs.", "Led a team of six."]
+        # Enhanced fields are laid over the submitted entry at the same position
+        assert merged["enhanced_experiences"][1]["company"] == "Globex"
+        assert merged["enhanced_experiences"][1]["achievements"] == "Achieved: Led a team of six."
+        # Skills are de-duplicated case-insensitively, first spelling wins
+        assert merged["enhanced_skills"] == ["Python", "Docker"]
+        # Education keeps only its original keys
+        assert merged["enhanced_education"] == [
+            {"degree": "BSc Computer Science", "institution": "UCT"},
+            {"degree": "MSc Computer Science", "institution": "Wits"}
+        ]
+
+    def test_submitted_cv_is_not_modified(self):
+        merge_enhancements(CV_DATA, [("experiences", 0, _experience("Built billing APIs."), None)])
+
+        assert CV_DATA["experiences"][0]["description"] == "Wrote code."
+
+    def test_enhance_cv_merges_in_cv_order_when_sections_finish_out_of_order(self, monkeypatch):
+        # Earlier sections answer last
+        answers = [
+            ("professional summary", 0.04, "Experienced developer."),
+            ("Acme", 0.03, '{"description": "Built billing APIs.", "achievements": "Cut costs"}'),
+            ("Globex", 0.02, '{"description": "Led a team of six.", "achievements": "Shipped v2"}'),
+            ("skills list", 0.01, '["Python", "Docker"]'),
+            ("UCT", 0.0, '{"degree": "BSc Computer Science"}'),
+            ("Wits", 0.0, '{"degree": "MSc Computer Science"}')
+        ]
+
+        async def complete(prompt, **kwargs):
+            for marker, delay, answer in answers:
+                if marker in prompt:
+                    await asyncio.sleep(delay)
+                    return answer
+            raise AssertionError(f"unexpected prompt: {prompt[:80]}")
+
+        monkeypatch.setattr(cv_enhancement_service.llm_gateway, "complete", complete)
+
+        merged = asyncio.run(enhance_cv(CV_DATA))
+
+        assert merged["partial"] is False
+        assert merged["enhanced_summary"] == "Experienced developer."
+        assert [e["description"] for e in merged["enhanced_experiences"]] == ["Built billing APIs.", "Led a team of six."]
+        assert merged["enhanced_skills"] == ["Python", "Docker"]
+        assert [e["degree"] for e in merged["enhanced_education"]] == ["BSc Computer Science", "MSc Computer Science"]
+
+
+class TestPartialFailure:
+    """Failed sections keep their content"""
+
+    def test_failed_sections_keep_submitted_content(self):
+        results = [
+            ("skills", None, None, ValueError("not JSON")),
+            ("experiences", 1, None, asyncio.TimeoutError()),
+            ("summary", None, "Experienced developer.", None),
+            ("experiences", 0, _experience("Built billing APIs."), None),
+            ("education", 0, None, LLMUnavailableError(retry_after=30))
+        ]
+
+        merged = merge_enhancements(CV_DATA, results)
+
+        assert merged["success"] is True
+        assert merged["partial"] is True
+        assert merged["enhanced_summary"] == "Experienced developer."
+        assert merged["enhanced_experiences"][0]["description"] == "Built billing APIs."
+        assert merged["enhanced_experiences"][1] == CV_DATA["experiences"][1]
+        assert merged["enhanced_skills"] == ["Python", "SQL"]
+        assert merged["enhanced_education"] == CV_DATA["education"]
+        # Listed in CV order, with the reason shown to the user
+        assert [(f["section"], f["index"]) for f in merged["failed_sections"]] == [
+            ("experiences", 1), ("skills", None), ("education", 0)
+        ]
+        reasons = [f["reason"] for f in merged["failed_sections"]]
+        assert reasons[:2] == ["Timed out", "Could not read the AI response"]
+        assert reasons[2] == LLMUnavailableError(retry_after=30).detail
+
+    def test_partial_failure_does_not_fail_the_request(self):
+        results = [
+            ("summary", None, None, asyncio.TimeoutError()),
+            ("skills", None, ["Python"], None)
+        ]
+
+        raise_if_nothing_enhanced(results)
+
+    def test_empty_skills_answer_keeps_submitted_skills(self):
+        merged = merge_enhancements(CV_DATA, [("skills", None, [], None)])
+
+        assert merged["enhanced_skills"] == ["Python", "SQL"]
+
+
+class TestAllSectionsFailed:
+    """The request fails only when nothing was enhanced"""
+
+    def test_gateway_error_is_raised_unchanged(self):
+        unavailable = LLMUnavailableError(retry_after=30)
+        results = [
+            ("summary", None, None, asyncio.TimeoutError()),
+            ("experiences", 0, None, unavailable),
+            ("skills", None, None, ValueError("not JSON"))
+        ]
+
+        with pytest.raises(HTTPException) as excinfo:
+            raise_if_nothing_enhanced(results)
+
+        assert excinfo.value is unavailable
+        assert excinfo.value.status_code == 503
+
+    def test_other_errors_become_500(self):
+        results = [
+            ("summary", None, None, asyncio.TimeoutError()),
+            ("skills", None, None, ValueError("not JSON"))
+        ]
+
+        with pytest.raises(HTTPException) as excinfo:
+            raise_if_nothing_enhanced(results)
+
+        assert excinfo.value.status_code == 500
+        assert excinfo.value.detail == "Enhancement failed: Timed out"
+
+    def test_no_results_is_not_an_error(self):
+        raise_if_nothing_enhanced([])
@@ -0,0 +1,204 @@
+"""
+Tests for compiled CV templates (docx_template_compiler.py)
+
+Templates are built in memory with python-docx, compiled, rendered and read
+back, no server needed:
+1. A placeholder Word split across runs is merged into its first run,
+   keeping that run's formatting, and indexed once
+2. Values are XML-escaped; line breaks and tabs become w:br / w:tab
+3. Unknown placeholders and placeholders without a value are left as they are
+4. Headers and footers are filled like the body
+5. The compiled template cache compiles legacy templates once and reuses them
+"""
+
+import io
+import os
+import sys
+
+import pytest
+from docx import Document
+
+# Add backend to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx_template_compiler import (  # noqa: E402
+    CompiledTemplateCache,
+    compile_template,
+    compiled_path_for,
+    load_compiled
+)
+
+
+def _docx(build) -> bytes:
+    document = Document()
+    build(document)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def _compile(content: bytes):
+    compiled_content, index = compile_template(content)
+    return load_compiled(compiled_content, index), index
+
+
+def _render(content: bytes, replacements) -> Document:
+    compiled, _ = _compile(content)
+    return Document(io.BytesIO(compiled.render(replacements)))
+
+
+def _split_name(document):
+    paragraph = document.add_paragraph()
+    first = paragraph.add_run("Name: {{FU")
+    first.bold = True
+    paragraph.add_run("LL_")
+    last = paragraph.add_run("NAME}} (CV)")
+    last.italic = True
+
+
+class TestSplitRuns:
+    """Placeholders split across runs"""
+
+    def test_split_placeholder_is_merged_and_indexed(self):
+        compiled, index = _compile(_docx(_split_name))
+
+        assert compiled.placeholders == ["{{FULL_NAME}}"]
+        assert [(entry["part"], entry["run"], entry["placeholder"]) for entry in index] == [
+            ("word/document.xml", 0, "{{FULL_NAME}}")
+        ]
+
+    def test_split_placeholder_is_filled_in_first_run_formatting(self):
+        document = _render(_docx(_split_name), {"{{FULL_NAME}}": "Thandi Nkosi"})
+
+        paragraph = document.paragraphs[0]
+        assert paragraph.text == "Name: Thandi Nkosi (CV)"
+        runs = [(run.text, run.bold, run.italic) for run in paragraph.runs]
+        assert runs == [
+            ("Name: Thandi Nkosi", True, None),
+            ("", None, None),
+            (" (CV)", None, True)
+        ]
+
+    def test_several_placeholders_in_one_paragraph(self):
+        def build(document):
+            paragraph = document.add_paragraph()
+            for text in ("{{EMAIL}} | {{PH", "ONE}}", " | {{CITY}}"):
+                paragraph.add_run(text)
+
+        document = _render(_docx(build), {
+            "{{EMAIL}}": "thandi@example.co.za", "{{PHONE}}": "+27 82 555 0143", "{{CITY}}": "Durban"
+        })
+
+        assert document.paragraphs[0].text == "thandi@example.co.za | +27 82 555 0143 | Durban"
+
+    def test_template_without_placeholders_is_unchanged(self):
+        content = _docx(lambda document: document.add_paragraph("No placeholders {here}"))
+
+        compiled, index = _compile(content)
+
+        assert index == []
+        assert compiled.fragments == {}
+        assert Document(io.BytesIO(compiled.render({}))).paragraphs[0].text == "No placeholders {here}"
+
+
+class TestEscaping:
+    """Values are escaped for XML"""
+
+    def test_markup_characters_are_escaped(self):
+        value = 'R&D <Lead> "Tools" & \'Ops\' ]]>'
+        document = _render(_docx(lambda d: d.add_paragraph("Role: {{JOB_TITLE}}")), {"{{JOB_TITLE}}": value})
+
+        assert document.paragraphs[0].text == f"Role: {value}"
+
+    def test_line_breaks_and_tabs(self):
+        document = _render(
+            _docx(lambda d: d.add_paragraph("{{SUMMARY}}")),
+            {"{{SUMMARY}}": "First line\r\nSecond\tline\nThird"}
+        )
+
+        paragraph = document.paragraphs[0]
+        assert paragraph.text == "First line\nSecond\tline\nThird"
+        xml = paragraph._p.xml
+        assert xml.count("<w:br/>") == 2
+        assert xml.count("<w:tab/>") == 1
+
+    def test_non_string_values(self):
+        document = _render(_docx(lambda d: d.add_paragraph("{{YEARS}} years")), {"{{YEARS}}": 7})
+
+        assert document.paragraphs[0].text == "7 years"
+
+
+class TestUnknownPlaceholders:
+    """Placeholders without a value stay in the document"""
+
+    def test_unknown_placeholder_is_left_as_is(self):
+        content = _docx(lambda d: d.add_paragraph("{{FULL_NAME}} - {{UNKNOWN_FIELD}}"))
+
+        document = _render(content, {"{{FULL_NAME}}": "Thandi Nkosi", "{{NOT_IN_TEMPLATE}}": "ignored"})
+
+        assert document.paragraphs[0].text == "Thandi Nkosi - {{UNKNOWN_FIELD}}"
+
+    def test_none_value_leaves_placeholder(self):
+        document = _render(_docx(lambda d: d.add_paragraph("{{PHONE}}")), {"{{PHONE}}": None})
+
+        assert document.paragraphs[0].text == "{{PHONE}}"
+
+    def test_lowercase_braces_are_not_placeholders(self):
+        compiled, index = _compile(_docx(lambda d: d.add_paragraph("{{full_name}} {{FULL_NAME}}")))
+
+        assert compiled.placeholders == ["{{FULL_NAME}}"]
+        document = Document(io.BytesIO(compiled.render({"{{FULL_NAME}}": "Thandi"})))
+        assert document.paragraphs[0].text == "{{full_name}} Thandi"
+
+
+class TestHeadersAndFooters:
+    """Every text part is compiled"""
+
+    def test_header_and_footer_placeholders(self):
+        def build(document):
+            section = document.sections[0]
+            section.header.paragraphs[0].add_run("{{FULL")
+            section.header.paragraphs[0].add_run("_NAME}}")
+            section.footer.paragraphs[0].text = "{{EMAIL}}"
+            document.add_paragraph("{{FULL_NAME}}")
+
+        compiled, index = _compile(_docx(build))
+        document = Document(io.BytesIO(compiled.render({"{{FULL_NAME}}": "Thandi", "{{EMAIL}}": "t@example.co.za"})))
+
+        assert {entry["part"] for entry in index} == {"word/document.xml", "word/header1.xml", "word/footer1.xml"}
+        assert document.sections[0].header.paragraphs[0].text == "Thandi"
+        assert document.sections[0].footer.paragraphs[0].text == "t@example.co.za"
+        assert document.paragraphs[0].text == "Thandi"
+
+
+class TestCompiledTemplateCache:
+    """Compile once, then serve from memory"""
+
+    @pytest.fixture
+    def template_path(self, tmp_path):
+        path = tmp_path / "template.docx"
+        path.write_bytes(_docx(_split_name))
+        return str(path)
+
+    def test_legacy_template_compiled_on_first_use(self, template_path):
+        cache = CompiledTemplateCache()
+
+        first = cache.get("t1", template_path, None)
+        second = cache.get("t1", template_path, [{"part": "word/document.xml", "paragraph": 0, "run": 0,
+                                                   "placeholder": "{{FULL_NAME}}"}])
+
+        assert os.path.exists(compiled_path_for(template_path))
+        assert second is first
+        assert cache.get_stats()["compiled"] == 1
+        assert cache.get_stats()["hits"] == 1
+
+    def test_invalidate_and_lru_eviction(self, template_path):
+        cache = CompiledTemplateCache(max_entries=1)
+        _, index = compile_template(open(template_path, "rb").read())
+
+        first = cache.get("t1", template_path, None)
+        cache.invalidate("t1")
+        assert cache.get("t1", template_path, index) is not first
+
+        cache.get("t2", template_path, index)
+        assert cache.get_stats()["entries"] == 1
@@ -0,0 +1,335 @@
+"""
+Tests for the pooled SMTP transport (smtp_transport.py)
+
+Runs against a local SMTP stand-in, no mail server or network needed:
+1. Connections are authenticated once and reused across messages
+2. Separate pools per SMTP configuration (platform and reseller accounts)
+3. A connection dropped by the server is replaced without losing the message
+4. smtplib errors reach the caller and the connection stays usable
+5. Keepalive NOOPs idle connections and closes expired ones
+"""
+
+import asyncio
+import base64
+import os
+import smtplib
+import socketserver
+import sys
+import threading
+
+import pytest
+
+# Add backend to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import smtp_transport as transport_module  # noqa: E402
+from smtp_transport import SMTPConfig, SMTPTransport  # noqa: E402
+
+SMTP_USER = "mailer@upshift.works"
+SMTP_PASSWORD = "secret"
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: EHLO, AUTH PLAIN, MAIL, RCPT, DATA, NOOP, RSET, QUIT"""
+
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+            server.open_sockets.append(self.connection)
+        self.reply("220 localhost stand-in ready")
+        sender, recipients = None, []
+        while True:
+            try:
+                line = self.rfile.readline()
+            except OSError:
+                return
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.wfile.write(b"250-localhost\r\n250-AUTH PLAIN\r\n250 8BITMIME\r\n")
+            elif verb == "AUTH":
+                _, user, password = base64.b64decode(command.split()[2]).decode().split("\0")
+                if (user, password) == (SMTP_USER, SMTP_PASSWORD):
+                    with server.lock:
+                        server.logins += 1
+                    self.reply("235 Authentication successful")
+                else:
+                    self.reply("535 Authentication failed")
+            elif verb == "MAIL":
+                sender, recipients = command[10:].strip("<>"), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                address = command[8:].strip("<>")
+                if address.startswith("reject"):
+                    self.reply("550 No such user")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if data_line in (b".\r\n", b""):
+                        break
+                    body.append(data_line)
+                with server.lock:
+                    server.messages.append((sender, recipients, b"".join(body).decode()))
+                self.reply("250 Queued")
+            elif verb == "NOOP":
+                with server.lock:
+                    server.noops += 1
+                self.reply("250 OK")
+            elif verb == "RSET":
+                sender, recipients = None, []
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.logins = 0
+        self.noops = 0
+        self.messages = []
+        self.open_sockets = []
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def drop_connections(self):
+        """Close every client connection, as a server does after its idle timeout"""
+        with self.lock:
+            sockets, self.open_sockets = self.open_sockets, []
+        for sock in sockets:
+            try:
+                sock.shutdown(2)
+            except OSError:
+                pass
+            sock.close()
+
+
+@pytest.fixture
+def smtp_server():
+    server = LocalSMTPServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.drop_connections()
+    server.server_close()
+
+
+def _config(server: LocalSMTPServer, user: str = SMTP_USER, password: str = SMTP_PASSWORD) -> SMTPConfig:
+    return SMTPConfig("127.0.0.1", server.port, user, password, encryption="none", timeout=5)
+
+
+def _message(to_email: str, subject: str = "Hello") -> str:
+    return f"From: {SMTP_USER}\r\nTo: {to_email}\r\nSubject: {subject}\r\n\r\nBody of {subject}\r\n"
+
+
+def _run(coro_fn):
+    """Run a test coroutine with a transport that is shut down afterwards"""
+    async def main():
+        transport = SMTPTransport(pool_size=2, max_threads=4)
+        try:
+            return await coro_fn(transport)
+        finally:
+            await transport.shutdown()
+    return asyncio.run(main())
+
+
+class TestConnectionReuse:
+    """Pooled connections are authenticated once"""
+
+    def test_sequential_messages_share_one_connection(self, smtp_server):
+        async def scenario(transport):
+            for i in range(5):
+                await transport.send(_config(smtp_server), SMTP_USER, [f"user{i}@example.com"], _message(f"user{i}@example.com", f"Mail {i}"))
+            return transport.get_stats()
+
+        stats = _run(scenario)
+
+        assert len(smtp_server.messages) == 5
+        assert smtp_server.connections == 1
+        assert smtp_server.logins == 1
+        pool = stats["pools"][0]
+        assert pool["sent"] == 5
+        assert pool["connections_opened"] == 1
+        assert pool["connections_reused"] == 4
+
+    def test_concurrent_messages_bounded_by_pool_size(self, smtp_server):
+        async def scenario(transport):
+            await asyncio.gather(*[
+                transport.send(_config(smtp_server), SMTP_USER, [f"user{i}@example.com"], _message(f"user{i}@example.com"))
+                for i in range(10)
+            ])
+
+        _run(scenario)
+
+        assert len(smtp_server.messages) == 10
+        assert 1 <= smtp_server.connections <= 2
+
+    def test_separate_pools_per_config(self, smtp_server):
+        async def scenario(transport):
+            platform = _config(smtp_server)
+            reseller = SMTPConfig("127.0.0.1", smtp_server.port, SMTP_USER, SMTP_PASSWORD, encryption="none", timeout=5)
+            reseller.host = "localhost"
+            await transport.send(platform, SMTP_USER, ["a@example.com"], _message("a@example.com"))
+            await transport.send(reseller, SMTP_USER, ["b@example.com"], _message("b@example.com"))
+            await transport.send(platform, SMTP_USER, ["c@example.com"], _message("c@example.com"))
+            return transport.get_stats()
+
+        stats = _run(scenario)
+
+        assert len(stats["pools"]) == 2
+        assert smtp_server.connections == 2
+
+    def test_changed_password_gets_new_pool(self):
+        old = SMTPConfig("smtp.example.com", 587, SMTP_USER, "old")
+        new = SMTPConfig.from_settings({"smtp_host": "smtp.example.com", "smtp_port": 587, "smtp_user": SMTP_USER, "smtp_password": "new"})
+        assert old.key != new.key
+        assert SMTPConfig.from_settings({"smtp_host": "smtp.example.com", "smtp_port": "587", "smtp_user": SMTP_USER, "smtp_password": "old"}).key == old.key
+
+
+class TestReconnect:
+    """Dropped connections are replaced"""
+
+    def test_message_sent_after_server_drops_connection(self, smtp_server, monkeypatch):
+        # Reuse without NOOP, so the send itself hits the closed connection
+        monkeypatch.setattr(transport_module, "SMTP_NOOP_AFTER_SECONDS", 3600)
+
+        async def scenario(transport):
+            await transport.send(_config(smtp_server), SMTP_USER, ["a@example.com"], _message("a@example.com"))
+            smtp_server.drop_connections()
+            await transport.send(_config(smtp_server), SMTP_USER, ["b@example.com"], _message("b@example.com", "After drop"))
+            return transport.get_stats()
+
+        stats = _run(scenario)
+
+        assert [m[1] for m in smtp_server.messages] == [["a@example.com"], ["b@example.com"]]
+        assert smtp_server.connections == 2
+        assert stats["pools"][0]["reconnects"] == 1
+
+    def test_stale_connection_checked_with_noop(self, smtp_server, monkeypatch):
+        monkeypatch.setattr(transport_module, "SMTP_NOOP_AFTER_SECONDS", 0)
+
+        async def scenario(transport):
+            await transport.send(_config(smtp_server), SMTP_USER, ["a@example.com"], _message("a@example.com"))
+            smtp_server.drop_connections()
+            await transport.send(_config(smtp_server), SMTP_USER, ["b@example.com"], _message("b@example.com"))
+            return transport.get_stats()
+
+        stats = _run(scenario)
+
+        assert len(smtp_server.messages) == 2
+        assert stats["pools"][0]["health_check_failures"] == 1
+        assert stats["pools"][0]["reconnects"] == 0
+
+
+class TestErrors:
+    """smtplib errors reach the caller unchanged"""
+
+    def test_authentication_error(self, smtp_server):
+        async def scenario(transport):
+            await transport.send(_config(smtp_server, password="wrong"), SMTP_USER, ["a@example.com"], _message("a@example.com"))
+
+        with pytest.raises(smtplib.SMTPAuthenticationError):
+            _run(scenario)
+        assert smtp_server.messages == []
+
+    def test_refused_recipient_keeps_connection(self, smtp_server):
+        async def scenario(transport):
+            with pytest.raises(smtplib.SMTPRecipientsRefused):
+                await transport.send(_config(smtp_server), SMTP_USER, ["reject@example.com"], _message("reject@example.com"))
+            await transport.send(_config(smtp_server), SMTP_USER, ["a@example.com"], _message("a@example.com"))
+            return transport.get_stats()
+
+        stats = _run(scenario)
+
+        assert len(smtp_server.messages) == 1
+        assert smtp_server.connections == 1
+        assert stats["pools"][0]["failed"] == 1
+
+    def test_verify(self, smtp_server):
+        async def scenario(transport):
+            await transport.verify(_config(smtp_server))
+            with pytest.raises(smtplib.SMTPAuthenticationError):
+                await transport.verify(_config(smtp_server, password="wrong"))
+
+        _run(scenario)
+        assert smtp_server.logins == 1
+
+
+class TestKeepalive:
+    """Idle connections are NOOPed and expired ones closed"""
+
+    def test_keepalive_noops_idle_connections(self, smtp_server):
+        async def scenario(transport):
+            await transport.send(_config(smtp_server), SMTP_USER, ["a@example.com"], _message("a@example.com"))
+            await transport.keepalive()
+            return transport.get_stats()
+
+        stats = _run(scenario)
+
+        assert smtp_server.noops == 1
+        assert stats["pools"][0]["idle"] == 1
+
+    def test_keepalive_closes_expired_connections(self, smtp_server, monkeypatch):
+        monkeypatch.setattr(transport_module, "SMTP_IDLE_SECONDS", 0)
+
+        async def scenario(transport):
+            await transport.send(_config(smtp_server), SMTP_USER, ["a@example.com"], _message("a@example.com"))
+            await transport.keepalive()
+            return transport.get_stats()
+
+        stats = _run(scenario)
+
+        assert smtp_server.noops == 0
+        assert stats["pools"] == []
+
+
+class TestEmailService:
+    """EmailService sends through the pool"""
+
+    def test_send_email_reuses_connection(self, smtp_server, monkeypatch):
+        from email_service import EmailService
+
+        async def scenario(transport):
+            monkeypatch.setattr("email_service.smtp_transport", transport)
+            service = EmailService()
+            service.configure({
+                "smtp_host": "127.0.0.1",
+                "smtp_port": smtp_server.port,
+                "smtp_user": SMTP_USER,
+                "smtp_password": SMTP_PASSWORD,
+                "encryption": "none"
+            })
+            results = [await service.send_email(f"user{i}@example.com", f"Subject {i}", "<p>Hi</p>", "Hi") for i in range(3)]
+            connection = await service.test_connection()
+            return results, connection
+
+        results, connection = _run(scenario)
+
+        assert results == [True, True, True]
+        assert connection["success"] is True
+        assert len(smtp_server.messages) == 3
+        assert "Subject: Subject 2" in smtp_server.messages[2][2]
+        # One pooled connection plus the separate connection test
+        assert smtp_server.connections == 2
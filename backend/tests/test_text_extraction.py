@@ -0,0 +1,82 @@
+"""
+Tests for the upload text extraction pool (text_extraction_service.py)
+
+Runs real worker processes, no server needed:
+1. A stuck extraction times out with a 422 and its worker is terminated
+2. The next upload is read normally instead of queueing behind stuck jobs
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+# Add backend to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import text_extraction_service as extraction_module  # noqa: E402
+from text_extraction_service import ExtractionError, TextExtractionService  # noqa: E402
+
+STUCK_CONTENT = b"stuck"
+extract_document_text = extraction_module.extract_document_text
+
+
+def stuck_extraction(content, file_type):
+    """Stands in for a pathological PDF: never finishes within the timeout"""
+    if content == STUCK_CONTENT:
+        time.sleep(120)
+    return extract_document_text(content, file_type)
+
+
+@pytest.fixture
+def service(monkeypatch):
+    # Looked up when each job is submitted; workers import this module to unpickle it
+    monkeypatch.setattr(extraction_module, "extract_document_text", stuck_extraction)
+    service = TextExtractionService(max_workers=2, timeout=5)
+    yield service
+    service.shutdown()
+
+
+class TestStuckExtraction:
+    """Timed-out jobs do not keep the pool busy"""
+
+    def test_stuck_extractions_do_not_block_the_next_upload(self, service):
+        async def scenario():
+            stuck = await asyncio.gather(
+                service._run(STUCK_CONTENT, "txt"),
+                service._run(STUCK_CONTENT, "txt"),
+                return_exceptions=True
+            )
+            started = time.monotonic()
+            result = await service._run(b"Thandi Nkosi\nPython developer", "txt")
+            return stuck, result, time.monotonic() - started
+
+        stuck, result, elapsed = asyncio.run(scenario())
+
+        assert all(isinstance(error, ExtractionError) and error.status_code == 422 for error in stuck)
+        assert result["text"] == "Thandi Nkosi\nPython developer"
+        # Read on a fresh pool, well inside the timeout
+        assert elapsed < service.timeout
+        assert service.stats["timed_out"] == 2
+        assert service.stats["recycled"] >= 1
+        assert service.get_stats()["pending"] == 0
+
+    def test_stuck_worker_is_terminated(self, service):
+        async def scenario():
+            job = asyncio.ensure_future(service._run(STUCK_CONTENT, "txt"))
+            await asyncio.sleep(1)
+            executor = service._executor
+            workers = list(executor._processes.values())
+            with pytest.raises(ExtractionError):
+                await job
+            return executor, workers
+
+        old_executor, workers = asyncio.run(scenario())
+
+        assert workers
+        assert service._executor is not old_executor
+        for process in workers:
+            process.join(timeout=5)
+            assert not process.is_alive()
@@ -0,0 +1,348 @@
+"""
+Text Extraction Service - Shared PDF/DOCX/TXT text extraction for uploads
+
+Used by every endpoint that reads an uploaded CV (ATS check, CV analysis,
+extract-and-enhance, CV data extraction). Parsing runs in a small process
+pool so it never blocks the event loop, uploads are capped in bytes, PDFs
+are read page by page and stop at the page/character limits, DOCX files are
+read in document order including tables, headers and footers, and the text
+is whitespace-normalized. Results are cached by the SHA-256 of the uploaded
+bytes, so re-uploading the same file skips parsing entirely.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import re
+import time
+from collections import OrderedDict
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, Optional
+
+from fastapi import HTTPException, UploadFile
+
+logger = logging.getLogger(__name__)
+
+# Configuration (overridable via environment)
+TEXT_EXTRACTION_WORKERS = int(os.environ.get("TEXT_EXTRACTION_WORKERS", 2))
+TEXT_EXTRACTION_MAX_PENDING = int(os.environ.get("TEXT_EXTRACTION_MAX_PENDING", TEXT_EXTRACTION_WORKERS * 8))
+TEXT_EXTRACTION_TIMEOUT = float(os.environ.get("TEXT_EXTRACTION_TIMEOUT", 20))
+TEXT_EXTRACTION_MAX_BYTES = int(os.environ.get("TEXT_EXTRACTION_MAX_BYTES", 10 * 1024 * 1024))
+TEXT_EXTRACTION_MAX_PAGES = int(os.environ.get("TEXT_EXTRACTION_MAX_PAGES", 20))
+TEXT_EXTRACTION_MAX_CHARS = int(os.environ.get("TEXT_EXTRACTION_MAX_CHARS", 100_000))
+TEXT_EXTRACTION_CACHE_BYTES = int(os.environ.get("TEXT_EXTRACTION_CACHE_BYTES", 32 * 1024 * 1024))
+
+
+class ExtractionError(HTTPException):
+    """Raised when an upload cannot be read"""
+
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(status_code=status_code, detail=detail)
+
+
+# ---------- parsing (runs in worker processes) ----------
+
+_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+_HORIZONTAL_SPACE = re.compile(r"[ \t\u00a0\u2000-\u200b\u202f\u205f\u3000]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def normalize_whitespace(text: str) -> str:
+    """Collapse runs of spaces, trim lines and limit blank lines to one"""
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = _CONTROL_CHARS.sub("", text)
+    text = _HORIZONTAL_SPACE.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def _iter_docx_blocks(document) -> Iterator[str]:
+    """Paragraph and table text in document order (headers/footers first)"""
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+    from docx.oxml.ns import qn
+
+    def walk(container_element, parent):
+        for child in container_element.iterchildren():
+            if child.tag == qn("w:p"):
+                yield Paragraph(child, parent).text
+            elif child.tag == qn("w:tbl"):
+                table = Table(child, parent)
+                for row in table.rows:
+                    cells = []
+                    seen = set()
+                    for cell in row.cells:
+                        # Merged cells repeat the same element
+                        if id(cell._tc) in seen:
+                            continue
+                        seen.add(id(cell._tc))
+                        cells.append(" ".join(walk(cell._tc, cell)))
+                    yield " | ".join(c for c in cells if c.strip())
+            elif child.tag == qn("w:sdt"):
+                content = child.find(qn("w:sdtContent"))
+                if content is not None:
+                    yield from walk(content, parent)
+
+    seen_parts = set()
+    for section in document.sections:
+        for part in (section.header, section.footer):
+            if part.is_linked_to_previous or id(part._element) in seen_parts:
+                continue
+            seen_parts.add(id(part._element))
+            yield from walk(part._element, part)
+    yield from walk(document.element.body, document)
+
+
+def extract_document_text(
+    content: bytes,
+    file_type: str,
+    max_pages: int = TEXT_EXTRACTION_MAX_PAGES,
+    max_chars: int = TEXT_EXTRACTION_MAX_CHARS
+) -> Dict[str, Any]:
+    """
+    Extract normalized text from a PDF, DOCX or text file.
+    Stops early once max_pages pages or max_chars characters were read.
+    """
+    chunks = []
+    length = 0
+    pages_read = 0
+    truncated = False
+
+    total_pages = None
+    if file_type == "pdf":
+        import PyPDF2
+        reader = PyPDF2.PdfReader(io.BytesIO(content))
+        total_pages = len(reader.pages)
+        # Pages are parsed lazily, so reading stops at the first limit hit
+        blocks = (page.extract_text() or "" for page in islice(reader.pages, max_pages))
+    elif file_type == "docx":
+        from docx import Document
+        blocks = _iter_docx_blocks(Document(io.BytesIO(content)))
+    else:
+        try:
+            blocks = iter([content.decode("utf-8")])
+        except UnicodeDecodeError:
+            blocks = iter([content.decode("latin-1")])
+
+    for block in blocks:
+        pages_read += 1
+        chunks.append(block)
+        length += len(block)
+        if length >= max_chars:
+            truncated = True
+            break
+
+    if total_pages is not None and total_pages > pages_read:
+        truncated = True
+
+    text = normalize_whitespace("\n".join(chunks))[:max_chars]
+    return {
+        "text": text,
+        "file_type": file_type,
+        "pages_read": pages_read if file_type == "pdf" else None,
+        "total_pages": total_pages,
+        "truncated": truncated
+    }
+
+
+# ---------- service ----------
+
+def detect_file_type(filename: Optional[str], content: bytes) -> str:
+    """pdf, docx, doc or txt - by magic bytes first, then by extension"""
+    if content[:5] == b"%PDF-":
+        return "pdf"
+    if content[:2] == b"PK":
+        return "docx"
+    if content[:4] == b"\xd0\xcf\x11\xe0":
+        # Legacy binary Word document
+        return "doc"
+    extension = (filename or "").lower().rsplit(".", 1)[-1]
+    if extension == "pdf":
+        return "pdf"
+    if extension == "docx":
+        return "docx"
+    return "txt"
+
+
+async def read_upload(file: UploadFile, max_bytes: int = TEXT_EXTRACTION_MAX_BYTES) -> bytes:
+    """Read an upload, rejecting files over the byte limit without reading them fully"""
+    content = await file.read(max_bytes + 1)
+    if len(content) > max_bytes:
+        raise ExtractionError(
+            f"File is too large. Maximum size is {max_bytes // (1024 * 1024)} MB.",
+            status_code=413
+        )
+    return content
+
+
+class TextExtractionService:
+    def __init__(
+        self,
+        max_workers: int = TEXT_EXTRACTION_WORKERS,
+        max_pending: int = TEXT_EXTRACTION_MAX_PENDING,
+        timeout: float = TEXT_EXTRACTION_TIMEOUT,
+        cache_budget: int = TEXT_EXTRACTION_CACHE_BYTES
+    ):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.cache_budget = cache_budget
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cache_bytes = 0
+        self.stats = {"extracted": 0, "cache_hits": 0, "failed": 0, "timed_out": 0, "rejected": 0, "recycled": 0}
+
+    def start(self):
+        """Start the worker pool (called on app startup, otherwise lazily)"""
+        if self._executor is None:
+            # Spawn rather than fork, as for the PDF render pool
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"Text extraction pool started: {self.max_workers} workers")
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # ---------- cache ----------
+
+    def _cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+        return result
+
+    def _cache_put(self, key: str, result: Dict[str, Any]):
+        size = len(result["text"])
+        if key in self._cache:
+            self._cache_bytes -= len(self._cache.pop(key)["text"])
+        self._cache[key] = result
+        self._cache_bytes += size
+        while self._cache_bytes > self.cache_budget and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted["text"])
+
+    # ---------- extraction ----------
+
+    def _recycle(self, executor: ProcessPoolExecutor, reason: str):
+        """Replace a pool, terminating its workers and whatever they are still parsing"""
+        if self._executor is not executor:
+            # Already replaced by another job
+            return
+        logger.warning(f"Restarting text extraction pool: {reason}")
+        self._executor = None
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        # Jobs still queued on the old pool fail with BrokenProcessPool once its workers are gone
+        executor.shutdown(wait=False)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        self.stats["recycled"] += 1
+        self.start()
+
+    async def _run(self, content: bytes, file_type: str) -> Dict[str, Any]:
+        if self._pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Document processing is busy right now. Please try again in a few seconds.",
+                headers={"Retry-After": "5"}
+            )
+        deadline = time.monotonic() + self.timeout
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        try:
+            for attempt in range(2):
+                executor = self.start()
+                try:
+                    future = loop.run_in_executor(executor, extract_document_text, content, file_type)
+                    return await asyncio.wait_for(future, timeout=max(deadline - time.monotonic(), 0.001))
+                except asyncio.TimeoutError:
+                    self.stats["timed_out"] += 1
+                    # Stop the parse: it would otherwise hold a worker after the upload has been answered
+                    self._recycle(executor, f"{file_type} extraction timed out")
+                    raise ExtractionError("Reading the document took too long. Please upload a smaller file.", status_code=422)
+                except BrokenProcessPool:
+                    self._recycle(executor, "a worker process died")
+                    if attempt == 0:
+                        # Lost with the pool (e.g. recycled after another upload's timeout): retry on the new one
+                        continue
+                    raise
+        finally:
+            self._pending -= 1
+
+    async def extract_document(self, content: bytes, filename: Optional[str] = None, lenient: bool = False) -> Dict[str, Any]:
+        """
+        Extract text and metadata (sha256, file_type, pages_read, truncated).
+
+        With lenient=True an unparseable PDF/DOCX is read as plain text
+        instead of raising, matching the forgiving behaviour of the public
+        ATS checker.
+        """
+        if len(content) > TEXT_EXTRACTION_MAX_BYTES:
+            raise ExtractionError(
+                f"File is too large. Maximum size is {TEXT_EXTRACTION_MAX_BYTES // (1024 * 1024)} MB.",
+                status_code=413
+            )
+
+        sha256 = hashlib.sha256(content).hexdigest()
+        file_type = detect_file_type(filename, content)
+        cache_key = f"{sha256}:{file_type}:{int(lenient)}"
+
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return {**cached, "cached": True}
+
+        try:
+            if file_type == "doc":
+                raise ValueError("legacy .doc files are not supported, please upload a PDF or DOCX")
+            result = await self._run(content, file_type)
+        except HTTPException:
+            raise
+        except Exception as e:
+            self.stats["failed"] += 1
+            if not lenient:
+                logger.error(f"Error extracting {file_type.upper()} text: {str(e)}")
+                raise ExtractionError(f"Could not read {file_type.upper()}: {str(e)}")
+            logger.warning(f"{file_type.upper()} extraction failed: {e}, trying as text")
+            result = {
+                "text": normalize_whitespace(content.decode("utf-8", errors="ignore"))[:TEXT_EXTRACTION_MAX_CHARS],
+                "file_type": "txt",
+                "pages_read": None,
+                "total_pages": None,
+                "truncated": False
+            }
+
+        result["sha256"] = sha256
+        self.stats["extracted"] += 1
+        self._cache_put(cache_key, result)
+        return {**result, "cached": False}
+
+    async def extract(self, content: bytes, filename: Optional[str] = None, lenient: bool = False) -> str:
+        """Extracted, whitespace-normalized text of an uploaded document"""
+        return (await self.extract_document(content, filename, lenient))["text"]
+
+    def get_stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "cache_entries": len(self._cache),
+            "cache_bytes": self._cache_bytes,
+            "cache_budget": self.cache_budget,
+            **self.stats
+        }
+
+
+# Global instance
+text_extraction_service = TextExtractionService()
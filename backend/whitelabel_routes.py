@@ -54,11 +54,11 @@ async def send_contact_notification_email(name: str, email: str, subject: str, m
         </html>
         """
         
-        await email_service.send_email(
+        await email_service.queue_email(
             to_email=admin_email,
             subject=f"[Contact Form] {subject}",
             html_body=email_content,
-            raise_exceptions=False
+            email_type="contact_form"
         )
         logger.info(f"Contact form notification sent to {admin_email}")
     except Exception as email_error:
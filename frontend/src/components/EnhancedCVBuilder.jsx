@@ -667,9 +667,20 @@ const EnhancedCVBuilder = ({ isPartner = false, baseUrl = '', primaryColor = '#1
                 ...exp
               }))
             : prev.experiences,
-          skills: data.enhanced_skills?.length > 0 ? data.enhanced_skills : prev.skills
+          skills: data.enhanced_skills?.length > 0 ? data.enhanced_skills : prev.skills,
+          education: data.enhanced_education?.length > 0
+            ? data.enhanced_education.map((edu, i) => ({
+                ...prev.education[i],
+                ...edu
+              }))
+            : prev.education
         }));
-        toast({ title: 'CV Enhanced!', description: 'All sections have been improved by AI' });
+        toast({
+          title: 'CV Enhanced!',
+          description: data.partial
+            ? 'Most sections were improved by AI. Some could not be enhanced and were left as they were.'
+            : 'All sections have been improved by AI'
+        });
       }
     } catch (error) {
       toast({ title: 'Error', description: 'Failed to enhance CV', variant: 'destructive' });
@@ -744,19 +755,13 @@ const EnhancedCVBuilder = ({ isPartner = false, baseUrl = '', primaryColor = '#1
       if (response.ok) {
         const data = await response.json();
         
-        // Download PDF
-        const pdfBlob = new Blob(
-          [Uint8Array.from(atob(data.pdf_base64), c => c.charCodeAt(0))],
-          { type: 'application/pdf' }
-        );
-        const url = URL.createObjectURL(pdfBlob);
+        // Download PDF via the short-lived signed link
         const a = document.createElement('a');
-        a.href = url;
+        a.href = `${API_URL}${data.download_url}`;
         a.download = data.filename || `CV_${formData.fullName.replace(/\s+/g, '_')}.pdf`;
         document.body.appendChild(a);
         a.click();
         document.body.removeChild(a);
-        URL.revokeObjectURL(url);
 
         toast({ 
           title: 'CV Created!', 
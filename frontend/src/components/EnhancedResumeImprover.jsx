@@ -206,7 +206,7 @@ const EnhancedResumeImprover = ({ isPartner = false, baseUrl = '', primaryColor
           languages: extractedData.languages || [],
           summary: data.enhanced_summary || extractedData.summary,
           experiences: data.enhanced_experiences || extractedData.experiences,
-          education: extractedData.education,
+          education: data.enhanced_education || extractedData.education,
           certifications: extractedData.certifications || [],
           skills: data.enhanced_skills || extractedData.skills,
           references: extractedData.references || []
@@ -243,19 +243,13 @@ const EnhancedResumeImprover = ({ isPartner = false, baseUrl = '', primaryColor
       if (response.ok) {
         const data = await response.json();
         
-        // Download PDF
-        const pdfBlob = new Blob(
-          [Uint8Array.from(atob(data.pdf_base64), c => c.charCodeAt(0))],
-          { type: 'application/pdf' }
-        );
-        const url = URL.createObjectURL(pdfBlob);
+        // Download PDF via the short-lived signed link
         const a = document.createElement('a');
-        a.href = url;
+        a.href = `${API_URL}${data.download_url}`;
         a.download = data.filename;
         document.body.appendChild(a);
         a.click();
         document.body.removeChild(a);
-        URL.revokeObjectURL(url);
 
         toast({ title: 'Success!', description: 'Your improved CV has been downloaded and saved to My Documents.' });
       }
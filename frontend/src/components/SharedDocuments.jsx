@@ -103,15 +103,11 @@ const SharedDocuments = ({
       const response = await fetch(`${API_URL}/api/cv/documents/${doc.id}/download`, { headers });
 
       if (response.ok) {
-        const data = await response.json();
-        const pdfBlob = new Blob(
-          [Uint8Array.from(atob(data.pdf_base64), c => c.charCodeAt(0))],
-          { type: 'application/pdf' }
-        );
+        const pdfBlob = await response.blob();
         const url = URL.createObjectURL(pdfBlob);
         const a = document.createElement('a');
         a.href = url;
-        a.download = data.filename || `${doc.name}.pdf`;
+        a.download = `${doc.name}.pdf`;
         document.body.appendChild(a);
         a.click();
         document.body.removeChild(a);